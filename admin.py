@@ -179,7 +179,7 @@ def clients(user):
     
     try:
         # Try to use list_clients function
-        clients_data = list_clients(cursor, page, per_page, filters)
+        clients_data = list_clients(cursor, page, per_page, filters, page_cursor=request.args.get('cursor'))
     except Exception as e:
         # Fallback to direct DB query if function not available
         logging.error(f"Error using list_clients: {e}")
@@ -291,6 +291,46 @@ def user_delete(user, user_id):
     
     return redirect(url_for('admin.user_list'))
 
+@admin_bp.route('/api/leads/search')
+@admin_required
+def search_leads_api(user):
+    """Ranked prefix search over leads across all clients"""
+    query = request.args.get('q', '').strip()
+    limit = min(100, max(1, request.args.get('limit', 25, type=int)))
+    client_id = request.args.get('client_id', type=int)
+    
+    if not query:
+        return jsonify({'status': 'success', 'leads': []})
+    
+    try:
+        from search_index import search_leads
+        conn = get_db_connection()
+        try:
+            leads = search_leads(conn, query, limit=limit, client_id=client_id)
+        finally:
+            conn.close()
+        return jsonify({'status': 'success', 'leads': leads})
+    except Exception as e:
+        logger.error(f"Error searching leads: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@admin_bp.route('/api/storage')
+@admin_required
+def storage_report_api(user):
+    """Per-tenant disk usage of hot and archived scan data"""
+    try:
+        from scan_archive import RETENTION_DAYS, tenant_storage_report
+        tenants = tenant_storage_report()
+        return jsonify({
+            'status': 'success',
+            'retention_days': RETENTION_DAYS,
+            'total_bytes': sum(tenant['total_bytes'] for tenant in tenants),
+            'tenants': tenants
+        })
+    except Exception as e:
+        logger.error(f"Error building storage report: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 # Missing admin routes
 
 @admin_bp.route('/subscriptions')
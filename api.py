@@ -6,8 +6,10 @@ import json
 from flask import Blueprint, request, jsonify, flash, redirect, url_for
 from client_db import (
     create_client, get_client_by_id, update_client, delete_client, 
-    get_client_by_api_key, log_scan, regenerate_api_key, list_clients
+    log_scan, regenerate_api_key, list_clients
 )
+from api_key_cache import get_client as get_client_by_api_key
+from rate_limit import enforce, ip_bucket, key_bucket
 from scanner_template import generate_scanner, update_scanner
 
 # Create blueprint for API routes
@@ -29,6 +31,11 @@ def api_key_required(f):
                 'message': 'Missing API key'
             }), 401
         
+        # Turn away floods from one address before looking up the key
+        limited = enforce([ip_bucket(request.remote_addr, 'api')])
+        if limited:
+            return limited
+        
         # Get client by API key
         client = get_client_by_api_key(api_key)
         
@@ -37,6 +44,10 @@ def api_key_required(f):
                 'status': 'error',
                 'message': 'Invalid API key'
             }), 401
+        
+        limited = enforce([key_bucket(api_key, client)])
+        if limited:
+            return limited
             
         # Set client in request context for the view function
         kwargs['client'] = client
@@ -381,7 +392,7 @@ def list_all_clients():
             filters['search'] = request.args.get('search')
         
         # Get client list
-        result = list_clients(page, per_page, filters)
+        result = list_clients(None, page, per_page, filters, page_cursor=request.args.get('cursor'))
         
         # Return client list
         return jsonify({
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+In-process cache of API credentials.
+
+The v1 API (X-API-Key, clients.api_key) and the scanner API (Bearer key,
+scanners.api_key) used to look up the key in the database on every call.
+Resolved credentials are now cached per worker. Keys are the SHA-256 of the
+API key, so plaintext keys never sit in the cache, and the api_key column is
+stripped from cached records. A cached client record carries the client's
+scanners and subscription level, so hot integrations authenticate without
+any database I/O.
+
+Unknown keys are cached briefly as misses, which keeps invalid-key floods
+off the database. Regenerating a client or scanner key publishes a
+'api_client' invalidation that drops the client's entries in every worker;
+configuration changes ('tenant_config', e.g. a plan change) do the same.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import invalidation
+from migrations import CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+API_KEY_CACHE_TTL = float(os.environ.get('API_KEY_CACHE_TTL', '300'))
+MISS_TTL = 5
+MAX_ENTRIES = 10000
+
+_clients = {}      # key hash -> (expires monotonic, client dict or None)
+_scanners = {}     # (scanner uid, key hash) -> (expires monotonic, (scanner dict, client dict) or None)
+_lock = threading.Lock()
+
+
+def key_hash(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def _get(cache, key):
+    entry = cache.get(key)
+    if entry is None or entry[0] <= time.monotonic():
+        return False, None
+    return True, entry[1]
+
+
+def _put(cache, key, value):
+    invalidation.ensure_listening(on_error=clear)
+    ttl = API_KEY_CACHE_TTL if value is not None else MISS_TTL
+    with _lock:
+        if len(cache) >= MAX_ENTRIES:
+            now = time.monotonic()
+            for stale in [k for k, entry in cache.items() if entry[0] <= now]:
+                del cache[stale]
+            while len(cache) >= MAX_ENTRIES:
+                del cache[next(iter(cache))]
+        cache[key] = (time.monotonic() + ttl, value)
+
+
+def _connect():
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _client_record(cursor, client_id=None, api_key=None):
+    """Client row with customizations, scanner list and subscription level"""
+    cursor.execute(f'''
+    SELECT c.*, cu.*, ds.subdomain, ds.deploy_status, c.id AS id
+    FROM clients c
+    LEFT JOIN customizations cu ON c.id = cu.client_id
+    LEFT JOIN deployed_scanners ds ON c.id = ds.client_id
+    WHERE {'c.api_key = ?' if api_key is not None else 'c.id = ?'}
+    ''', (api_key if api_key is not None else client_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    client = dict(row)
+    client.pop('api_key', None)
+    if client.get('default_scans'):
+        try:
+            client['default_scans'] = json.loads(client['default_scans'])
+        except (TypeError, ValueError):
+            client['default_scans'] = []
+
+    cursor.execute('''
+    SELECT id, scanner_id, name, status FROM scanners
+    WHERE client_id = ? AND (status IS NULL OR status != 'deleted')
+    ''', (client['id'],))
+    client['scanners'] = [dict(scanner) for scanner in cursor.fetchall()]
+    client['subscription_level'] = client.get('subscription_level') or 'basic'
+    return client
+
+
+def get_client(api_key):
+    """
+    Client record for a v1 API key.
+
+    Returns:
+        dict: Client record (without api_key) or None if the key is unknown
+    """
+    if not api_key:
+        return None
+    key = key_hash(api_key)
+    found, client = _get(_clients, key)
+    if not found:
+        conn = _connect()
+        try:
+            client = _client_record(conn.cursor(), api_key=api_key)
+        except sqlite3.Error as e:
+            logger.error(f"Error looking up API key: {e}")
+            return None
+        finally:
+            conn.close()
+        _put(_clients, key, client)
+    return copy.deepcopy(client)
+
+
+def get_scanner(scanner_uid, api_key):
+    """
+    Scanner and owning client for a scanner API key.
+
+    Returns:
+        tuple: (scanner dict, client dict) or (None, None) if the pair is unknown
+    """
+    if not scanner_uid or not api_key:
+        return None, None
+    key = (scanner_uid, key_hash(api_key))
+    found, resolved = _get(_scanners, key)
+    if not found:
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, client_id FROM scanners WHERE scanner_id = ? AND api_key = ?',
+                           (scanner_uid, api_key))
+            scanner = cursor.fetchone()
+            resolved = None
+            if scanner:
+                resolved = (dict(scanner), _client_record(cursor, client_id=scanner['client_id']))
+        except sqlite3.Error as e:
+            logger.error(f"Error looking up scanner API key: {e}")
+            return None, None
+        finally:
+            conn.close()
+        _put(_scanners, key, resolved)
+    if not resolved:
+        return None, None
+    scanner, client = copy.deepcopy(resolved)
+    return scanner, client
+
+
+def _drop_client(client_id):
+    client_id = int(client_id)
+    with _lock:
+        for key in [k for k, entry in _clients.items() if entry[1] and entry[1]['id'] == client_id]:
+            del _clients[key]
+        for key in [k for k, entry in _scanners.items() if entry[1] and entry[1][0]['client_id'] == client_id]:
+            del _scanners[key]
+        # A regenerated key may have been looked up (and missed) moments ago
+        for cache in (_clients, _scanners):
+            for key in [k for k, entry in cache.items() if entry[1] is None]:
+                del cache[key]
+
+
+def invalidate_client(client_id, conn=None):
+    """Drop a client's cached credentials in every worker (key regeneration, plan changes)"""
+    if client_id is not None:
+        invalidation.publish('api_client', client_id, conn)
+
+
+def clear():
+    with _lock:
+        _clients.clear()
+        _scanners.clear()
+
+
+invalidation.subscribe('api_client', _drop_client)
+invalidation.subscribe('tenant_config', _drop_client)
@@ -28,6 +28,13 @@ app = Flask(__name__)
 # Load configuration
 app.config.from_object('config.Config')
 
+# Render terminates connections at its proxy: take the client address from
+# X-Forwarded-For so per-IP rate limits don't put every visitor in one bucket
+from werkzeug.middleware.proxy_fix import ProxyFix
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '1'))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
 # Ensure the instance folder exists
 os.makedirs(app.instance_path, exist_ok=True)
 
@@ -165,6 +172,58 @@ except Exception as e:
 # Disabled other emergency routes to prevent interference
 logger.info("✅ Using standalone scanner for all embed requests")
 
+# Migrate leads.db and every client database once, so request paths can assume the schema
+from migrations import migrate_all
+migrate_all()
+
+# Replay any writes a previous worker queued but didn't persist
+from write_behind import start_writer
+start_writer()
+
+# Deliver report emails queued by this or a previous worker over a pooled SMTP connection
+from mail_queue import start_sender
+start_sender()
+
+# Archive old scan payloads and vacuum client databases on a schedule
+from scan_archive import start_retention_scheduler
+start_retention_scheduler()
+
+# Automatic backups run in the background when enabled in backup settings
+from backup_service import start_backup_scheduler
+start_backup_scheduler()
+
+# Delete expired session rows hourly; verified sessions are cached per worker
+from session_cache import start_session_sweeper
+start_session_sweeper()
+
+# Token-bucket limits on the scan endpoints and APIs, shared across workers
+import rate_limit
+rate_limit.init_app(app)
+
+# Sample process, database and queue health in the background for the admin views
+import health_sampler
+health_sampler.init_app(app)
+
+# Long-lived caching for generated scanner deployment files
+import http_cache
+http_cache.init_app(app)
+
+# gzip/brotli for large HTML/JSON responses and precompressed static assets
+import compression
+compression.init_app(app)
+
+# Compiled templates are cached on disk so new workers skip compilation
+import report_templates
+report_templates.init_app(app)
+
+# The admin dashboard reads a snapshot refreshed here, periodically and on invalidation
+from dashboard_snapshot import start_refresher
+start_refresher()
+
+# Re-queue report renders left pending by a worker that stopped
+from report_artifacts import start_requeue_task
+start_requeue_task()
+
 if __name__ == "__main__":
     # For development
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
@@ -286,16 +286,22 @@ def update_user(user_id, user_data, admin_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         
+        full_name = user_data.get('full_name', '')
+        email = user_data.get('email', '')
+        cursor.execute("SELECT full_name, email FROM users WHERE id = ?", (user_id,))
+        current = cursor.fetchone()
+        
         # Update user record
         cursor.execute("""
             UPDATE users 
             SET full_name = ?, email = ?
             WHERE id = ?
-        """, (
-            user_data.get('full_name', ''),
-            user_data.get('email', ''),
-            user_id
-        ))
+        """, (full_name, email, user_id))
+        
+        # Cached sessions carry the name and email; drop them in every worker with this commit
+        if current and (current[0], current[1]) != (full_name, email):
+            import session_cache
+            session_cache.invalidate_user(user_id, conn)
         conn.commit()
         conn.close()
         
@@ -6,12 +6,18 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 
+import login_pipeline
+import session_cache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define database path
-CLIENT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+CLIENT_DB_PATH = os.environ.get(
+    'CLIENT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+)
 
 def save_uploaded_file(file, directory, allowed_extensions=None):
     """Save uploaded file with security checks"""
@@ -70,35 +76,12 @@ def authenticate_user(username_or_email, password, ip_address=None, user_agent=N
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Find user by username or email
-        cursor.execute('''
-        SELECT * FROM users 
-        WHERE (username = ? OR email = ?) AND active = 1
-        ''', (username_or_email, username_or_email))
-        
-        user = cursor.fetchone()
-        
-        if not user:
-            conn.close()
-            return {"status": "error", "message": "Invalid credentials"}
-        
-        # Verify password
-        try:
-            # Get stored salt and hash
-            salt = user['salt']
-            stored_hash = user['password_hash']
-            
-            # Compute hash with same parameters
-            password_hash, _ = hash_password(password, salt)
-            
-            password_correct = (password_hash == stored_hash)
-        except Exception as e:
-            logger.error(f"Password verification error: {e}")
-            password_correct = False
+        # Throttle, then verify the password (hashed in this request thread)
+        user, error = login_pipeline.authenticate(cursor, username_or_email, password, ip_address)
         
-        if not password_correct:
+        if error:
             conn.close()
-            return {"status": "error", "message": "Invalid credentials"}
+            return error
         
         # Create a session token
         session_token = secrets.token_hex(32)
@@ -220,6 +203,10 @@ def verify_session(session_token):
         if not session_token:
             return {"status": "error", "message": "No session token provided"}
         
+        cached = session_cache.get_session(session_token)
+        if cached:
+            return cached
+        
         # Connect to database
         conn = sqlite3.connect(CLIENT_DB_PATH)
         conn.row_factory = sqlite3.Row
@@ -271,6 +258,7 @@ def verify_session(session_token):
         }
         
         conn.close()
+        session_cache.store_session(session_token, result, session['expires_at'])
         return result
     
     except Exception as e:
@@ -327,6 +315,7 @@ def logout_user(session_token):
         
         # Delete the session
         cursor.execute('DELETE FROM sessions WHERE session_token = ?', (session_token,))
+        session_cache.invalidate_token(session_token, conn)
         
         conn.commit()
         conn.close()
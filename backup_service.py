@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Online, incremental, compressed database backups.
+
+Backups copy each database with the sqlite3 online backup API in small page
+steps, sleeping between steps so scan writes are never locked out for long.
+Each copy is gzipped into the backup directory as
+<name>_<YYYYmmdd_HHMMSS>.db.gz.
+
+A manifest (backup_manifest.json) in the backup directory records each
+source's change signature: the header's file change counter, plus size and
+mtime of the file and any WAL. Sources whose signature hasn't moved since
+their last backup are skipped, so a run over thousands of idle client
+databases only copies the few that changed.
+
+Backups run in a background thread, so neither the admin request nor the
+gunicorn worker waits on them. Scheduled runs follow the
+auto_backup_enabled / backup_frequency settings and are claimed across
+workers through maintenance.claim_task().
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from migrations import CLIENT_DB_DIR, CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+MANIFEST_NAME = 'backup_manifest.json'
+BACKUP_PAGES = int(os.environ.get('BACKUP_PAGES_PER_STEP', '256'))
+BACKUP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', '0.05'))
+SCHEDULE_CHECK_INTERVAL = 3600
+FREQUENCIES = {'hourly': timedelta(hours=1), 'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+
+_run_lock = threading.Lock()
+_status = {'running': False, 'started_at': None, 'current': None, 'last_result': None}
+
+
+def backup_sources(main_db_path=CLIENT_DB_PATH, leads_db_path=None, client_db_dir=CLIENT_DB_DIR, spool_paths=None):
+    """
+    Databases covered by a backup: main DB, leads.db, the write-behind and
+    mail spools (which hold accepted but unapplied writes and unsent
+    reports) and every client database and archive
+    """
+    if leads_db_path is None:
+        leads_db_path = os.path.abspath('leads.db')
+    if spool_paths is None:
+        from mail_queue import MAIL_SPOOL_PATH
+        from write_behind import SPOOL_PATH
+        spool_paths = [SPOOL_PATH, MAIL_SPOOL_PATH]
+    sources = [path for path in [main_db_path, leads_db_path] + list(spool_paths) if os.path.exists(path)]
+    sources += sorted(glob.glob(os.path.join(client_db_dir, '*.db')))
+    sources += sorted(glob.glob(os.path.join(client_db_dir, 'archive', '*.db')))
+    return sources
+
+
+def change_signature(db_path):
+    """
+    Cheap fingerprint that moves whenever the database changes.
+
+    The header's file change counter (bytes 24-27) is bumped on every commit
+    in rollback-journal mode; WAL commits don't bump it, so the WAL file's
+    size and mtime are included too.
+    """
+    with open(db_path, 'rb') as f:
+        header = f.read(100)
+    counter = int.from_bytes(header[24:28], 'big') if len(header) >= 28 else 0
+    stat = os.stat(db_path)
+    signature = [counter, stat.st_size, int(stat.st_mtime)]
+    wal_path = db_path + '-wal'
+    if os.path.exists(wal_path):
+        wal_stat = os.stat(wal_path)
+        signature += [wal_stat.st_size, int(wal_stat.st_mtime)]
+    return signature
+
+
+def _backup_name(db_path, timestamp):
+    """Backup file name, keeping archive databases distinct from hot ones"""
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    if os.path.basename(os.path.dirname(db_path)) == 'archive':
+        base = f'archive_{base}'
+    return f'{base}_{timestamp}.db.gz'
+
+
+def load_manifest(backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable backup manifest {path}: {e}")
+        return {}
+
+
+def _save_manifest(backup_dir, manifest):
+    path = os.path.join(backup_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def backup_database(db_path, target_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """
+    Copy one database with the online backup API and gzip the result.
+
+    The copy is taken pages at a time with a sleep between steps, so writers
+    on the source only wait for a single step. (The backup API's own sleep
+    argument only applies when a step hits SQLITE_BUSY/LOCKED, so the pause
+    between steps comes from the progress callback.)
+
+    Returns:
+        int: Size of the compressed backup in bytes
+    """
+    snapshot_path = target_path + '.partial'
+    source = sqlite3.connect(db_path, timeout=20.0)
+    try:
+        destination = sqlite3.connect(snapshot_path)
+        try:
+            def pause(status, remaining, total):
+                if remaining and sleep:
+                    time.sleep(sleep)
+
+            source.backup(destination, pages=pages, progress=pause, sleep=sleep)
+        finally:
+            destination.close()
+    finally:
+        source.close()
+
+    try:
+        with open(snapshot_path, 'rb') as raw, gzip.open(target_path + '.tmp', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.replace(target_path + '.tmp', target_path)
+    finally:
+        for leftover in (snapshot_path, target_path + '.tmp'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return os.path.getsize(target_path)
+
+
+def prune_backups(backup_dir, retention_days, manifest):
+    """Delete backups older than the retention window, keeping each source's latest"""
+    keep = {entry['file'] for entry in manifest.values()}
+    cutoff = time.time() - retention_days * 86400
+    removed = 0
+    for path in glob.glob(os.path.join(backup_dir, '*.db.gz')):
+        if os.path.basename(path) in keep or os.path.getmtime(path) >= cutoff:
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not remove old backup {path}: {e}")
+    return removed
+
+
+def run_backup(backup_dir=None, retention_days=7, sources=None, force=False):
+    """
+    Back up every changed database into backup_dir.
+
+    Args:
+        backup_dir (str): Destination directory (created if missing)
+        retention_days (int): Age after which superseded backups are deleted
+        sources (list): Databases to back up, default backup_sources()
+        force (bool): Copy every source even if unchanged
+
+    Returns:
+        dict: Counts of copied, unchanged and failed databases, bytes written
+    """
+    backup_dir = backup_dir or DEFAULT_BACKUP_DIR
+    os.makedirs(backup_dir, exist_ok=True)
+    manifest = load_manifest(backup_dir)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    result = {'copied': 0, 'unchanged': 0, 'failed': 0, 'bytes': 0, 'pruned': 0, 'backup_dir': backup_dir}
+
+    for db_path in (sources if sources is not None else backup_sources()):
+        key = os.path.abspath(db_path)
+        try:
+            # Taken before the copy, so a write that lands mid-backup is picked up next run
+            signature = change_signature(db_path)
+            previous = manifest.get(key)
+            if (not force and previous and previous.get('signature') == signature
+                    and os.path.exists(os.path.join(backup_dir, previous['file']))):
+                result['unchanged'] += 1
+                continue
+
+            _status['current'] = os.path.basename(db_path)
+            filename = _backup_name(db_path, timestamp)
+            size = backup_database(db_path, os.path.join(backup_dir, filename))
+            manifest[key] = {'signature': signature, 'file': filename, 'backed_up_at': datetime.now().isoformat()}
+            # Saved per database so an interrupted run keeps what it finished
+            _save_manifest(backup_dir, manifest)
+            result['copied'] += 1
+            result['bytes'] += size
+        except Exception as e:
+            logger.error(f"Error backing up {db_path}: {e}")
+            result['failed'] += 1
+
+    result['pruned'] = prune_backups(backup_dir, retention_days, manifest)
+    logger.info(f"Backup finished: {result}")
+    return result
+
+
+def _backup_settings():
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute('SELECT * FROM backup_settings LIMIT 1').fetchone()
+        return dict(row) if row else {}
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+
+def _record_backup(user_id=None):
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+    try:
+        now = datetime.now().isoformat()
+        if user_id is None:
+            conn.execute('UPDATE backup_settings SET last_backup = ? WHERE id = 1', (now,))
+        else:
+            conn.execute('UPDATE backup_settings SET last_backup = ?, last_updated = ?, updated_by = ? WHERE id = 1',
+                         (now, now, user_id))
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error recording backup time: {e}")
+    finally:
+        conn.close()
+
+
+def _run_with_status(settings, user_id=None, force=False):
+    try:
+        result = run_backup(settings.get('backup_path'), settings.get('backup_retention_days') or 7, force=force)
+        if not result['failed']:
+            _record_backup(user_id)
+        _status['last_result'] = dict(result, finished_at=datetime.now().isoformat())
+        return result
+    except Exception as e:
+        logger.error(f"Backup run failed: {e}")
+        _status['last_result'] = {'error': str(e), 'finished_at': datetime.now().isoformat()}
+        return None
+    finally:
+        _status.update(running=False, current=None)
+        _run_lock.release()
+
+
+def start_backup(user_id=None, force=False):
+    """
+    Start a backup in a background thread using the saved backup settings.
+
+    Returns:
+        bool: False if a backup is already running in this process
+    """
+    if not _run_lock.acquire(blocking=False):
+        return False
+    _status.update(running=True, started_at=datetime.now().isoformat(), current=None)
+    threading.Thread(
+        target=_run_with_status, args=(_backup_settings(), user_id, force),
+        name='database-backup', daemon=True
+    ).start()
+    return True
+
+
+def backup_status():
+    """Progress of the current run and the result of the last one in this process"""
+    return dict(_status)
+
+
+def run_scheduled_backup():
+    """Back up if auto backups are on and the configured frequency has elapsed"""
+    settings = _backup_settings()
+    if not settings.get('auto_backup_enabled'):
+        return 'disabled'
+    due = FREQUENCIES.get(settings.get('backup_frequency'), FREQUENCIES['daily'])
+    last = settings.get('last_backup')
+    if last and datetime.now() - datetime.fromisoformat(last) < due:
+        return 'not due'
+    if not _run_lock.acquire(blocking=False):
+        return 'already running'
+    _status.update(running=True, started_at=datetime.now().isoformat(), current=None)
+    return _run_with_status(settings)
+
+
+def start_backup_scheduler():
+    """Check hourly whether an automatic backup is due, shared across workers"""
+    from maintenance import start_periodic_task
+    start_periodic_task('database_backup', SCHEDULE_CHECK_INTERVAL, run_scheduled_backup)
+
+
+if __name__ == "__main__":
+    import sys
+
+    settings = _backup_settings()
+    print(json.dumps(run_backup(settings.get('backup_path'), settings.get('backup_retention_days') or 7,
+                                force='--force' in sys.argv), indent=2))
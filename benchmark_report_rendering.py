@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Compare report render times of the string-building generators and the
+compiled Jinja templates.
+
+The baseline is loaded from git: by default the revision just before the
+report templates were added. The benchmark renders a sample scan through
+both implementations and bypasses report_cache. It measures:
+
+    render time per report (mean / median over --iterations)
+    template load time in a new worker, without and with the bytecode cache
+
+Usage:
+    python benchmark_report_rendering.py [--iterations 200] [--baseline-rev REV]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import types
+
+import enhanced_scan_report_generator
+import report_templates
+import scan
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def sample_scan():
+    """A scan result with every section the reports render"""
+    findings = [
+        {'title': f'Finding {i}', 'severity': ('Critical', 'High', 'Medium', 'Low')[i % 4],
+         'description': 'Issue detected during the assessment', 'recommendation': 'Review and remediate'}
+        for i in range(8)
+    ]
+    return {
+        'scan_id': 'scan_benchmark',
+        'target': 'example.com',
+        'timestamp': '2025-06-01T12:00:00',
+        'risk_assessment': {
+            'overall_score': 68, 'risk_level': 'Medium', 'grade': 'C', 'color': '#ffcc00',
+            'component_scores': {'network': 55, 'web': 72, 'email': 81, 'ssl': 90}
+        },
+        'industry': {'name': 'Technology', 'benchmarks': {
+            'message': 'Your score is below the industry average', 'avg_score': 74,
+            'standing': 'Below Average', 'key_compliance': ['SOC 2', 'ISO 27001', 'GDPR']
+        }},
+        'network_security': {'findings': findings, 'open_ports': [
+            {'port': port, 'service': 'svc'} for port in (22, 80, 443, 3306, 8080)
+        ]},
+        'web_security': {'findings': findings, 'security_headers': {
+            'security_score': 45, 'missing_headers': [{'header': 'Content-Security-Policy'}, {'header': 'X-Frame-Options'}]
+        }},
+        'email_security': {
+            'findings': findings,
+            'spf_analysis': {'status': 'PASS'}, 'dkim_analysis': {'status': 'FAIL'}, 'dmarc_analysis': {'status': 'PASS'},
+            'spf': {'status': 'Valid', 'severity': 'Low'}, 'dmarc': {'status': 'Missing', 'severity': 'High'},
+            'dkim': {'status': 'Valid', 'severity': 'Low'}
+        },
+        'ssl_security': {'findings': findings, 'certificate_analysis': {
+            'status': 'valid', 'days_until_expiry': 45, 'not_before': '2025-01-01', 'not_after': '2025-12-31'
+        }},
+        'ssl_certificate': {'status': 'Valid', 'issuer': 'Example CA', 'days_remaining': 45, 'severity': 'Low'},
+        'security_headers': {'score': 45, 'severity': 'High'},
+        'system': {'firewall': {'status': 'Disabled', 'severity': 'Critical'},
+                   'os_updates': {'message': 'Updates pending', 'severity': 'High'}},
+        'recommendations': [
+            {'title': f'Recommendation {i}', 'priority': ('high', 'medium', 'low')[i % 3],
+             'description': 'Implement security best practices', 'category': 'General Security'}
+            for i in range(12)
+        ],
+        'threat_scenarios': [
+            {'name': f'Threat {i}', 'description': 'Scenario', 'impact': 'High', 'likelihood': 'Medium'}
+            for i in range(4)
+        ]
+    }
+
+
+def default_baseline_rev():
+    """Parent of the commit that introduced the report templates, or HEAD"""
+    added = subprocess.run(
+        ['git', 'log', '-1', '--diff-filter=A', '--format=%H', '--', 'templates/reports/enhanced_report.html'],
+        cwd=BASE_DIR, capture_output=True, text=True
+    ).stdout.strip()
+    return f'{added}~1' if added else 'HEAD'
+
+
+def load_baseline(rev, path):
+    """Import a module's source as of a git revision"""
+    source = subprocess.check_output(['git', 'show', f'{rev}:{path}'], cwd=BASE_DIR, text=True)
+    module = types.ModuleType(f'baseline_{os.path.splitext(path)[0]}')
+    module.__file__ = os.path.join(BASE_DIR, path)
+    exec(compile(source, f'{rev}:{path}', 'exec'), module.__dict__)
+    return module
+
+
+def time_renders(render, iterations):
+    render()  # first call pays for any template loading
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.mean(samples), statistics.median(samples)
+
+
+def time_template_load(cache_dir):
+    env = report_templates.create_environment(cache_dir=cache_dir)
+    started = time.perf_counter()
+    for name in report_templates.REPORT_TEMPLATES:
+        env.get_template(name)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--baseline-rev', default=None)
+    args = parser.parse_args()
+
+    rev = args.baseline_rev or default_baseline_rev()
+    baseline_scan = load_baseline(rev, 'scan.py')
+    baseline_enhanced = load_baseline(rev, 'enhanced_scan_report_generator.py')
+    results = sample_scan()
+    branding = {'business_name': 'Acme Security', 'primary_color': '#123456', 'secondary_color': '#abcdef'}
+
+    cases = [
+        ('scan report', lambda: baseline_scan._render_html_report(dict(results)),
+         lambda: scan._render_html_report(dict(results))),
+        ('enhanced report', lambda: baseline_enhanced._render_enhanced_html_report(dict(results), branding),
+         lambda: enhanced_scan_report_generator._render_enhanced_html_report(dict(results), branding)),
+    ]
+
+    print(f"Baseline: {rev}, {args.iterations} renders per case")
+    print(f"{'report':<18}{'baseline mean':>15}{'template mean':>15}{'baseline p50':>14}{'template p50':>14}")
+    for label, before, after in cases:
+        before_mean, before_median = time_renders(before, args.iterations)
+        after_mean, after_median = time_renders(after, args.iterations)
+        print(f"{label:<18}{before_mean:>13.3f}ms{after_mean:>13.3f}ms{before_median:>12.3f}ms{after_median:>12.3f}ms")
+
+    cache_dir = tempfile.mkdtemp(prefix='jinja-bench-')
+    try:
+        cold = time_template_load(cache_dir)    # compiles and fills the cache
+        warm = time_template_load(cache_dir)    # a new worker reading the cache
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    print(f"\nTemplate load in a new worker: {cold:.1f}ms compiling, {warm:.1f}ms from bytecode cache")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Compare the per-client and consolidated scan storage layouts.
+
+For each tenant count the benchmark provisions tenants in a temporary
+directory, writes scans through the same batch writer the write-behind
+pipeline uses, then measures:
+
+    tenant creation time
+    write throughput (scans/second)
+    dashboard latency (client statistics + first report page, uncached)
+    cross-tenant aggregation latency
+
+Usage:
+    python benchmark_scan_storage.py [--tenants 10,1000,10000] [--scans-per-tenant 5]
+"""
+
+import argparse
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import client_database_manager as manager
+from pagination import invalidate_counts
+from scan_storage import ConsolidatedScanStore, PerClientScanStore, get_scan_store, set_scan_store
+
+DASHBOARD_SAMPLES = 25
+
+
+def _fake_scan(client_id, index):
+    created = datetime.now() - timedelta(days=random.randint(0, 90), seconds=index)
+    return {
+        'client_id': client_id,
+        'scan_data': {
+            'scan_id': str(uuid.uuid4()),
+            'scanner_id': f'scanner_{client_id}_{index % 3}',
+            'timestamp': created.isoformat(),
+            'name': f'Lead {index}',
+            'email': f'lead{index}@tenant{client_id}.example',
+            'company': f'Company {index % 7}',
+            'target': f'tenant{client_id}.example',
+            'risk_assessment': {'overall_score': random.randint(30, 100)},
+            'findings': ['finding'] * 20
+        }
+    }
+
+
+def _write(store, payloads, batch_size=200):
+    """Apply scans the way the write-behind writer does: grouped by database, one commit per batch"""
+    groups = defaultdict(list)
+    for payload in payloads:
+        groups[store.db_path(payload['client_id'])].append(payload)
+    for db_path, items in groups.items():
+        conn = sqlite3.connect(db_path, timeout=20.0)
+        try:
+            for start in range(0, len(items), batch_size):
+                manager._write_client_scans(conn, items[start:start + batch_size])
+                conn.commit()
+        finally:
+            conn.close()
+
+
+def _timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run_layout(store, tenants, scans_per_tenant):
+    set_scan_store(store)
+    client_ids = list(range(1, tenants + 1))
+
+    create_seconds = _timed(lambda: [store.create_tenant(cid, f'Tenant {cid}') for cid in client_ids])
+
+    payloads = [_fake_scan(cid, i) for cid in client_ids for i in range(scans_per_tenant)]
+    random.shuffle(payloads)
+    write_seconds = _timed(lambda: _write(store, payloads))
+
+    dashboard = []
+    for cid in random.sample(client_ids, min(DASHBOARD_SAMPLES, len(client_ids))):
+        invalidate_counts()
+
+        def load_dashboard():
+            manager.get_client_scan_statistics(cid)
+            manager.get_client_scan_reports(cid, per_page=25)
+        dashboard.append(_timed(load_dashboard))
+
+    aggregate_seconds = _timed(manager.get_all_client_scan_statistics)
+
+    return {
+        'layout': store.name,
+        'tenants': tenants,
+        'scans': len(payloads),
+        'create_s': create_seconds,
+        'writes_per_s': len(payloads) / write_seconds if write_seconds else 0,
+        'dashboard_ms_p50': statistics.median(dashboard) * 1000,
+        'dashboard_ms_max': max(dashboard) * 1000,
+        'aggregate_ms': aggregate_seconds * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tenants', default='10,1000,10000', help='Comma-separated tenant counts')
+    parser.add_argument('--scans-per-tenant', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    original_store = get_scan_store()
+    results = []
+    try:
+        for tenants in [int(value) for value in args.tenants.split(',')]:
+            for make_store in (PerClientScanStore, ConsolidatedScanStore):
+                workdir = tempfile.mkdtemp(prefix='scan_storage_bench_')
+                try:
+                    if make_store is PerClientScanStore:
+                        store = PerClientScanStore(workdir)
+                    else:
+                        store = ConsolidatedScanStore(f'{workdir}/consolidated_scans.db')
+                    results.append(run_layout(store, tenants, args.scans_per_tenant))
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        set_scan_store(original_store)
+
+    header = f"{'layout':<13}{'tenants':>8}{'scans':>8}{'create s':>10}{'writes/s':>10}" \
+             f"{'dash p50 ms':>13}{'dash max ms':>13}{'aggregate ms':>14}"
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        print(f"{row['layout']:<13}{row['tenants']:>8}{row['scans']:>8}{row['create_s']:>10.2f}"
+              f"{row['writes_per_s']:>10.0f}{row['dashboard_ms_p50']:>13.2f}{row['dashboard_ms_max']:>13.2f}"
+              f"{row['aggregate_ms']:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
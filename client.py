@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, Response
 import os
 import logging
 import json
@@ -30,6 +30,7 @@ from client_db import (
     get_scan_statistics_for_client,
     get_db_connection
 )
+import tenant_config
 
 
 def get_color_for_score(score):
@@ -675,7 +676,8 @@ def scan_reports(user):
             # Ensure client database exists and is properly set up
             ensure_client_database(client['id'], client.get('business_name', 'Unknown Client'))
             
-            scan_reports, pagination = get_client_scan_reports(client['id'], page, per_page, filters)
+            scan_reports, pagination = get_client_scan_reports(client['id'], page, per_page, filters,
+                                                               page_cursor=request.args.get('cursor'))
             scan_stats = get_client_scan_statistics(client['id'])
             
             # If no data in client-specific database, fall back to main database
@@ -1177,7 +1179,8 @@ def scanner_reports(user, scanner_id):
         # Get scan reports for this specific scanner
         try:
             from client_database_manager import get_scanner_scan_reports
-            scan_reports, pagination = get_scanner_scan_reports(client['id'], scanner['scanner_id'], page, per_page)
+            scan_reports, pagination = get_scanner_scan_reports(client['id'], scanner['scanner_id'], page, per_page,
+                                                                page_cursor=request.args.get('cursor'))
         except Exception as e:
             logger.error(f"Error getting scanner reports: {e}")
             scan_reports, pagination = [], {'page': 1, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
@@ -1197,6 +1200,87 @@ def scanner_reports(user, scanner_id):
         flash('An error occurred while loading scanner reports', 'danger')
         return redirect(url_for('client.scanners'))
 
+def _export_response(client_id, dataset, suffix=None, scanner_id=None):
+    """Stream an export built from the request's format, columns and date range"""
+    from scan_export import FORMATS, export_filename, export_stream, select_columns
+    
+    fmt = request.args.get('format', 'csv')
+    try:
+        columns = select_columns(dataset, request.args.get('columns'))
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}'")
+        stream = export_stream(client_id, dataset, fmt, columns,
+                               date_from=request.args.get('date_from'),
+                               date_to=request.args.get('date_to'),
+                               scanner_id=scanner_id)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return Response(stream, mimetype=FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{export_filename(dataset, fmt, suffix)}"',
+        # Let proxies pass chunks through as they are produced
+        'X-Accel-Buffering': 'no',
+        'Cache-Control': 'no-store'
+    })
+
+@client_bp.route('/export/<dataset>')
+@client_required
+def export_data(user, dataset):
+    """Stream all of the client's scans or leads as CSV or NDJSON"""
+    client = get_client_by_user_id(user['user_id'])
+    
+    if not client:
+        return jsonify({'status': 'error', 'message': 'Client profile not found'}), 404
+    
+    return _export_response(client['id'], dataset)
+
+@client_bp.route('/scanners/<int:scanner_id>/export')
+@client_required
+def scanner_export(user, scanner_id):
+    """Stream one scanner's scan history as CSV or NDJSON"""
+    client = get_client_by_user_id(user['user_id'])
+    scanner = get_scanner_by_id(scanner_id)
+    
+    if not client or not scanner or scanner['client_id'] != client['id']:
+        return jsonify({'status': 'error', 'message': 'Scanner not found'}), 404
+    
+    return _export_response(client['id'], 'scans', suffix=scanner['scanner_id'], scanner_id=scanner['scanner_id'])
+
+@client_bp.route('/reports/<scan_id>/download/<fmt>')
+@client_required
+def download_report(user, scan_id, fmt):
+    """Serve a pre-rendered HTML or PDF report file"""
+    import report_artifacts
+
+    client = get_client_by_user_id(user['user_id'])
+
+    if not client:
+        return jsonify({'status': 'error', 'message': 'Client profile not found'}), 404
+    if fmt not in report_artifacts.FORMATS:
+        return jsonify({'status': 'error', 'message': f"Unknown report format '{fmt}'"}), 400
+
+    try:
+        response = report_artifacts.send_artifact(client['id'], scan_id, fmt)
+        if response is not None:
+            return response
+        row = report_artifacts.get_artifact(client['id'], scan_id, fmt)
+    except Exception as e:
+        logger.error(f"Error serving {fmt} report for scan {scan_id}: {e}")
+        return jsonify({'status': 'error', 'message': 'Report could not be loaded'}), 500
+
+    if not row:
+        return jsonify({'status': 'error', 'message': 'Scan not found'}), 404
+    if report_artifacts.exhausted(row):
+        # Retrying is pointless; polling clients must stop here
+        return jsonify({'status': 'error', 'message': 'The report could not be generated',
+                        'error': row.get('error')}), 500
+    if row['status'] in ('pending', 'failed'):
+        # Rendering runs in the background; the client polls until it is ready
+        response = jsonify({'status': 'pending', 'message': 'The report is being generated, try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 202
+    return jsonify({'status': 'error', 'message': row.get('error') or 'Report is not available'}), 404
+
 @client_bp.route('/reports/<scan_id>')
 @client_required
 def report_view(user, scan_id):
@@ -1244,31 +1328,10 @@ def report_view(user, scan_id):
         scanner_branding = None
         if scan and scan.get('scanner_id'):
             try:
-                from client_db import get_db_connection
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute('''
-                SELECT s.*, c.business_name,
-                       COALESCE(s.primary_color, cu.primary_color, '#02054c') as final_primary_color,
-                       COALESCE(s.secondary_color, cu.secondary_color, '#35a310') as final_secondary_color,
-                       COALESCE(s.logo_url, cu.logo_path, '') as final_logo_url,
-                       COALESCE(s.email_subject, cu.email_subject, 'Your Security Scan Report') as final_email_subject,
-                       COALESCE(s.email_intro, cu.email_intro, '') as final_email_intro,
-                       cu.scanner_description, cu.cta_button_text, cu.company_tagline, 
-                       cu.support_email, cu.custom_footer_text, cu.favicon_path
-                FROM scanners s 
-                JOIN clients c ON s.client_id = c.id 
-                LEFT JOIN customizations cu ON c.id = cu.client_id
-                WHERE s.scanner_id = ?
-                ''', (scan.get('scanner_id'),))
-                
-                scanner_row = cursor.fetchone()
-                conn.close()
+                from tenant_config import get_scanner
+                scanner_data = get_scanner(scan.get('scanner_id'))
                 
-                if scanner_row:
-                    # Convert to dict for easier access
-                    scanner_data = dict(scanner_row) if hasattr(scanner_row, 'keys') else dict(zip([col[0] for col in cursor.description], scanner_row))
-                    
+                if scanner_data:
                     # Create client branding object using COALESCED final values (same as scanner_routes.py)
                     scanner_branding = {
                         'business_name': scanner_data.get('name', scanner_data.get('business_name', '')),  # Use scanner name first
@@ -1285,7 +1348,8 @@ def report_view(user, scan_id):
                         'cta_button_text': scanner_data.get('cta_button_text', 'Start Security Scan'),
                         'company_tagline': scanner_data.get('company_tagline', ''),
                         'support_email': scanner_data.get('support_email', ''),
-                        'custom_footer_text': scanner_data.get('custom_footer_text', '')
+                        'custom_footer_text': scanner_data.get('custom_footer_text', ''),
+                        'config_version': scanner_data.get('config_version', 0)
                     }
                     
                     logger.info(f"Retrieved scanner branding for scanner {scan.get('scanner_id')}: primary={scanner_branding['primary_color']}, secondary={scanner_branding['secondary_color']}, logo={scanner_branding['logo_url']}")
@@ -1297,97 +1361,108 @@ def report_view(user, scan_id):
                 import traceback
                 logger.error(traceback.format_exc())
         
-        # Format scan data for template - preserve comprehensive scan data
-        formatted_scan = process_scan_data(scan)
-        if scan and not scan.get('client_info'):
-            # Check if this is from parsed_results (comprehensive) or raw database (minimal)
-            if scan.get('parsed_results') and scan['parsed_results'].get('findings'):
-                # Use the comprehensive parsed_results
-                formatted_scan = scan['parsed_results']
-                logger.info(f"Using comprehensive parsed_results with {len(formatted_scan.get('findings', []))} findings")
-            elif scan.get('scan_results'):
-                # Try to parse scan_results JSON field
-                try:
-                    import json
-                    comprehensive_data = json.loads(scan.get('scan_results', '{}'))
-                    if comprehensive_data.get('findings'):
-                        formatted_scan = comprehensive_data
-                        logger.info(f"Using comprehensive scan_results with {len(formatted_scan.get('findings', []))} findings")
-                except:
-                    pass
-            
-            # If we still don't have client_info, add it while preserving existing data
-            if not formatted_scan.get('client_info'):
-                # Copy the original scan data to preserve comprehensive results
-                if isinstance(formatted_scan, dict):
-                    formatted_scan = dict(formatted_scan)  # Make a copy
-                else:
-                    formatted_scan = dict(scan)
-                
-                # Add missing client_info structure without overriding existing comprehensive data
-                formatted_scan['client_info'] = {
-                    'name': scan.get('lead_name', formatted_scan.get('name', 'N/A')),
-                    'email': scan.get('lead_email', formatted_scan.get('email', 'N/A')),
-                    'company': scan.get('lead_company', formatted_scan.get('company', 'N/A')),
-                    'phone': scan.get('lead_phone', 'N/A'),
-                    'os': scan.get('user_agent', 'N/A'),
-                    'browser': scan.get('user_agent', 'N/A')
-                }
-                
-                # Ensure risk_assessment has required structure for template
-                if not formatted_scan.get('risk_assessment') or not isinstance(formatted_scan.get('risk_assessment'), dict):
-                    formatted_scan['risk_assessment'] = {
-                        'overall_score': scan.get('security_score', 75),
-                        'risk_level': scan.get('risk_level', 'Medium'),
-                        'color': get_color_for_score(scan.get('security_score', 75)),
-                        'critical_issues': 0,
-                        'high_issues': 1,
-                        'medium_issues': 1,
-                        'low_issues': 1
-                    }
-                
-                logger.info(f"Enhanced scan data: findings={len(formatted_scan.get('findings', []))}, recommendations={len(formatted_scan.get('recommendations', []))}")
-        
-        # Format risk levels for client-friendly display (if not already done)
-        if 'risk_assessment' in formatted_scan and 'risk_color' not in formatted_scan:
-            risk_level = formatted_scan['risk_assessment'].get('risk_level', 'Unknown')
-            if risk_level.lower() == 'critical':
-                formatted_scan['risk_color'] = 'danger'
-            elif risk_level.lower() == 'high':
-                formatted_scan['risk_color'] = 'warning'
-            elif risk_level.lower() == 'medium':
-                formatted_scan['risk_color'] = 'info'
-            else:
-                formatted_scan['risk_color'] = 'success'
-        
-        # Format dates for display (if not already done)
-        if 'timestamp' in formatted_scan and 'formatted_date' not in formatted_scan:
-            try:
-                dt = datetime.fromisoformat(formatted_scan['timestamp'])
-                formatted_scan['formatted_date'] = dt.strftime('%B %d, %Y at %I:%M %p')
-            except:
-                pass
-        
-        # Add summary statistics (if not already done)
-        if 'risk_assessment' in formatted_scan and 'total_issues' not in formatted_scan:
-            risk_assessment = formatted_scan['risk_assessment']
-            formatted_scan['total_issues'] = (
-                risk_assessment.get('critical_issues', 0) +
-                risk_assessment.get('high_issues', 0) +
-                risk_assessment.get('medium_issues', 0) +
-                risk_assessment.get('low_issues', 0)
+        # A finished scan's report only changes with the scanner's branding
+        if scan.get('status') == 'completed':
+            import report_cache
+            version = scanner_branding['config_version'] if scanner_branding else 0
+            return report_cache.get_or_render(
+                scan_id, 'client_view', version, lambda: _render_report_view(scan, scanner_branding)
             )
-        
-        return render_template(
-            'results.html',
-            scan=formatted_scan,
-            client_branding=scanner_branding  # Pass scanner branding as client_branding for template compatibility
-        )
+        return _render_report_view(scan, scanner_branding)
     except Exception as e:
         logger.error(f"Error displaying report: {str(e)}")
         flash('An error occurred while loading the report', 'danger')
         return redirect(url_for('client.reports'))
 
+def _render_report_view(scan, scanner_branding):
+    """Format a scan for the report template and render it"""
+    # Format scan data for template - preserve comprehensive scan data
+    formatted_scan = process_scan_data(scan)
+    if scan and not scan.get('client_info'):
+        # Check if this is from parsed_results (comprehensive) or raw database (minimal)
+        if scan.get('parsed_results') and scan['parsed_results'].get('findings'):
+            # Use the comprehensive parsed_results
+            formatted_scan = scan['parsed_results']
+            logger.info(f"Using comprehensive parsed_results with {len(formatted_scan.get('findings', []))} findings")
+        elif scan.get('scan_results'):
+            # Try to parse scan_results JSON field
+            try:
+                import json
+                comprehensive_data = json.loads(scan.get('scan_results', '{}'))
+                if comprehensive_data.get('findings'):
+                    formatted_scan = comprehensive_data
+                    logger.info(f"Using comprehensive scan_results with {len(formatted_scan.get('findings', []))} findings")
+            except:
+                pass
+        
+        # If we still don't have client_info, add it while preserving existing data
+        if not formatted_scan.get('client_info'):
+            # Copy the original scan data to preserve comprehensive results
+            if isinstance(formatted_scan, dict):
+                formatted_scan = dict(formatted_scan)  # Make a copy
+            else:
+                formatted_scan = dict(scan)
+            
+            # Add missing client_info structure without overriding existing comprehensive data
+            formatted_scan['client_info'] = {
+                'name': scan.get('lead_name', formatted_scan.get('name', 'N/A')),
+                'email': scan.get('lead_email', formatted_scan.get('email', 'N/A')),
+                'company': scan.get('lead_company', formatted_scan.get('company', 'N/A')),
+                'phone': scan.get('lead_phone', 'N/A'),
+                'os': scan.get('user_agent', 'N/A'),
+                'browser': scan.get('user_agent', 'N/A')
+            }
+            
+            # Ensure risk_assessment has required structure for template
+            if not formatted_scan.get('risk_assessment') or not isinstance(formatted_scan.get('risk_assessment'), dict):
+                formatted_scan['risk_assessment'] = {
+                    'overall_score': scan.get('security_score', 75),
+                    'risk_level': scan.get('risk_level', 'Medium'),
+                    'color': get_color_for_score(scan.get('security_score', 75)),
+                    'critical_issues': 0,
+                    'high_issues': 1,
+                    'medium_issues': 1,
+                    'low_issues': 1
+                }
+            
+            logger.info(f"Enhanced scan data: findings={len(formatted_scan.get('findings', []))}, recommendations={len(formatted_scan.get('recommendations', []))}")
+    
+    # Format risk levels for client-friendly display (if not already done)
+    if 'risk_assessment' in formatted_scan and 'risk_color' not in formatted_scan:
+        risk_level = formatted_scan['risk_assessment'].get('risk_level', 'Unknown')
+        if risk_level.lower() == 'critical':
+            formatted_scan['risk_color'] = 'danger'
+        elif risk_level.lower() == 'high':
+            formatted_scan['risk_color'] = 'warning'
+        elif risk_level.lower() == 'medium':
+            formatted_scan['risk_color'] = 'info'
+        else:
+            formatted_scan['risk_color'] = 'success'
+    
+    # Format dates for display (if not already done)
+    if 'timestamp' in formatted_scan and 'formatted_date' not in formatted_scan:
+        try:
+            dt = datetime.fromisoformat(formatted_scan['timestamp'])
+            formatted_scan['formatted_date'] = dt.strftime('%B %d, %Y at %I:%M %p')
+        except:
+            pass
+    
+    # Add summary statistics (if not already done)
+    if 'risk_assessment' in formatted_scan and 'total_issues' not in formatted_scan:
+        risk_assessment = formatted_scan['risk_assessment']
+        formatted_scan['total_issues'] = (
+            risk_assessment.get('critical_issues', 0) +
+            risk_assessment.get('high_issues', 0) +
+            risk_assessment.get('medium_issues', 0) +
+            risk_assessment.get('low_issues', 0)
+        )
+    
+    return render_template(
+        'results.html',
+        scan=formatted_scan,
+        client_branding=scanner_branding  # Pass scanner branding as client_branding for template compatibility
+    )
+
 @client_bp.route('/settings', methods=['GET', 'POST'])
 @client_required
 def settings(user):
@@ -1491,6 +1566,8 @@ def settings(user):
                                     SET password_hash = ?, salt = ? 
                                     WHERE id = ?
                                 """, (new_hash, new_salt, user['user_id']))
+                                from session_cache import invalidate_user
+                                invalidate_user(user['user_id'], conn)
                                 conn.commit()
                                 conn.close()
                                 
@@ -1603,6 +1680,7 @@ def update_client(client_id, data, user_id):
         # Log the SQL query for debugging
         logger.debug(f"Executing SQL: {update_query} with params {params}")
         
+        tenant_config.invalidate(client_id, conn)
         conn.commit()
         conn.close()
         
@@ -1894,6 +1972,7 @@ def process_upgrade(user):
                     subscription_start = ?, updated_at = ?
                 WHERE id = ?
             ''', (new_plan, datetime.now().isoformat(), datetime.now().isoformat(), client['id']))
+            tenant_config.invalidate(client['id'], conn)
             
             conn.commit()
             conn.close()
@@ -7,337 +7,307 @@ import logging
 from datetime import datetime
 from pathlib import Path
 
+import report_artifacts
+import report_cache
+from pagination import (
+    build_page, cached_count, decode_cursor, invalidate_counts, keyset_clause, page_info
+)
+from migrations import CLIENT_SCANS_DB, ensure_schema
+from scan_archive import hydrate_scan
+from scan_storage import get_scan_store
+from time_buckets import day_range_epochs, month_bucket
+from search_index import index_scan_globally, scan_search_condition
+from write_behind import enqueue, get_pending, register_handler
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def create_client_specific_database(client_id, business_name):
-    """Create a dedicated database for a specific client to track their scans"""
-    try:
-        # Create databases directory if it doesn't exist
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        os.makedirs(db_dir, exist_ok=True)
-        
-        # Database path for this specific client
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
-        
-        # Create database connection
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create scans table for this client
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            scan_id TEXT UNIQUE NOT NULL,
-            scanner_id TEXT,
-            timestamp TEXT NOT NULL,
-            lead_name TEXT,
-            lead_email TEXT NOT NULL,
-            lead_phone TEXT,
-            lead_company TEXT,
-            company_size TEXT,
-            target_domain TEXT,
-            security_score INTEGER DEFAULT 0,
-            risk_level TEXT,
-            scan_type TEXT DEFAULT 'comprehensive',
-            status TEXT DEFAULT 'completed',
-            ip_address TEXT,
-            user_agent TEXT,
-            scan_duration INTEGER,
-            vulnerabilities_found INTEGER DEFAULT 0,
-            recommendations_count INTEGER DEFAULT 0,
-            scan_results TEXT,  -- JSON data
-            created_at TEXT NOT NULL,
-            updated_at TEXT
-        )
-        ''')
-        
-        # Create reports table for generated reports
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            scan_id TEXT NOT NULL,
-            report_type TEXT DEFAULT 'pdf',
-            report_path TEXT,
-            generated_at TEXT NOT NULL,
-            email_sent BOOLEAN DEFAULT 0,
-            email_sent_at TEXT,
-            download_count INTEGER DEFAULT 0,
-            FOREIGN KEY (scan_id) REFERENCES scans(scan_id)
-        )
-        ''')
-        
-        # Create leads table for lead management
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS leads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT,
-            phone TEXT,
-            company TEXT,
-            company_size TEXT,
-            industry TEXT,
-            first_scan_date TEXT,
-            last_scan_date TEXT,
-            total_scans INTEGER DEFAULT 1,
-            avg_security_score REAL DEFAULT 0,
-            lead_status TEXT DEFAULT 'new',  -- new, contacted, qualified, converted
-            notes TEXT,
-            created_at TEXT NOT NULL,
-            updated_at TEXT
-        )
-        ''')
-        
-        # Create scanner_usage table to track which scanners are used
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS scanner_usage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            scanner_id TEXT NOT NULL,
-            date TEXT NOT NULL,
-            scans_count INTEGER DEFAULT 0,
-            unique_leads INTEGER DEFAULT 0,
-            avg_score REAL DEFAULT 0,
-            created_at TEXT NOT NULL
-        )
-        ''')
-        
-        # Create indexes for better performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_email ON scans(lead_email)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_date ON scans(created_at)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_score ON scans(security_score)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_scanner ON scans(scanner_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(lead_status)')
-        
-        # Insert initial metadata
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS database_info (
-            key TEXT PRIMARY KEY,
-            value TEXT
-        )
-        ''')
-        
-        cursor.execute('INSERT OR REPLACE INTO database_info (key, value) VALUES (?, ?)', 
-                      ('client_id', str(client_id)))
-        cursor.execute('INSERT OR REPLACE INTO database_info (key, value) VALUES (?, ?)', 
-                      ('business_name', business_name))
-        cursor.execute('INSERT OR REPLACE INTO database_info (key, value) VALUES (?, ?)', 
-                      ('created_at', datetime.now().isoformat()))
-        cursor.execute('INSERT OR REPLACE INTO database_info (key, value) VALUES (?, ?)', 
-                      ('database_version', '1.0'))
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Created dedicated database for client {client_id} ({business_name}): {db_path}")
-        return db_path
-        
-    except Exception as e:
-        logger.error(f"Error creating client database for {client_id}: {e}")
-        return None
+    """Create a dedicated database for a specific client to track their scans
+    
+    With the consolidated storage layout this registers the client in the
+    shared database instead.
+    """
+    return get_scan_store().create_tenant(client_id, business_name)
 
-def save_scan_to_client_db(client_id, scan_data):
-    """Save scan data to client's dedicated database"""
-    try:
-        # Get client database path
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
-        
-        if not os.path.exists(db_path):
-            logger.warning(f"Client database not found for {client_id}, creating new one")
-            create_client_specific_database(client_id, scan_data.get('business_name', 'Unknown'))
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Extract scan information
-        scan_id = scan_data.get('scan_id')
-        scanner_id = scan_data.get('scanner_id', 'web_interface')
-        timestamp = scan_data.get('timestamp', datetime.now().isoformat())
-        lead_name = scan_data.get('name', '')
-        lead_email = scan_data.get('email', '')
-        lead_phone = scan_data.get('phone', '')
-        lead_company = scan_data.get('company', '')
-        company_size = scan_data.get('company_size', 'Unknown')
-        target_domain = scan_data.get('target', '')
-        
-        # Calculate security score
-        security_score = 75  # Default
-        if 'risk_assessment' in scan_data and 'overall_score' in scan_data['risk_assessment']:
-            security_score = scan_data['risk_assessment']['overall_score']
-        
-        # Determine risk level
-        if security_score >= 90:
-            risk_level = 'Low'
-        elif security_score >= 75:
-            risk_level = 'Moderate'
-        elif security_score >= 50:
-            risk_level = 'High'
-        else:
-            risk_level = 'Critical'
-        
-        # Count vulnerabilities and recommendations
-        vulnerabilities_found = 0
-        recommendations_count = len(scan_data.get('recommendations', []))
-        
-        # Insert scan record
-        cursor.execute('''
-        INSERT OR REPLACE INTO scans (
-            scan_id, scanner_id, timestamp, lead_name, lead_email, lead_phone,
-            lead_company, company_size, target_domain, security_score, risk_level,
-            scan_type, status, vulnerabilities_found, recommendations_count,
-            scan_results, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            scan_id, scanner_id, timestamp, lead_name, lead_email, lead_phone,
-            lead_company, company_size, target_domain, security_score, risk_level,
-            'comprehensive', 'completed', vulnerabilities_found, recommendations_count,
-            json.dumps(scan_data), datetime.now().isoformat(), datetime.now().isoformat()
-        ))
-        
-        logger.info(f"✅ Saved scan {scan_id} for scanner {scanner_id} to client {client_id} database")
-        logger.info(f"   📊 Scan details: email={lead_email}, target={target_domain}, score={security_score}")
-        logger.info(f"   🔍 Saved comprehensive data: findings={len(scan_data.get('findings', []))}, recommendations={len(scan_data.get('recommendations', []))}")
-        logger.info(f"   📝 Scan data keys: {list(scan_data.keys())}")
+def get_client_db_path(client_id):
+    """Path of the database holding a client's scans"""
+    return get_scan_store().db_path(client_id)
+
+def _scoped(conditions, params, client_id):
+    """Add the storage layout's tenant condition to a WHERE clause"""
+    condition, scope_params = get_scan_store().scope(client_id)
+    if condition:
+        return [condition] + list(conditions), list(scope_params) + list(params)
+    return list(conditions), list(params)
+
+def _scan_row(scan_data):
+    """Map raw scan data onto the columns of the client scans table"""
+    # Calculate security score
+    security_score = 75  # Default
+    if 'risk_assessment' in scan_data and 'overall_score' in scan_data['risk_assessment']:
+        security_score = scan_data['risk_assessment']['overall_score']
+    
+    # Determine risk level
+    if security_score >= 90:
+        risk_level = 'Low'
+    elif security_score >= 75:
+        risk_level = 'Moderate'
+    elif security_score >= 50:
+        risk_level = 'High'
+    else:
+        risk_level = 'Critical'
+    
+    now = datetime.now().isoformat()
+    return {
+        'scan_id': scan_data.get('scan_id'),
+        'scanner_id': scan_data.get('scanner_id', 'web_interface'),
+        'timestamp': scan_data.get('timestamp', now),
+        'lead_name': scan_data.get('name', ''),
+        'lead_email': scan_data.get('email', ''),
+        'lead_phone': scan_data.get('phone', ''),
+        'lead_company': scan_data.get('company', ''),
+        'company_size': scan_data.get('company_size', 'Unknown'),
+        'target_domain': scan_data.get('target', ''),
+        'security_score': security_score,
+        'risk_level': risk_level,
+        'scan_type': 'comprehensive',
+        'status': 'completed',
+        'vulnerabilities_found': 0,
+        'recommendations_count': len(scan_data.get('recommendations', [])),
+        'scan_results': json.dumps(scan_data),
+        'created_at': now,
+        'updated_at': now
+    }
+
+def _write_client_scans(conn, payloads):
+    """Write a batch of scans (and their lead rows) into one client database without committing"""
+    cursor = conn.cursor()
+    store = get_scan_store()
+    
+    for payload in payloads:
+        client_id = payload['client_id']
+        row = _scan_row(payload['scan_data'])
+        row.update(store.tenant_values(client_id))
+        now = row['updated_at']
+        columns = list(row)
+        
+        # Upsert the scan record; updating in place (rather than INSERT OR REPLACE)
+        # keeps the row id stable and fires the search index update trigger
+        cursor.execute(f'''
+        INSERT INTO scans ({', '.join(columns)})
+        VALUES ({', '.join('?' for _ in columns)})
+        ON CONFLICT(scan_id) DO UPDATE SET
+            scanner_id = excluded.scanner_id,
+            timestamp = excluded.timestamp,
+            lead_name = excluded.lead_name,
+            lead_email = excluded.lead_email,
+            lead_phone = excluded.lead_phone,
+            lead_company = excluded.lead_company,
+            company_size = excluded.company_size,
+            target_domain = excluded.target_domain,
+            security_score = excluded.security_score,
+            risk_level = excluded.risk_level,
+            scan_type = excluded.scan_type,
+            status = excluded.status,
+            vulnerabilities_found = excluded.vulnerabilities_found,
+            recommendations_count = excluded.recommendations_count,
+            scan_results = excluded.scan_results,
+            updated_at = excluded.updated_at
+        ''', [row[column] for column in columns])
+        
+        logger.info(f"✅ Saved scan {row['scan_id']} for scanner {row['scanner_id']} to client {client_id} database")
+        logger.info(f"   📊 Scan details: email={row['lead_email']}, target={row['target_domain']}, score={row['security_score']}")
         
         # Update or insert lead information
-        if lead_email:
-            cursor.execute('SELECT * FROM leads WHERE email = ?', (lead_email,))
+        if row['lead_email']:
+            lead_conditions, lead_params = _scoped(['email = ?'], [row['lead_email']], client_id)
+            lead_where = ' AND '.join(lead_conditions)
+            cursor.execute(f'SELECT id FROM leads WHERE {lead_where}', lead_params)
             existing_lead = cursor.fetchone()
             
             if existing_lead:
-                # Update existing lead
-                cursor.execute('''
+                # Counters are recomputed from the lead's distinct scan_ids, so a
+                # replayed write doesn't count the same scan twice
+                scan_conditions, scan_params = _scoped(['lead_email = ?'], [row['lead_email']], client_id)
+                cursor.execute(f'''
+                SELECT COUNT(*), AVG(security_score) FROM scans WHERE {' AND '.join(scan_conditions)}
+                ''', scan_params)
+                total_scans, avg_security_score = cursor.fetchone()
+                cursor.execute(f'''
                 UPDATE leads SET 
                     name = COALESCE(?, name),
                     phone = COALESCE(?, phone),
                     company = COALESCE(?, company),
                     company_size = COALESCE(?, company_size),
                     last_scan_date = ?,
-                    total_scans = total_scans + 1,
-                    avg_security_score = (avg_security_score * total_scans + ?) / (total_scans + 1),
+                    total_scans = ?,
+                    avg_security_score = ?,
                     updated_at = ?
-                WHERE email = ?
-                ''', (lead_name, lead_phone, lead_company, company_size, 
-                     datetime.now().isoformat(), security_score, 
-                     datetime.now().isoformat(), lead_email))
+                WHERE {lead_where}
+                ''', [row['lead_name'], row['lead_phone'], row['lead_company'], row['company_size'],
+                      now, total_scans, avg_security_score, now] + lead_params)
             else:
                 # Insert new lead
-                cursor.execute('''
-                INSERT INTO leads (
-                    email, name, phone, company, company_size,
-                    first_scan_date, last_scan_date, total_scans, avg_security_score,
-                    lead_status, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (lead_email, lead_name, lead_phone, lead_company, company_size,
-                     datetime.now().isoformat(), datetime.now().isoformat(), 1, security_score,
-                     'new', datetime.now().isoformat(), datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+                lead = {
+                    'email': row['lead_email'], 'name': row['lead_name'], 'phone': row['lead_phone'],
+                    'company': row['lead_company'], 'company_size': row['company_size'],
+                    'first_scan_date': now, 'last_scan_date': now, 'total_scans': 1,
+                    'avg_security_score': row['security_score'], 'lead_status': 'new',
+                    'created_at': now, 'updated_at': now
+                }
+                lead.update(store.tenant_values(client_id))
+                cursor.execute(f'''
+                INSERT INTO leads ({', '.join(lead)})
+                VALUES ({', '.join('?' for _ in lead)})
+                ''', list(lead.values()))
+        
+        invalidate_counts(store.cache_scope(client_id))
+
+def _write_catalog_entries(conn, payloads):
+    """Write a batch of global lead catalog entries into the main database without committing"""
+    for payload in payloads:
+        index_scan_globally(conn, payload['client_id'], payload['entry'])
+
+def _main_db_path(payload=None):
+    from client_db import CLIENT_DB_PATH
+    return CLIENT_DB_PATH
+
+register_handler('client_scan', lambda payload: get_client_db_path(payload['client_id']), _write_client_scans)
+register_handler('lead_catalog', _main_db_path, _write_catalog_entries)
+
+def save_scan_to_client_db(client_id, scan_data):
+    """Save scan data to client's dedicated database
+    
+    The write is queued on the write-behind pipeline and committed in the
+    background, grouped with other writes to the same database. Until then
+    get_scan_by_id serves the scan from the queue.
+    """
+    try:
+        store = get_scan_store()
         
-        logger.info(f"Saved scan {scan_id} to client {client_id} database")
+        if not store.tenant_exists(client_id):
+            logger.warning(f"Client database not found for {client_id}, creating new one")
+            store.create_tenant(client_id, scan_data.get('business_name', 'Unknown'))
+        else:
+            ensure_schema(store.db_path(client_id), store.schema_kind)
+        
+        scan_id = scan_data.get('scan_id')
+        enqueue('client_scan', {'client_id': client_id, 'scan_data': scan_data}, item_key=scan_id)
+        # A rewritten scan must not keep serving its old rendering
+        report_cache.invalidate_scan(scan_id)
+        # Render the HTML and PDF reports off the request path
+        report_artifacts.queue_scan(client_id, scan_data)
+        
+        # Keep the cross-tenant lead catalog in step with the client database
+        row = _scan_row(scan_data)
+        enqueue('lead_catalog', {
+            'client_id': client_id,
+            'entry': {key: row[key] for key in ('scan_id', 'scanner_id', 'timestamp', 'lead_name',
+                                                'lead_email', 'lead_company', 'target_domain')}
+        })
+        
+        logger.info(f"Queued scan {scan_id} for client {client_id} database")
         return True
         
     except Exception as e:
         logger.error(f"Error saving scan to client database {client_id}: {e}")
         return False
 
-def get_client_scan_reports(client_id, page=1, per_page=25, filters=None):
-    """Get scan reports from client's dedicated database"""
+def get_pending_scan(scan_id):
+    """Return a queued-but-unwritten scan shaped like a scans row, or None"""
+    payload = get_pending('client_scan', scan_id)
+    if not payload:
+        return None
+    scan = _scan_row(payload['scan_data'])
+    scan['client_id'] = payload['client_id']
+    scan['parsed_results'] = payload['scan_data']
+    return scan
+
+def get_client_scan_reports(client_id, page=1, per_page=25, filters=None, page_cursor=None):
+    """Get scan reports from client's dedicated database
+    
+    Pages are fetched by keyset on (created_at, id). Pass the opaque
+    next_cursor/prev_cursor from a previous pagination dict as page_cursor.
+    """
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             logger.info(f"Client database not found for client {client_id}, returning empty results")
             return [], {'page': 1, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
         
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = store.connect(client_id)
         cursor = conn.cursor()
         
-        # Check if the scans table exists and has the expected schema
-        try:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='scans'")
-            if not cursor.fetchone():
-                logger.warning(f"Scans table not found in client {client_id} database")
-                conn.close()
-                return [], {'page': 1, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
-                
-            # Check table schema - ensure required columns exist
-            cursor.execute("PRAGMA table_info(scans)")
-            columns = [col[1] for col in cursor.fetchall()]
-            required_columns = ['scan_id', 'timestamp', 'lead_name', 'lead_email', 'target_domain', 'security_score']
-            
-            missing_columns = [col for col in required_columns if col not in columns]
-            if missing_columns:
-                logger.warning(f"Client {client_id} database missing columns: {missing_columns}")
-                conn.close()
-                return [], {'page': 1, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
-                
-        except Exception as schema_error:
-            logger.error(f"Schema validation error for client {client_id}: {schema_error}")
-            conn.close()
-            return [], {'page': 1, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
-        
         # Build WHERE clause based on filters
         where_conditions = []
         params = []
         
         if filters:
-            if filters.get('search'):
-                search_term = f"%{filters['search']}%"
-                where_conditions.append("(lead_name LIKE ? OR lead_email LIKE ? OR lead_company LIKE ?)")
-                params.extend([search_term, search_term, search_term])
+            # Prefix search through the FTS5 index instead of leading-wildcard LIKEs
+            search_condition, search_params = scan_search_condition(filters.get('search'))
+            if search_condition:
+                where_conditions.append(search_condition)
+                params.extend(search_params)
             
-            if filters.get('date_from'):
-                where_conditions.append("DATE(created_at) >= ?")
-                params.append(filters['date_from'])
+            # Date filters run as range scans on the precomputed epoch column
+            start_epoch, end_epoch = day_range_epochs(filters.get('date_from'), filters.get('date_to'))
+            if start_epoch is not None:
+                where_conditions.append("epoch >= ?")
+                params.append(start_epoch)
             
-            if filters.get('date_to'):
-                where_conditions.append("DATE(created_at) <= ?")
-                params.append(filters['date_to'])
+            if end_epoch is not None:
+                where_conditions.append("epoch < ?")
+                params.append(end_epoch)
             
             if filters.get('score_min'):
                 where_conditions.append("security_score >= ?")
                 params.append(int(filters['score_min']))
         
+        where_conditions, params = _scoped(where_conditions, params, client_id)
         where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
         
-        # Get total count for pagination
-        count_query = f"SELECT COUNT(*) FROM scans WHERE {where_clause}"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
+        # Total count is cached per tenant so deep pages don't recount
+        total_count = cached_count(store.cache_scope(client_id), cursor,
+                                   f"SELECT COUNT(*) FROM scans WHERE {where_clause}", params)
+        
+        # Keyset pagination on (created_at, id); fall back to OFFSET only for
+        # legacy page-number links without a cursor
+        key, direction = decode_cursor(page_cursor)
+        if key is None:
+            direction = 'next'
+        keyset_condition, keyset_params, order_by = keyset_clause(('created_at', 'id'), key, direction)
         
-        # Calculate pagination
-        total_pages = (total_count + per_page - 1) // per_page
-        offset = (page - 1) * per_page
+        page_conditions = list(where_conditions)
+        if keyset_condition:
+            page_conditions.append(keyset_condition)
+        page_where = " AND ".join(page_conditions) if page_conditions else "1=1"
+        offset = (page - 1) * per_page if key is None and page > 1 else 0
         
         # Get scan reports
         query = f"""
         SELECT 
-            scan_id, scanner_id, timestamp, lead_name, lead_email, lead_phone,
+            id, scan_id, scanner_id, timestamp, lead_name, lead_email, lead_phone,
             lead_company, company_size, target_domain, security_score, risk_level,
             scan_type, status, created_at
         FROM scans 
-        WHERE {where_clause}
-        ORDER BY created_at DESC
+        WHERE {page_where}
+        ORDER BY {order_by}
         LIMIT ? OFFSET ?
         """
         
-        cursor.execute(query, params + [per_page, offset])
-        scan_reports = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(query, params + keyset_params + [per_page + 1, offset])
+        rows = [dict(row) for row in cursor.fetchall()]
         
         conn.close()
         
-        pagination = {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages,
-            'total_count': total_count
-        }
+        scan_reports, cursor_info = build_page(
+            rows, per_page, lambda row: (row['created_at'], row['id']),
+            direction, key is not None or offset > 0
+        )
+        pagination = page_info(page, per_page, total_count, cursor_info)
         
         return scan_reports, pagination
         
@@ -348,13 +318,14 @@ def get_client_scan_reports(client_id, page=1, per_page=25, filters=None):
 def ensure_client_database(client_id, business_name="Unknown Client"):
     """Ensure client database exists and has proper schema"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             logger.info(f"Creating missing database for client {client_id}")
-            return create_client_specific_database(client_id, business_name)
-        else:
+            return store.create_tenant(client_id, business_name)
+        
+        db_path = store.db_path(client_id)
+        if store.schema_kind == CLIENT_SCANS_DB:
             # Validate existing database schema
             conn = sqlite3.connect(db_path)
             cursor = conn.cursor()
@@ -365,10 +336,13 @@ def ensure_client_database(client_id, business_name="Unknown Client"):
                 logger.warning(f"Recreating database for client {client_id} - missing scans table")
                 conn.close()
                 os.remove(db_path)  # Remove corrupted database
-                return create_client_specific_database(client_id, business_name)
+                return store.create_tenant(client_id, business_name)
             
             conn.close()
-            return db_path
+        
+        # Older databases predate the indexes, time buckets and search index
+        ensure_schema(db_path, store.schema_kind)
+        return db_path
             
     except Exception as e:
         logger.error(f"Error ensuring client database for {client_id}: {e}")
@@ -377,22 +351,23 @@ def ensure_client_database(client_id, business_name="Unknown Client"):
 def get_scanner_scan_count(client_id, scanner_id):
     """Get scan count for a specific scanner"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             return 0
         
-        conn = sqlite3.connect(db_path)
+        conn = store.connect(client_id)
         cursor = conn.cursor()
+        conditions, params = _scoped(['scanner_id = ?'], [scanner_id], client_id)
+        where_clause = ' AND '.join(conditions)
         
         # Get scan count for this specific scanner
-        cursor.execute('SELECT COUNT(*) FROM scans WHERE scanner_id = ?', (scanner_id,))
+        cursor.execute(f'SELECT COUNT(*) FROM scans WHERE {where_clause}', params)
         result = cursor.fetchone()
         scan_count = result[0] if result else 0
         
         # Debug: List all scans for this scanner
-        cursor.execute('SELECT scan_id, timestamp FROM scans WHERE scanner_id = ? ORDER BY timestamp DESC LIMIT 5', (scanner_id,))
+        cursor.execute(f'SELECT scan_id, timestamp FROM scans WHERE {where_clause} ORDER BY timestamp DESC LIMIT 5', params)
         recent_scans = cursor.fetchall()
         logger.info(f"Scanner {scanner_id} has {scan_count} total scans. Recent: {[(row[0][:8], row[1]) for row in recent_scans]}")
         
@@ -403,42 +378,53 @@ def get_scanner_scan_count(client_id, scanner_id):
         logging.error(f"Error getting scanner scan count for {scanner_id}: {e}")
         return 0
 
-def get_scanner_scan_reports(client_id, scanner_id, page=1, per_page=10):
-    """Get scan reports for a specific scanner with pagination"""
+def get_scanner_scan_reports(client_id, scanner_id, page=1, per_page=10, page_cursor=None):
+    """Get scan reports for a specific scanner with keyset pagination on (timestamp, id)"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             return [], {'page': page, 'per_page': per_page, 'total_pages': 1, 'total_count': 0}
         
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        db_path = store.db_path(client_id)
+        conn = store.connect(client_id)
         cursor = conn.cursor()
+        conditions, params = _scoped(['scanner_id = ?'], [scanner_id], client_id)
         
         # Get total count for pagination
-        cursor.execute('SELECT COUNT(*) FROM scans WHERE scanner_id = ?', (scanner_id,))
-        total_count = cursor.fetchone()[0]
+        total_count = cached_count(store.cache_scope(client_id), cursor,
+                                   f"SELECT COUNT(*) FROM scans WHERE {' AND '.join(conditions)}", params)
         
-        # Calculate pagination
-        total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
-        offset = (page - 1) * per_page
+        key, direction = decode_cursor(page_cursor)
+        if key is None:
+            direction = 'next'
+        keyset_condition, keyset_params, order_by = keyset_clause(('timestamp', 'id'), key, direction)
+        offset = (page - 1) * per_page if key is None and page > 1 else 0
+        
+        if keyset_condition:
+            conditions.append(keyset_condition)
+        where_clause = ' AND '.join(conditions)
         
         # Get paginated results
-        cursor.execute('''
+        cursor.execute(f'''
         SELECT * FROM scans 
-        WHERE scanner_id = ? 
-        ORDER BY timestamp DESC 
+        WHERE {where_clause} 
+        ORDER BY {order_by} 
         LIMIT ? OFFSET ?
-        ''', (scanner_id, per_page, offset))
+        ''', params + keyset_params + [per_page + 1, offset])
         
         rows = cursor.fetchall()
         conn.close()
         
+        rows, cursor_info = build_page(
+            rows, per_page, lambda row: (row['timestamp'], row['id']),
+            direction, key is not None or offset > 0
+        )
+        
         # Convert to list of dicts
         reports = []
         for row in rows:
-            report = dict(row)
+            report = hydrate_scan(db_path, dict(row))
             # Parse scan_results if it's JSON
             if report.get('scan_results'):
                 try:
@@ -447,12 +433,7 @@ def get_scanner_scan_reports(client_id, scanner_id, page=1, per_page=10):
                     report['parsed_results'] = {}
             reports.append(report)
         
-        pagination = {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages,
-            'total_count': total_count
-        }
+        pagination = page_info(page, per_page, total_count, cursor_info)
         
         logger.info(f"Retrieved {len(reports)} scan reports for scanner {scanner_id}")
         return reports, pagination
@@ -464,42 +445,24 @@ def get_scanner_scan_reports(client_id, scanner_id, page=1, per_page=10):
 def get_scan_by_id(scan_id):
     """Search for a scan by ID across all client databases"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        
-        if not os.path.exists(db_dir):
-            return None
-        
-        # Search through all client database files
-        for db_file in os.listdir(db_dir):
-            if db_file.startswith('client_') and db_file.endswith('_scans.db'):
-                db_path = os.path.join(db_dir, db_file)
-                
+        # A just-finished scan may still be on the write-behind queue
+        pending_scan = get_pending_scan(scan_id)
+        if pending_scan:
+            return pending_scan
+        
+        db_path, scan_data = get_scan_store().find_scan(scan_id)
+        if scan_data:
+            # Old scans keep their full payload in a monthly archive
+            scan_data = hydrate_scan(db_path, scan_data)
+            # Parse scan_results if it's JSON
+            if scan_data.get('scan_results'):
                 try:
-                    conn = sqlite3.connect(db_path)
-                    conn.row_factory = sqlite3.Row
-                    cursor = conn.cursor()
-                    
-                    cursor.execute('SELECT * FROM scans WHERE scan_id = ?', (scan_id,))
-                    row = cursor.fetchone()
-                    
-                    if row:
-                        scan_data = dict(row)
-                        # Parse scan_results if it's JSON
-                        if scan_data.get('scan_results'):
-                            try:
-                                scan_data['parsed_results'] = json.loads(scan_data['scan_results'])
-                            except:
-                                scan_data['parsed_results'] = {}
-                        
-                        conn.close()
-                        logger.info(f"Found scan {scan_id} in database {db_file}")
-                        return scan_data
-                    
-                    conn.close()
-                    
-                except Exception as db_error:
-                    logger.error(f"Error searching in {db_file}: {db_error}")
-                    continue
+                    scan_data['parsed_results'] = json.loads(scan_data['scan_results'])
+                except:
+                    scan_data['parsed_results'] = {}
+            
+            logger.info(f"Found scan {scan_id} in database {os.path.basename(db_path)}")
+            return scan_data
         
         return None
         
@@ -511,22 +474,23 @@ def get_scan_by_id(scan_id):
 def get_recent_client_scans(client_id, limit=10):
     """Get recent scans for a specific client"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             return []
         
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = store.connect(client_id)
         cursor = conn.cursor()
+        conditions, params = _scoped([], [], client_id)
+        where_clause = ' AND '.join(conditions) if conditions else '1=1'
         
         # Get recent scans with all details
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT * FROM scans 
+            WHERE {where_clause}
             ORDER BY timestamp DESC 
             LIMIT ?
-        ''', (limit,))
+        ''', params + [limit])
         
         scans = [dict(row) for row in cursor.fetchall()]
         conn.close()
@@ -541,37 +505,10 @@ def get_recent_client_scans(client_id, limit=10):
 def get_all_client_scan_statistics():
     """Get aggregated scan statistics across all clients"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        
-        if not os.path.exists(db_dir):
-            return {'total_scans': 0, 'clients_with_scans': 0}
-        
-        total_scans = 0
-        clients_with_scans = 0
-        
-        for filename in os.listdir(db_dir):
-            if filename.startswith('client_') and filename.endswith('_scans.db'):
-                try:
-                    db_path = os.path.join(db_dir, filename)
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    
-                    cursor.execute('SELECT COUNT(*) FROM scans')
-                    client_scan_count = cursor.fetchone()[0]
-                    
-                    if client_scan_count > 0:
-                        total_scans += client_scan_count
-                        clients_with_scans += 1
-                    
-                    conn.close()
-                    
-                except Exception as e:
-                    logging.warning(f"Error reading {filename}: {e}")
-                    continue
-        
+        totals = get_scan_store().scan_totals()
         return {
-            'total_scans': total_scans,
-            'clients_with_scans': clients_with_scans
+            'total_scans': totals['total_scans'],
+            'clients_with_scans': totals['clients_with_scans']
         }
         
     except Exception as e:
@@ -581,10 +518,9 @@ def get_all_client_scan_statistics():
 def get_client_scan_statistics(client_id):
     """Get scan statistics from client's dedicated database"""
     try:
-        db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        db_path = os.path.join(db_dir, f'client_{client_id}_scans.db')
+        store = get_scan_store()
         
-        if not os.path.exists(db_path):
+        if not store.tenant_exists(client_id):
             logger.info(f"Client database not found for client {client_id}, returning zero stats")
             return {
                 'total_scans': 0,
@@ -593,52 +529,30 @@ def get_client_scan_statistics(client_id):
                 'unique_companies': 0
             }
         
-        conn = sqlite3.connect(db_path)
+        conn = store.connect(client_id)
         cursor = conn.cursor()
-        
-        # Validate database schema
-        try:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='scans'")
-            if not cursor.fetchone():
-                logger.warning(f"Scans table not found in client {client_id} database")
-                conn.close()
-                return {
-                    'total_scans': 0,
-                    'avg_score': 0,
-                    'this_month': 0,
-                    'unique_companies': 0
-                }
-        except Exception as schema_error:
-            logger.error(f"Schema validation error for client {client_id} statistics: {schema_error}")
-            conn.close()
-            return {
-                'total_scans': 0,
-                'avg_score': 0,
-                'this_month': 0,
-                'unique_companies': 0
-            }
+        scope, scope_params = store.scope(client_id)
+        tenant = f"{scope} AND " if scope else ""
         
         # Total scans
-        cursor.execute("SELECT COUNT(*) FROM scans")
+        cursor.execute(f"SELECT COUNT(*) FROM scans WHERE {scope or '1=1'}", scope_params)
         total_scans = cursor.fetchone()[0]
         
         # Average security score
-        cursor.execute("SELECT AVG(security_score) FROM scans WHERE security_score > 0")
+        cursor.execute(f"SELECT AVG(security_score) FROM scans WHERE {tenant}security_score > 0", scope_params)
         avg_score_result = cursor.fetchone()[0]
         avg_score = avg_score_result if avg_score_result else 0
         
-        # This month's scans
-        cursor.execute("""
-            SELECT COUNT(*) FROM scans 
-            WHERE strftime('%Y-%m', created_at) = strftime('%Y-%m', 'now')
-        """)
+        # This month's scans, via the indexed month bucket
+        cursor.execute(f"SELECT COUNT(*) FROM scans WHERE {tenant}month_bucket = ?",
+                       scope_params + [month_bucket(datetime.now())])
         this_month = cursor.fetchone()[0]
         
         # Unique companies
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(DISTINCT lead_company) FROM scans 
-            WHERE lead_company IS NOT NULL AND lead_company != ''
-        """)
+            WHERE {tenant}lead_company IS NOT NULL AND lead_company != ''
+        """, scope_params)
         unique_companies = cursor.fetchone()[0]
         
         conn.close()
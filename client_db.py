@@ -12,6 +12,16 @@ from datetime import datetime, timedelta
 import functools
 from functools import wraps
 
+from pagination import build_page, cached_count, decode_cursor, keyset_clause, page_info
+from migrations import MAIN_DB, ensure_schema
+from write_behind import enqueue, register_handler
+import login_pipeline
+import api_key_cache
+import dashboard_snapshot
+import report_cache
+import session_cache
+import tenant_config
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,7 +34,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Define database path
-CLIENT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+CLIENT_DB_PATH = os.environ.get(
+    'CLIENT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+)
 
 # Create the schema string for initialization
 SCHEMA_SQL = """
@@ -181,6 +194,7 @@ CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_clients_business_name ON clients(business_name);
 CREATE INDEX IF NOT EXISTS idx_clients_api_key ON clients(api_key);
 CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
 """
 
 SCHEMA_SQL = """
@@ -259,24 +273,28 @@ def get_client_by_user_id(user_id):
         if 'conn' in locals():
             conn.close()
 
+def _write_activity(conn, payloads):
+    """Insert a batch of queued activity log rows without committing"""
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO activity_logs 
+        (client_id, activity_type, details, created_at)
+        VALUES (?, ?, ?, ?)
+    """, [
+        (p['client_id'], p['activity_type'], json.dumps(p['details']), p['created_at'])
+        for p in payloads
+    ])
+
+register_handler('activity', lambda payload: CLIENT_DB_PATH, _write_activity)
+
 def track_activity(client_id, activity_type, details):
-    """Track client activities"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO activity_logs 
-            (client_id, activity_type, details, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (
-            client_id,
-            activity_type,
-            json.dumps(details),
-            datetime.now().isoformat()
-        ))
-        conn.commit()
-    finally:
-        conn.close()
+    """Track client activities (queued on the write-behind pipeline)"""
+    enqueue('activity', {
+        'client_id': client_id,
+        'activity_type': activity_type,
+        'details': details,
+        'created_at': datetime.now().isoformat()
+    })
 
 def _get_client_by_user_id_legacy(user_id):
     """Legacy version of get_client_by_user_id for backward compatibility"""
@@ -317,42 +335,38 @@ def _get_client_by_user_id_legacy(user_id):
         logging.error(f"Error in legacy get_client_by_user_id: {e}")
         return None
 
+def _write_audit_entries(conn, payloads):
+    """Insert a batch of queued audit log entries without committing"""
+    cursor = conn.cursor()
+    cursor.executemany('''
+    INSERT INTO audit_log (user_id, action, entity_type, entity_id, changes, timestamp, ip_address)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (p['user_id'], p['action'], p['entity_type'], p['entity_id'],
+         json.dumps(p['changes']) if p.get('changes') else None, p['timestamp'], p.get('ip_address'))
+        for p in payloads
+    ])
+
+register_handler('audit', lambda payload: CLIENT_DB_PATH, _write_audit_entries)
+
 # Add this function to client_db.py for audit logging with better error handling
 def add_audit_log(conn, user_id, action, entity_type, entity_id, changes=None, ip_address=None):
     """
-    Add an entry to the audit log with enhanced error handling
+    Add an entry to the audit log via the write-behind pipeline.
+    
+    The conn argument is kept for compatibility; the entry is written to the
+    main database in a batch after the caller's transaction.
     """
     try:
-        cursor = conn.cursor()
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Check if audit_log table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='audit_log'")
-        if not cursor.fetchone():
-            logging.warning("Audit log table doesn't exist. Creating it now.")
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                action TEXT NOT NULL,
-                entity_type TEXT NOT NULL,
-                entity_id INTEGER NOT NULL,
-                changes TEXT,
-                timestamp TEXT NOT NULL,
-                ip_address TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-            )
-            ''')
-            conn.commit()
-        
-        # Insert the audit log entry
-        cursor.execute('''
-        INSERT INTO audit_log (user_id, action, entity_type, entity_id, changes, timestamp, ip_address)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, action, entity_type, entity_id, json.dumps(changes) if changes else None, timestamp, ip_address))
-        
-        conn.commit()
-        return True
+        return enqueue('audit', {
+            'user_id': user_id,
+            'action': action,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'changes': changes,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'ip_address': ip_address
+        })
     except Exception as e:
         logging.warning(f"Could not add audit log: {e}")
         return False
@@ -884,6 +898,7 @@ def update_scanner_config(conn, cursor, scanner_id, scanner_data, user_id):
         
         # Log the update
         log_action(conn, cursor, user_id, 'update', 'scanner', scanner_id, scanner_data)
+        tenant_config.invalidate(client_id, conn)
         
         return {"status": "success", "scanner_id": scanner_id}
     except Exception as e:
@@ -971,19 +986,19 @@ def get_dashboard_summary(cursor=None):
         }
 
 @with_transaction
-def deactivate_client(conn, cursor, client_id, user_id=None):
+def deactivate_client(conn, client_id, user_id=None):
     """
     Deactivate a client (soft delete)
     
     Args:
         conn: Database connection
-        cursor: Database cursor
         client_id (int): ID of the client to deactivate
         user_id (int, optional): ID of the user performing the action
         
     Returns:
         dict: Status result
     """
+    cursor = conn.cursor()
     try:
         # Check if client exists
         cursor.execute('SELECT id FROM clients WHERE id = ?', (client_id,))
@@ -1006,6 +1021,9 @@ def deactivate_client(conn, cursor, client_id, user_id=None):
             last_updated = ?
         WHERE client_id = ?
         ''', (datetime.now().isoformat(), client_id))
+        # Cached credentials and tenant config (checked for 'active') must go in every worker
+        api_key_cache.invalidate_client(client_id, conn)
+        tenant_config.invalidate(client_id, conn)
         
         # Log the deactivation
         if user_id:
@@ -1302,6 +1320,7 @@ def update_client(conn, client_id, client_data):
     except Exception as log_error:
         logging.warning(f"Could not create audit log: {log_error}")
     
+    tenant_config.invalidate(client_id, conn)
     return {'status': 'success'}
 
 @with_transaction
@@ -1568,6 +1587,9 @@ def update_user(conn, user_id, user_data):
         # Remove password from user_data after handling
         del user_data['password']
     
+    # Password, role and active changes must not be served from cached sessions
+    session_cache.invalidate_user(user_id, conn)
+    
     # Update other fields
     update_fields = [k for k in user_data.keys() if k not in ['password']]
     
@@ -1591,19 +1613,21 @@ def deactivate_user(conn, user_id):
     
     # Terminate all active sessions
     cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+    session_cache.invalidate_user(user_id, conn)
     
     return {'status': 'success'}
 
 @with_transaction
-def list_deployed_scanners(conn, page=1, per_page=10, filters=None):
+def list_deployed_scanners(conn, page=1, per_page=10, filters=None, page_cursor=None):
     """
-    List deployed scanners with pagination and filtering
+    List deployed scanners with keyset pagination and filtering
     
     Args:
         conn: Database connection
-        page (int): Page number (1-indexed)
+        page (int): Page number (1-indexed), used for display and legacy links
         per_page (int): Number of items per page
         filters (dict): Optional filters like {'status': 'deployed', 'search': 'query', etc.}
+        page_cursor (str): Opaque next/prev cursor from a previous page
     
     Returns:
         dict: Dictionary with scanners and pagination info
@@ -1648,38 +1672,41 @@ def list_deployed_scanners(conn, page=1, per_page=10, filters=None):
         conditions.append("ds.client_id = ?")
         params.append(filters['client_id'])
     
-    # Add WHERE clause if conditions exist
     if conditions:
-        query += " WHERE " + " AND ".join(conditions)
         count_query += " WHERE " + " AND ".join(conditions)
     
-    # Add ORDER BY clause
-    query += " ORDER BY ds.id DESC"
+    cursor = conn.cursor()
     
-    # Add LIMIT and OFFSET
-    query += f" LIMIT {per_page} OFFSET {offset}"
+    # Get total count (cached between page loads)
+    total_count = cached_count(CLIENT_DB_PATH, cursor, count_query, params)
     
-    cursor = conn.cursor()
+    # Keyset on ds.id; OFFSET only for legacy page-number links
+    key, direction = decode_cursor(page_cursor)
+    if key is None:
+        direction = 'next'
+    else:
+        offset = 0
+    keyset_condition, keyset_params, order_by = keyset_clause(('ds.id',), key, direction)
+    if keyset_condition:
+        conditions.append(keyset_condition)
     
-    # Get total count
-    cursor.execute(count_query, params)
-    total_count = cursor.fetchone()['total']
+    # Add WHERE clause if conditions exist
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
     
-    # Get current page data
-    cursor.execute(query, params)
-    scanners = [dict(row) for row in cursor.fetchall()]
+    # Add ORDER BY, LIMIT and OFFSET
+    query += f" ORDER BY {order_by} LIMIT {per_page + 1} OFFSET {offset}"
     
-    # Calculate pagination details
-    total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
+    # Get current page data
+    cursor.execute(query, params + keyset_params)
+    scanners, cursor_info = build_page(
+        [dict(row) for row in cursor.fetchall()], per_page, lambda scanner: (scanner['id'],),
+        direction, key is not None or offset > 0
+    )
     
     return {
         'scanners': scanners,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_count': total_count,
-            'total_pages': total_pages
-        }
+        'pagination': page_info(page, per_page, total_count, cursor_info)
     }
 
 @with_transaction
@@ -1751,6 +1778,7 @@ def update_scanner(conn, scanner_id, scanner_data):
         values = [scanner_data[field] for field in update_fields] + [scanner_id]
         
         cursor.execute(query, values)
+        tenant_config.invalidate(scanner['client_id'], conn)
     
     return {'status': 'success'}
 
@@ -1775,6 +1803,7 @@ def regenerate_scanner_api_key(conn, scanner_id):
     cursor.execute("""
         UPDATE clients SET api_key = ? WHERE id = ?
     """, (new_api_key, client_id))
+    api_key_cache.invalidate_client(client_id, conn)
     
     return {'status': 'success', 'api_key': new_api_key}
 
@@ -1990,15 +2019,16 @@ def get_scan_history(conn, scanner_id, page=1, per_page=10):
     }
 
 @with_transaction
-def list_subscriptions(conn, page=1, per_page=10, filters=None):
+def list_subscriptions(conn, page=1, per_page=10, filters=None, page_cursor=None):
     """
-    List subscription details with pagination and filtering
+    List subscription details with keyset pagination and filtering
     
     Args:
         conn: Database connection
-        page (int): Page number (1-indexed)
+        page (int): Page number (1-indexed), used for display and legacy links
         per_page (int): Number of items per page
         filters (dict): Optional filters
+        page_cursor (str): Opaque next/prev cursor from a previous page
     
     Returns:
         dict: Dictionary with subscriptions and pagination info
@@ -2024,49 +2054,51 @@ def list_subscriptions(conn, page=1, per_page=10, filters=None):
     count_query = "SELECT COUNT(*) as total FROM clients WHERE active = 1"
     
     # Apply filters
-    conditions = []
-    params = []
+    count_params = []
     
     if 'search' in filters and filters['search']:
         search_term = f"%{filters['search']}%"
-        # Add WHERE clause to the main query
         query += " AND (c.business_name LIKE ? OR c.business_domain LIKE ? OR c.contact_email LIKE ?)"
-        params.extend([search_term, search_term, search_term])
-        # Add WHERE clause to the count query
         count_query += " AND (business_name LIKE ? OR business_domain LIKE ? OR contact_email LIKE ?)"
-        params.extend([search_term, search_term, search_term])
+        count_params.extend([search_term, search_term, search_term])
     
     if 'level' in filters and filters['level']:
-        # Add to main query
         query += " AND c.subscription_level = ?"
-        params.append(filters['level'])
-        # Add to count query
         count_query += " AND subscription_level = ?"
-        params.append(filters['level'])
+        count_params.append(filters['level'])
     
     if 'status' in filters and filters['status']:
-        # Add to main query
         query += " AND c.subscription_status = ?"
-        params.append(filters['status'])
-        # Add to count query
         count_query += " AND subscription_status = ?"
-        params.append(filters['status'])
+        count_params.append(filters['status'])
     
-    # Add ORDER BY clause
-    query += " ORDER BY c.id DESC"
+    params = list(count_params)
     
-    # Add LIMIT and OFFSET
-    query += f" LIMIT {per_page} OFFSET {offset}"
+    # Keyset on c.id; OFFSET only for legacy page-number links
+    key, direction = decode_cursor(page_cursor)
+    if key is None:
+        direction = 'next'
+    else:
+        offset = 0
+    keyset_condition, keyset_params, order_by = keyset_clause(('c.id',), key, direction)
+    if keyset_condition:
+        query += f" AND {keyset_condition}"
+        params.extend(keyset_params)
+    
+    # Add ORDER BY, LIMIT and OFFSET
+    query += f" ORDER BY {order_by} LIMIT {per_page + 1} OFFSET {offset}"
     
     cursor = conn.cursor()
     
-    # Get total count
-    cursor.execute(count_query, params[:len(params)//2] if 'search' in filters else params)
-    total_count = cursor.fetchone()['total']
+    # Get total count (cached between page loads)
+    total_count = cached_count(CLIENT_DB_PATH, cursor, count_query, count_params)
     
     # Get current page data
     cursor.execute(query, params)
-    subscriptions = [dict(row) for row in cursor.fetchall()]
+    subscriptions, cursor_info = build_page(
+        [dict(row) for row in cursor.fetchall()], per_page, lambda sub: (sub['id'],),
+        direction, key is not None or offset > 0
+    )
     
     # Get recent transactions for each subscription
     for sub in subscriptions:
@@ -2089,17 +2121,9 @@ def list_subscriptions(conn, page=1, per_page=10, filters=None):
             except (ValueError, TypeError):
                 sub['days_until_billing'] = None
     
-    # Calculate pagination details
-    total_pages = (total_count + per_page - 1) // per_page  # Ceiling division
-    
     return {
         'subscriptions': subscriptions,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total_count': total_count,
-            'total_pages': total_pages
-        }
+        'pagination': page_info(page, per_page, total_count, cursor_info)
     }
 
 @with_transaction
@@ -2673,6 +2697,7 @@ def regenerate_api_key(client_id):
                 'message': 'Client not found'
             }
         
+        api_key_cache.invalidate_client(client_id, conn)
         conn.commit()
         conn.close()
         
@@ -2892,47 +2917,9 @@ def init_db():
             else:
                 logging.info("Database initialization completed from client_db")
         
-        # Now check if the users table exists before trying to add columns
-        conn = sqlite3.connect(CLIENT_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check if users table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        users_table_exists = cursor.fetchone() is not None
-        
-        if users_table_exists:
-            # Check if the full_name column exists
-            cursor.execute("PRAGMA table_info(users)")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            
-            if 'full_name' not in column_names:
-                logging.info("Adding 'full_name' column to users table...")
-                cursor.execute("ALTER TABLE users ADD COLUMN full_name TEXT")
-                conn.commit()
-                logging.info("'full_name' column added successfully")
-        else:
-            logging.info("Users table doesn't exist yet - skipping column check")
-        
-        # Check if clients table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='clients'")
-        clients_table_exists = cursor.fetchone() is not None
+        # Bring the schema to the latest version once; request paths assume it
+        ensure_schema(CLIENT_DB_PATH, MAIN_DB)
         
-        if clients_table_exists:
-            # Check if the user_id column exists in clients table
-            cursor.execute("PRAGMA table_info(clients)")
-            columns = cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            
-            if 'user_id' not in column_names:
-                logging.info("Adding 'user_id' column to clients table...")
-                cursor.execute("ALTER TABLE clients ADD COLUMN user_id INTEGER REFERENCES users(id) ON DELETE CASCADE")
-                conn.commit()
-                logging.info("'user_id' column added successfully")
-        else:
-            logging.info("Clients table doesn't exist yet - skipping column check")
-        
-        conn.close()
         logging.info("Database initialization completed")
         return True
     except Exception as e:
@@ -3284,6 +3271,7 @@ def update_scanner_config(conn, scanner_id, scanner_data, user_id):
     except Exception as e:
         logging.warning(f"Audit log failed: {e}")
     
+    tenant_config.invalidate(client_id, conn)
     return {"status": "success", "scanner_id": scanner_id}
 
 @with_transaction
@@ -3381,53 +3369,13 @@ def authenticate_user(username_or_email, password, ip_address=None, user_agent=N
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Find user by username or email
-        cursor.execute('''
-        SELECT * FROM users 
-        WHERE (username = ? OR email = ?) AND active = 1
-        ''', (username_or_email, username_or_email))
-        
-        user = cursor.fetchone()
+        # Throttle, then verify the password (hashed in this request thread)
+        user, error = login_pipeline.authenticate(cursor, username_or_email, password, ip_address)
         
-        if not user:
-            logging.warning(f"Authentication failed: User not found: {username_or_email}")
+        if error:
+            logging.warning(f"Authentication failed for {username_or_email}: {error['message']}")
             conn.close()
-            return {"status": "error", "message": "Invalid credentials"}
-        
-        # Verify password
-        try:
-            # Use pbkdf2_hmac if salt exists (new format)
-            salt = user['salt']
-            stored_hash = user['password_hash']
-            
-            # Log for debugging (don't log this in production)
-            logging.debug(f"Authenticating {user['username']} (ID: {user['id']}) with salt: {salt[:5]}...")
-            
-            # Compute hash with pbkdf2
-            password_hash = hashlib.pbkdf2_hmac(
-                'sha256', 
-                password.encode(), 
-                salt.encode(), 
-                100000  # Same iterations as used for storing
-            ).hex()
-            
-            password_correct = (password_hash == stored_hash)
-            logging.debug(f"Password verification result: {password_correct}")
-        except Exception as pw_error:
-            # Fallback to simple hash if pbkdf2 fails
-            logging.warning(f"Error in password verification with pbkdf2: {pw_error}, falling back to simple hash")
-            try:
-                password_hash = hashlib.sha256((password + user['salt']).encode()).hexdigest()
-                password_correct = (password_hash == user['password_hash'])
-                logging.debug(f"Fallback password verification result: {password_correct}")
-            except Exception as fallback_error:
-                logging.error(f"Error in fallback password verification: {fallback_error}")
-                password_correct = False
-        
-        if not password_correct:
-            logging.warning(f"Authentication failed: Invalid password for user: {user['username']}")
-            conn.close()
-            return {"status": "error", "message": "Invalid credentials"}
+            return error
         
         # Create a session token
         session_token = secrets.token_hex(32)
@@ -3481,6 +3429,10 @@ def verify_session(session_token):
             logging.debug("verify_session called with empty token")
             return {"status": "error", "message": "No session token provided"}
         
+        cached = session_cache.get_session(session_token)
+        if cached:
+            return cached
+        
         # Create a new connection for each verification
         conn = sqlite3.connect(CLIENT_DB_PATH)
         conn.row_factory = sqlite3.Row
@@ -3528,6 +3480,7 @@ def verify_session(session_token):
         
         logging.debug(f"Session verified successfully for {session['username']} (role: {session['role']})")
         conn.close()
+        session_cache.store_session(session_token, result, session['expires_at'])
         return result
     
     except Exception as e:
@@ -3547,6 +3500,7 @@ def logout_user(session_token):
         
         # Delete the session
         cursor.execute('DELETE FROM sessions WHERE session_token = ?', (session_token,))
+        session_cache.invalidate_token(session_token, conn)
         
         conn.commit()
         conn.close()
@@ -3648,6 +3602,8 @@ def create_client(conn, cursor, client_data, user_id):
     log_action(conn, cursor, user_id, 'create', 'client', client_id, 
               {'business_name': client_data.get('business_name'), 
                'subscription': client_data.get('subscription', 'basic')})
+    # The admin dashboard snapshot refreshes once this commits
+    dashboard_snapshot.invalidate(f'client:{client_id}', conn)
     
     return {
         "status": "success",
@@ -3768,6 +3724,7 @@ def update_user_password(conn, cursor, user_id, new_password):
     
     # Mark all reset tokens for this user as used
     cursor.execute('UPDATE password_resets SET used = 1 WHERE user_id = ?', (user_id,))
+    session_cache.invalidate_user(user_id, conn)
     
     # Log the password change
     log_action(conn, cursor, user_id, 'password_change', 'user', user_id, None)
@@ -4083,6 +4040,7 @@ def update_scan_status(conn, cursor, scan_id, status, report_path=None):
     if cursor.rowcount == 0:
         return {"status": "error", "message": "Scan not found"}
     
+    report_cache.invalidate_scan(scan_id, conn)
     return {"status": "success"}
 
 @with_transaction
@@ -4156,6 +4114,7 @@ def create_billing_record(conn, cursor, client_id, plan_data):
         SET subscription_level = ?, subscription_status = 'active', subscription_start = ?
         WHERE id = ?
         ''', (plan_data['subscription_level'], start_date, client_id))
+        tenant_config.invalidate(client_id, conn)
     
     return {
         "status": "success",
@@ -4282,6 +4241,7 @@ def update_client(conn, cursor, client_id, client_data, user_id):
     
     # Log the update
     log_action(conn, cursor, user_id, 'update', 'client', client_id, client_data)
+    tenant_config.invalidate(client_id, conn)
     
     return {"status": "success", "client_id": client_id}
     
@@ -4344,8 +4304,9 @@ def update_deployment_status(conn, cursor, client_id, status, config_path=None):
     return {"status": "success"}
 
 @with_transaction
-def delete_client(conn, cursor, client_id):
+def delete_client(conn, client_id):
     """Delete a client and all associated data"""
+    cursor = conn.cursor()
     if not client_id:
         return {"status": "error", "message": "Client ID is required"}
     
@@ -4356,6 +4317,9 @@ def delete_client(conn, cursor, client_id):
     
     # Delete client (cascade will handle related records)
     cursor.execute('DELETE FROM clients WHERE id = ?', (client_id,))
+    # Cached API credentials and tenant config must stop resolving in every worker
+    api_key_cache.invalidate_client(client_id, conn)
+    tenant_config.invalidate(client_id, conn)
     
     return {"status": "success", "message": "Client deleted successfully"}
 
@@ -4409,13 +4373,12 @@ def regenerate_api_key(conn, cursor, client_id):
     
     # Log the regeneration
     log_action(conn, cursor, client_id, 'regenerate_api_key', 'client', client_id, None)
+    api_key_cache.invalidate_client(client_id, conn)
     
     return {"status": "success", "api_key": new_api_key}
 
-@with_transaction
-
-def list_clients(cursor=None, page=1, per_page=10, filters=None):
-    """List clients with pagination and filtering."""
+def list_clients(cursor=None, page=1, per_page=10, filters=None, page_cursor=None):
+    """List clients with keyset pagination (newest id first) and filtering."""
     try:
         # Use provided cursor or create a new connection
         conn = None
@@ -4447,18 +4410,29 @@ def list_clients(cursor=None, page=1, per_page=10, filters=None):
             where_clauses.append("active = ?")
             params.append(1 if filters['active'] else 0)
         
+        # Count total matching clients (cached between page loads)
+        count_query = "SELECT COUNT(*) FROM clients"
+        if where_clauses:
+            count_query += " WHERE " + " AND ".join(where_clauses)
+        total_count = cached_count(CLIENT_DB_PATH, cursor, count_query, params)
+        
+        # Keyset on the primary key; OFFSET only for legacy page-number links
+        key, direction = decode_cursor(page_cursor)
+        if key is None:
+            direction = 'next'
+        keyset_condition, keyset_params, order_by = keyset_clause(('id',), key, direction)
+        if keyset_condition:
+            where_clauses.append(keyset_condition)
+            params.extend(keyset_params)
+        offset = (page - 1) * per_page if key is None and page > 1 else 0
+        
         # Add WHERE clause if needed
         if where_clauses:
             query += " WHERE " + " AND ".join(where_clauses)
         
-        # Count total matching clients
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        
         # Add pagination
-        query += " ORDER BY id DESC LIMIT ? OFFSET ?"
-        params.extend([per_page, (page - 1) * per_page])
+        query += f" ORDER BY {order_by} LIMIT ? OFFSET ?"
+        params.extend([per_page + 1, offset])
         
         # Execute query
         cursor.execute(query, params)
@@ -4471,8 +4445,10 @@ def list_clients(cursor=None, page=1, per_page=10, filters=None):
                 client[col[0]] = row[idx]
             clients.append(client)
         
-        # Calculate pagination info
-        total_pages = (total_count + per_page - 1) // per_page if per_page > 0 else 1
+        clients, cursor_info = build_page(
+            clients, per_page, lambda client: (client['id'],),
+            direction, key is not None or offset > 0
+        )
         
         # Close connection if we created it
         if conn:
@@ -4481,12 +4457,7 @@ def list_clients(cursor=None, page=1, per_page=10, filters=None):
         # Return clients and pagination info
         return {
             'clients': clients,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_count': total_count,
-                'total_pages': total_pages
-            }
+            'pagination': page_info(page, per_page, total_count, cursor_info)
         }
     except Exception as e:
         import traceback
@@ -4516,9 +4487,14 @@ def get_scan_reports_for_client(client_id, page=1, per_page=25, filters=None):
         
         if filters:
             if filters.get('search'):
-                search_term = f"%{filters['search']}%"
-                where_conditions.append("(lead_name LIKE ? OR lead_email LIKE ? OR lead_company LIKE ?)")
-                params.extend([search_term, search_term, search_term])
+                # Prefix search through the global lead catalog instead of leading-wildcard LIKEs
+                from search_index import build_match_query
+                match_query = build_match_query(filters['search'])
+                if match_query:
+                    where_conditions.append(
+                        "scan_id IN (SELECT scan_id FROM lead_search WHERE lead_search MATCH ? AND client_id = ?)"
+                    )
+                    params.extend([match_query, client_id])
             
             if filters.get('date_from'):
                 where_conditions.append("DATE(created_at) >= ?")
@@ -199,6 +199,11 @@ def client_deactivate(user, client_id):
         except Exception as scanner_error:
             logger.warning(f"Error updating scanner status: {scanner_error}")
         
+        import api_key_cache
+        import tenant_config
+        api_key_cache.invalidate_client(client_id, conn)
+        tenant_config.invalidate(client_id, conn)
+        
         # Add to audit log if the table exists
         try:
             cursor.execute('''
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Response compression and precompressed static assets.
+
+Three parts:
+
+    precompress(path)   writes path.gz and path.br beside a generated file.
+                        deployment_build calls it for every file it writes,
+                        so embed scripts and styles are compressed once, at
+                        maximum level, at build time.
+    static files        a static response whose file has a sibling the
+                        client accepts is swapped for that sibling, with
+                        Content-Encoding, Vary and a per-encoding ETag.
+                        Range and conditional requests still work.
+    dynamic responses   HTML/JSON bodies of COMPRESS_MIN_SIZE bytes or more
+                        are compressed at COMPRESS_LEVEL (gzip) or
+                        BROTLI_QUALITY. Results are kept in a small LRU
+                        keyed by a hash of the body, so the same report or
+                        dashboard is not compressed again on every request.
+
+Brotli needs the optional 'brotli' package. Without it everything falls
+back to gzip. Dynamic compression keeps the view's ETag but marks it weak,
+as nginx does, so If-None-Match revalidation keeps producing 304s.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+CACHE_MAX_BYTES = int(os.environ.get('COMPRESS_CACHE_BYTES', str(16 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/markdown', 'text/csv', 'text/xml',
+    'text/javascript', 'application/javascript', 'application/json', 'application/xml',
+    'image/svg+xml'
+}
+PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.md', '.json', '.svg', '.txt')
+
+# encoding -> file suffix, in order of preference
+SIBLINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL if level is None else level, mtime=0)
+
+
+def choose_encoding(accept_encodings, encodings=None):
+    """The preferred encoding the client accepts, or None"""
+    for encoding in encodings or available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def needs_precompress(path):
+    """True if a compressible file has no up-to-date gzip sibling"""
+    if not path.endswith(PRECOMPRESS_EXTENSIONS):
+        return False
+    try:
+        source = os.stat(path)
+        if source.st_size < COMPRESS_MIN_SIZE:
+            return False
+        return os.stat(f'{path}.gz').st_mtime_ns < source.st_mtime_ns
+    except FileNotFoundError:
+        return os.path.exists(path)
+
+
+def precompress(path):
+    """
+    Write maximum-level .gz (and .br) siblings of a file.
+
+    Siblings are removed when the file shrinks below COMPRESS_MIN_SIZE or
+    compression would not make it smaller.
+
+    Returns:
+        list: Encodings written
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    written = []
+    for encoding, suffix in SIBLINGS:
+        sibling = path + suffix
+        if encoding == 'br' and not brotli:
+            continue
+        compressed = compress(data, encoding, level=11 if encoding == 'br' else 9) \
+            if len(data) >= COMPRESS_MIN_SIZE else None
+        if compressed is None or len(compressed) >= len(data):
+            if os.path.exists(sibling):
+                os.remove(sibling)
+            continue
+        _write_atomic(sibling, compressed)
+        written.append(encoding)
+    return written
+
+
+def precompress_tree(directory):
+    """Precompress every stale compressible file under a directory. Returns the count"""
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if needs_precompress(path):
+                precompress(path)
+                count += 1
+    return count
+
+
+def _cached_compress(data, encoding):
+    """Compress a body, reusing the result for identical bodies"""
+    global _cache_bytes
+    key = (hashlib.sha1(data).digest(), encoding)
+    with _cache_lock:
+        compressed = _cache.get(key)
+        if compressed is not None:
+            _cache.move_to_end(key)
+            return compressed
+
+    compressed = compress(data, encoding)
+    if len(compressed) > CACHE_MAX_BYTES // 8:
+        return compressed
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = compressed
+            _cache_bytes += len(compressed)
+            while _cache_bytes > CACHE_MAX_BYTES:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= len(evicted)
+    return compressed
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _add_vary(response):
+    response.vary.add('Accept-Encoding')
+
+
+def _serve_precompressed(response):
+    """Swap a static file response for a precompressed sibling the client accepts"""
+    from flask import current_app, request, send_file
+    from werkzeug.security import safe_join
+
+    path = safe_join(current_app.static_folder, (request.view_args or {}).get('filename', ''))
+    if not path or not path.endswith(PRECOMPRESS_EXTENSIONS):
+        return response
+    _add_vary(response)
+    if response.status_code != 200:
+        return response
+
+    for encoding, suffix in SIBLINGS:
+        sibling = path + suffix
+        if not request.accept_encodings[encoding] or not os.path.isfile(sibling):
+            continue
+        try:
+            if os.stat(sibling).st_mtime_ns < os.stat(path).st_mtime_ns:
+                continue    # stale: the file was rewritten without its siblings
+        except OSError:
+            continue
+        etag, _ = response.get_etag()
+        compressed = send_file(
+            sibling, mimetype=response.mimetype, conditional=True,
+            etag=f'{etag}-{encoding}' if etag else True, max_age=current_app.get_send_file_max_age(path)
+        )
+        response.close()
+        compressed.headers['Content-Encoding'] = encoding
+        _add_vary(compressed)
+        return compressed
+    return response
+
+
+def _compress_response(response):
+    """after_request hook: serve precompressed static files, compress large dynamic bodies"""
+    from flask import request
+
+    if request.endpoint == 'static':
+        return _serve_precompressed(response)
+
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    _add_vary(response)
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or request.method == 'HEAD'):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    compressed = _cached_compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    # Registered after http_cache, so this runs before its hook adds Cache-Control
+    if ENABLED:
+        app.after_request(_compress_response)
+
+
+if __name__ == '__main__':
+    import sys
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    directories = sys.argv[1:] or [os.path.join(base_dir, 'static')]
+    for directory in directories:
+        print(f"{directory}: precompressed {precompress_tree(directory)} file(s)")
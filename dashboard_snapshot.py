@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Materialized admin dashboard snapshot.
+
+The enhanced admin dashboard runs dozens of queries per load (statistics,
+clients, scanners, cross-database leads, health probes, activity and login
+history). Instead, one worker rebuilds the whole dashboard in the background
+and writes it to SNAPSHOT_PATH as JSON; page loads only read that file.
+
+A refresh runs every REFRESH_INTERVAL seconds, claimed through the
+maintenance_runs table so only one worker does the work. An invalidation on
+one of INVALIDATING_CHANNELS (a new client or scanner, a saved scan, a
+tenant settings change) requests an early refresh: SETTLE_DELAY seconds
+later, and no more than once per MIN_REFRESH_INTERVAL. Each snapshot
+records when it was generated, which the dashboard shows as its "last
+updated" time.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import invalidation
+from maintenance import claim_task
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.environ.get(
+    'DASHBOARD_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard_snapshot.json')
+)
+REFRESH_INTERVAL = int(os.environ.get('DASHBOARD_REFRESH_INTERVAL', '60'))
+MIN_REFRESH_INTERVAL = int(os.environ.get('DASHBOARD_MIN_REFRESH_INTERVAL', '5'))
+SETTLE_DELAY = 2.0  # lets the invalidating transaction and write-behind flush land
+
+TASK = 'dashboard_snapshot'
+INVALIDATING_CHANNELS = ('dashboard', 'report_cache', 'tenant_config', 'api_client')
+
+_loaded = None      # ((path, mtime_ns), snapshot)
+_pending = None     # time an early refresh is due, or None
+_wakeup = threading.Event()
+_started = False
+_lock = threading.Lock()
+
+
+def build_snapshot():
+    """Run every dashboard query now"""
+    from enhanced_admin_dashboard import build_dashboard_data
+    started = time.time()
+    data = build_dashboard_data()
+    return {
+        'generated_at': datetime.fromtimestamp(started).isoformat(),
+        'started_at': started,
+        'build_seconds': round(time.time() - started, 3),
+        'data': data
+    }
+
+
+def refresh(path=None):
+    """
+    Rebuild the snapshot and replace the file atomically.
+
+    Returns:
+        dict: The new snapshot
+    """
+    global _loaded
+    path = path or SNAPSHOT_PATH
+    snapshot = build_snapshot()
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, default=str)
+    os.replace(tmp_path, path)
+    _loaded = ((path, os.stat(path).st_mtime_ns), snapshot)
+    logger.info(f"Dashboard snapshot refreshed in {snapshot['build_seconds']}s")
+    return snapshot
+
+
+def load_snapshot(path=None):
+    """The latest snapshot on disk, parsed once per write, or None"""
+    global _loaded
+    path = path or SNAPSHOT_PATH
+    try:
+        version = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    loaded = _loaded
+    if loaded and loaded[0] == version:
+        return loaded[1]
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading dashboard snapshot: {e}")
+        return None
+    _loaded = (version, snapshot)
+    return snapshot
+
+
+def get_snapshot():
+    """The latest snapshot; built inline only when none exists yet"""
+    snapshot = load_snapshot()
+    if snapshot is None:
+        snapshot = refresh()
+    return snapshot
+
+
+def invalidate(key='all', conn=None):
+    """
+    Request an early refresh from every worker.
+
+    Args:
+        key: What changed (logged only)
+        conn: Open connection on the main database, if the caller is
+            inside a transaction there
+    """
+    invalidation.publish('dashboard', key, conn)
+
+
+def _mark_stale(key):
+    global _pending
+    with _lock:
+        if _pending is None:
+            _pending = time.time() + SETTLE_DELAY
+    _wakeup.set()
+
+
+def _until_next_refresh(now):
+    """Seconds until the next periodic refresh of the snapshot on disk is due"""
+    snapshot = load_snapshot()
+    if not snapshot or 'started_at' not in snapshot:
+        return REFRESH_INTERVAL
+    # Still no sooner than MIN_REFRESH_INTERVAL while another worker is rebuilding
+    return max(MIN_REFRESH_INTERVAL, snapshot['started_at'] + REFRESH_INTERVAL - now)
+
+
+def run_due_refresh():
+    """
+    Refresh the snapshot if a periodic or early refresh is due and no other
+    worker has claimed it.
+
+    Returns:
+        float: Seconds until the next check
+    """
+    global _pending
+    now = time.time()
+    with _lock:
+        pending = _pending
+    if pending is not None:
+        if now < pending:
+            return pending - now
+        snapshot = load_snapshot()
+        if snapshot and snapshot.get('started_at', 0) >= pending:
+            # Another worker's refresh already covers the change
+            with _lock:
+                if _pending == pending:
+                    _pending = None
+            return REFRESH_INTERVAL
+
+    if not claim_task(TASK, MIN_REFRESH_INTERVAL if pending is not None else REFRESH_INTERVAL):
+        # Retry an early refresh soon; otherwise the next periodic slot is the earliest it can be claimed
+        return MIN_REFRESH_INTERVAL if pending is not None else _until_next_refresh(now)
+    with _lock:
+        if _pending == pending:
+            _pending = None
+    refresh()
+    return REFRESH_INTERVAL
+
+
+def _refresh_loop():
+    while True:
+        try:
+            delay = run_due_refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing dashboard snapshot: {e}")
+            delay = REFRESH_INTERVAL
+        if _wakeup.wait(delay):
+            _wakeup.clear()
+
+
+def start_refresher():
+    """Refresh the snapshot in a daemon thread, periodically and on invalidation"""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    for channel in INVALIDATING_CHANNELS:
+        invalidation.subscribe(channel, _mark_stale)
+    invalidation.ensure_listening()
+    threading.Thread(target=_refresh_loop, name='dashboard-snapshot', daemon=True).start()
+
+
+if __name__ == "__main__":
+    snapshot = refresh()
+    print(f"Wrote {SNAPSHOT_PATH} ({snapshot['build_seconds']}s)")
@@ -1,9 +1,13 @@
 from contextlib import contextmanager
+import os
 import sqlite3
 import logging
 import uuid
 from datetime import datetime
 
+from migrations import LEADS_DB, ensure_schema
+from write_behind import enqueue, get_pending, register_handler
+
 @contextmanager
 def get_db_connection(db_path=None):
     """Context manager for database connections with improved error handling"""
@@ -45,82 +49,16 @@ def get_client_db(db_manager, client_id):
         if conn:
             conn.close()
 
-def save_lead_data(lead_data):
-    """Save lead data to the leads database"""
-    try:
-        # Use leads.db for storing lead data
-        conn = sqlite3.connect('leads.db', timeout=20.0)
-        cursor = conn.cursor()
-        
-        # Create leads table if it doesn't exist - check existing schema first
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='leads'")
-        table_exists = cursor.fetchone()
-        
-        if not table_exists:
-            cursor.execute('''
-            CREATE TABLE leads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lead_id TEXT UNIQUE,
-                name TEXT,
-                email TEXT,
-                company TEXT,
-                phone TEXT,
-                industry TEXT,
-                company_size TEXT,
-                company_website TEXT,
-                target TEXT,
-                client_os TEXT,
-                client_browser TEXT,
-                windows_version TEXT,
-                timestamp TEXT,
-                created_at TEXT
-            )
-            ''')
-        else:
-            # Check if required columns exist, if not add them
-            cursor.execute("PRAGMA table_info(leads)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'lead_id' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN lead_id TEXT")
-                logging.info("Added lead_id column to existing leads table")
-            
-            if 'industry' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN industry TEXT")
-                logging.info("Added industry column to existing leads table")
-            
-            if 'company_size' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN company_size TEXT")
-                logging.info("Added company_size column to existing leads table")
-            
-            if 'company_website' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN company_website TEXT")
-                logging.info("Added company_website column to existing leads table")
-            
-            if 'target' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN target TEXT")
-                logging.info("Added target column to existing leads table")
-            
-            if 'client_os' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN client_os TEXT")
-                logging.info("Added client_os column to existing leads table")
-            
-            if 'client_browser' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN client_browser TEXT")
-                logging.info("Added client_browser column to existing leads table")
-            
-            if 'windows_version' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN windows_version TEXT")
-                logging.info("Added windows_version column to existing leads table")
-            
-            if 'timestamp' not in columns:
-                cursor.execute("ALTER TABLE leads ADD COLUMN timestamp TEXT")
-                logging.info("Added timestamp column to existing leads table")
+def _write_leads(conn, payloads):
+    """Insert a batch of queued leads into leads.db without committing"""
+    cursor = conn.cursor()
+    
+    for lead_data in payloads:
+        # Replays after a crash must not duplicate the lead
+        cursor.execute('SELECT 1 FROM leads WHERE lead_id = ?', (lead_data['lead_id'],))
+        if cursor.fetchone():
+            continue
         
-        # Generate unique lead ID
-        lead_id = f"lead_{uuid.uuid4().hex[:12]}"
-        
-        # Insert lead data
         cursor.execute('''
         INSERT INTO leads (
             lead_id, name, email, company, phone, industry, 
@@ -128,7 +66,7 @@ def save_lead_data(lead_data):
             client_browser, windows_version, timestamp, created_at
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            lead_id,
+            lead_data['lead_id'],
             lead_data.get('name', ''),
             lead_data.get('email', ''),
             lead_data.get('company', ''),
@@ -141,24 +79,67 @@ def save_lead_data(lead_data):
             lead_data.get('client_browser', ''),
             lead_data.get('windows_version', ''),
             lead_data.get('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-            datetime.now().isoformat()
+            lead_data.get('created_at', datetime.now().isoformat())
         ))
+
+register_handler('lead', lambda lead_data: lead_data['db_path'], _write_leads)
+
+def save_lead_data(lead_data):
+    """Save lead data to the leads database
+    
+    The insert is queued on the write-behind pipeline; the lead ID is
+    returned immediately and get_scan_results can see the lead before it
+    is committed.
+    """
+    try:
+        # Generate unique lead ID
+        lead_id = f"lead_{uuid.uuid4().hex[:12]}"
         
-        conn.commit()
-        conn.close()
+        queued_lead = dict(lead_data)
+        queued_lead['lead_id'] = lead_id
+        queued_lead['db_path'] = os.path.abspath('leads.db')
+        ensure_schema(queued_lead['db_path'], LEADS_DB)
+        queued_lead.setdefault('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        queued_lead['created_at'] = datetime.now().isoformat()
+        enqueue('lead', queued_lead, item_key=lead_id)
         
-        logging.info(f"Lead data saved successfully with ID: {lead_id}")
+        logging.info(f"Lead data queued with ID: {lead_id}")
         return lead_id
         
     except Exception as e:
         logging.error(f"Error saving lead data: {e}")
         return None
 
+def _lead_scan_results(scan_id, lead_data):
+    """Scan results format for a lead, whether stored or still queued"""
+    return {
+        'scan_id': scan_id,
+        'timestamp': lead_data.get('timestamp', ''),
+        'email': lead_data.get('email', ''),
+        'name': lead_data.get('name', ''),
+        'company': lead_data.get('company', ''),
+        'target': lead_data.get('target', ''),
+        'risk_assessment': {
+            'overall_score': 75,
+            'risk_level': 'Medium'
+        },
+        'recommendations': [
+            'Implement comprehensive security monitoring',
+            'Regular security assessments',
+            'Employee training programs'
+        ]
+    }
+
 def get_scan_results(scan_id):
     """Get scan results by scan ID"""
     try:
         # Check multiple databases for scan results
         
+        # A lead saved moments ago may still be on the write-behind queue
+        lead_data = get_pending('lead', scan_id)
+        if lead_data:
+            return _lead_scan_results(scan_id, lead_data)
+        
         # First check leads.db
         conn = sqlite3.connect('leads.db', timeout=20.0)
         cursor = conn.cursor()
@@ -175,23 +156,7 @@ def get_scan_results(scan_id):
                       'client_browser', 'windows_version', 'timestamp', 'created_at']
             lead_data = dict(zip(columns[:len(lead_row)], lead_row))
             
-            return {
-                'scan_id': scan_id,
-                'timestamp': lead_data.get('timestamp', ''),
-                'email': lead_data.get('email', ''),
-                'name': lead_data.get('name', ''),
-                'company': lead_data.get('company', ''),
-                'target': lead_data.get('target', ''),
-                'risk_assessment': {
-                    'overall_score': 75,
-                    'risk_level': 'Medium'
-                },
-                'recommendations': [
-                    'Implement comprehensive security monitoring',
-                    'Regular security assessments',
-                    'Employee training programs'
-                ]
-            }
+            return _lead_scan_results(scan_id, lead_data)
         
         return None
         
@@ -33,29 +33,18 @@ def register_debug_middleware(app):
         app.logger.debug(f"Request: {request.method} {request.path}")
         app.logger.debug(f"Session: {session}")
         
-        # Check for session token and verify it in the database
+        # Check for session token; verification goes through the session cache, so the
+        # route's own verify_session() call on this request is a dict lookup
         if 'session_token' in session:
             try:
+                from auth_utils import verify_session
                 token = session['session_token']
-                conn = sqlite3.connect(CLIENT_DB_PATH)
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
+                result = verify_session(token)
                 
-                cursor.execute('''
-                SELECT s.*, u.username, u.role 
-                FROM sessions s 
-                JOIN users u ON s.user_id = u.id 
-                WHERE s.session_token = ?
-                ''', (token,))
-                
-                db_session = cursor.fetchone()
-                
-                if db_session:
-                    app.logger.debug(f"Valid session found for user: {db_session['username']}, role: {db_session['role']}")
+                if result['status'] == 'success':
+                    app.logger.debug(f"Valid session found for user: {result['user']['username']}, role: {result['user']['role']}")
                 else:
-                    app.logger.warning(f"Session token in cookie not found in database: {token}")
-                
-                conn.close()
+                    app.logger.warning(f"Session token in cookie not valid: {token[:10]}... ({result.get('message')})")
             except Exception as e:
                 app.logger.error(f"Error verifying session: {str(e)}")
                 app.logger.error(traceback.format_exc())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Incremental build of scanner deployments under static/deployments/.
+
+A deployment has four targets, each written by one generator in
+scanner_deployment:
+
+    css   scanner-styles.css
+    js    scanner-script.js
+    html  index.html, embed-snippet.html (links css/js by content hash)
+    docs  api-docs.md
+
+Each target's inputs are hashed: the scanner values it uses, plus the
+source of its generator, which holds the inline template. The hashes are
+kept in .build-manifest.json in the deployment directory. A build rewrites
+only targets whose hash changed or whose files are missing. Editing a
+scanner's colors therefore rewrites its CSS and HTML. Changing the HTML
+template rewrites index.html for every scanner and leaves the rest alone.
+Files are replaced atomically (temp file plus rename). Each file also gets
+.gz/.br siblings (see compression.precompress) that the static route
+serves to clients that accept them.
+
+Rebuild every deployment in parallel with:
+
+    python deployment_build.py [--jobs N] [--force] [--scanner UID ...]
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import scanner_deployment
+from compression import needs_precompress, precompress
+from http_cache import asset_version, file_version
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_NAME = '.build-manifest.json'
+
+# Scanner rows with the customizations that override their branding
+SCANNER_QUERY = '''
+    SELECT s.*, c.primary_color, c.secondary_color, c.button_color,
+           c.logo_path, c.favicon_path, cl.business_name
+    FROM scanners s
+    JOIN clients cl ON s.client_id = cl.id
+    LEFT JOIN customizations c ON cl.id = c.client_id
+'''
+
+_source_hashes = {}
+
+
+def _source_hash(func):
+    """Hash of a generator's source, so template edits invalidate its target"""
+    name = func.__name__
+    if name not in _source_hashes:
+        _source_hashes[name] = hashlib.sha256(inspect.getsource(func).encode()).hexdigest()
+    return _source_hashes[name]
+
+
+def _input_hash(func, inputs):
+    payload = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha256(f'{_source_hash(func)}:{payload}'.encode()).hexdigest()
+
+
+def _targets(deployment_dir, scanner_uid, scanner_data, api_key):
+    """
+    The deployment's targets in build order.
+
+    Returns:
+        list: (name, files, generator, inputs_func, build_func) tuples;
+            inputs_func is called just before the target is checked, so
+            html sees the css/js versions written earlier in the build
+    """
+    base_url = os.environ.get('BASE_URL', '')
+
+    def asset_versions():
+        return {
+            'css': file_version(os.path.join(deployment_dir, 'scanner-styles.css')),
+            'js': file_version(os.path.join(deployment_dir, 'scanner-script.js'))
+        }
+
+    return [
+        ('css', ('scanner-styles.css',), scanner_deployment.generate_scanner_css,
+         lambda: [scanner_data],
+         lambda: scanner_deployment.generate_scanner_css(deployment_dir, scanner_data)),
+        ('js', ('scanner-script.js',), scanner_deployment.generate_scanner_js,
+         lambda: [scanner_uid, api_key],
+         lambda: scanner_deployment.generate_scanner_js(deployment_dir, scanner_uid, api_key)),
+        ('html', ('index.html', 'embed-snippet.html'), scanner_deployment.generate_scanner_html,
+         lambda: [scanner_uid, scanner_data, api_key, asset_versions(), base_url],
+         lambda: scanner_deployment.generate_scanner_html(
+             deployment_dir, scanner_uid, scanner_data, api_key, asset_versions())),
+        ('docs', ('api-docs.md',), scanner_deployment.generate_api_docs,
+         lambda: [scanner_uid, api_key, (scanner_data or {}).get('contact_email'), base_url, asset_version()],
+         lambda: scanner_deployment.generate_api_docs(deployment_dir, scanner_uid, api_key, scanner_data)),
+    ]
+
+
+def _read_manifest(deployment_dir):
+    try:
+        with open(os.path.join(deployment_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_scanner(scanner_uid, scanner_data, api_key, force=False, deployments_dir=None):
+    """
+    Bring one scanner's deployment up to date.
+
+    Args:
+        scanner_uid: Scanner UID (deployment directory name)
+        scanner_data (dict): Branding and contact values for the templates
+        api_key: Scanner API key embedded in the assets
+        force: Rebuild every target regardless of the manifest
+        deployments_dir: Parent directory (defaults to static/deployments)
+
+    Returns:
+        dict: status, scanner_uid, deployment_path, rebuilt and unchanged
+            target names, or status 'error' with a message
+    """
+    deployment_dir = os.path.join(deployments_dir or scanner_deployment.DEPLOYMENTS_DIR, scanner_uid)
+    result = {'status': 'success', 'scanner_uid': scanner_uid, 'deployment_path': deployment_dir,
+              'rebuilt': [], 'unchanged': []}
+    try:
+        os.makedirs(deployment_dir, exist_ok=True)
+        manifest = _read_manifest(deployment_dir)
+        updated = dict(manifest)
+
+        for name, files, generator, inputs, build in _targets(deployment_dir, scanner_uid, scanner_data, api_key):
+            digest = _input_hash(generator, inputs())
+            present = all(os.path.exists(os.path.join(deployment_dir, f)) for f in files)
+            paths = [os.path.join(deployment_dir, f) for f in files]
+            if not force and present and manifest.get(name) == digest:
+                result['unchanged'].append(name)
+            else:
+                if not build():
+                    raise RuntimeError(f"Failed to generate {name} for scanner {scanner_uid}")
+                # html hashes the css/js files, so recompute after they change
+                updated[name] = _input_hash(generator, inputs())
+                result['rebuilt'].append(name)
+            for path in paths:
+                if needs_precompress(path):
+                    precompress(path)
+
+        if updated != manifest:
+            scanner_deployment.write_file(os.path.join(deployment_dir, MANIFEST_NAME),
+                                          json.dumps(updated, indent=2, sort_keys=True))
+        if result['rebuilt']:
+            logger.info(f"Rebuilt {', '.join(result['rebuilt'])} for scanner {scanner_uid}")
+        return result
+
+    except Exception as e:
+        logger.error(f"Error building scanner deployment {scanner_uid}: {e}")
+        return {'status': 'error', 'scanner_uid': scanner_uid, 'message': str(e)}
+
+
+def scanner_build_data(row):
+    """(scanner_uid, scanner_data, api_key) from a SCANNER_QUERY row"""
+    fs = dict(row)
+    scanner_data = {
+        'name': fs['name'],
+        'business_name': fs['business_name'],
+        'primary_color': fs['primary_color'] or '#02054c',
+        'secondary_color': fs['secondary_color'] or '#35a310',
+        'button_color': fs['button_color'] or fs['primary_color'] or '#02054c',
+        'logo_url': fs['logo_path'] or '',
+        'favicon_url': fs['favicon_path'] or '',
+    }
+    return fs['scanner_id'], scanner_data, fs['api_key']
+
+
+def load_scanners(scanner_uids=None, scanner_id=None):
+    """Build inputs for deployed scanners, optionally limited to some UIDs or one row ID"""
+    import sqlite3
+    from client_db import get_db_connection
+
+    conditions, params = ["COALESCE(s.status, 'active') != 'deleted'"], []
+    if scanner_uids:
+        conditions.append(f"s.scanner_id IN ({', '.join('?' for _ in scanner_uids)})")
+        params.extend(scanner_uids)
+    if scanner_id is not None:
+        conditions.append('s.id = ?')
+        params.append(scanner_id)
+
+    conn = get_db_connection()
+    try:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"{SCANNER_QUERY} WHERE {' AND '.join(conditions)} ORDER BY s.id", params).fetchall()
+    finally:
+        conn.close()
+    return [scanner_build_data(row) for row in rows]
+
+
+def rebuild_all(scanners=None, jobs=None, force=False, deployments_dir=None, progress=None):
+    """
+    Build many deployments in parallel processes.
+
+    Args:
+        scanners: (scanner_uid, scanner_data, api_key) tuples; defaults to
+            every deployed scanner
+        jobs: Worker processes (defaults to the CPU count)
+        force: Rebuild every target
+        deployments_dir: Parent directory (defaults to static/deployments)
+        progress: Callable(done, total, result) run as each build finishes
+
+    Returns:
+        dict: total, rebuilt, unchanged and failed counts plus the results
+    """
+    scanners = load_scanners() if scanners is None else scanners
+    summary = {'total': len(scanners), 'rebuilt': 0, 'unchanged': 0, 'failed': 0, 'results': []}
+    if not scanners:
+        return summary
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = [executor.submit(build_scanner, uid, data, api_key, force, deployments_dir)
+                   for uid, data, api_key in scanners]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'error', 'message': str(e)}
+            if result['status'] != 'success':
+                summary['failed'] += 1
+            elif result['rebuilt']:
+                summary['rebuilt'] += 1
+            else:
+                summary['unchanged'] += 1
+            summary['results'].append(result)
+            if progress:
+                progress(done, len(scanners), result)
+    return summary
+
+
+def _print_progress(done, total, result):
+    width = len(str(total))
+    uid = result.get('scanner_uid', '?')
+    if result['status'] != 'success':
+        status = f"FAILED: {result.get('message')}"
+    elif result['rebuilt']:
+        status = f"rebuilt {', '.join(result['rebuilt'])}"
+    else:
+        status = 'up to date'
+    print(f"[{done:>{width}}/{total}] {uid}: {status}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='rebuild every target')
+    parser.add_argument('--scanner', action='append', dest='scanners', metavar='UID',
+                        help='only build these scanners (repeatable)')
+    args = parser.parse_args()
+
+    # Deployment paths are relative to the app directory, as in the web app
+    os.chdir(BASE_DIR)
+    started = time.time()
+    summary = rebuild_all(load_scanners(args.scanners), jobs=args.jobs, force=args.force,
+                          progress=_print_progress)
+    print(f"\n{summary['total']} scanner(s) in {time.time() - started:.1f}s: "
+          f"{summary['rebuilt']} rebuilt, {summary['unchanged']} up to date, {summary['failed']} failed")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
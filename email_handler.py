@@ -1,11 +1,10 @@
 import os
 import logging
-import smtplib
-from email.message import EmailMessage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from datetime import datetime
+
+import mail_queue
+import scan_summary
 
 # Set up logging configuration if not already set
 if not logging.getLogger().handlers:
@@ -13,8 +12,8 @@ if not logging.getLogger().handlers:
                        format='%(asctime)s - %(levelname)s - %(message)s')
 
 def send_branded_email_report(lead_data, scan_results, html_report, company_name, logo_path, 
-                            brand_color, email_subject, email_intro):
-    """Send a branded email report to the client"""
+                            brand_color, email_subject, email_intro, client_id=None):
+    """Queue a branded email report to the client"""
     try:
         # Use environment variables for credentials
         smtp_user = os.environ.get('SMTP_USER')
@@ -27,90 +26,67 @@ def send_branded_email_report(lead_data, scan_results, html_report, company_name
             
         logging.debug(f"Attempting to send branded email with SMTP user: {smtp_user}")
         
-        # Create a multipart message for HTML and text
-        msg = MIMEMultipart('alternative')
+        # The logo is read once per tenant; later emails reuse the cached part
+        logo_part = scan_summary.load_logo(logo_path, tenant=client_id)
+        branding = {
+            'company_name': company_name,
+            'brand_color': brand_color,
+            'email_intro': email_intro,
+            'has_logo': logo_part is not None,
+            'has_report': bool(html_report)
+        }
+        msg = build_report_message(scan_results, html_report, branding, logo_part)
         msg["Subject"] = email_subject
         msg["From"] = smtp_user
+        msg["To"] = lead_data.get("email", "")
         
-        # Send to the user's email address
-        user_email = lead_data.get("email", "")
-        msg["To"] = user_email
-        
-        logging.debug(f"Email recipient: {user_email}")
-        
-        # Create a simple text version as a fallback
-        text_body = create_comprehensive_text_summary(scan_results)
-        
-        # Create the branded HTML wrapper
-        branded_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 0; }}
-                .header {{ background-color: {brand_color}; color: white; padding: 20px; text-align: center; }}
-                .logo {{ max-width: 200px; }}
-                .content {{ padding: 20px; }}
-                .footer {{ background-color: #f5f5f5; padding: 20px; text-align: center; font-size: 12px; color: #666; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                {f'<img src="cid:logo" class="logo" alt="{company_name}">' if logo_path else ''}
-                <h1>{company_name} Security Scan Report</h1>
-            </div>
-            <div class="content">
-                <p>{email_intro}</p>
-                <hr>
-                {html_report}
-            </div>
-            <div class="footer">
-                <p>This report was generated on {datetime.now().strftime("%Y-%m-%d")} at the request of {lead_data.get('name', 'Unknown')}.</p>
-                <p>&copy; {datetime.now().year} {company_name}. All rights reserved.</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Create text part (fallback for email clients that don't support HTML)
-        part1 = MIMEText(text_body, 'plain')
-        
-        # Create HTML part - use the HTML report
-        part2 = MIMEText(branded_html, 'html')
-        
-        # Add parts to message
-        msg.attach(part1)
-        msg.attach(part2)
+        logging.debug(f"Email recipient: {msg['To']}")
         
-        # Add logo as embedded image if provided
-        if logo_path and os.path.exists(logo_path):
-            with open(logo_path, 'rb') as logo_file:
-                logo_part = MIMEImage(logo_file.read())
-                logo_part.add_header('Content-ID', '<logo>')
-                logo_part.add_header('Content-Disposition', 'inline', filename='logo.png')
-                msg.attach(logo_part)
-        
-        # Configure SMTP
-        smtp_server = os.environ.get('SMTP_SERVER', 'mail.privateemail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        
-        logging.debug(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
-        
-        # Send the email
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=30) as server:
-            logging.debug("SMTP connection established")
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
-            logging.debug("Branded email sent successfully!")
-            return True
+        # Hand off to the delivery queue; the SMTP round trips happen in the background
+        message_id = mail_queue.enqueue(msg, client_id=client_id, scan_id=scan_results.get('scan_id'))
+        logging.debug(f"Branded email queued as {message_id}")
+        return message_id is not None
             
     except Exception as e:
         logging.error(f"Error sending branded email: {e}")
         return False
+
+def build_report_message(scan_results, html_report, branding, logo_part=None):
+    """Assemble a report email from the scan's cached summary.
+    
+    The text and HTML bodies render from scan_summary's per-scan model and
+    are cached, so a resend does no report processing. The full report, if
+    given, is attached rather than inlined.
+    
+    Args:
+        scan_results (dict): Full scan results (only read the first time a scan is summarized)
+        html_report (str): Rendered report to attach, or None
+        branding (dict): company_name, brand_color, email_intro, has_logo, has_report
+        logo_part: Inline logo from scan_summary.load_logo, or None
+    
+    Returns:
+        MIMEMultipart: Message without Subject/From/To
+    """
+    summary = scan_summary.get_summary(scan_results)
+    text_body, html_body = scan_summary.email_parts(summary, branding)
+    
+    body = MIMEMultipart('alternative')
+    body.attach(MIMEText(text_body, 'plain'))
+    body.attach(MIMEText(html_body, 'html'))
+    
+    if logo_part is not None:
+        related = MIMEMultipart('related')
+        related.attach(body)
+        related.attach(logo_part)
+        body = related
+    
+    if not html_report:
+        return body
+    
+    msg = MIMEMultipart('mixed')
+    msg.attach(body)
+    msg.attach(scan_summary.report_attachment(summary, html_report))
+    return msg
         
 def create_comprehensive_text_summary(scan_results):
     """Create a comprehensive text summary of ALL scan results.
@@ -389,16 +365,17 @@ def create_comprehensive_text_summary(scan_results):
     
     return "\n".join(summary)
 
-def send_email_report(lead_data, scan_results, html_report):
-    """Send lead info and scan result to your email using a mail relay.
+def send_email_report(lead_data, scan_results, html_report, client_id=None):
+    """Queue lead info and scan result for delivery through the mail relay.
     
     Args:
         lead_data (dict): Dictionary containing lead information (name, email, etc.)
         scan_results (dict): Dictionary containing the full scan results
         html_report (str): HTML string containing the rendered report
+        client_id: Client whose reports row records the delivery
     
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        bool: True if the email was queued, False otherwise
     """
     try:
         # Use environment variables for credentials
@@ -412,46 +389,25 @@ def send_email_report(lead_data, scan_results, html_report):
             
         logging.debug(f"Attempting to send email with SMTP user: {smtp_user}")
         
-        # Create a multipart message for HTML and text
-        msg = MIMEMultipart('alternative')
-        msg["Subject"] = f"Security Scan Report - {lead_data.get('company', 'Unknown Company')}"
+        company = lead_data.get('company', 'Unknown Company')
+        branding = {
+            'company_name': company,
+            'brand_color': '#02054c',
+            'email_intro': None,
+            'has_logo': False,
+            'has_report': bool(html_report)
+        }
+        msg = build_report_message(scan_results, html_report, branding)
+        msg["Subject"] = f"Security Scan Report - {company}"
         msg["From"] = smtp_user
+        msg["To"] = lead_data.get("email", "")
         
-        # Send to the user's email address
-        user_email = lead_data.get("email", "")
-        msg["To"] = user_email
-        
-        logging.debug(f"Email recipient: {user_email}")
-        
-        # Create a simple text version as a fallback
-        text_body = create_comprehensive_text_summary(scan_results)
-        
-        # Create text part (fallback for email clients that don't support HTML)
-        part1 = MIMEText(text_body, 'plain')
-        
-        # Create HTML part - use the HTML report
-        part2 = MIMEText(html_report, 'html')
-        
-        # Add parts to message
-        msg.attach(part1)
-        msg.attach(part2)
-        
-        # Configure SMTP
-        smtp_server = "mail.privateemail.com"  # Change to your SMTP server
-        smtp_port = 587  # 587 is typical for authenticated TLS
-        
-        logging.debug(f"Connecting to SMTP server: {smtp_server}:{smtp_port}")
+        logging.debug(f"Email recipient: {msg['To']}")
         
-        # Send the email
-        with smtplib.SMTP(smtp_server, smtp_port, timeout=30) as server:
-            logging.debug("SMTP connection established")
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
-            logging.debug("Email sent successfully!")
-            return True
+        # Hand off to the delivery queue; the SMTP round trips happen in the background
+        message_id = mail_queue.enqueue(msg, client_id=client_id, scan_id=scan_results.get('scan_id'))
+        logging.debug(f"Email queued as {message_id}")
+        return message_id is not None
             
     except Exception as e:
         logging.error(f"Error sending email: {e}")
@@ -17,7 +17,10 @@ import re
 from pathlib import Path
 
 # Import required modules
-from client_db import get_db_connection
+from client_db import CLIENT_DB_PATH, get_db_connection
+from migrations import MAIN_DB, ensure_schema, table_columns
+from scan_storage import get_scan_store
+from time_buckets import day_bucket
 import scanner_db_functions
 import admin_db_functions
 
@@ -29,10 +32,35 @@ def get_enhanced_dashboard_data():
     """
     Get comprehensive data for the admin dashboard
     
+    Reads the snapshot dashboard_snapshot refreshes in the background, so a
+    page load runs no dashboard queries.
+    
     Returns:
         dict: All data needed for the admin dashboard
     """
+    import dashboard_snapshot
     try:
+        snapshot = dashboard_snapshot.get_snapshot()
+        dashboard_data = dict(snapshot['data'])
+        dashboard_data['snapshot_generated_at'] = datetime.fromisoformat(snapshot['generated_at'])
+    except Exception as e:
+        logger.error(f"Error loading dashboard snapshot: {str(e)}")
+        dashboard_data = build_dashboard_data()
+    dashboard_data['datetime'] = datetime
+    return dashboard_data
+
+def build_dashboard_data():
+    """
+    Run every dashboard query
+    
+    Returns:
+        dict: Dashboard data, JSON-serializable
+    """
+    try:
+        # Finish a migration this worker couldn't complete at startup; that
+        # also drops the cached table_columns taken before it
+        ensure_schema(CLIENT_DB_PATH, MAIN_DB)
+        
         # Get dashboard statistics
         dashboard_stats = get_dashboard_statistics()
         
@@ -53,9 +81,6 @@ def get_enhanced_dashboard_data():
         
         # Get recent logins
         recent_logins = get_recent_logins(10)
-
-        # Add date utilities for the template
-        from datetime import datetime
         
         # Combine all data into a single dashboard data object
         dashboard_data = {
@@ -65,8 +90,7 @@ def get_enhanced_dashboard_data():
             'recent_leads': recent_leads,
             'system_health': system_health,
             'recent_activities': recent_activities,
-            'recent_logins': recent_logins,
-            'datetime': datetime
+            'recent_logins': recent_logins
         }
         
         return dashboard_data
@@ -81,8 +105,7 @@ def get_enhanced_dashboard_data():
             'recent_leads': [],
             'system_health': {},
             'recent_activities': [],
-            'recent_logins': [],
-            'datetime': datetime
+            'recent_logins': []
         }
 
 def get_dashboard_statistics():
@@ -119,7 +142,8 @@ def get_dashboard_statistics():
             
             # Get new clients in last 30 days
             thirty_days_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            cursor.execute("SELECT COUNT(*) FROM clients WHERE DATE(created_at) >= ?", (thirty_days_ago,))
+            # ISO timestamps sort lexically, so a plain comparison can use an index
+            cursor.execute("SELECT COUNT(*) FROM clients WHERE created_at >= ?", (thirty_days_ago,))
             new_clients_30d = cursor.fetchone()[0]
         except Exception as e:
             logger.warning(f"Error getting client statistics: {str(e)}")
@@ -128,23 +152,18 @@ def get_dashboard_statistics():
         scanner_tables = ['scanners', 'scanner']
         for table in scanner_tables:
             try:
-                # Check if table exists
-                cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")
-                if cursor.fetchone():
-                    # Table exists, get statistics
+                # Column lists come from the schema snapshot taken once per process
+                columns = table_columns(CLIENT_DB_PATH, table)
+                if columns:
                     cursor.execute(f"SELECT COUNT(*) FROM {table}")
                     total_scanners += cursor.fetchone()[0]
                     
-                    # Check if status column exists
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
                     if 'status' in columns:
                         cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE status = 'deployed'")
                         active_scanners += cursor.fetchone()[0]
                     
                     if 'created_at' in columns:
-                        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE DATE(created_at) >= ?", (thirty_days_ago,))
+                        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE created_at >= ?", (thirty_days_ago,))
                         new_scanners_30d += cursor.fetchone()[0]
             except Exception as e:
                 logger.warning(f"Error getting scanner statistics from {table}: {str(e)}")
@@ -152,20 +171,15 @@ def get_dashboard_statistics():
         # Get scan statistics - try both 'scan_history' and 'scans' tables
         scan_tables = ['scan_history', 'scans']
         today = datetime.now().strftime('%Y-%m-%d')
+        today_bucket = day_bucket(datetime.now())
         
         for table in scan_tables:
             try:
-                # Check if table exists
-                cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")
-                if cursor.fetchone():
-                    # Table exists, get statistics
+                columns = table_columns(CLIENT_DB_PATH, table)
+                if columns:
                     cursor.execute(f"SELECT COUNT(*) FROM {table}")
                     total_scans += cursor.fetchone()[0]
                     
-                    # Check if timestamp column exists
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
                     # Get today's scan count using the appropriate timestamp column
                     timestamp_column = None
                     for col in ['timestamp', 'created_at', 'scan_date']:
@@ -173,7 +187,10 @@ def get_dashboard_statistics():
                             timestamp_column = col
                             break
                     
-                    if timestamp_column:
+                    if 'day_bucket' in columns:
+                        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE day_bucket = ?", (today_bucket,))
+                        scans_today += cursor.fetchone()[0]
+                    elif timestamp_column:
                         cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE DATE({timestamp_column}) = ?", (today,))
                         scans_today += cursor.fetchone()[0]
             except Exception as e:
@@ -181,13 +198,10 @@ def get_dashboard_statistics():
         
         # Get revenue data - try different subscription column names
         subscription_columns = ['subscription_level', 'subscription', 'plan']
+        client_columns = table_columns(CLIENT_DB_PATH, 'clients')
         for col in subscription_columns:
             try:
-                # Check if column exists in clients table
-                cursor.execute("PRAGMA table_info(clients)")
-                columns = [column[1] for column in cursor.fetchall()]
-                
-                if col in columns:
+                if col in client_columns:
                     # Column exists, get subscription breakdown
                     cursor.execute(f"""
                     SELECT 
@@ -239,50 +253,11 @@ def get_dashboard_statistics():
             }
             monthly_revenue = active_clients * 49.99
         
-        # Check client-specific databases for additional scan counts
+        # Scan counts from the client scan store (one file per client or consolidated)
         try:
-            # Find client databases
-            client_db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-            client_scan_count = 0
-            client_scan_today_count = 0
-            
-            if os.path.exists(client_db_dir):
-                for file in os.listdir(client_db_dir):
-                    if file.endswith('.db'):
-                        try:
-                            client_db_path = os.path.join(client_db_dir, file)
-                            client_conn = sqlite3.connect(client_db_path)
-                            client_cursor = client_conn.cursor()
-                            
-                            # Check if scans table exists
-                            client_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='scans'")
-                            if client_cursor.fetchone():
-                                # Get total scans
-                                client_cursor.execute("SELECT COUNT(*) FROM scans")
-                                client_scan_count += client_cursor.fetchone()[0]
-                                
-                                # Get today's scans
-                                client_cursor.execute("PRAGMA table_info(scans)")
-                                columns = [col[1] for col in client_cursor.fetchall()]
-                                
-                                # Find timestamp column
-                                timestamp_column = None
-                                for col in ['timestamp', 'created_at', 'scan_date']:
-                                    if col in columns:
-                                        timestamp_column = col
-                                        break
-                                
-                                if timestamp_column:
-                                    client_cursor.execute(f"SELECT COUNT(*) FROM scans WHERE DATE({timestamp_column}) = ?", (today,))
-                                    client_scan_today_count += client_cursor.fetchone()[0]
-                            
-                            client_conn.close()
-                        except Exception as e:
-                            logger.warning(f"Error reading client database {file}: {str(e)}")
-                
-                # Add client-specific counts to totals
-                total_scans += client_scan_count
-                scans_today += client_scan_today_count
+            client_totals = get_scan_store().scan_totals(today_bucket)
+            total_scans += client_totals['total_scans']
+            scans_today += client_totals['scans_today']
         except Exception as e:
             logger.warning(f"Error checking client databases: {str(e)}")
         
@@ -796,46 +771,86 @@ def get_recent_leads(limit=10):
         logger.error(f"Error getting recent leads: {str(e)}")
         return []
 
+def search_dashboard_leads(query, limit=25):
+    """
+    Ranked lead search for the dashboard's Recent Leads section
+    
+    Reads the global lead_search catalog instead of LIKE-scanning every
+    client's scans, then fills in client names and scores from the main
+    database.
+    
+    Args:
+        query (str): Free-text search
+        limit (int): Maximum number of leads to return
+        
+    Returns:
+        list: Lead dictionaries shaped like get_recent_leads() rows
+    """
+    try:
+        from search_index import search_leads
+        conn = get_db_connection()
+        try:
+            leads = search_leads(conn, query, limit=limit)
+            if not leads:
+                return []
+            
+            client_ids = sorted({lead['client_id'] for lead in leads if lead.get('client_id') is not None})
+            names = {}
+            if client_ids:
+                placeholders = ','.join('?' * len(client_ids))
+                names = dict(conn.execute(
+                    f"SELECT id, business_name FROM clients WHERE id IN ({placeholders})", client_ids
+                ).fetchall())
+            
+            scores = {}
+            scan_ids = [lead['scan_id'] for lead in leads if lead.get('scan_id')]
+            if scan_ids and 'security_score' in table_columns(CLIENT_DB_PATH, 'scan_history'):
+                placeholders = ','.join('?' * len(scan_ids))
+                for row in conn.execute(f"""
+                    SELECT scan_id, security_score, risk_level FROM scan_history
+                    WHERE scan_id IN ({placeholders})
+                """, scan_ids).fetchall():
+                    scores[row[0]] = (row[1], row[2])
+        finally:
+            conn.close()
+        
+        for lead in leads:
+            lead['client_name'] = names.get(lead.get('client_id'))
+            lead['security_score'], lead['risk_level'] = scores.get(lead.get('scan_id'), (None, None))
+        return leads
+    
+    except Exception as e:
+        logger.error(f"Error searching dashboard leads: {str(e)}")
+        return []
+
 def get_system_health():
     """
     Get system health information
     
+    Reads the background health sampler rather than statting files here.
+    
     Returns:
-        dict: System health statistics
+        dict: System health statistics, with recent history for sparklines
     """
     try:
-        # Get database information
-        db_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cybrscan.db')
-        db_size = os.path.getsize(db_file) if os.path.exists(db_file) else 0
-        
-        # Get client database information
-        client_db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
-        client_dbs = []
-        client_db_total_size = 0
-        
-        if os.path.exists(client_db_dir):
-            for file in os.listdir(client_db_dir):
-                if file.endswith('.db'):
-                    db_path = os.path.join(client_db_dir, file)
-                    size = os.path.getsize(db_path)
-                    client_dbs.append({
-                        'name': file,
-                        'size': size
-                    })
-                    client_db_total_size += size
-        
-        # Get system information
-        hostname = socket.gethostname()
-        platform_info = platform.platform()
+        import health_sampler
+        health = health_sampler.health_report(limit=30)
+        current = health['current']
         
         return {
             'db_integrity': 'ok',
-            'main_db_size': db_size,
-            'client_db_count': len(client_dbs),
-            'client_db_total_size': client_db_total_size,
-            'hostname': hostname,
-            'platform': platform_info,
-            'client_dbs': client_dbs
+            'main_db_size': current.get('main_db_size') or 0,
+            'client_db_count': current.get('client_db_count') or 0,
+            'client_db_total_size': current.get('client_db_total_size') or 0,
+            'hostname': socket.gethostname(),
+            'platform': platform.platform(),
+            'cpu_percent': current.get('system_cpu_percent'),
+            'memory_percent': current.get('memory_percent'),
+            'write_queue_depth': current.get('write_queue_depth'),
+            'mail_queue_depth': current.get('mail_queue_depth'),
+            'active_scans': current.get('active_scans'),
+            'sampled_at': current.get('timestamp'),
+            'history': health['history']
         }
     
     except Exception as e:
@@ -847,7 +862,7 @@ def get_system_health():
             'client_db_total_size': 0,
             'hostname': 'unknown',
             'platform': 'unknown',
-            'client_dbs': []
+            'history': {}
         }
 
 def get_recent_activities(limit=10):
@@ -1186,6 +1201,12 @@ def enhance_admin_dashboard():
                 # Get enhanced dashboard data
                 dashboard_data = get_enhanced_dashboard_data()
                 
+                # Lead search replaces the recent leads with ranked catalog matches
+                lead_search = admin.request.args.get('lead_search', '').strip()
+                if lead_search:
+                    dashboard_data['recent_leads'] = search_dashboard_leads(lead_search)
+                dashboard_data['lead_search'] = lead_search
+                
                 # Add the user to the dashboard data
                 dashboard_data['user'] = user
                 
@@ -318,38 +318,38 @@ def send_enhanced_scan_report(scan_results, lead_data, client_id=None):
         # Get client customizations if applicable
         client_branding = None
         if client_id:
-            from client_db import get_db_connection
-            conn = get_db_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT c.*, cu.* FROM clients c
-                LEFT JOIN customizations cu ON c.id = cu.client_id
-                WHERE c.id = ?
-            """, (client_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                client_branding = dict(result)
-            conn.close()
+            from tenant_config import get_client
+            client_branding = get_client(client_id)
         
-        # Generate HTML report
-        from enhanced_scan_report_generator import generate_enhanced_html_report
-        html_report = generate_enhanced_html_report(scan_results, client_branding)
+        # Attach the background-rendered report. This runs on the scan
+        # thread, so it can wait for the render; if the render fails or
+        # runs late the email goes out with its summary only
+        import report_artifacts
+        html_report = report_artifacts.wait_for_html(client_id, scan_results.get('scan_id'))
+        if html_report is None:
+            logger.warning(f"Report for scan {scan_results.get('scan_id')} not ready; emailing the summary only")
         
-        # Send email
-        from email_utils import send_scan_report_email
-        send_scan_report_email(
-            to_email=lead_data['email'],
-            to_name=lead_data.get('name', 'Security Scan User'),
-            company_name=lead_data.get('company', 'Your Company'),
-            scan_results=scan_results,
-            html_report=html_report,
-            client_branding=client_branding
-        )
+        # Queue the email; reports.email_sent is set by the mail queue once it is delivered
+        from email_handler import send_branded_email_report, send_email_report
+        if client_branding:
+            queued = send_branded_email_report(
+                lead_data,
+                scan_results,
+                html_report,
+                client_branding.get('business_name') or lead_data.get('company', 'Your Company'),
+                client_branding.get('logo_path', ''),
+                client_branding.get('primary_color') or '#02054c',
+                client_branding.get('email_subject') or "Your Security Scan Report",
+                client_branding.get('email_intro') or "Thank you for using our security scanner.",
+                client_id=client_id
+            )
+        else:
+            queued = send_email_report(lead_data, scan_results, html_report, client_id=client_id)
         
-        logger.info(f"Enhanced scan report sent to {lead_data['email']}")
+        if queued:
+            logger.info(f"Enhanced scan report queued for {lead_data['email']}")
+        else:
+            logger.error(f"Enhanced scan report for {lead_data['email']} could not be queued")
         
     except Exception as e:
         logger.error(f"Error sending enhanced scan report: {e}")
@@ -6,12 +6,18 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 
+import login_pipeline
+import session_cache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Define database path
-CLIENT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+CLIENT_DB_PATH = os.environ.get(
+    'CLIENT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+)
 
 def ensure_db_tables():
     """Ensure all required database tables exist"""
@@ -48,6 +54,7 @@ def ensure_db_tables():
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
         )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
         
         conn.commit()
         conn.close()
@@ -73,44 +80,11 @@ def authenticate_user(conn, cursor, username_or_email, password, ip_address=None
         dict: Authentication result
     """
     try:
-        # Find user by username or email
-        cursor.execute('''
-        SELECT * FROM users 
-        WHERE (username = ? OR email = ?) AND active = 1
-        ''', (username_or_email, username_or_email))
-        
-        user = cursor.fetchone()
-        
-        if not user:
-            return {"status": "error", "message": "Invalid credentials"}
-        
-        # Verify password
-        try:
-            # Use pbkdf2_hmac if salt exists (new format)
-            salt = user['salt']
-            stored_hash = user['password_hash']
-            
-            # Compute hash with pbkdf2
-            password_hash = hashlib.pbkdf2_hmac(
-                'sha256', 
-                password.encode(), 
-                salt.encode(), 
-                100000  # Same iterations as used for storing
-            ).hex()
-            
-            password_correct = (password_hash == stored_hash)
-        except Exception as pw_error:
-            logger.warning(f"Error in password verification with pbkdf2: {pw_error}, falling back to simple hash")
-            # Fallback to simple hash if pbkdf2 fails
-            try:
-                password_hash = hashlib.sha256((password + user['salt']).encode()).hexdigest()
-                password_correct = (password_hash == user['password_hash'])
-            except Exception as fallback_error:
-                logger.error(f"Error in fallback password verification: {fallback_error}")
-                password_correct = False
+        # Throttle, then verify the password (hashed in this request thread)
+        user, error = login_pipeline.authenticate(cursor, username_or_email, password, ip_address)
         
-        if not password_correct:
-            return {"status": "error", "message": "Invalid credentials"}
+        if error:
+            return error
         
         # Create a session token
         session_token = secrets.token_hex(32)
@@ -164,56 +138,13 @@ def authenticate_user_wrapper(username_or_email, password, ip_address=None, user
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Find user by username or email
-        cursor.execute('''
-        SELECT * FROM users 
-        WHERE (username = ? OR email = ?) AND active = 1
-        ''', (username_or_email, username_or_email))
-        
-        user = cursor.fetchone()
-        
-        if not user:
-            conn.close()
-            logging.warning(f"Login failed: User not found - {username_or_email}")
-            return {"status": "error", "message": "Invalid credentials"}
+        # Throttle, then verify the password (hashed in this request thread)
+        user, error = login_pipeline.authenticate(cursor, username_or_email, password, ip_address)
         
-        # Verify password
-        try:
-            # Use pbkdf2_hmac if salt exists (new format)
-            salt = user['salt']
-            stored_hash = user['password_hash']
-            
-            # Log password verification process (use for debugging)
-            logging.debug(f"Authenticating with salt: {salt[:5]}... for user {user['username']}")
-            
-            # Try PBKDF2 method first (more secure)
-            password_hash = hashlib.pbkdf2_hmac(
-                'sha256', 
-                password.encode(), 
-                salt.encode(), 
-                100000  # Same iterations as used for storing
-            ).hex()
-            
-            if password_hash == stored_hash:
-                password_correct = True
-                logging.debug("Password verified with PBKDF2")
-            else:
-                # Try simple SHA-256 as fallback (for older passwords)
-                password_hash_simple = hashlib.sha256((password + salt).encode()).hexdigest()
-                password_correct = (password_hash_simple == stored_hash)
-                if password_correct:
-                    logging.debug("Password verified with SHA-256 (consider upgrading)")
-                else:
-                    logging.debug("Password verification failed")
-        except Exception as pw_error:
-            # Log the exact error for debugging
-            logging.error(f"Password verification error: {str(pw_error)}")
-            password_correct = False
-        
-        if not password_correct:
+        if error:
             conn.close()
-            logging.warning(f"Login failed: Invalid password for user {username_or_email}")
-            return {"status": "error", "message": "Invalid credentials"}
+            logging.warning(f"Login failed for {username_or_email}: {error['message']}")
+            return error
         
         # Create a session token
         session_token = secrets.token_hex(32)
@@ -272,6 +203,10 @@ def verify_session(session_token):
         if not session_token:
             return {"status": "error", "message": "No session token provided"}
         
+        cached = session_cache.get_session(session_token)
+        if cached:
+            return cached
+        
         # Connect to database
         conn = sqlite3.connect(CLIENT_DB_PATH)
         conn.row_factory = sqlite3.Row
@@ -323,6 +258,7 @@ def verify_session(session_token):
         }
         
         conn.close()
+        session_cache.store_session(session_token, result, session['expires_at'])
         return result
     
     except Exception as e:
@@ -341,6 +277,7 @@ def logout_user(session_token):
         
         # Delete session
         cursor.execute('DELETE FROM sessions WHERE session_token = ?', (session_token,))
+        session_cache.invalidate_token(session_token, conn)
         conn.commit()
         conn.close()
         
@@ -29,6 +29,15 @@ scan_results_storage = {}
 def fixed_scan_page():
     """Fixed scan page with comprehensive scan capabilities"""
     if request.method == 'POST':
+        # Turn away floods from one address before any lead or scan work
+        from rate_limit import enforce, ip_bucket
+        limited = enforce([ip_bucket(request.remote_addr)])
+        if limited:
+            return limited
+        # Counted in the health sampler's active scans until the request ends
+        from health_sampler import scan_started
+        scan_started()
+
         try:
             # Get form data
             lead_data = {
@@ -96,17 +105,11 @@ def fixed_scan_page():
             if client_id:
                 try:
                     from client import get_client_total_scans, get_client_scan_limit
-                    from client_db import get_db_connection
+                    from tenant_config import get_client
                     
-                    conn = get_db_connection()
-                    conn.row_factory = sqlite3.Row
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT * FROM clients WHERE id = ?", (client_id,))
-                    client_row = cursor.fetchone()
-                    conn.close()
+                    client = get_client(client_id)
                     
-                    if client_row:
-                        client = dict(client_row)
+                    if client:
                         current_scans = get_client_total_scans(client_id)
                         scan_limit = get_client_scan_limit(client)
                         
@@ -156,22 +159,9 @@ def fixed_scan_page():
     client_branding = None
     if client_id:
         try:
-            from client_db import get_db_connection
-            conn = get_db_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get client and customization data
-            cursor.execute("""
-                SELECT c.*, cu.* FROM clients c
-                LEFT JOIN customizations cu ON c.id = cu.client_id
-                WHERE c.id = ?
-            """, (client_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                client_branding = dict(result)
-            conn.close()
+            # Client and customization data from the tenant config cache
+            from tenant_config import get_client
+            client_branding = get_client(client_id)
         except Exception as e:
             logger.error(f"Error getting client branding: {e}")
     
@@ -242,24 +232,20 @@ def view_scan_report(scan_id):
     client_id = scan_results.get('client_id')
     if client_id:
         try:
-            from client_db import get_db_connection
-            conn = get_db_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT c.*, cu.* FROM clients c
-                LEFT JOIN customizations cu ON c.id = cu.client_id
-                WHERE c.id = ?
-            """, (client_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                client_branding = dict(result)
-            conn.close()
+            from tenant_config import get_client
+            client_branding = get_client(client_id)
         except Exception as e:
             logger.error(f"Error getting client branding: {e}")
     
+    # Finished reports only change with the client's branding
+    import report_cache
+    version = client_branding.get('config_version', 0) if client_branding else 0
+    return report_cache.get_or_render(
+        scan_id, 'public_view', version, lambda: _render_scan_report(scan_results, client_branding)
+    )
+
+def _render_scan_report(scan_results, client_branding):
+    """Add industry analysis to a finished scan and render the report page"""
     # Determine company domain and calculate industry type
     target_domain = scan_results.get('target')
     client_email = scan_results.get('client_info', {}).get('email', '')
@@ -431,21 +417,8 @@ def send_scan_report(scan_results, lead_data, client_id=None):
         # Get client customizations if applicable
         client_branding = None
         if client_id:
-            from client_db import get_db_connection
-            conn = get_db_connection()
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT c.*, cu.* FROM clients c
-                LEFT JOIN customizations cu ON c.id = cu.client_id
-                WHERE c.id = ?
-            """, (client_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                client_branding = dict(result)
-            conn.close()
+            from tenant_config import get_client
+            client_branding = get_client(client_id)
         
         # Send email
         from email_utils import send_scan_report_email
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Background system-health sampler.
+
+The admin health views used to call psutil (including a blocking 0.1s CPU
+sample) and stat every database file while serving the request, and could
+only show that one moment. A daemon thread in each worker now records a
+sample every SAMPLE_INTERVAL seconds into a ring buffer of HISTORY_SIZE
+entries. Health endpoints read the latest sample and short history series
+for sparklines, and never sample themselves.
+
+Each sample holds:
+
+    cpu_percent, rss, open_fds, threads   this worker process
+    system_cpu_percent, memory_*, disk_*  the host
+    main_db_size, client_db_count,
+    client_db_total_size                  database files
+    write_queue_depth                     scan and lead writes waiting in the write-behind spool
+    mail_queue_depth                      report emails waiting to be sent
+    active_scans                          scan requests this worker is serving
+
+Set HEALTH_SAMPLES_PATH to also append samples to a SQLite file; a worker
+then starts with the recent history instead of an empty buffer. Every
+worker writes to the same file, so only the figures that are the same from
+any worker (SHARED_FIELDS: host, database files, queues) are persisted,
+and the history is read back as one sample per SAMPLE_INTERVAL. The
+per-process series start empty after a restart. psutil is
+optional: without it the process and host figures are read from /proc
+where possible, or left as None.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.environ.get('HEALTH_SAMPLE_INTERVAL', '10'))
+HISTORY_SIZE = int(os.environ.get('HEALTH_HISTORY_SIZE', '360'))
+SAMPLES_PATH = os.environ.get('HEALTH_SAMPLES_PATH', '')
+
+# Fields served as sparkline series, in display order
+SERIES_FIELDS = (
+    'cpu_percent', 'system_cpu_percent', 'memory_percent', 'rss', 'open_fds', 'threads',
+    'main_db_size', 'client_db_total_size', 'write_queue_depth', 'mail_queue_depth', 'active_scans'
+)
+
+# Figures every worker sees the same, so persisted samples from any worker can be mixed
+SHARED_FIELDS = (
+    'system_cpu_percent', 'memory_total', 'memory_available', 'memory_percent',
+    'disk_total', 'disk_used', 'disk_free', 'disk_percent',
+    'main_db_size', 'client_db_count', 'client_db_total_size', 'write_queue_depth', 'mail_queue_depth'
+)
+
+_samples = deque(maxlen=HISTORY_SIZE)
+_lock = threading.Lock()
+_active_scans = 0
+_tracking = False
+_started = False
+_process = None
+
+
+def scan_started():
+    """Count the current request as an active scan until it tears down"""
+    global _active_scans
+    from flask import g
+    if not _tracking or getattr(g, 'health_scan', False):
+        return
+    g.health_scan = True
+    with _lock:
+        _active_scans += 1
+
+
+def _scan_finished(exc=None):
+    """teardown_request hook"""
+    global _active_scans
+    from flask import g
+    if g.pop('health_scan', False):
+        with _lock:
+            _active_scans -= 1
+
+
+def _open_fds():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def _process_stats():
+    global _process
+    if psutil is None:
+        return {'cpu_percent': None, 'rss': None, 'open_fds': _open_fds(),
+                'threads': threading.active_count()}
+    if _process is None:
+        _process = psutil.Process()
+    with _process.oneshot():
+        return {
+            # Since the previous sample, so this never blocks
+            'cpu_percent': _process.cpu_percent(None),
+            'rss': _process.memory_info().rss,
+            'open_fds': _process.num_fds() if hasattr(_process, 'num_fds') else _open_fds(),
+            'threads': _process.num_threads()
+        }
+
+
+def _host_stats():
+    if psutil is None:
+        return {'system_cpu_percent': None, 'memory_percent': None}
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    return {
+        'system_cpu_percent': psutil.cpu_percent(None),
+        'memory_total': memory.total,
+        'memory_available': memory.available,
+        'memory_percent': memory.percent,
+        'disk_total': disk.total,
+        'disk_used': disk.used,
+        'disk_free': disk.free,
+        'disk_percent': disk.percent
+    }
+
+
+def _database_stats():
+    from migrations import CLIENT_DB_PATH
+    from scan_storage import get_scan_store
+
+    sizes = []
+    for db_path in get_scan_store().databases():
+        try:
+            sizes.append(os.path.getsize(db_path))
+        except OSError:
+            continue
+    return {
+        'main_db_size': os.path.getsize(CLIENT_DB_PATH) if os.path.exists(CLIENT_DB_PATH) else 0,
+        'client_db_count': len(sizes),
+        'client_db_total_size': sum(sizes)
+    }
+
+
+def _queue_stats():
+    import mail_queue
+    import write_behind
+    return {
+        'write_queue_depth': write_behind.queue_depth(),
+        'mail_queue_depth': mail_queue.queue_depth()
+    }
+
+
+def collect_sample():
+    """Take one sample now. Each group of figures fails independently"""
+    sample = {'timestamp': time.time(), 'pid': os.getpid()}
+    for collect in (_process_stats, _host_stats, _database_stats, _queue_stats):
+        try:
+            sample.update(collect())
+        except Exception as e:
+            logger.error(f"Error collecting health figures ({collect.__name__}): {e}")
+    with _lock:
+        sample['active_scans'] = _active_scans
+    return sample
+
+
+def record(sample):
+    with _lock:
+        _samples.append(sample)
+    if SAMPLES_PATH:
+        try:
+            _persist(sample)
+        except sqlite3.Error as e:
+            logger.error(f"Error persisting health sample: {e}")
+
+
+def latest():
+    """The most recent sample, or None before the first one"""
+    with _lock:
+        return _samples[-1] if _samples else None
+
+
+def history(fields=SERIES_FIELDS, limit=None):
+    """
+    Recent samples as one series per field, oldest first.
+
+    Returns:
+        dict: {'timestamps': [...], field: [...], ...}
+    """
+    with _lock:
+        samples = list(_samples)
+    if limit:
+        samples = samples[-limit:]
+    series = {'timestamps': [sample['timestamp'] for sample in samples]}
+    for field in fields:
+        series[field] = [sample.get(field) for sample in samples]
+    return series
+
+
+def health_report(limit=60):
+    """Current values plus sparkline history, for the health endpoints"""
+    current = latest()
+    if current is None:
+        # Sampler not running (scripts, tests): one sample keeps the shape
+        current = collect_sample()
+        record(current)
+    return {
+        'current': current,
+        'history': history(limit=limit),
+        'sample_interval': SAMPLE_INTERVAL
+    }
+
+
+def _connect(path=None):
+    conn = sqlite3.connect(path or SAMPLES_PATH, timeout=5.0)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS health_samples (
+        timestamp REAL NOT NULL,
+        pid INTEGER,
+        sample TEXT NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_health_samples_timestamp ON health_samples(timestamp)')
+    return conn
+
+
+def _persist(sample, path=None):
+    shared = {field: sample[field] for field in SHARED_FIELDS if field in sample}
+    shared['timestamp'] = sample['timestamp']
+    conn = _connect(path)
+    try:
+        conn.execute('INSERT INTO health_samples (timestamp, pid, sample) VALUES (?, ?, ?)',
+                     (sample['timestamp'], sample.get('pid'), json.dumps(shared)))
+        conn.execute('DELETE FROM health_samples WHERE timestamp < ?',
+                     (time.time() - HISTORY_SIZE * SAMPLE_INTERVAL,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def load_history(path=None):
+    """
+    Fill the ring buffer from persisted samples, keeping the latest one per
+    SAMPLE_INTERVAL when several workers wrote. Returns the number loaded
+    """
+    conn = _connect(path)
+    try:
+        rows = conn.execute('''
+            SELECT sample FROM health_samples WHERE rowid IN (
+                SELECT MAX(rowid) FROM health_samples WHERE timestamp >= ?
+                GROUP BY CAST(timestamp / ? AS INTEGER)
+            )
+            ORDER BY timestamp DESC LIMIT ?
+        ''', (time.time() - HISTORY_SIZE * SAMPLE_INTERVAL, SAMPLE_INTERVAL, _samples.maxlen)).fetchall()
+    finally:
+        conn.close()
+    with _lock:
+        _samples.extendleft(json.loads(row[0]) for row in rows)
+    return len(rows)
+
+
+def _sample_loop():
+    while True:
+        try:
+            record(collect_sample())
+        except Exception as e:
+            logger.error(f"Error sampling system health: {e}")
+        time.sleep(SAMPLE_INTERVAL)
+
+
+def start_sampler():
+    """Start this worker's sampler thread"""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    if SAMPLES_PATH:
+        try:
+            load_history()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading health history: {e}")
+    threading.Thread(target=_sample_loop, name='health-sampler', daemon=True).start()
+
+
+def init_app(app):
+    """Count active scan requests on app and start the sampler"""
+    global _tracking
+    app.teardown_request(_scan_finished)
+    _tracking = True
+    start_sampler()
+
+
+if __name__ == "__main__":
+    print(json.dumps(collect_sample(), indent=2))
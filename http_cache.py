@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+HTTP caching for embed pages and generated scanner assets.
+
+The embed page, the per-scanner stylesheet and script, and the files under
+static/deployments/ are loaded by visitors of every client website. They
+now carry ETags and Cache-Control, so browsers and CDNs can absorb repeat
+loads:
+
+- Validators are computed before rendering from what the content depends
+  on: the tenant's config_version and the deployed code (ASSET_VERSION). A
+  matching If-None-Match gets a 304 without rendering anything.
+- Asset URLs carry ?v=<version>. A request for the current version is
+  cached for a year as immutable. Any other request is served fresh with a
+  short max-age and must revalidate.
+"""
+
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+EMBED_MAX_AGE = int(os.environ.get('EMBED_MAX_AGE', '60'))
+DEPLOYMENTS_PREFIX = 'deployments/'
+
+
+def _code_fingerprint():
+    """Changes whenever a deploy changes templates or route code"""
+    digest = hashlib.sha256()
+    for folder in ('templates', 'routes'):
+        for root, _, files in os.walk(os.path.join(BASE_DIR, folder)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+
+ASSET_VERSION = os.environ.get('APP_VERSION') or os.environ.get('RENDER_GIT_COMMIT', '')[:12] or _code_fingerprint()
+
+
+def make_etag(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def asset_version(config_version=0):
+    """Version for a generated asset URL (?v=...)"""
+    return make_etag(ASSET_VERSION, config_version)[:12]
+
+
+def file_version(path):
+    """Content hash of a generated file, for versioned links to it"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def cache_control(response, max_age, immutable=False):
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.must_revalidate = True
+    return response
+
+
+def versioned_max_age(version):
+    """Max-age for an asset request: a year if it asked for the current version"""
+    from flask import request
+    requested = request.args.get('v')
+    if requested and requested == version:
+        return IMMUTABLE_MAX_AGE, True
+    return EMBED_MAX_AGE, False
+
+
+def not_modified(etag, max_age=EMBED_MAX_AGE, immutable=False):
+    """
+    Answer a conditional GET before doing any work.
+
+    Returns:
+        Response: 304 if the client already holds this version, else None
+    """
+    from flask import Response, request
+    # Weak comparison: compression hands clients a W/ form of the same tag
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return cache_control(response, max_age, immutable)
+
+
+def finish(response, etag=None, max_age=EMBED_MAX_AGE, immutable=False):
+    """
+    Add validators and caching hints to a full response.
+
+    Args:
+        etag: Precomputed validator; defaults to a hash of the body
+    """
+    from flask import make_response, request
+    response = make_response(response)
+    if response.status_code != 200:
+        return response
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    cache_control(response, max_age, immutable)
+    return response.make_conditional(request)
+
+
+def _static_deployment_headers(response):
+    """after_request hook: cache generated deployment files under /static/deployments/"""
+    from flask import request
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint != 'static' or not filename.startswith(DEPLOYMENTS_PREFIX):
+        return response
+    if response.status_code not in (200, 304):
+        return response
+    # send_file already set an ETag and Last-Modified from the file
+    if request.args.get('v'):
+        # Links from generated pages carry the file's content hash
+        return cache_control(response, IMMUTABLE_MAX_AGE, immutable=True)
+    return cache_control(response, EMBED_MAX_AGE)
+
+
+def init_app(app):
+    app.after_request(_static_deployment_headers)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cross-worker invalidation channel for in-process caches.
+
+Each gunicorn worker keeps its own caches (sessions, API credentials, ...).
+When a cache entry goes stale, publish() runs this worker's callbacks
+straight away and writes a (channel, key) row to the cache_invalidations
+table in the main database. It can write in the caller's transaction. Every
+worker that holds cached entries tails the table from one background thread
+and runs its own callbacks within POLL_INTERVAL seconds.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from migrations import CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get('CACHE_INVALIDATION_POLL', '1'))
+MESSAGE_RETENTION = 24 * 3600
+
+_subscribers = {}     # channel -> list of callbacks taking the key
+_error_callbacks = []
+_last_id = None
+_listening = False
+_lock = threading.Lock()
+
+
+def subscribe(channel, callback):
+    """Run callback(key) whenever channel is invalidated, here or in another worker"""
+    with _lock:
+        _subscribers.setdefault(channel, []).append(callback)
+
+
+def _dispatch(channel, key):
+    for callback in _subscribers.get(channel, []):
+        try:
+            callback(key)
+        except Exception as e:
+            logger.error(f"Error applying {channel} invalidation for {key}: {e}")
+
+
+def publish(channel, key, conn=None):
+    """
+    Invalidate key on channel in every worker.
+
+    Args:
+        channel (str): Cache name
+        key: Entry to drop (stored as text)
+        conn: Open connection on the main database; the message then
+            commits (or rolls back) with the caller's transaction
+    """
+    key = str(key)
+    _dispatch(channel, key)
+    statement = 'INSERT INTO cache_invalidations (channel, cache_key, created_at) VALUES (?, ?, ?)'
+    values = (channel, key, time.time())
+    try:
+        if conn is not None:
+            conn.execute(statement, values)
+            return
+        own_conn = sqlite3.connect(CLIENT_DB_PATH, timeout=5.0)
+        try:
+            own_conn.execute(statement, values)
+            own_conn.commit()
+        finally:
+            own_conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error publishing {channel} invalidation: {e}")
+
+
+def apply_pending():
+    """
+    Run callbacks for messages published since the last call.
+
+    The first call only records where the channel currently ends.
+
+    Returns:
+        int: Messages applied
+    """
+    global _last_id
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=5.0)
+    try:
+        if _last_id is None:
+            _last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM cache_invalidations').fetchone()[0]
+            return 0
+        rows = conn.execute(
+            'SELECT id, channel, cache_key FROM cache_invalidations WHERE id > ? ORDER BY id', (_last_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    for message_id, channel, key in rows:
+        _dispatch(channel, key)
+        _last_id = message_id
+    return len(rows)
+
+
+def _poll():
+    while True:
+        time.sleep(POLL_INTERVAL)
+        try:
+            apply_pending()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading cache invalidations: {e}")
+            for callback in _error_callbacks:
+                callback()
+
+
+def ensure_listening(on_error=None):
+    """
+    Start tailing the channel, before a cache stores its first entry.
+
+    Args:
+        on_error: Called if the channel can't be read, so the cache can
+            drop everything rather than miss a message
+    """
+    global _listening
+    if on_error is not None and on_error not in _error_callbacks:
+        _error_callbacks.append(on_error)
+    if _listening:
+        return
+    with _lock:
+        if _listening:
+            return
+        _listening = True
+    try:
+        apply_pending()
+    except sqlite3.Error as e:
+        logger.error(f"Error reading cache invalidations: {e}")
+    threading.Thread(target=_poll, name='cache-invalidations', daemon=True).start()
+
+
+def prune_messages(db_path=None):
+    """Delete messages every worker has long since seen"""
+    conn = sqlite3.connect(db_path or CLIENT_DB_PATH, timeout=20.0)
+    try:
+        removed = conn.execute('DELETE FROM cache_invalidations WHERE created_at < ?',
+                               (time.time() - MESSAGE_RETENTION,)).rowcount
+        conn.commit()
+        return removed
+    finally:
+        conn.close()
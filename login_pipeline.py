@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Login pipeline: throttling, bounded password hashing and legacy hash upgrades.
+
+Every authenticate_user() variant goes through authenticate():
+
+1. Throttling. Too many attempts from one IP are rejected before the user
+   lookup, and too many recent failures for an account before any PBKDF2
+   work. Failures are counted per user id, so switching between username
+   and email doesn't reset the count.
+2. Hashing. PBKDF2 (100,000 iterations) runs in the request's own thread;
+   hashlib releases the GIL while hashing, so threaded workers hash in
+   parallel. At most HASH_WORKERS hashes run at once per process and
+   HASH_QUEUE_LIMIT more may wait. Beyond that the attempt is turned away
+   immediately instead of queueing behind a credential-stuffing burst.
+   These limits only engage with threaded workers: with the shipped
+   Procfile and render.yaml (sync gunicorn workers, one thread each) a
+   worker never hashes more than one password at a time, and throttling
+   is the only thing that keeps a burst from tying the worker up.
+3. Upgrades. Accounts still stored as sha256(password + salt) are re-hashed
+   with PBKDF2 on their next successful login.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PBKDF2_ITERATIONS = 100000
+HASH_WORKERS = int(os.environ.get('LOGIN_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.environ.get('LOGIN_HASH_QUEUE', '16'))
+HASH_TIMEOUT = 10
+
+ACCOUNT_MAX_FAILURES = int(os.environ.get('LOGIN_ACCOUNT_MAX_FAILURES', '5'))
+ACCOUNT_WINDOW = 15 * 60
+IP_MAX_ATTEMPTS = int(os.environ.get('LOGIN_IP_MAX_ATTEMPTS', '30'))
+IP_WINDOW = 5 * 60
+MAX_TRACKED_KEYS = 50000
+
+INVALID_CREDENTIALS = {"status": "error", "message": "Invalid credentials"}
+THROTTLED = {"status": "error", "message": "Too many login attempts. Please wait a few minutes and try again."}
+BUSY = {"status": "error", "message": "The server is busy. Please try again in a moment."}
+
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+_hashing = threading.BoundedSemaphore(HASH_WORKERS)
+_account_failures = {}   # user id -> deque of failure times
+_ip_attempts = {}        # ip -> deque of attempt times
+_throttle_lock = threading.Lock()
+
+
+def pbkdf2_hash(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), PBKDF2_ITERATIONS).hex()
+
+
+def _run_hash(func, *args):
+    """
+    Run a hash in the calling thread, within the process-wide limits.
+
+    Returns:
+        The hash, or None if too many hashes are running or waiting, or
+        none finished within HASH_TIMEOUT
+    """
+    if not _slots.acquire(blocking=False):
+        logger.warning("Password hashing saturated, rejecting login attempt")
+        return None
+    try:
+        if not _hashing.acquire(timeout=HASH_TIMEOUT):
+            logger.error("Timed out waiting to hash a password")
+            return None
+        try:
+            return func(*args)
+        finally:
+            _hashing.release()
+    finally:
+        _slots.release()
+
+
+def _recent(times, window, now):
+    while times and times[0] <= now - window:
+        times.popleft()
+    return len(times)
+
+
+def _prune(tracked, window, now):
+    """Forget keys with no events inside the window (caller holds _throttle_lock)"""
+    if len(tracked) < MAX_TRACKED_KEYS:
+        return
+    for key in [key for key, times in tracked.items() if not _recent(times, window, now)]:
+        del tracked[key]
+
+
+def check_ip_throttle(ip_address):
+    """
+    Count this attempt against the IP and check its limit.
+
+    Returns:
+        dict: Error result if the attempt should be rejected, else None
+    """
+    if not ip_address:
+        return None
+    now = time.monotonic()
+    with _throttle_lock:
+        _prune(_ip_attempts, IP_WINDOW, now)
+        attempts = _ip_attempts.setdefault(ip_address, deque())
+        if _recent(attempts, IP_WINDOW, now) >= IP_MAX_ATTEMPTS:
+            logger.warning(f"Login throttled for IP {ip_address}")
+            return dict(THROTTLED)
+        attempts.append(now)
+    return None
+
+
+def check_account_throttle(user_id):
+    """
+    Check the recent failures of a resolved account.
+
+    Returns:
+        dict: Error result if the attempt should be rejected, else None
+    """
+    now = time.monotonic()
+    with _throttle_lock:
+        failures = _account_failures.get(user_id)
+        if failures is not None and _recent(failures, ACCOUNT_WINDOW, now) >= ACCOUNT_MAX_FAILURES:
+            logger.warning(f"Login throttled for user {user_id}")
+            return dict(THROTTLED)
+    return None
+
+
+def record_failure(user_id):
+    now = time.monotonic()
+    with _throttle_lock:
+        _prune(_account_failures, ACCOUNT_WINDOW, now)
+        _account_failures.setdefault(user_id, deque()).append(now)
+
+
+def record_success(user_id):
+    with _throttle_lock:
+        _account_failures.pop(user_id, None)
+
+
+def verify_password(password, stored_hash, salt):
+    """
+    Check a password against a PBKDF2 hash, falling back to the legacy sha256 format.
+
+    Returns:
+        dict: status 'success' with valid/legacy flags, or BUSY if hashing was refused
+    """
+    if not stored_hash or not salt:
+        return {'status': 'success', 'valid': False, 'legacy': False}
+    computed = _run_hash(pbkdf2_hash, password, salt)
+    if computed is None:
+        return dict(BUSY)
+    if hmac.compare_digest(computed, stored_hash):
+        return {'status': 'success', 'valid': True, 'legacy': False}
+    # Older accounts were stored as sha256(password + salt); a single sha256 is cheap
+    legacy = hashlib.sha256((password + salt).encode()).hexdigest()
+    valid = hmac.compare_digest(legacy, stored_hash)
+    return {'status': 'success', 'valid': valid, 'legacy': valid}
+
+
+def upgrade_legacy_hash(cursor, user_id, password):
+    """Re-hash a legacy sha256 password with PBKDF2; committed with the caller's login"""
+    salt = secrets.token_hex(16)
+    password_hash = _run_hash(pbkdf2_hash, password, salt)
+    if password_hash is None:
+        # Try again on the next login
+        return False
+    cursor.execute('UPDATE users SET password_hash = ?, salt = ? WHERE id = ?', (password_hash, salt, user_id))
+    logger.info(f"Upgraded legacy password hash for user {user_id}")
+    return True
+
+
+def authenticate(cursor, username_or_email, password, ip_address=None):
+    """
+    Throttle, look up and verify a login attempt.
+
+    Args:
+        cursor: Cursor on the main database (row factory sqlite3.Row)
+
+    Returns:
+        tuple: (user row, None) on success, or (None, error result)
+    """
+    throttled = check_ip_throttle(ip_address)
+    if throttled:
+        return None, throttled
+
+    cursor.execute('''
+    SELECT * FROM users
+    WHERE (username = ? OR email = ?) AND active = 1
+    ''', (username_or_email, username_or_email))
+    user = cursor.fetchone()
+
+    if not user:
+        return None, dict(INVALID_CREDENTIALS)
+
+    # Keyed by user id, so the username and email of one account share a count
+    throttled = check_account_throttle(user['id'])
+    if throttled:
+        return None, throttled
+
+    outcome = verify_password(password, user['password_hash'], user['salt'])
+    if outcome['status'] != 'success':
+        return None, outcome
+    if not outcome['valid']:
+        record_failure(user['id'])
+        return None, dict(INVALID_CREDENTIALS)
+
+    if outcome['legacy']:
+        upgrade_legacy_hash(cursor, user['id'], password)
+    record_success(user['id'])
+    return user, None
+
+
+def reset_throttle():
+    """Forget all recorded attempts in this process"""
+    with _throttle_lock:
+        _account_failures.clear()
+        _ip_attempts.clear()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Durable outbound mail queue with a pooled SMTP connection.
+
+Report emails used to open their own SMTP connection (connect, STARTTLS,
+login) inside the scan flow, so a slow mail server held up the scan
+response. Messages are now serialized into a local spool database and
+enqueue() returns immediately.
+
+A background sender thread claims due messages in batches and delivers
+them over one persistent SMTP connection. The connection is reused across
+messages and batches. It is checked with NOOP after IDLE_CHECK seconds of
+quiet, closed after IDLE_TIMEOUT, and reopened when the server drops it.
+
+Temporary failures (connection errors, 4xx replies) are retried with
+exponential backoff, up to MAX_ATTEMPTS. Permanent rejections (5xx) fail
+at once. When a message that carries a client and scan ID is delivered,
+reports.email_sent / email_sent_at are set in that client's database.
+
+Like the write-behind spool, the queue is shared by every gunicorn worker.
+A worker renews its claim on each message right before sending it, so a
+slow batch doesn't let another worker re-send the rest. Stale claims are
+retried, so delivery is at-least-once.
+"""
+
+import atexit
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from email.utils import getaddresses
+
+logger = logging.getLogger(__name__)
+
+MAIL_SPOOL_PATH = os.environ.get(
+    'MAIL_SPOOL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mail_spool.db')
+)
+ENABLED = os.environ.get('MAIL_QUEUE_ENABLED', 'True') == 'True'
+
+BATCH_SIZE = 50
+POLL_INTERVAL = 2.0       # seconds between idle polls of the spool
+CLAIM_TIMEOUT = 300       # seconds after a message's claim was renewed before another worker may retry it
+MAX_ATTEMPTS = 8
+RETRY_BASE_DELAY = 30     # seconds; doubles with every failed attempt
+RETRY_MAX_DELAY = 6 * 3600
+IDLE_CHECK = 30           # seconds idle before a pooled connection is NOOP-checked
+IDLE_TIMEOUT = 120        # seconds idle before the pooled connection is closed
+SMTP_TIMEOUT = 30
+
+_wakeup = threading.Event()
+_sender_thread = None
+_sender_lock = threading.Lock()
+_stopping = False
+
+
+def smtp_settings():
+    """SMTP settings from the environment, read at connect time"""
+    return {
+        'host': os.environ.get('SMTP_SERVER', 'mail.privateemail.com'),
+        'port': int(os.environ.get('SMTP_PORT', 587)),
+        'user': os.environ.get('SMTP_USER'),
+        'password': os.environ.get('SMTP_PASSWORD'),
+        'starttls': os.environ.get('SMTP_STARTTLS', 'True') == 'True'
+    }
+
+
+def _connect_spool():
+    conn = sqlite3.connect(MAIL_SPOOL_PATH, timeout=5.0)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS outbound_mail (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender TEXT NOT NULL,
+        recipients TEXT NOT NULL,
+        message BLOB NOT NULL,
+        client_id INTEGER,
+        scan_id TEXT,
+        status TEXT DEFAULT 'queued',
+        attempts INTEGER DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        claimed_by TEXT,
+        claimed_at REAL,
+        last_error TEXT,
+        enqueued_at TEXT NOT NULL,
+        sent_at TEXT
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outbound_mail_due ON outbound_mail(status, next_attempt_at)')
+    return conn
+
+
+def enqueue(msg, client_id=None, scan_id=None):
+    """
+    Queue an email.message message for delivery.
+
+    Args:
+        msg: A Message/EmailMessage with From and To set
+        client_id: Client whose reports row records the delivery
+        scan_id: Scan the email reports on
+
+    Returns:
+        int: Queue ID of the message, or None if it could not be queued
+    """
+    recipients = [address for _, address in getaddresses(
+        msg.get_all('To', []) + msg.get_all('Cc', []) + msg.get_all('Bcc', [])
+    ) if address]
+    if not recipients:
+        logger.error("Not queueing email without recipients")
+        return None
+    del msg['Bcc']
+
+    try:
+        conn = _connect_spool()
+        try:
+            cursor = conn.execute('''
+                INSERT INTO outbound_mail (sender, recipients, message, client_id, scan_id, next_attempt_at, enqueued_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (msg['From'], json.dumps(recipients), msg.as_bytes(), client_id, scan_id,
+                  time.time(), datetime.now().isoformat()))
+            conn.commit()
+            message_id = cursor.lastrowid
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Error queueing email to {', '.join(recipients)}: {e}")
+        return None
+
+    if ENABLED:
+        _ensure_sender()
+        _wakeup.set()
+    return message_id
+
+
+def status(message_id):
+    """Delivery state of a queued message as a dict, or None"""
+    conn = _connect_spool()
+    try:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('''
+            SELECT id, status, attempts, last_error, enqueued_at, sent_at FROM outbound_mail WHERE id = ?
+        ''', (message_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def queue_depth():
+    """Number of messages waiting to be delivered"""
+    if not os.path.exists(MAIL_SPOOL_PATH):
+        return 0
+    try:
+        conn = _connect_spool()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM outbound_mail WHERE status = 'queued'").fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        return 0
+
+
+class SMTPConnection:
+    """One persistent SMTP session, reopened on demand"""
+
+    def __init__(self):
+        self.server = None
+        self.used_at = 0
+
+    def get(self):
+        if self.server is not None and time.time() - self.used_at > IDLE_CHECK:
+            try:
+                self.server.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self.server is None:
+            self.server = self._open()
+        return self.server
+
+    def _open(self):
+        settings = smtp_settings()
+        server = smtplib.SMTP(settings['host'], settings['port'], timeout=SMTP_TIMEOUT)
+        try:
+            server.ehlo()
+            if settings['starttls']:
+                server.starttls()
+                server.ehlo()
+            if settings['user'] and settings['password']:
+                server.login(settings['user'], settings['password'])
+        except Exception:
+            server.close()
+            raise
+        logger.debug(f"Opened SMTP connection to {settings['host']}:{settings['port']}")
+        return server
+
+    def send(self, sender, recipients, message):
+        server = self.get()
+        try:
+            refused = server.sendmail(sender, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session; one fresh connection, then give up
+            self.close()
+            refused = self.get().sendmail(sender, recipients, message)
+        self.used_at = time.time()
+        return refused
+
+    def idle(self):
+        return self.server is not None and time.time() - self.used_at > IDLE_TIMEOUT
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+        self.server = None
+
+
+def _is_permanent(error):
+    """5xx replies will fail again; connection errors and 4xx may not"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500 and not isinstance(error, smtplib.SMTPAuthenticationError)
+    return False
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def _claim_batch(conn, worker_id):
+    """Claim up to BATCH_SIZE due messages for this worker"""
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('''
+            UPDATE outbound_mail SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM outbound_mail
+                WHERE status = 'queued' AND next_attempt_at <= ?
+                  AND (claimed_at IS NULL OR claimed_at < ?)
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            )
+        ''', (worker_id, now, now, now - CLAIM_TIMEOUT, BATCH_SIZE))
+        rows = conn.execute('''
+            SELECT id, sender, recipients, message, client_id, scan_id, attempts
+            FROM outbound_mail WHERE claimed_by = ? AND claimed_at = ? ORDER BY id
+        ''', (worker_id, now)).fetchall()
+        conn.execute('COMMIT')
+        return rows
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _record_report_email(client_id, scan_id, sent_at):
+    try:
+        from report_artifacts import mark_emailed
+        mark_emailed(client_id, scan_id, sent_at)
+    except Exception as e:
+        logger.error(f"Error recording email delivery for scan {scan_id}: {e}")
+
+
+def _renew_claim(conn, worker_id, row_id):
+    """
+    Restart this worker's claim on one message just before it is sent.
+
+    A batch can take longer than CLAIM_TIMEOUT against a slow server, so
+    each message's claim is renewed on its own; a message another worker
+    has already reclaimed is left to that worker.
+
+    Returns:
+        bool: True if the message is still this worker's to send
+    """
+    cursor = conn.execute('''
+        UPDATE outbound_mail SET claimed_at = ?
+        WHERE id = ? AND claimed_by = ? AND status = 'queued' AND claimed_at IS NOT NULL
+    ''', (time.time(), row_id, worker_id))
+    conn.commit()
+    return cursor.rowcount == 1
+
+
+def _deliver(spool_conn, connection, rows, worker_id):
+    """Send claimed messages over the pooled connection and record each outcome"""
+    for row_id, sender, recipients_json, message, client_id, scan_id, attempts in rows:
+        if not _renew_claim(spool_conn, worker_id, row_id):
+            logger.warning(f"Claim on email {row_id} expired and was taken over; skipping it")
+            continue
+        try:
+            refused = connection.send(sender, json.loads(recipients_json), message)
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                connection.close()
+            if _is_permanent(e) or attempts >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on email {row_id} after {attempts} attempt(s): {e}")
+                spool_conn.execute('''
+                    UPDATE outbound_mail SET status = 'failed', claimed_at = NULL, last_error = ? WHERE id = ?
+                ''', (str(e), row_id))
+            else:
+                delay = retry_delay(attempts)
+                logger.warning(f"Email {row_id} failed, retrying in {delay}s: {e}")
+                spool_conn.execute('''
+                    UPDATE outbound_mail SET claimed_at = NULL, next_attempt_at = ?, last_error = ? WHERE id = ?
+                ''', (time.time() + delay, str(e), row_id))
+            spool_conn.commit()
+            continue
+
+        sent_at = datetime.now().isoformat()
+        spool_conn.execute('''
+            UPDATE outbound_mail SET status = 'sent', claimed_at = NULL, sent_at = ?, last_error = ? WHERE id = ?
+        ''', (sent_at, f"Refused: {', '.join(refused)}" if refused else None, row_id))
+        spool_conn.commit()
+        if client_id and scan_id:
+            _record_report_email(client_id, scan_id, sent_at)
+
+
+def drain_once(connection):
+    """Claim and deliver one batch. Returns the number of messages attempted"""
+    worker_id = f"{os.getpid()}-{threading.get_ident()}"
+    spool_conn = _connect_spool()
+    try:
+        rows = _claim_batch(spool_conn, worker_id)
+        if rows:
+            _deliver(spool_conn, connection, rows, worker_id)
+        return len(rows)
+    finally:
+        spool_conn.close()
+
+
+def _sender_loop():
+    connection = SMTPConnection()
+    while not _stopping:
+        try:
+            processed = drain_once(connection)
+        except Exception as e:
+            logger.error(f"Mail sender error: {e}")
+            processed = 0
+        if not processed:
+            if connection.idle():
+                connection.close()
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+    connection.close()
+
+
+def _ensure_sender():
+    global _sender_thread
+    if _sender_thread and _sender_thread.is_alive():
+        return
+    with _sender_lock:
+        if _sender_thread and _sender_thread.is_alive():
+            return
+        _sender_thread = threading.Thread(target=_sender_loop, name='mail-sender', daemon=True)
+        _sender_thread.start()
+
+
+def start_sender():
+    """Start the background sender (also delivers mail left by a previous process)"""
+    if ENABLED:
+        _ensure_sender()
+
+
+def flush(timeout=10.0):
+    """
+    Deliver due messages in the calling thread until none are left.
+
+    Returns:
+        bool: True if nothing due is left queued
+    """
+    deadline = time.time() + timeout
+    connection = SMTPConnection()
+    try:
+        while time.time() < deadline:
+            if not drain_once(connection):
+                return True
+    finally:
+        connection.close()
+    return False
+
+
+@atexit.register
+def _stop_sender():
+    global _stopping
+    _stopping = True
+    _wakeup.set()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Periodic maintenance tasks shared across gunicorn workers.
+
+Every worker starts the same background threads, so each run is claimed in
+the main database first: claim_task() updates the task's row only if its
+last run is older than the interval, and only the worker whose update
+succeeds does the work.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from migrations import CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 60  # seconds between claim attempts
+
+_started = set()
+_started_lock = threading.Lock()
+
+
+def claim_task(task, interval, db_path=CLIENT_DB_PATH):
+    """
+    Claim the next run of a periodic task.
+
+    Args:
+        task (str): Task name
+        interval (int): Minimum seconds between runs
+
+    Returns:
+        bool: True if this caller should run the task now
+    """
+    now = time.time()
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    try:
+        conn.execute('INSERT OR IGNORE INTO maintenance_runs (task, last_run) VALUES (?, 0)', (task,))
+        cursor = conn.execute(
+            'UPDATE maintenance_runs SET last_run = ? WHERE task = ? AND last_run <= ?',
+            (now, task, now - interval)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+    except Exception as e:
+        logger.error(f"Error claiming maintenance task {task}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _run_periodically(task, interval, func, first_delay=0):
+    if first_delay:
+        time.sleep(first_delay)
+    while True:
+        if claim_task(task, interval):
+            started = time.time()
+            try:
+                result = func()
+                logger.info(f"Maintenance task {task} finished in {time.time() - started:.1f}s: {result}")
+            except Exception as e:
+                logger.error(f"Maintenance task {task} failed: {e}")
+        time.sleep(min(CHECK_INTERVAL, interval))
+
+
+def start_periodic_task(task, interval, func, first_delay=0):
+    """
+    Run func at most once per interval across all workers, in a daemon thread.
+
+    Args:
+        first_delay (int): Seconds to wait before the first claim attempt
+    """
+    with _started_lock:
+        if task in _started:
+            return
+        _started.add(task)
+    threading.Thread(
+        target=_run_periodically, args=(task, interval, func, first_delay),
+        name=f'maintenance-{task}', daemon=True
+    ).start()
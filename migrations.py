@@ -3,9 +3,14 @@
 import os
 import sqlite3
 import logging
+import threading
 import traceback
 from datetime import datetime
 
+from time_buckets import ensure_time_buckets
+from search_index import ensure_global_catalog, ensure_scan_search_index, rebuild_catalog_keys
+from report_metrics import ensure_report_metrics
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,7 +18,19 @@ logging.basicConfig(
 )
 
 # Database paths
-CLIENT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+CLIENT_DB_PATH = os.environ.get(
+    'CLIENT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_scanner.db')
+)
+CLIENT_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
+
+# Database kinds known to the versioned schema registry
+MAIN_DB = 'main'
+LEADS_DB = 'leads'
+CLIENT_SCANS_DB = 'client'
+CONSOLIDATED_SCANS_DB = 'consolidated'
+
+CONSOLIDATED_DB_PATH = os.path.join(CLIENT_DB_DIR, 'consolidated_scans.db')
 
 def run_migrations():
     """Run all pending migrations"""
@@ -248,6 +265,440 @@ def fix_users_table():
             conn.close()
         return False
 
+# Versioned schema registry
+#
+# Each database kind has an ordered list of (version, description, step)
+# entries. A step brings the schema up to its version and must be safe to
+# re-run, since two workers may race on a fresh database. The applied version
+# is stored in PRAGMA user_version, so a database costs one pragma read the
+# first time a process opens it and nothing after that; request paths can
+# assume the schema instead of probing sqlite_master / PRAGMA table_info.
+
+_migrated_paths = set()
+_schema_cache = {}
+_registry_lock = threading.Lock()
+
+def _table_columns(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+def _add_column(cursor, table, column, definition):
+    """Add a column unless the table is missing or already has it"""
+    columns = _table_columns(cursor, table)
+    if not columns or column in columns:
+        return
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logging.info(f"Added {column} column to {table}")
+    except sqlite3.OperationalError as e:
+        if 'duplicate column' not in str(e):
+            raise
+
+def _require_table(cursor, table):
+    """
+    Fail the step, so its version isn't stamped, until the table it changes
+    exists. Returns the table's columns.
+    """
+    columns = _table_columns(cursor, table)
+    if not columns:
+        raise sqlite3.OperationalError(f"no such table: {table}")
+    return columns
+
+def _main_legacy_columns(conn):
+    cursor = conn.cursor()
+    _require_table(cursor, 'users')
+    _require_table(cursor, 'clients')
+    _add_column(cursor, 'users', 'full_name', 'TEXT')
+    _add_column(cursor, 'clients', 'user_id', 'INTEGER REFERENCES users(id) ON DELETE CASCADE')
+
+def _main_log_tables(conn):
+    conn.executescript('''
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        action TEXT NOT NULL,
+        entity_type TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        changes TEXT,
+        timestamp TEXT NOT NULL,
+        ip_address TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+    );
+    CREATE TABLE IF NOT EXISTS activity_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER,
+        activity_type TEXT NOT NULL,
+        details TEXT,
+        created_at TEXT NOT NULL
+    );
+    ''')
+
+def _main_pagination_indexes(conn):
+    cursor = conn.cursor()
+    pagination_indexes = [
+        ('clients', ['active', 'id'], "CREATE INDEX IF NOT EXISTS idx_clients_active_id ON clients(active, id)"),
+        ('deployed_scanners', ['client_id', 'id'],
+         "CREATE INDEX IF NOT EXISTS idx_deployed_scanners_client_id ON deployed_scanners(client_id, id)"),
+        ('scan_history', ['client_id', 'timestamp'],
+         "CREATE INDEX IF NOT EXISTS idx_scan_history_client_ts ON scan_history(client_id, timestamp)")
+    ]
+    for table, required, index_sql in pagination_indexes:
+        columns = _require_table(cursor, table)
+        # Legacy layouts of a table may lack the indexed columns
+        if all(column in columns for column in required):
+            cursor.execute(index_sql)
+
+def _main_time_buckets(conn):
+    _require_table(conn.cursor(), 'scan_history')
+    ensure_time_buckets(conn, 'scan_history')
+
+def _main_lead_catalog(conn):
+    ensure_global_catalog(conn)
+
+def _main_maintenance_runs(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS maintenance_runs (
+        task TEXT PRIMARY KEY,
+        last_run REAL NOT NULL DEFAULT 0
+    )
+    ''')
+
+def _main_session_expiry_index(conn):
+    # Session invalidations travel on the cache_invalidations channel (v8)
+    _require_table(conn.cursor(), 'sessions')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)')
+
+def _main_cache_invalidations(conn):
+    # One channel for every in-process cache, sessions included
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS cache_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        cache_key TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_invalidations_created ON cache_invalidations(created_at)')
+
+def _main_tenant_config_version(conn):
+    cursor = conn.cursor()
+    _require_table(cursor, 'clients')
+    _add_column(cursor, 'clients', 'config_version', 'INTEGER DEFAULT 0')
+
+def _main_report_metrics(conn):
+    ensure_report_metrics(conn)
+
+def _main_lead_catalog_keys(conn):
+    ensure_global_catalog(conn)
+    rebuild_catalog_keys(conn)
+
+def _leads_table(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS leads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lead_id TEXT UNIQUE,
+        name TEXT,
+        email TEXT,
+        company TEXT,
+        phone TEXT,
+        industry TEXT,
+        company_size TEXT,
+        company_website TEXT,
+        target TEXT,
+        client_os TEXT,
+        client_browser TEXT,
+        windows_version TEXT,
+        timestamp TEXT,
+        created_at TEXT
+    )
+    ''')
+    # Older leads databases were created with fewer columns
+    for column in ['lead_id', 'industry', 'company_size', 'company_website', 'target',
+                   'client_os', 'client_browser', 'windows_version', 'timestamp']:
+        _add_column(cursor, 'leads', column, 'TEXT')
+
+def _leads_lookup_index(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_lead_id ON leads(lead_id)")
+
+def _client_pagination_indexes(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_created_id ON scans(created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_scanner_ts_id ON scans(scanner_id, timestamp, id)')
+
+def _client_time_buckets(conn):
+    ensure_time_buckets(conn, 'scans')
+
+def _client_search_index(conn):
+    ensure_scan_search_index(conn)
+
+def _client_archival(conn):
+    _add_column(conn.cursor(), 'scans', 'archived_month', 'INTEGER')
+    # On an existing database this only takes effect after a full VACUUM,
+    # which the retention job runs in the background rather than at startup
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+REPORT_ARTIFACT_COLUMNS = (
+    ('status', "TEXT DEFAULT 'pending'"),
+    ('content_hash', 'TEXT'),
+    ('content_type', 'TEXT'),
+    ('size', 'INTEGER'),
+    ('branding_version', 'INTEGER DEFAULT 0'),
+    ('error', 'TEXT'),
+    ('updated_at', 'TEXT')
+)
+
+def _report_artifacts(conn, tenant_columns):
+    """reports rows describe rendered artifacts, one per scan and report type"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        scan_id TEXT NOT NULL,
+        report_type TEXT DEFAULT 'pdf',
+        report_path TEXT,
+        generated_at TEXT NOT NULL,
+        email_sent BOOLEAN DEFAULT 0,
+        email_sent_at TEXT,
+        download_count INTEGER DEFAULT 0
+    )
+    ''')
+    cursor = conn.cursor()
+    for column in tenant_columns:
+        _add_column(cursor, 'reports', column, 'INTEGER')
+    for column, definition in REPORT_ARTIFACT_COLUMNS:
+        _add_column(cursor, 'reports', column, definition)
+    key = ', '.join(tenant_columns + ['scan_id', 'report_type'])
+    conn.execute(f'''
+    DELETE FROM reports WHERE id NOT IN (SELECT MAX(id) FROM reports GROUP BY {key})
+    ''')
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_scan_type ON reports({key})')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status, updated_at)')
+
+def _client_report_artifacts(conn):
+    _report_artifacts(conn, [])
+
+def _report_render_attempts(conn):
+    """Renders of a report so far, so failures stop being retried"""
+    _add_column(conn.cursor(), 'reports', 'render_attempts', 'INTEGER DEFAULT 0')
+
+def _consolidated_tables(conn):
+    conn.executescript('''
+    CREATE TABLE IF NOT EXISTS tenants (
+        client_id INTEGER PRIMARY KEY,
+        business_name TEXT,
+        created_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS scans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL,
+        scan_id TEXT UNIQUE NOT NULL,
+        scanner_id TEXT,
+        timestamp TEXT NOT NULL,
+        lead_name TEXT,
+        lead_email TEXT NOT NULL,
+        lead_phone TEXT,
+        lead_company TEXT,
+        company_size TEXT,
+        target_domain TEXT,
+        security_score INTEGER DEFAULT 0,
+        risk_level TEXT,
+        scan_type TEXT DEFAULT 'comprehensive',
+        status TEXT DEFAULT 'completed',
+        ip_address TEXT,
+        user_agent TEXT,
+        scan_duration INTEGER,
+        vulnerabilities_found INTEGER DEFAULT 0,
+        recommendations_count INTEGER DEFAULT 0,
+        scan_results TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS leads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id INTEGER NOT NULL,
+        email TEXT NOT NULL,
+        name TEXT,
+        phone TEXT,
+        company TEXT,
+        company_size TEXT,
+        industry TEXT,
+        first_scan_date TEXT,
+        last_scan_date TEXT,
+        total_scans INTEGER DEFAULT 1,
+        avg_security_score REAL DEFAULT 0,
+        lead_status TEXT DEFAULT 'new',
+        notes TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT,
+        UNIQUE (client_id, email)
+    );
+    CREATE INDEX IF NOT EXISTS idx_scans_client_created_id ON scans(client_id, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_scans_client_scanner_ts_id ON scans(client_id, scanner_id, timestamp, id);
+    CREATE INDEX IF NOT EXISTS idx_scans_client_email ON scans(client_id, lead_email);
+    CREATE INDEX IF NOT EXISTS idx_leads_client_status ON leads(client_id, lead_status);
+    ''')
+
+def _consolidated_time_buckets(conn):
+    ensure_time_buckets(conn, 'scans')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_client_month ON scans(client_id, month_bucket)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_scans_client_day ON scans(client_id, day_bucket)')
+
+def _consolidated_report_artifacts(conn):
+    _report_artifacts(conn, ['client_id'])
+
+SCHEMA_VERSIONS = {
+    MAIN_DB: [
+        (1, 'users.full_name and clients.user_id', _main_legacy_columns),
+        (2, 'audit_log and activity_logs tables', _main_log_tables),
+        (3, 'keyset pagination indexes', _main_pagination_indexes),
+        (4, 'scan_history time buckets', _main_time_buckets),
+        (5, 'global lead search catalog', _main_lead_catalog),
+        (6, 'maintenance task claims', _main_maintenance_runs),
+        (7, 'sessions expiry index', _main_session_expiry_index),
+        (8, 'shared cache invalidation channel', _main_cache_invalidations),
+        (9, 'clients.config_version for the tenant config cache', _main_tenant_config_version),
+        (10, 'daily and monthly report metric aggregates', _main_report_metrics),
+        (11, 'lead_search rowid keys', _main_lead_catalog_keys)
+    ],
+    LEADS_DB: [
+        (1, 'leads table and columns', _leads_table),
+        (2, 'lead_id lookup index', _leads_lookup_index)
+    ],
+    CLIENT_SCANS_DB: [
+        (1, 'keyset pagination indexes', _client_pagination_indexes),
+        (2, 'scans time buckets', _client_time_buckets),
+        (3, 'scans full-text index', _client_search_index),
+        (4, 'archived_month column and incremental vacuum', _client_archival),
+        (5, 'report artifact columns', _client_report_artifacts),
+        (6, 'report render attempt count', _report_render_attempts)
+    ],
+    CONSOLIDATED_SCANS_DB: [
+        (1, 'tenant-partitioned tables and composite indexes', _consolidated_tables),
+        (2, 'scans time buckets', _consolidated_time_buckets),
+        (3, 'scans full-text index', _client_search_index),
+        (4, 'archived_month column and incremental vacuum', _client_archival),
+        (5, 'report artifact columns', _consolidated_report_artifacts),
+        (6, 'report render attempt count', _report_render_attempts)
+    ]
+}
+
+def latest_version(kind):
+    """Highest schema version registered for a database kind"""
+    return SCHEMA_VERSIONS[kind][-1][0]
+
+def migrate_database(db_path, kind):
+    """
+    Bring a database up to the latest registered schema version.
+    
+    Args:
+        db_path (str): Database file
+        kind (str): MAIN_DB, LEADS_DB, CLIENT_SCANS_DB or CONSOLIDATED_SCANS_DB
+        
+    Returns:
+        int: Schema version after migrating, or None on failure
+    """
+    target = latest_version(kind)
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path, timeout=20.0)
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        if current >= target:
+            return current
+        
+        for version, description, step in SCHEMA_VERSIONS[kind]:
+            if version <= current:
+                continue
+            logging.info(f"Migrating {os.path.basename(db_path)} to schema v{version}: {description}")
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            current = version
+        
+        return current
+    except Exception as e:
+        logging.error(f"Error migrating {db_path} ({kind}): {e}")
+        logging.debug(traceback.format_exc())
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            conn.close()
+        # Steps committed before a failure changed the schema too
+        _schema_cache.pop(db_path, None)
+
+def ensure_schema(db_path, kind):
+    """
+    Migrate a database the first time this process sees it.
+    
+    Cheap enough for request paths: after the first call for a path it is
+    a set lookup.
+    
+    Returns:
+        bool: True if the database is at the latest version
+    """
+    if db_path in _migrated_paths:
+        return True
+    with _registry_lock:
+        if db_path in _migrated_paths:
+            return True
+        version = migrate_database(db_path, kind)
+        if version is not None and version >= latest_version(kind):
+            _migrated_paths.add(db_path)
+            return True
+        return False
+
+def table_columns(db_path, table):
+    """
+    Columns of a table, read once per process and database.
+    
+    Returns:
+        list: Column names, empty if the table doesn't exist
+    """
+    schema = _schema_cache.get(db_path)
+    if schema is None:
+        schema = {}
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            for (name,) in cursor.fetchall():
+                schema[name] = _table_columns(cursor, name)
+        finally:
+            conn.close()
+        _schema_cache[db_path] = schema
+    return schema.get(table, [])
+
+def migrate_all(main_db_path=CLIENT_DB_PATH, leads_db_path=None, client_db_dir=CLIENT_DB_DIR):
+    """
+    Migrate the main database, leads.db and every client scan database.
+    
+    Returns:
+        dict: Counts of databases migrated and failed
+    """
+    if leads_db_path is None:
+        leads_db_path = os.path.abspath('leads.db')
+    
+    targets = [(main_db_path, MAIN_DB)]
+    if os.path.exists(leads_db_path):
+        targets.append((leads_db_path, LEADS_DB))
+    if os.path.exists(client_db_dir):
+        for filename in sorted(os.listdir(client_db_dir)):
+            if filename.startswith('client_') and filename.endswith('_scans.db'):
+                targets.append((os.path.join(client_db_dir, filename), CLIENT_SCANS_DB))
+    consolidated_path = os.path.join(client_db_dir, os.path.basename(CONSOLIDATED_DB_PATH))
+    if os.path.exists(consolidated_path):
+        targets.append((consolidated_path, CONSOLIDATED_SCANS_DB))
+    
+    migrated = failed = 0
+    for db_path, kind in targets:
+        if ensure_schema(db_path, kind):
+            migrated += 1
+        else:
+            failed += 1
+    
+    logging.info(f"Schema migrations complete: {migrated} databases current, {failed} failed")
+    return {'migrated': migrated, 'failed': failed}
+
 # Allow running just the fix for the users table
 if __name__ == "__main__":
     # You can run either the full migrations or just the fix for the users table
@@ -256,5 +707,8 @@ if __name__ == "__main__":
     # Run all migrations
     # run_migrations()
     
+    # Bring every database up to the latest schema version
+    # migrate_all()
+    
     # Run only the fix for users table
     fix_users_table()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Keyset (cursor) pagination helpers and a cached row counter.
+
+Listings are ordered newest first on a (sort_value, id) pair. Instead of
+LIMIT/OFFSET, each page carries an opaque cursor holding the boundary key,
+so fetching page 500 costs the same as fetching page 1.
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How long cached COUNT(*) results stay valid (seconds)
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_MAX_ENTRIES = 1024
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def encode_cursor(key, direction='next'):
+    """Encode a (sort_value, id) boundary key into an opaque URL-safe token"""
+    payload = json.dumps({'k': list(key), 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token. Returns (key, direction) or (None, None) if invalid"""
+    if not token:
+        return None, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        key = payload['k']
+        direction = payload.get('d', 'next')
+        if not isinstance(key, list) or direction not in ('next', 'prev'):
+            return None, None
+        return tuple(key), direction
+    except Exception as e:
+        logger.warning(f"Ignoring invalid pagination cursor: {e}")
+        return None, None
+
+
+def keyset_clause(columns, key, direction):
+    """
+    Build the WHERE fragment and ORDER BY for a newest-first keyset page.
+
+    Args:
+        columns (tuple): Sort columns, e.g. ('created_at', 'id')
+        key (tuple): Boundary values from the cursor, or None for the first page
+        direction (str): 'next' (older rows) or 'prev' (newer rows)
+
+    Returns:
+        tuple: (condition or None, params, order_by)
+    """
+    column_list = ', '.join(columns)
+    if direction == 'prev':
+        order_by = ', '.join(f"{col} ASC" for col in columns)
+        operator = '>'
+    else:
+        order_by = ', '.join(f"{col} DESC" for col in columns)
+        operator = '<'
+
+    if key is None:
+        return None, [], order_by
+
+    placeholders = ', '.join('?' for _ in columns)
+    if len(columns) == 1:
+        return f"{columns[0]} {operator} ?", [key[0]], order_by
+    return f"({column_list}) {operator} ({placeholders})", list(key), order_by
+
+
+def build_page(rows, per_page, key_func, direction, had_cursor):
+    """
+    Trim an over-fetched result set and compute the neighbouring cursors.
+
+    Rows must have been fetched with LIMIT per_page + 1 using keyset_clause.
+
+    Returns:
+        tuple: (rows, cursor_info) where cursor_info has next_cursor,
+        prev_cursor, has_next and has_prev
+    """
+    has_more = len(rows) > per_page
+    rows = list(rows[:per_page])
+
+    if direction == 'prev':
+        rows.reverse()
+        has_next = had_cursor
+        has_prev = has_more
+    else:
+        has_next = has_more
+        has_prev = had_cursor
+
+    next_cursor = encode_cursor(key_func(rows[-1]), 'next') if rows and has_next else None
+    prev_cursor = encode_cursor(key_func(rows[0]), 'prev') if rows and has_prev else None
+
+    return rows, {
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'has_next': has_next,
+        'has_prev': has_prev
+    }
+
+
+def cached_count(cache_scope, cursor, query, params=(), ttl=COUNT_CACHE_TTL):
+    """
+    Run a COUNT(*) query, reusing the result for up to ttl seconds.
+
+    Args:
+        cache_scope (str): Namespace for invalidation, usually the database path
+        cursor: Database cursor used on a cache miss
+        query (str): COUNT query returning a single value
+        params: Query parameters
+    """
+    cache_key = (cache_scope, query, tuple(params))
+    now = time.monotonic()
+
+    with _count_cache_lock:
+        entry = _count_cache.get(cache_key)
+        if entry and entry[1] > now:
+            return entry[0]
+
+    cursor.execute(query, list(params))
+    row = cursor.fetchone()
+    total = row[0] if row else 0
+
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[cache_key] = (total, now + ttl)
+
+    return total
+
+
+def invalidate_counts(cache_scope=None):
+    """Drop cached counts for one scope (database path), or all of them"""
+    with _count_cache_lock:
+        if cache_scope is None:
+            _count_cache.clear()
+            return
+        for cache_key in [k for k in _count_cache if k[0] == cache_scope]:
+            del _count_cache[cache_key]
+
+
+def page_info(page, per_page, total_count, cursor_info):
+    """Assemble the pagination dict shared by templates and JSON responses"""
+    total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
+    info = {
+        'page': page,
+        'per_page': per_page,
+        'total_pages': total_pages,
+        'total_count': total_count
+    }
+    info.update(cursor_info)
+    return info
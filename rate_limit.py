@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiting for the public scan endpoints and the APIs.
+
+Buckets are kept per client IP, per scanner_uid and per API key. Each bucket
+holds up to `capacity` tokens and refills at `rate` tokens per second; a
+request spends one token from every bucket it is checked against, or is
+rejected with 429 if any of them is empty. Rejections happen before any
+client lookup, database write or scan work.
+
+Bucket state lives in a small SQLite file of its own (like the write-behind
+spool), so every gunicorn worker draws from the same buckets without adding
+write traffic to the main database. If that file can't be used, requests
+are allowed rather than failing the endpoint.
+
+Limits per subscription tier are in TIER_LIMITS and can be overridden with
+RATE_LIMIT_TIERS, e.g. "basic=20/60,enterprise=300/3000" (burst/per hour).
+Anonymous scans per IP are limited by Config.RATE_LIMIT_PER_HOUR (burst)
+and Config.RATE_LIMIT_PER_DAY (sustained); API calls per IP get a larger
+allowance, since one integration usually calls from one address.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from config import Config
+from subscription_constants import get_client_subscription_level
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_PATH = os.environ.get(
+    'RATE_LIMIT_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rate_limits.db')
+)
+ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+PRUNE_INTERVAL = 3600
+IDLE_RETENTION = 24 * 3600
+
+# tier -> (burst, requests per hour), for scanner_uid and API key buckets
+TIER_LIMITS = {
+    'basic': (10, 60),
+    'starter': (20, 300),
+    'professional': (60, 1200),
+    'enterprise': (120, 3600)
+}
+
+# scope -> (burst, requests per hour), for client IP buckets
+IP_LIMITS = {
+    'scan': (Config.RATE_LIMIT_PER_HOUR, Config.RATE_LIMIT_PER_DAY / 24),
+    'api': (300, 6000)
+}
+
+_local = threading.local()
+
+
+def _load_tier_overrides():
+    for item in os.environ.get('RATE_LIMIT_TIERS', '').split(','):
+        if not item.strip():
+            continue
+        try:
+            tier, limits = item.split('=')
+            burst, per_hour = limits.split('/')
+            TIER_LIMITS[tier.strip().lower()] = (int(burst), int(per_hour))
+        except ValueError:
+            logger.error(f"Ignoring invalid RATE_LIMIT_TIERS entry: {item}")
+
+
+_load_tier_overrides()
+
+
+def ip_bucket(ip_address, scope='scan'):
+    """Bucket for traffic from one address, checked before any lookup"""
+    burst, per_hour = IP_LIMITS[scope]
+    return (f'ip:{scope}:{ip_address or "unknown"}', burst, per_hour / 3600)
+
+
+def tier_bucket(kind, identifier, client=None):
+    """Bucket for a scanner_uid or API key, sized by the owning client's tier"""
+    level = get_client_subscription_level(client) if client and client.get('subscription_level') else 'basic'
+    burst, per_hour = TIER_LIMITS.get(level, TIER_LIMITS['basic'])
+    return (f'{kind}:{identifier}', burst, per_hour / 3600)
+
+
+def key_bucket(api_key, client=None):
+    # Bucket keys are persisted, so never store the key itself
+    return tier_bucket('key', hashlib.sha256(api_key.encode()).hexdigest(), client)
+
+
+def scanner_bucket(scanner_uid, client=None):
+    return tier_bucket('scanner', scanner_uid, client)
+
+
+def _ensure_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+        bucket_key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(RATE_LIMIT_PATH, timeout=2.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # Losing the last few token counts in a crash is harmless
+        conn.execute('PRAGMA synchronous=OFF')
+        _ensure_table(conn)
+        _local.conn = conn
+    return conn
+
+
+def consume(buckets, cost=1):
+    """
+    Spend `cost` tokens from every bucket, or none if any bucket is short.
+
+    Args:
+        buckets (list): (bucket key, capacity, refill tokens per second) tuples
+
+    Returns:
+        dict: allowed, limit, remaining, reset and retry_after (seconds) for
+            the tightest bucket, or None if limiting is off or unavailable
+    """
+    if not ENABLED or not buckets:
+        return None
+    now = time.time()
+    try:
+        conn = _connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            states = []
+            for key, capacity, rate in buckets:
+                row = conn.execute('SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?',
+                                   (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                states.append((key, capacity, rate, tokens))
+            allowed = all(tokens >= cost for _, _, _, tokens in states)
+            if allowed:
+                states = [(key, capacity, rate, tokens - cost) for key, capacity, rate, tokens in states]
+                conn.executemany('INSERT OR REPLACE INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?)',
+                                 [(key, tokens, now) for key, _, _, tokens in states])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error as e:
+        logger.error(f"Rate limit store unavailable, allowing request: {e}")
+        return None
+
+    _, capacity, rate, tokens = min(states, key=lambda state: state[3] / state[1])
+    decision = {
+        'allowed': allowed,
+        'limit': int(capacity),
+        'remaining': max(0, int(tokens)),
+        'reset': math.ceil((capacity - tokens) / rate) if rate else 0,
+        'retry_after': 0
+    }
+    if not allowed:
+        short = [(key, math.ceil((cost - tokens) / rate) if rate else 0)
+                 for key, _, rate, tokens in states if tokens < cost]
+        decision['retry_after'] = max(wait for _, wait in short)
+        logger.warning(f"Rate limited {', '.join(key for key, _ in short)} (retry in {decision['retry_after']}s)")
+    return decision
+
+
+def headers(decision):
+    """Standard RateLimit-* headers (plus Retry-After when rejected)"""
+    if not decision:
+        return {}
+    result = {
+        'RateLimit-Limit': str(decision['limit']),
+        'RateLimit-Remaining': str(decision['remaining']),
+        'RateLimit-Reset': str(decision['reset'])
+    }
+    if not decision['allowed']:
+        result['Retry-After'] = str(max(1, decision['retry_after']))
+    return result
+
+
+def enforce(buckets):
+    """
+    Check a request against its buckets.
+
+    The decision is kept on flask.g so the response gets the headers.
+
+    Returns:
+        Response: 429 response if the request is over its limit, else None
+    """
+    from flask import g, jsonify
+    decision = consume(buckets)
+    if decision is None:
+        return None
+    g.rate_limit = decision
+    if decision['allowed']:
+        return None
+    response = jsonify({
+        'status': 'error',
+        'message': 'Too many requests. Please slow down and try again shortly.',
+        'retry_after': decision['retry_after']
+    })
+    response.status_code = 429
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+def add_headers(response):
+    """after_request hook adding the headers for the request's decision"""
+    from flask import g
+    for name, value in headers(getattr(g, 'rate_limit', None)).items():
+        response.headers[name] = value
+    return response
+
+
+def prune_buckets(db_path=None):
+    """Forget buckets idle long enough to have refilled"""
+    conn = sqlite3.connect(db_path or RATE_LIMIT_PATH, timeout=20.0)
+    try:
+        _ensure_table(conn)
+        removed = conn.execute('DELETE FROM rate_limit_buckets WHERE updated_at < ?',
+                               (time.time() - IDLE_RETENTION,)).rowcount
+        conn.commit()
+        return removed
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    """Send rate-limit headers and prune idle buckets hourly, shared across workers"""
+    app.after_request(add_headers)
+    from maintenance import start_periodic_task
+    start_periodic_task('rate_limit_prune', PRUNE_INTERVAL, prune_buckets)
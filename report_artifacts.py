@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Background rendering of report artifacts.
+
+When a scan is saved, queue_scan() records a 'pending' row per report type
+in the client's reports table. It then hands the rendering to a process
+pool, so the GIL-bound HTML and PDF work never runs on a request thread.
+reports rows are written through the write-behind pipeline like the scan
+itself; each write carries its timestamp and never overwrites a newer one,
+so queued writes can land in any order.
+Finished artifacts are written content-addressed under REPORT_ARTIFACT_DIR
+(<hash[:2]>/<hash>.<ext>), so identical reports share one file. Their hash,
+size and branding version are recorded on the row.
+
+Downloads are served straight from those files with send_file, which
+handles conditional and Range requests. Email uses the stored HTML. A row
+rendered with an older branding version is still served, and a fresh
+rendering is queued. A failed rendering is retried on request until it has
+been attempted MAX_RENDER_ATTEMPTS times; after that it is reported as
+failed rather than re-queued.
+
+PDFs need the optional WeasyPrint package. Without it only HTML artifacts
+are produced, and PDF rows are marked 'unavailable'. Rows left pending by
+a worker that died are re-queued by a periodic maintenance task.
+"""
+
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from write_behind import enqueue, get_pending, register_handler
+
+logger = logging.getLogger(__name__)
+
+REPORT_ARTIFACT_DIR = os.environ.get(
+    'REPORT_ARTIFACT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_artifacts')
+)
+ENABLED = os.environ.get('REPORT_ARTIFACTS_ENABLED', 'True') == 'True'
+RENDER_PROCESSES = int(os.environ.get('REPORT_RENDER_PROCESSES', '2'))
+PENDING_TIMEOUT = 15 * 60     # seconds before a pending row is considered lost
+REQUEUE_INTERVAL = 10 * 60
+MAX_RENDER_ATTEMPTS = 3
+EMAIL_WAIT = 60               # seconds an email waits for its report to render
+
+FORMATS = ('html', 'pdf')
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'pdf': 'application/pdf'
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pdf_available():
+    return importlib.util.find_spec('weasyprint') is not None
+
+
+def artifact_path(content_hash, fmt):
+    return os.path.join(REPORT_ARTIFACT_DIR, content_hash[:2], f'{content_hash}.{fmt}')
+
+
+def store_artifact(data, fmt):
+    """
+    Write artifact bytes under their content hash.
+
+    Returns:
+        tuple: (content_hash, size)
+    """
+    content_hash = hashlib.sha256(data).hexdigest()
+    path = artifact_path(content_hash, fmt)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return content_hash, len(data)
+
+
+def render_artifacts(scan_results, branding, formats):
+    """
+    Render and store a scan's artifacts. Runs in a pool process.
+
+    Returns:
+        dict: format -> {'content_hash', 'size'} or {'status', 'error'}
+    """
+    from enhanced_scan_report_generator import _render_enhanced_html_report
+
+    results = {}
+    try:
+        html = _render_enhanced_html_report(scan_results, branding)
+    except Exception as e:
+        return {fmt: {'status': 'failed', 'error': str(e)} for fmt in formats}
+
+    for fmt in formats:
+        try:
+            if fmt == 'html':
+                data = html.encode('utf-8')
+            elif fmt == 'pdf':
+                if not pdf_available():
+                    results[fmt] = {'status': 'unavailable', 'error': 'WeasyPrint is not installed'}
+                    continue
+                from weasyprint import HTML
+                data = HTML(string=html).write_pdf()
+            else:
+                raise ValueError(f"Unknown report format '{fmt}'")
+            content_hash, size = store_artifact(data, fmt)
+            results[fmt] = {'status': 'ready', 'content_hash': content_hash, 'size': size}
+        except Exception as e:
+            results[fmt] = {'status': 'failed', 'error': str(e)}
+    return results
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded gunicorn worker can copy held locks
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_PROCESSES, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _connect(client_id):
+    from scan_storage import get_scan_store
+    store = get_scan_store()
+    return store, store.connect(client_id)
+
+
+def _scoped_where(store, client_id, conditions, params):
+    condition, scope_params = store.scope(client_id)
+    if condition:
+        conditions = [condition] + conditions
+        params = scope_params + params
+    return ' AND '.join(conditions), params
+
+
+def _write_report_rows(conn, payloads):
+    """Upsert queued reports rows without committing; older writes never replace newer ones"""
+    from scan_storage import get_scan_store
+    store = get_scan_store()
+    for payload in payloads:
+        tenant = store.tenant_values(payload['client_id'])
+        key = list(tenant) + ['scan_id', 'report_type']
+        now = payload['updated_at']
+        for fmt, values in payload['rows'].items():
+            row = dict(tenant, scan_id=payload['scan_id'], report_type=fmt, generated_at=now, updated_at=now)
+            row.update(values)
+            columns = list(row)
+            updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in key)
+            conn.execute(f'''
+            INSERT INTO reports ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT({', '.join(key)}) DO UPDATE SET {updates}
+            WHERE reports.updated_at IS NULL OR reports.updated_at <= excluded.updated_at
+            ''', [row[column] for column in columns])
+
+
+def _report_db_path(payload):
+    from scan_storage import get_scan_store
+    return get_scan_store().db_path(payload['client_id'])
+
+
+register_handler('report_artifact', _report_db_path, _write_report_rows)
+
+
+def _save_rows(client_id, scan_id, rows):
+    """Queue an upsert of reports rows; rows maps format -> column values"""
+    enqueue('report_artifact', {
+        'client_id': client_id, 'scan_id': scan_id, 'rows': rows, 'updated_at': datetime.now().isoformat()
+    }, item_key=f'{client_id}:{scan_id}')
+
+
+def _pending_row(client_id, scan_id, fmt, row):
+    """Overlay a queued, not yet written reports row on the stored one"""
+    payload = get_pending('report_artifact', f'{client_id}:{scan_id}')
+    if not payload or fmt not in payload['rows']:
+        return row
+    if row and (row.get('updated_at') or '') > payload['updated_at']:
+        return row
+    merged = dict(row or {'scan_id': scan_id, 'report_type': fmt})
+    merged.update(payload['rows'][fmt], updated_at=payload['updated_at'])
+    return merged
+
+
+def exhausted(row):
+    """True for a failed rendering that will not be retried"""
+    return bool(row) and row.get('status') == 'failed' and \
+        (row.get('render_attempts') or 0) >= MAX_RENDER_ATTEMPTS
+
+
+def _record(client_id, scan_id, branding_version, formats, future):
+    """Done-callback: store the outcome of a render job on its rows"""
+    try:
+        results = future.result()
+    except BrokenProcessPool as e:
+        _reset_executor()
+        results = {fmt: {'status': 'failed', 'error': str(e)} for fmt in formats}
+    except Exception as e:
+        results = {fmt: {'status': 'failed', 'error': str(e)} for fmt in formats}
+
+    rows = {}
+    for fmt, result in results.items():
+        status = result['status']
+        rows[fmt] = {
+            'status': status,
+            'error': result.get('error'),
+            'branding_version': branding_version
+        }
+        if status == 'ready':
+            rows[fmt].update(
+                content_hash=result['content_hash'],
+                size=result['size'],
+                content_type=CONTENT_TYPES[fmt],
+                report_path=artifact_path(result['content_hash'], fmt)
+            )
+        else:
+            logger.error(f"Rendering {fmt} report for scan {scan_id} {status}: {result.get('error')}")
+    try:
+        _save_rows(client_id, scan_id, rows)
+    except Exception as e:
+        logger.error(f"Error recording report artifacts for scan {scan_id}: {e}")
+
+
+def queue_scan(client_id, scan_results, formats=FORMATS, attempt=1):
+    """
+    Queue HTML and PDF rendering of a completed scan.
+
+    Args:
+        client_id: Client owning the scan
+        scan_results (dict): The scan's full results (must include scan_id)
+        formats: Report types to render
+        attempt (int): Which rendering attempt this is (1 for a new scan)
+
+    Returns:
+        bool: True if the job was queued
+    """
+    scan_id = scan_results.get('scan_id') if scan_results else None
+    if not ENABLED or not client_id or not scan_id:
+        return False
+    try:
+        from tenant_config import get_client
+        branding = get_client(client_id)
+        version = branding.get('config_version', 0) if branding else 0
+
+        _save_rows(client_id, scan_id, {
+            fmt: {'status': 'pending', 'error': None, 'render_attempts': attempt} for fmt in formats
+        })
+        future = _get_executor().submit(render_artifacts, scan_results, branding, tuple(formats))
+        future.add_done_callback(lambda f: _record(client_id, scan_id, version, formats, f))
+        return True
+    except Exception as e:
+        logger.error(f"Error queueing report artifacts for scan {scan_id}: {e}")
+        return False
+
+
+def _load_scan(store, conn, client_id, scan_id):
+    """A scan's full results from the client database, or None"""
+    from scan_archive import hydrate_scan
+    where, params = _scoped_where(store, client_id, ['scan_id = ?'], [scan_id])
+    row = conn.execute(f'SELECT scan_id, scan_results, archived_month FROM scans WHERE {where}', params).fetchone()
+    if not row:
+        return None
+    scan = hydrate_scan(store.db_path(client_id), dict(row))
+    try:
+        return json.loads(scan.get('scan_results') or 'null')
+    except ValueError:
+        return None
+
+
+def get_artifact(client_id, scan_id, fmt):
+    """
+    The reports row for a scan's artifact, re-queueing it if missing or stale.
+
+    A failed rendering is re-queued until it is exhausted().
+
+    Returns:
+        dict: Row with 'path' set when the file is ready, or None if the
+            scan is unknown
+    """
+    store, conn = _connect(client_id)
+    try:
+        where, params = _scoped_where(store, client_id, ['scan_id = ?', 'report_type = ?'], [scan_id, fmt])
+        row = conn.execute(f'SELECT * FROM reports WHERE {where}', params).fetchone()
+        row = _pending_row(client_id, scan_id, fmt, dict(row) if row else None)
+
+        path = artifact_path(row['content_hash'], fmt) if row and row.get('content_hash') else None
+        if path and not os.path.exists(path):
+            path = None
+
+        from tenant_config import get_client
+        branding = get_client(client_id)
+        current = branding.get('config_version', 0) if branding else 0
+        stale = row is None or (path is None and row['status'] != 'pending') or \
+            (row['status'] == 'ready' and (row.get('branding_version') or 0) < current)
+        if stale and (row is None or row['status'] != 'unavailable') and not exhausted(row):
+            scan_results = _load_scan(store, conn, client_id, scan_id)
+            if scan_results is None:
+                return row
+            retry = row is not None and row['status'] == 'failed'
+            attempt = (row.get('render_attempts') or 0) + 1 if retry else 1
+            queue_scan(client_id, scan_results, attempt=attempt)
+            if row is None or retry:
+                row = dict(row or {'scan_id': scan_id, 'report_type': fmt},
+                           status='pending', render_attempts=attempt)
+    finally:
+        conn.close()
+
+    row['path'] = path
+    return row
+
+
+def _update(client_id, scan_id, fmt, assignments):
+    store, conn = _connect(client_id)
+    try:
+        where, params = _scoped_where(store, client_id, ['scan_id = ?', 'report_type = ?'], [scan_id, fmt])
+        conn.execute(f'UPDATE reports SET {assignments} WHERE {where}', params)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error updating report {scan_id} ({fmt}): {e}")
+    finally:
+        conn.close()
+
+
+def send_artifact(client_id, scan_id, fmt):
+    """
+    Response serving a ready artifact file, or None if it is not ready.
+
+    Range and conditional requests are answered by send_file.
+    """
+    from flask import send_file
+    row = get_artifact(client_id, scan_id, fmt)
+    if not row or not row.get('path'):
+        return None
+    _update(client_id, scan_id, fmt, 'download_count = COALESCE(download_count, 0) + 1')
+    response = send_file(
+        row['path'], mimetype=CONTENT_TYPES[fmt], as_attachment=True,
+        download_name=f'security-report-{scan_id}.{fmt}', conditional=True, etag=row['content_hash']
+    )
+    response.cache_control.private = True
+    return response
+
+
+def load_html(client_id, scan_id):
+    """Stored HTML of a scan's report, or None if it has not been rendered yet"""
+    if not ENABLED or not client_id or not scan_id:
+        return None
+    try:
+        row = get_artifact(client_id, scan_id, 'html')
+    except Exception as e:
+        logger.error(f"Error loading report artifact for scan {scan_id}: {e}")
+        return None
+    if not row or not row.get('path'):
+        return None
+    with open(row['path'], encoding='utf-8') as f:
+        return f.read()
+
+
+def wait_for_html(client_id, scan_id, timeout=EMAIL_WAIT, poll=1.0):
+    """
+    Stored HTML of a scan's report, waiting up to timeout for the
+    background render. For background threads such as the email sender.
+
+    Returns:
+        str: The report, or None if it failed or did not finish in time
+    """
+    if not ENABLED or not client_id or not scan_id:
+        return None
+    deadline = time.time() + timeout
+    while True:
+        html = load_html(client_id, scan_id)
+        if html is not None or time.time() >= deadline:
+            return html
+        try:
+            row = get_artifact(client_id, scan_id, 'html')
+        except Exception as e:
+            logger.error(f"Error checking report artifact for scan {scan_id}: {e}")
+            return None
+        if not row or row['status'] == 'unavailable' or exhausted(row):
+            return None
+        time.sleep(poll)
+
+
+def mark_emailed(client_id, scan_id, sent_at=None):
+    """
+    Record that a scan's report reached the lead's inbox.
+
+    Delivery can land before the queued reports rows are written (or with
+    artifacts turned off), so this is an upsert. Rows it creates carry no
+    status or updated_at: the render's own write still applies over them,
+    and it only sets its own columns, so email_sent is kept.
+
+    Returns:
+        bool: True if the delivery was recorded
+    """
+    sent_at = sent_at or datetime.now().isoformat()
+    store, conn = _connect(client_id)
+    try:
+        tenant = store.tenant_values(client_id)
+        key = list(tenant) + ['scan_id', 'report_type']
+        recorded = 0
+        for fmt in FORMATS:
+            row = dict(tenant, scan_id=scan_id, report_type=fmt, generated_at=sent_at, status=None,
+                       email_sent=1, email_sent_at=sent_at)
+            columns = list(row)
+            recorded += conn.execute(f'''
+            INSERT INTO reports ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT({', '.join(key)}) DO UPDATE SET email_sent = 1, email_sent_at = excluded.email_sent_at
+            ''', [row[column] for column in columns]).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if not recorded:
+        logger.error(f"Email delivery for scan {scan_id} was not recorded")
+    return recorded > 0
+
+
+def requeue_stale():
+    """
+    Re-queue reports left pending by a worker that stopped.
+
+    A lost render counts as an attempt; once MAX_RENDER_ATTEMPTS are used up
+    the rows are marked failed instead.
+
+    Returns:
+        int: Number of scans re-queued
+    """
+    from scan_storage import get_scan_store
+    store = get_scan_store()
+    cutoff = datetime.fromtimestamp(time.time() - PENDING_TIMEOUT).isoformat()
+    requeued = 0
+    for client_id in store.tenant_ids():
+        conn = store.connect(client_id)
+        try:
+            where, params = _scoped_where(store, client_id, ["status = 'pending'", 'updated_at < ?'], [cutoff])
+            lost = {}
+            for scan_id, fmt, attempts in conn.execute(
+                f'SELECT scan_id, report_type, COALESCE(render_attempts, 0) FROM reports WHERE {where}', params
+            ).fetchall():
+                formats, most = lost.get(scan_id, ([], 0))
+                lost[scan_id] = (formats + [fmt], max(most, attempts))
+            for scan_id, (formats, attempts) in lost.items():
+                if attempts >= MAX_RENDER_ATTEMPTS:
+                    logger.error(f"Giving up on reports for scan {scan_id} after {attempts} attempts")
+                    _save_rows(client_id, scan_id, {
+                        fmt: {'status': 'failed', 'error': 'Rendering did not finish'} for fmt in formats
+                    })
+                    continue
+                scan_results = _load_scan(store, conn, client_id, scan_id)
+                if scan_results and queue_scan(client_id, scan_results, attempt=attempts + 1):
+                    requeued += 1
+        except Exception as e:
+            logger.error(f"Error re-queueing reports for client {client_id}: {e}")
+        finally:
+            conn.close()
+    return requeued
+
+
+def start_requeue_task():
+    from maintenance import start_periodic_task
+    start_periodic_task('report_artifact_requeue', REQUEUE_INTERVAL, requeue_stale)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Cache of rendered scan reports.
+
+A report is fixed once its scan finishes, yet every view re-renders it:
+the HTML generators concatenate a large document, the report pages
+recompute industry benchmarks and the email path renders the same report
+again. Rendered reports are therefore kept under
+(scan_id, variant, branding version):
+
+- A memory tier per worker, an LRU bounded by MEMORY_MAX_BYTES.
+- A disk tier shared by all workers, gzip files under REPORT_CACHE_DIR,
+  bounded by DISK_MAX_BYTES with the least recently read files evicted.
+
+The branding version is the tenant's config_version, so a branding change
+makes new keys and old renderings age out. Keys also carry the deployed
+code version (ASSET_VERSION), so a deploy that changes templates never
+serves an old layout. invalidate_scan() drops every rendering of a scan
+when its data is rewritten.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+import invalidation
+from http_cache import ASSET_VERSION
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = os.environ.get(
+    'REPORT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_cache')
+)
+ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'True') == 'True'
+MEMORY_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MEMORY_BYTES', str(32 * 1024 * 1024)))
+DISK_MAX_BYTES = int(os.environ.get('REPORT_CACHE_DISK_BYTES', str(512 * 1024 * 1024)))
+
+_memory = OrderedDict()   # (scan_id, variant, version) -> html, least recently used first
+_memory_bytes = 0
+_disk_bytes = None        # estimate of the disk tier size; None until first measured
+_lock = threading.Lock()
+
+
+def _scan_dir(scan_id):
+    return os.path.join(REPORT_CACHE_DIR, hashlib.sha256(str(scan_id).encode()).hexdigest()[:32])
+
+
+def _disk_path(key):
+    scan_id, variant, version = key
+    tag = hashlib.sha256(f'{variant}|{version}|{ASSET_VERSION}'.encode()).hexdigest()[:16]
+    return os.path.join(_scan_dir(scan_id), f'{tag}.html.gz')
+
+
+def _remember(key, html):
+    """Put a rendering in the memory tier, evicting least recently used entries"""
+    global _memory_bytes
+    size = len(html)
+    if size > MEMORY_MAX_BYTES // 4:
+        return
+    with _lock:
+        previous = _memory.pop(key, None)
+        if previous is not None:
+            _memory_bytes -= len(previous)
+        _memory[key] = html
+        _memory_bytes += size
+        while _memory_bytes > MEMORY_MAX_BYTES and _memory:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted)
+
+
+def _read_disk(key):
+    path = _disk_path(key)
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            html = f.read()
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError) as e:
+        logger.error(f"Error reading cached report {path}: {e}")
+        return None
+    try:
+        # Mark as recently used for eviction
+        os.utime(path)
+    except OSError:
+        pass
+    return html
+
+
+def _write_disk(key, html):
+    global _disk_bytes
+    path = _disk_path(key)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            f.write(html)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Error writing cached report {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+    with _lock:
+        if _disk_bytes is not None:
+            _disk_bytes += size
+    if _disk_bytes is None or _disk_bytes > DISK_MAX_BYTES:
+        prune_disk()
+
+
+def prune_disk():
+    """
+    Evict the least recently read files until the disk tier fits DISK_MAX_BYTES.
+
+    Returns:
+        int: Number of files removed
+    """
+    global _disk_bytes
+    files = []
+    for root, _, names in os.walk(REPORT_CACHE_DIR):
+        for name in names:
+            if not name.endswith('.html.gz'):
+                continue
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if total > DISK_MAX_BYTES:
+        # Leave headroom so the next few writes do not trigger another sweep
+        target = DISK_MAX_BYTES * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            try:
+                # Drop the scan's folder once its last rendering is gone
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+    with _lock:
+        _disk_bytes = total
+    return removed
+
+
+def get(scan_id, variant, version=0):
+    """Cached rendering, or None"""
+    if not ENABLED or not scan_id:
+        return None
+    key = (str(scan_id), variant, str(version))
+    with _lock:
+        html = _memory.get(key)
+        if html is not None:
+            _memory.move_to_end(key)
+            return html
+    html = _read_disk(key)
+    if html is not None:
+        _remember(key, html)
+    return html
+
+
+def put(scan_id, variant, version, html):
+    if not ENABLED or not scan_id or not isinstance(html, str):
+        return
+    key = (str(scan_id), variant, str(version))
+    invalidation.ensure_listening(on_error=clear)
+    _remember(key, html)
+    _write_disk(key, html)
+
+
+def get_or_render(scan_id, variant, version, render):
+    """
+    Serve a report rendering from cache, rendering and storing it on a miss.
+
+    Args:
+        scan_id: Finished scan the report is for; falsy disables caching
+        variant (str): Which rendering ('client_view', 'enhanced', ...)
+        version: Branding version of the tenant (config_version)
+        render: Callable returning the HTML; exceptions propagate and
+            nothing is cached
+
+    Returns:
+        str: Rendered HTML
+    """
+    html = get(scan_id, variant, version)
+    if html is not None:
+        return html
+    start = time.perf_counter()
+    html = render()
+    put(scan_id, variant, version, html)
+    logger.debug(f"Rendered {variant} report for {scan_id} in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return html
+
+
+def _drop_memory(scan_id):
+    global _memory_bytes
+    scan_id = str(scan_id)
+    with _lock:
+        for key in [key for key in _memory if key[0] == scan_id]:
+            _memory_bytes -= len(_memory.pop(key))
+
+
+def invalidate_scan(scan_id, conn=None):
+    """
+    Drop every rendering of a scan whose data changed, in every worker.
+
+    Args:
+        scan_id: Scan whose results or status were rewritten
+        conn: Open connection on the main database, if the caller is
+            inside a transaction there
+    """
+    if not scan_id:
+        return
+    folder = _scan_dir(scan_id)
+    if os.path.isdir(folder):
+        shutil.rmtree(folder, ignore_errors=True)
+    invalidation.publish('report_cache', scan_id, conn)
+
+
+def clear():
+    """Empty the memory tier"""
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+
+
+invalidation.subscribe('report_cache', _drop_memory)
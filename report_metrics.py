@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated daily and monthly counts for the admin report charts.
+
+The reports pages grouped raw history tables by strftime() on every load
+and then zero-filled the dates in Python. Instead, metric_daily and
+metric_monthly hold one count per (metric, bucket, dimension). Triggers on
+the source tables keep them current on every insert, delete and relevant
+update, so a chart reads at most a year of days (or 13 months) from an
+index.
+
+Metrics:
+
+    scans        scan_history rows, by scan_type
+    new_clients  clients rows, by subscription_level
+    new_users    users rows
+    logins       sessions rows, counted as events: deleting an expired
+                 session does not remove its login from history
+
+Buckets are the integers time_buckets uses: day YYYYMMDD, month YYYYMM.
+rebuild() recomputes everything from the source tables, e.g. after a bulk
+import that bypassed the triggers:
+
+    python report_metrics.py
+"""
+
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# metric -> (table, candidate time columns, dimension column or None, counts deletes)
+METRICS = {
+    'scans': ('scan_history', ['timestamp', 'created_at'], 'scan_type', True),
+    'new_clients': ('clients', ['created_at'], 'subscription_level', True),
+    'new_users': ('users', ['created_at'], None, True),
+    'logins': ('sessions', ['created_at'], None, False)
+}
+
+# table -> (bucket column, strftime format)
+AGGREGATE_TABLES = {
+    'metric_daily': ('day', '%Y%m%d'),
+    'metric_monthly': ('month', '%Y%m')
+}
+
+
+def _source(conn, metric):
+    """(table, time column, dimension column) for a metric, or None if its table is missing"""
+    table, time_columns, dimension, _ = METRICS[metric]
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    time_column = next((col for col in time_columns if col in columns), None)
+    if not time_column:
+        return None
+    return table, time_column, dimension if dimension in columns else None
+
+
+def _dimension_sql(alias, dimension):
+    return f"COALESCE({alias}.{dimension}, '')" if dimension else "''"
+
+
+def _adjust_statements(metric, alias, time_column, dimension, delta):
+    """SQL adding delta to the aggregate rows of one source row"""
+    statements = []
+    for table, (bucket, fmt) in AGGREGATE_TABLES.items():
+        bucket_sql = f"CAST(strftime('{fmt}', {alias}.{time_column}) AS INTEGER)"
+        if delta > 0:
+            statements.append(f"""
+                INSERT INTO {table} (metric, {bucket}, dimension, count)
+                SELECT '{metric}', {bucket_sql}, {_dimension_sql(alias, dimension)}, 1
+                WHERE strftime('{fmt}', {alias}.{time_column}) IS NOT NULL
+                ON CONFLICT (metric, {bucket}, dimension) DO UPDATE SET count = count + 1;""")
+        else:
+            statements.append(f"""
+                UPDATE {table} SET count = count - 1
+                WHERE metric = '{metric}' AND {bucket} = {bucket_sql}
+                  AND dimension = {_dimension_sql(alias, dimension)};""")
+    return ''.join(statements)
+
+
+def _create_triggers(conn, metric):
+    source = _source(conn, metric)
+    if not source:
+        logger.warning(f"No source table for report metric {metric}; skipping triggers")
+        return False
+    table, time_column, dimension = source
+    counts_deletes = METRICS[metric][3]
+    prefix = f"trg_metric_{metric}"
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {table}
+        BEGIN {_adjust_statements(metric, 'NEW', time_column, dimension, 1)}
+        END
+    """)
+    if not counts_deletes:
+        return True
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {table}
+        BEGIN {_adjust_statements(metric, 'OLD', time_column, dimension, -1)}
+        END
+    """)
+    changed = [time_column] + ([dimension] if dimension else [])
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE OF {', '.join(changed)} ON {table}
+        WHEN {' OR '.join(f'OLD.{col} IS NOT NEW.{col}' for col in changed)}
+        BEGIN {_adjust_statements(metric, 'OLD', time_column, dimension, -1)}
+              {_adjust_statements(metric, 'NEW', time_column, dimension, 1)}
+        END
+    """)
+    return True
+
+
+def rebuild(conn, metrics=None):
+    """
+    Recompute aggregates from the source tables (caller commits).
+
+    Event metrics (logins) keep the larger of the stored and recomputed
+    count per bucket, so history whose source rows were swept survives.
+
+    Returns:
+        dict: Source rows counted per metric
+    """
+    counted = {}
+    for metric in metrics or METRICS:
+        source = _source(conn, metric)
+        if not source:
+            continue
+        table, time_column, dimension = source
+        counts_deletes = METRICS[metric][3]
+        for aggregate, (bucket, fmt) in AGGREGATE_TABLES.items():
+            if counts_deletes:
+                conn.execute(f"DELETE FROM {aggregate} WHERE metric = ?", (metric,))
+                on_conflict = "count = excluded.count"
+            else:
+                on_conflict = "count = MAX(count, excluded.count)"
+            conn.execute(f"""
+                INSERT INTO {aggregate} (metric, {bucket}, dimension, count)
+                SELECT ?, CAST(strftime('{fmt}', {time_column}) AS INTEGER) AS bucket,
+                       {_dimension_sql(table, dimension)} AS dim, COUNT(*)
+                FROM {table}
+                WHERE strftime('{fmt}', {time_column}) IS NOT NULL
+                GROUP BY bucket, dim
+                ON CONFLICT (metric, {bucket}, dimension) DO UPDATE SET {on_conflict}
+            """, (metric,))
+        counted[metric] = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE strftime('%Y%m%d', {time_column}) IS NOT NULL"
+        ).fetchone()[0]
+    return counted
+
+
+def ensure_report_metrics(conn):
+    """Create the aggregate tables and source triggers, and backfill them"""
+    for table, (bucket, _) in AGGREGATE_TABLES.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                metric TEXT NOT NULL,
+                {bucket} INTEGER NOT NULL,
+                dimension TEXT NOT NULL DEFAULT '',
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (metric, {bucket}, dimension)
+            ) WITHOUT ROWID
+        """)
+    for metric in METRICS:
+        _create_triggers(conn, metric)
+    rebuild(conn)
+
+
+def _day(value):
+    return int(value.strftime('%Y%m%d'))
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value):
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def daily_counts(cursor, metric, start, end):
+    """{date: count} for the days from start to end inclusive (zeros omitted)"""
+    cursor.execute("""
+        SELECT day, SUM(count) FROM metric_daily
+        WHERE metric = ? AND day BETWEEN ? AND ?
+        GROUP BY day
+    """, (metric, _day(start), _day(end)))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def series(cursor, metric, start_date, end_date, granularity='day'):
+    """
+    Zero-filled chart series for a metric.
+
+    Args:
+        start_date, end_date (str): Inclusive range, YYYY-MM-DD
+        granularity (str): 'day', 'week' (Monday-based, like strftime %W)
+            or 'month'
+
+    Returns:
+        list: {'date': label, 'count': n} per bucket, oldest first
+    """
+    start = datetime.strptime(start_date[:10], '%Y-%m-%d')
+    end = datetime.strptime(end_date[:10], '%Y-%m-%d')
+
+    if granularity == 'month':
+        cursor.execute("""
+            SELECT month, SUM(count) FROM metric_monthly
+            WHERE metric = ? AND month BETWEEN ? AND ?
+            GROUP BY month
+        """, (metric, int(start.strftime('%Y%m')), int(end.strftime('%Y%m'))))
+        counts = {row[0]: row[1] for row in cursor.fetchall()}
+        chart = []
+        current = _month_start(start)
+        while current <= end:
+            chart.append({'date': current.strftime('%Y-%m'), 'count': counts.get(int(current.strftime('%Y%m')), 0)})
+            current = _next_month(current)
+        return chart
+
+    counts = daily_counts(cursor, metric, start, end)
+    chart = []
+    current = start
+    while current <= end:
+        count = counts.get(_day(current), 0)
+        if granularity == 'week':
+            label = current.strftime('Week %W, %Y')
+            if chart and chart[-1]['date'] == label:
+                chart[-1]['count'] += count
+            else:
+                chart.append({'date': label, 'count': count})
+        else:
+            chart.append({'date': current.strftime('%Y-%m-%d'), 'count': count})
+        current += timedelta(days=1)
+    return chart
+
+
+def total(cursor, metric, start_date, end_date):
+    """Count for an inclusive YYYY-MM-DD range"""
+    cursor.execute("""
+        SELECT COALESCE(SUM(count), 0) FROM metric_daily
+        WHERE metric = ? AND day BETWEEN ? AND ?
+    """, (metric, int(start_date[:10].replace('-', '')), int(end_date[:10].replace('-', ''))))
+    return cursor.fetchone()[0]
+
+
+def dimension_totals(cursor, metric, start_date, end_date):
+    """
+    Counts per dimension value over an inclusive range, largest first.
+
+    Returns:
+        list: (dimension or None, count) tuples, zero counts omitted
+    """
+    cursor.execute("""
+        SELECT dimension, SUM(count) AS total FROM metric_daily
+        WHERE metric = ? AND day BETWEEN ? AND ?
+        GROUP BY dimension
+        HAVING total > 0
+        ORDER BY total DESC
+    """, (metric, int(start_date[:10].replace('-', '')), int(end_date[:10].replace('-', ''))))
+    return [(row[0] or None, row[1]) for row in cursor.fetchall()]
+
+
+if __name__ == "__main__":
+    from migrations import CLIENT_DB_PATH
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+    try:
+        ensure_report_metrics(conn)
+        for metric, rows in rebuild(conn).items():
+            print(f"{metric}: {rows} source rows")
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compiled Jinja templates for scan reports.
+
+The report generators used to assemble their HTML and CSS in Python
+strings on every call. They now render templates under templates/reports/.
+The component sections are macros in templates/reports/components.html.
+
+Reports are also generated outside a request (background scans, email), so
+they use their own environment rather than the Flask app's. Both
+environments share a filesystem bytecode cache in JINJA_CACHE_DIR. A new
+gunicorn worker then loads compiled templates from disk instead of parsing
+and compiling them again.
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(BASE_DIR, 'jinja_cache'))
+
+REPORT_TEMPLATES = (
+    'reports/components.html',
+    'reports/enhanced_report.html',
+    'reports/scan_report.html',
+    'emails/scan_summary.html',
+)
+
+_env = None
+
+
+def _bytecode_cache(directory=None):
+    directory = directory or JINJA_CACHE_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Error creating template cache directory {directory}: {e}")
+        return None
+    return FileSystemBytecodeCache(directory)
+
+
+def score_color(score):
+    """Hex color for a 0-100 score"""
+    if score >= 80:
+        return '#28a745'
+    elif score >= 60:
+        return '#ffc107'
+    elif score >= 40:
+        return '#fd7e14'
+    else:
+        return '#dc3545'
+
+
+def severity_color(severity):
+    """Bootstrap color class for a severity or priority"""
+    colors = {
+        'critical': 'danger',
+        'high': 'warning',
+        'medium': 'info',
+        'low': 'success'
+    }
+    return colors.get(str(severity).lower(), 'secondary')
+
+
+def create_environment(cache_dir=None, auto_reload=False):
+    """
+    Build a report environment.
+
+    Args:
+        cache_dir: Bytecode cache directory (defaults to JINJA_CACHE_DIR)
+        auto_reload: Check template files for changes on every load; off in
+            production, where templates only change with a deploy
+    """
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        bytecode_cache=_bytecode_cache(cache_dir),
+        auto_reload=auto_reload,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    env.globals.update(score_color=score_color, severity_color=severity_color)
+    return env
+
+
+def get_environment():
+    global _env
+    if _env is None:
+        _env = create_environment(auto_reload=os.environ.get('FLASK_DEBUG') == '1')
+    return _env
+
+
+def render(name, **context):
+    """Render a report template with now() available as generated_at"""
+    context.setdefault('generated_at', datetime.now())
+    return get_environment().get_template(name).render(**context)
+
+
+def macro(name, template='reports/components.html'):
+    """A macro from a report template, callable from Python"""
+    return getattr(get_environment().get_template(template).module, name)
+
+
+def warm():
+    """Load every report template now so the first report does not pay for it"""
+    env = get_environment()
+    for name in REPORT_TEMPLATES:
+        try:
+            env.get_template(name)
+        except Exception as e:
+            logger.error(f"Error compiling report template {name}: {e}")
+
+
+def init_app(app):
+    # Page templates share the bytecode cache with the report templates
+    app.jinja_env.bytecode_cache = _bytecode_cache()
+    warm()
@@ -6,6 +6,9 @@ import sqlite3
 from datetime import datetime, timedelta
 import json
 
+import report_metrics
+from time_buckets import day_range_epochs
+
 # Define reports blueprint
 reports_bp = Blueprint('reports', __name__, url_prefix='/admin')
 
@@ -180,23 +183,9 @@ def get_summary_stats(cursor, period):
     
     end_date = today.strftime('%Y-%m-%d')
     
-    # Get scan statistics
-    cursor.execute("""
-        SELECT COUNT(*) as total_scans
-        FROM scan_history
-        WHERE timestamp BETWEEN ? AND ?
-    """, (start_date, end_date))
-    
-    total_scans = cursor.fetchone()[0] or 0
-    
-    # Get new clients
-    cursor.execute("""
-        SELECT COUNT(*) as new_clients
-        FROM clients
-        WHERE created_at BETWEEN ? AND ?
-    """, (start_date, end_date))
-    
-    new_clients = cursor.fetchone()[0] or 0
+    # Scan and new client counts come from the daily aggregates
+    total_scans = report_metrics.total(cursor, 'scans', start_date, end_date)
+    new_clients = report_metrics.total(cursor, 'new_clients', start_date, end_date)
     
     # Get active users
     cursor.execute("""
@@ -240,98 +229,35 @@ def get_scan_reports(cursor, period):
     
     if period == 'week':
         start_date = (today - timedelta(days=7)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', timestamp)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'month':
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', timestamp)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'quarter':
         start_date = (today - timedelta(days=90)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%W', timestamp)"
-        label_format = "Week %W, %Y"
+        granularity = 'week'
     elif period == 'year':
         start_date = (today - timedelta(days=365)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m', timestamp)"
-        label_format = "%Y-%m"
+        granularity = 'month'
     else:
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', timestamp)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     
     end_date = today.strftime('%Y-%m-%d')
     
-    # Get scan counts by date
-    cursor.execute(f"""
-        SELECT 
-            {group_by} as date_group,
-            COUNT(*) as scan_count
-        FROM scan_history
-        WHERE timestamp BETWEEN ? AND ?
-        GROUP BY date_group
-        ORDER BY date_group
-    """, (start_date, end_date))
-    
-    scan_data = {}
-    for row in cursor.fetchall():
-        scan_data[row['date_group']] = row['scan_count']
-    
-    # Fill in missing dates with 0
-    current_date = datetime.strptime(start_date, '%Y-%m-%d')
-    end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
-    
-    chart_data = []
-    
-    while current_date <= end_datetime:
-        if period == 'week':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'month':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'quarter':
-            date_key = current_date.strftime('%Y-%W')
-        elif period == 'year':
-            date_key = current_date.strftime('%Y-%m')
-        else:
-            date_key = current_date.strftime('%Y-%m-%d')
-        
-        if date_key in scan_data:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': scan_data[date_key]
-            })
-        else:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': 0
-            })
-        
-        if period == 'week' or period == 'month':
-            current_date += timedelta(days=1)
-        elif period == 'quarter':
-            current_date += timedelta(days=7)
-        elif period == 'year':
-            current_date += timedelta(days=30)
-        else:
-            current_date += timedelta(days=1)
-    
-    # Get scan counts by type
-    cursor.execute("""
-        SELECT 
-            scan_type,
-            COUNT(*) as scan_count
-        FROM scan_history
-        WHERE timestamp BETWEEN ? AND ?
-        GROUP BY scan_type
-        ORDER BY scan_count DESC
-    """, (start_date, end_date))
+    # Zero-filled series and per-type counts from the scan aggregates
+    chart_data = report_metrics.series(cursor, 'scans', start_date, end_date, granularity)
     
     scan_types = []
-    for row in cursor.fetchall():
+    for scan_type, count in report_metrics.dimension_totals(cursor, 'scans', start_date, end_date):
         scan_types.append({
-            'type': row['scan_type'] or 'Unknown',
-            'count': row['scan_count']
+            'type': scan_type or 'Unknown',
+            'count': count
         })
     
+    # Range scan on the precomputed epoch column instead of the raw timestamp
+    start_epoch, end_epoch = day_range_epochs(start_date, end_date)
+    
     # Get top clients by scan count
     cursor.execute("""
         SELECT 
@@ -339,11 +265,11 @@ def get_scan_reports(cursor, period):
             COUNT(s.id) as scan_count
         FROM scan_history s
         JOIN clients c ON s.client_id = c.id
-        WHERE s.timestamp BETWEEN ? AND ?
+        WHERE s.epoch >= ? AND s.epoch < ?
         GROUP BY c.id
         ORDER BY scan_count DESC
         LIMIT 5
-    """, (start_date, end_date))
+    """, (start_epoch, end_epoch))
     
     top_clients = []
     for row in cursor.fetchall():
@@ -368,96 +294,30 @@ def get_client_reports(cursor, period):
     
     if period == 'week':
         start_date = (today - timedelta(days=7)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'month':
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'quarter':
         start_date = (today - timedelta(days=90)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%W', created_at)"
-        label_format = "Week %W, %Y"
+        granularity = 'week'
     elif period == 'year':
         start_date = (today - timedelta(days=365)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m', created_at)"
-        label_format = "%Y-%m"
+        granularity = 'month'
     else:
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     
     end_date = today.strftime('%Y-%m-%d')
     
-    # Get new clients by date
-    cursor.execute(f"""
-        SELECT 
-            {group_by} as date_group,
-            COUNT(*) as client_count
-        FROM clients
-        WHERE created_at BETWEEN ? AND ?
-        GROUP BY date_group
-        ORDER BY date_group
-    """, (start_date, end_date))
-    
-    client_data = {}
-    for row in cursor.fetchall():
-        client_data[row['date_group']] = row['client_count']
-    
-    # Fill in missing dates with 0
-    current_date = datetime.strptime(start_date, '%Y-%m-%d')
-    end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
-    
-    chart_data = []
-    
-    while current_date <= end_datetime:
-        if period == 'week':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'month':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'quarter':
-            date_key = current_date.strftime('%Y-%W')
-        elif period == 'year':
-            date_key = current_date.strftime('%Y-%m')
-        else:
-            date_key = current_date.strftime('%Y-%m-%d')
-        
-        if date_key in client_data:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': client_data[date_key]
-            })
-        else:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': 0
-            })
-        
-        if period == 'week' or period == 'month':
-            current_date += timedelta(days=1)
-        elif period == 'quarter':
-            current_date += timedelta(days=7)
-        elif period == 'year':
-            current_date += timedelta(days=30)
-        else:
-            current_date += timedelta(days=1)
-    
-    # Get clients by subscription level
-    cursor.execute("""
-        SELECT 
-            subscription_level,
-            COUNT(*) as client_count
-        FROM clients
-        WHERE created_at BETWEEN ? AND ?
-        GROUP BY subscription_level
-        ORDER BY client_count DESC
-    """, (start_date, end_date))
+    # Zero-filled series and per-level counts from the new client aggregates
+    chart_data = report_metrics.series(cursor, 'new_clients', start_date, end_date, granularity)
     
     subscription_levels = []
-    for row in cursor.fetchall():
+    for level, count in report_metrics.dimension_totals(cursor, 'new_clients', start_date, end_date):
         subscription_levels.append({
-            'level': row['subscription_level'] or 'Unknown',
-            'count': row['client_count']
+            'level': level or 'Unknown',
+            'count': count
         })
     
     # Get clients by status
@@ -577,79 +437,24 @@ def get_user_reports(cursor, period):
     
     if period == 'week':
         start_date = (today - timedelta(days=7)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'month':
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     elif period == 'quarter':
         start_date = (today - timedelta(days=90)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%W', created_at)"
-        label_format = "Week %W, %Y"
+        granularity = 'week'
     elif period == 'year':
         start_date = (today - timedelta(days=365)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m', created_at)"
-        label_format = "%Y-%m"
+        granularity = 'month'
     else:
         start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
-        group_by = "strftime('%Y-%m-%d', created_at)"
-        label_format = "%Y-%m-%d"
+        granularity = 'day'
     
     end_date = today.strftime('%Y-%m-%d')
     
-    # Get new users by date
-    cursor.execute(f"""
-        SELECT 
-            {group_by} as date_group,
-            COUNT(*) as user_count
-        FROM users
-        WHERE created_at BETWEEN ? AND ?
-        GROUP BY date_group
-        ORDER BY date_group
-    """, (start_date, end_date))
-    
-    user_data = {}
-    for row in cursor.fetchall():
-        user_data[row['date_group']] = row['user_count']
-    
-    # Fill in missing dates with 0
-    current_date = datetime.strptime(start_date, '%Y-%m-%d')
-    end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
-    
-    chart_data = []
-    
-    while current_date <= end_datetime:
-        if period == 'week':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'month':
-            date_key = current_date.strftime('%Y-%m-%d')
-        elif period == 'quarter':
-            date_key = current_date.strftime('%Y-%W')
-        elif period == 'year':
-            date_key = current_date.strftime('%Y-%m')
-        else:
-            date_key = current_date.strftime('%Y-%m-%d')
-        
-        if date_key in user_data:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': user_data[date_key]
-            })
-        else:
-            chart_data.append({
-                'date': current_date.strftime(label_format),
-                'count': 0
-            })
-        
-        if period == 'week' or period == 'month':
-            current_date += timedelta(days=1)
-        elif period == 'quarter':
-            current_date += timedelta(days=7)
-        elif period == 'year':
-            current_date += timedelta(days=30)
-        else:
-            current_date += timedelta(days=1)
+    # Zero-filled new user series from the aggregates
+    chart_data = report_metrics.series(cursor, 'new_users', start_date, end_date, granularity)
     
     # Get users by role
     cursor.execute("""
@@ -685,40 +490,8 @@ def get_user_reports(cursor, period):
             'count': row['user_count']
         })
     
-    # Get login activity
-    cursor.execute("""
-        SELECT 
-            strftime('%Y-%m-%d', created_at) as login_date,
-            COUNT(*) as login_count
-        FROM sessions
-        WHERE created_at BETWEEN ? AND ?
-        GROUP BY login_date
-        ORDER BY login_date
-    """, (start_date, end_date))
-    
-    login_data = {}
-    for row in cursor.fetchall():
-        login_data[row['login_date']] = row['login_count']
-    
-    # Fill in missing dates for login data
-    login_chart_data = []
-    current_date = datetime.strptime(start_date, '%Y-%m-%d')
-    
-    while current_date <= end_datetime:
-        date_key = current_date.strftime('%Y-%m-%d')
-        
-        if date_key in login_data:
-            login_chart_data.append({
-                'date': date_key,
-                'count': login_data[date_key]
-            })
-        else:
-            login_chart_data.append({
-                'date': date_key,
-                'count': 0
-            })
-        
-        current_date += timedelta(days=1)
+    # Daily login activity, kept after expired sessions are swept
+    login_chart_data = report_metrics.series(cursor, 'logins', start_date, end_date, 'day')
     
     return {
         'chart_data': chart_data,
@@ -31,6 +31,15 @@ def scan_page():
         return response
 
     if request.method == 'POST':
+        # Turn away floods from one address before any lead or scan work
+        from rate_limit import enforce, ip_bucket, scanner_bucket
+        limited = enforce([ip_bucket(request.remote_addr)])
+        if limited:
+            return limited
+        # Counted in the health sampler's active scans until the request ends
+        from health_sampler import scan_started
+        scan_started()
+
         try:
             # Get form data including client OS info and new fields
             lead_data = {
@@ -99,18 +108,17 @@ def scan_page():
             client = None
             if client_id:
                 try:
-                    from client_db import get_db_connection
-                    conn = get_db_connection()
-                    conn.row_factory = sqlite3.Row
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT * FROM clients WHERE id = ?", (client_id,))
-                    client_row = cursor.fetchone()
-                    conn.close()
+                    from tenant_config import get_client
+                    client = get_client(client_id)
                     
-                    if client_row:
-                        client = dict(client_row)
+                    if client:
                         logging.info(f"Using client {client_id} for scan tracking (scanner: {scanner_id})")
                         
+                        if scanner_id:
+                            limited = enforce([scanner_bucket(scanner_id, client)])
+                            if limited:
+                                return limited
+                        
                         # Check scan limits before proceeding
                         try:
                             from client import get_client_total_scans, get_client_scan_limit
@@ -838,12 +846,14 @@ def api_scan():
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
         return response
 
+    from rate_limit import enforce, ip_bucket
+    limited = enforce([ip_bucket(request.remote_addr)])
+    if limited:
+        return limited
+    from health_sampler import scan_started
+    scan_started()
+
     try:
-        from flask import current_app
-        limiter = getattr(current_app, 'limiter', None)
-        if limiter:
-            limiter.limit("5 per minute")(lambda: None)()
-        
         # Get client info from authentication
         from database_utils import get_client_id_from_request
         client_id = get_client_id_from_request()
@@ -852,20 +862,13 @@ def api_scan():
         # Check scan limits if client_id is available
         if client_id:
             try:
-                from client_db import get_db_connection
+                from tenant_config import get_client
                 from client import get_client_total_scans, get_client_scan_limit
                 
                 # Get client information
-                conn = get_db_connection()
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM clients WHERE id = ?", (client_id,))
-                client_row = cursor.fetchone()
-                conn.close()
+                client = get_client(client_id)
                 
-                if client_row:
-                    client = dict(client_row)
-                    
+                if client:
                     # Check scan limits
                     current_scans = get_client_total_scans(client_id)
                     scan_limit = get_client_scan_limit(client)
@@ -88,35 +88,17 @@ def scanner_embed(scanner_uid):
             logging.info(f"Universal mode explicitly requested for {scanner_uid}")
             return redirect(url_for('universal_scanner.universal_scanner_view', scanner_uid=scanner_uid))
             
-        # Get scanner data from database to provide branding
-        from client_db import get_db_connection
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT s.*, c.business_name,
-               COALESCE(s.primary_color, cu.primary_color, '#02054c') as final_primary_color,
-               COALESCE(s.secondary_color, cu.secondary_color, '#35a310') as final_secondary_color,
-               COALESCE(s.button_color, cu.button_color, '#28a745') as final_button_color,
-               COALESCE(s.font_family, cu.font_family, 'Inter') as final_font_family,
-               COALESCE(s.color_style, cu.color_style, 'gradient') as final_color_style,
-               COALESCE(s.logo_url, cu.logo_path, '') as final_logo_url,
-               COALESCE(s.email_subject, cu.email_subject, 'Your Security Scan Report') as final_email_subject,
-               COALESCE(s.email_intro, cu.email_intro, '') as final_email_intro,
-               cu.scanner_description, cu.cta_button_text, cu.company_tagline, 
-               cu.support_email, cu.custom_footer_text, cu.favicon_path
-        FROM scanners s 
-        JOIN clients c ON s.client_id = c.id 
-        LEFT JOIN customizations cu ON c.id = cu.client_id
-        WHERE s.scanner_id = ?
-        ''', (scanner_uid,))
-        
-        scanner_row = cursor.fetchone()
-        conn.close()
-        
-        if scanner_row:
-            # Convert to dict for easier access
-            scanner_data = dict(scanner_row) if hasattr(scanner_row, 'keys') else dict(zip([col[0] for col in cursor.description], scanner_row))
+        # Scanner branding comes from the tenant config cache
+        from tenant_config import get_scanner
+        from http_cache import ASSET_VERSION, finish, make_etag, not_modified
+        scanner_data = get_scanner(scanner_uid)
+        
+        if scanner_data:
+            # The page only changes with the tenant's config or a deploy
+            etag = make_etag('embed', scanner_uid, scanner_data['config_version'], ASSET_VERSION, request.query_string)
+            cached = not_modified(etag)
+            if cached:
+                return cached
             
             # Create client branding object using COALESCED final values
             client_branding = {
@@ -148,24 +130,24 @@ def scanner_embed(scanner_uid):
             # Add universal scanner option in the template context
             universal_scanner_url = url_for('universal_scanner.universal_scanner_view', scanner_uid=scanner_uid)
             
-            return render_template('scan.html', 
+            return finish(render_template('scan.html', 
                                  client_branding=client_branding,
                                  scanner_uid=scanner_uid,
                                  scanner_id=scanner_uid,  # Add this for the form
                                  client_id=scanner_data.get('client_id'),  # Add this for the form
                                  is_embedded=True,
                                  embed_url_params=embed_url_params,
-                                 universal_scanner_url=universal_scanner_url)
+                                 universal_scanner_url=universal_scanner_url), etag)
         else:
             # Fallback for scanners without branding data
             universal_scanner_url = url_for('universal_scanner.universal_scanner_view', scanner_uid=scanner_uid)
-            return render_template('scan.html', 
+            return finish(render_template('scan.html', 
                                  client_branding=None,
                                  scanner_uid=scanner_uid,
                                  scanner_id=scanner_uid,  # Add this for the form
                                  is_embedded=True,
                                  embed_url_params=f"?scanner_id={scanner_uid}",
-                                 universal_scanner_url=universal_scanner_url)
+                                 universal_scanner_url=universal_scanner_url))
     
     except Exception as e:
         logging.error(f"Error serving scanner embed: {e}")
@@ -183,26 +165,23 @@ def scanner_embed(scanner_uid):
 def scanner_styles(scanner_uid):
     """Serve dynamic CSS for scanner customization"""
     try:
-        # Get scanner branding from database
-        from client_db import get_db_connection
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-        SELECT cu.primary_color, cu.secondary_color, cu.button_color
-        FROM scanners s 
-        JOIN clients c ON s.client_id = c.id 
-        LEFT JOIN customizations cu ON c.id = cu.client_id
-        WHERE s.scanner_id = ?
-        ''', (scanner_uid,))
-        
-        branding_row = cursor.fetchone()
-        conn.close()
-        
-        if branding_row:
-            primary_color = branding_row[0] or '#02054c'
-            secondary_color = branding_row[1] or '#35a310'  
-            button_color = branding_row[2] or primary_color
+        # Get scanner branding from the tenant config cache
+        from tenant_config import get_scanner
+        from http_cache import asset_version, finish, make_etag, not_modified, versioned_max_age
+        scanner_data = get_scanner(scanner_uid)
+        
+        # ?v= links for the current branding are cached as immutable
+        version = asset_version(scanner_data['config_version'] if scanner_data else 0)
+        max_age, immutable = versioned_max_age(version)
+        etag = make_etag('styles', scanner_uid, version)
+        cached = not_modified(etag, max_age, immutable)
+        if cached:
+            return cached
+        
+        if scanner_data:
+            primary_color = scanner_data['custom_primary_color'] or '#02054c'
+            secondary_color = scanner_data['custom_secondary_color'] or '#35a310'  
+            button_color = scanner_data['custom_button_color'] or primary_color
         else:
             primary_color = '#02054c'
             secondary_color = '#35a310'
@@ -239,9 +218,7 @@ def scanner_styles(scanner_uid):
         }}
         """
         
-        response = Response(css_content, mimetype='text/css')
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        return response
+        return finish(Response(css_content, mimetype='text/css'), etag, max_age, immutable)
         
     except Exception as e:
         logging.error(f"Error serving scanner styles: {e}")
@@ -252,6 +229,14 @@ def scanner_styles(scanner_uid):
 def scanner_script(scanner_uid):
     """Serve dynamic JavaScript for scanner functionality"""
     try:
+        from http_cache import asset_version, finish, make_etag, not_modified, versioned_max_age
+        version = asset_version()
+        max_age, immutable = versioned_max_age(version)
+        etag = make_etag('script', scanner_uid, version)
+        cached = not_modified(etag, max_age, immutable)
+        if cached:
+            return cached
+        
         js_content = f"""
         /* Dynamic Scanner JavaScript */
         console.log('Scanner {scanner_uid} initialized');
@@ -263,9 +248,7 @@ def scanner_script(scanner_uid):
         }});
         """
         
-        response = Response(js_content, mimetype='application/javascript')
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        return response
+        return finish(Response(js_content, mimetype='application/javascript'), etag, max_age, immutable)
         
     except Exception as e:
         logging.error(f"Error serving scanner script: {e}")
@@ -364,29 +347,30 @@ def api_scanner_scan(scanner_uid):
         
         api_key = auth_header.replace('Bearer ', '')
         
-        # Verify scanner and API key
-        from client_db import get_db_connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name, client_id FROM scanners WHERE scanner_id = ? AND api_key = ?', 
-                      (scanner_uid, api_key))
-        scanner = cursor.fetchone()
+        # Turn away floods from one address before looking up the key
+        from rate_limit import enforce, ip_bucket, scanner_bucket
+        limited = enforce([ip_bucket(request.remote_addr, 'api')])
+        if limited:
+            return limited
+        
+        # Verify scanner and API key (cached per worker)
+        from api_key_cache import get_scanner
+        scanner, client = get_scanner(scanner_uid, api_key)
         
         if not scanner:
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Invalid scanner or API key'}), 401
         
+        limited = enforce([scanner_bucket(scanner_uid, client)])
+        if limited:
+            return limited
+        # Counted in the health sampler's active scans until the request ends
+        from health_sampler import scan_started
+        scan_started()
+        
         # Check scan limits for the client
-        client_id = scanner[2]  # client_id is the third column
+        client_id = scanner['client_id']
         try:
-            # Get client information
-            cursor.execute("SELECT * FROM clients WHERE id = ?", (client_id,))
-            client_row = cursor.fetchone()
-            
-            if client_row:
-                # Convert to dict for easier access
-                client = dict(zip([col[0] for col in cursor.description], client_row))
-                
+            if client:
                 # Check scan limits
                 from client import get_client_total_scans, get_client_scan_limit
                 
@@ -394,7 +378,6 @@ def api_scanner_scan(scanner_uid):
                 scan_limit = get_client_scan_limit(client)
                 
                 if current_scans >= scan_limit:
-                    conn.close()
                     logging.warning(f"API scan blocked: Client {client_id} has reached scan limit: {current_scans}/{scan_limit}")
                     return jsonify({
                         'status': 'error', 
@@ -429,13 +412,15 @@ def api_scanner_scan(scanner_uid):
             return jsonify({'status': 'error', 'message': 'Unable to process request data'}), 400
         
         if not scan_data or not scan_data.get('target_url') or not scan_data.get('contact_email'):
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Missing required fields: target_url, contact_email'}), 400
         
         # Generate scan ID
         scan_id = f"scan_{uuid.uuid4().hex[:12]}"
         
         # Store scan in database (create table if not exists)
+        from client_db import get_db_connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
         try:
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS scan_history (
@@ -503,8 +488,8 @@ def api_scanner_scan(scanner_uid):
                 })
             }
             
-            save_scan_to_client_db(scanner[2], enhanced_scan_data)  # scanner[2] is client_id
-            logging.info(f"Saved API scan to client-specific database: client_id={scanner[2]}, scanner_id={scanner_uid}")
+            save_scan_to_client_db(client_id, enhanced_scan_data)
+            logging.info(f"Saved API scan to client-specific database: client_id={client_id}, scanner_id={scanner_uid}")
             
         except Exception as client_db_error:
             logging.error(f"Error saving API scan to client-specific database: {client_db_error}")
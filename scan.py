@@ -1838,571 +1838,13 @@ def generate_threat_scenario(scan_results):
     return threats
 
 def generate_html_report(scan_results, is_integrated=False, output_dir=None):
-    """Generate an HTML report from scan results"""
+    """Generate an HTML report from scan results, cached per finished scan"""
+    import report_cache
     try:
-        # Start HTML document
-        html = """
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Security Scan Report</title>
-            <style>
-                body {
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    margin: 0;
-                    padding: 20px;
-                    color: #333;
-                    background-color: #f9f9f9;
-                }
-                .container {
-                    max-width: 1000px;
-                    margin: 0 auto;
-                    background: white;
-                    padding: 30px;
-                    box-shadow: 0 0 10px rgba(0,0,0,0.1);
-                }
-                .header {
-                    background-color: #2c3e50;
-                    color: white;
-                    padding: 20px;
-                    text-align: center;
-                    margin-bottom: 20px;
-                    border-radius: 5px;
-                }
-                .logo {
-                    max-width: 200px;
-                    margin: 0 auto 20px auto;
-                    display: block;
-                }
-                h1 {
-                    margin: 0;
-                    font-size: 24px;
-                }
-                h2 {
-                    color: #2c3e50;
-                    border-bottom: 2px solid #eee;
-                    padding-bottom: 10px;
-                    margin-top: 30px;
-                }
-                h3 {
-                    color: #3498db;
-                    margin-top: 20px;
-                }
-                table {
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 20px 0;
-                }
-                th, td {
-                    padding: 12px 15px;
-                    text-align: left;
-                    border-bottom: 1px solid #ddd;
-                }
-                th {
-                    background-color: #f2f2f2;
-                }
-                tr:hover {
-                    background-color: #f5f5f5;
-                }
-                .severity {
-                    font-weight: bold;
-                    padding: 5px 10px;
-                    border-radius: 4px;
-                    display: inline-block;
-                }
-                .Critical {
-                    background-color: #ff4d4d;
-                    color: white;
-                }
-                .High {
-                    background-color: #ff9933;
-                    color: white;
-                }
-                .Medium {
-                    background-color: #ffcc00;
-                    color: #333;
-                }
-                .Low {
-                    background-color: #92d36e;
-                    color: #333;
-                }
-                .Info {
-                    background-color: #3498db;
-                    color: white;
-                }
-                .summary {
-                    background-color: #f8f9fa;
-                    padding: 20px;
-                    border-radius: 5px;
-                    margin: 20px 0;
-                }
-                .score-container {
-                    text-align: center;
-                    margin: 30px 0;
-                }
-                .score {
-                    font-size: 64px;
-                    font-weight: bold;
-                    line-height: 1;
-                }
-                .recommendation {
-                    background-color: #e8f4fc;
-                    padding: 15px;
-                    border-left: 5px solid #3498db;
-                    margin: 10px 0;
-                }
-                .threat {
-                    background-color: #fff3e0;
-                    padding: 15px;
-                    border-left: 5px solid #ff9800;
-                    margin: 10px 0;
-                }
-                .footer {
-                    margin-top: 50px;
-                    text-align: center;
-                    color: #777;
-                    font-size: 14px;
-                }
-                
-                /* Improved gauge style for score visualization */
-                .score-gauge {
-                    width: 200px;
-                    height: 200px;
-                    margin: 0 auto;
-                    position: relative;
-                }
-                .gauge {
-                    width: 100%;
-                    height: 100%;
-                }
-                .gauge-background {
-                    fill: none;
-                    stroke: #e6e6e6;
-                    transform: rotate(135deg);
-                    transform-origin: center;
-                    stroke-dasharray: 339 339;
-                }
-                .gauge-value {
-                    fill: none;
-                    transform: rotate(135deg);
-                    transform-origin: center;
-                    transition: stroke-dasharray 1s ease;
-                }
-                .gauge-text {
-                    font-size: 24px;
-                    font-weight: bold;
-                    dominant-baseline: middle;
-                    text-anchor: middle;
-                }
-                
-                /* Industry comparison styles */
-                .industry-comparison {
-                    margin-top: 30px;
-                    padding: 20px;
-                    background-color: #f8f9fa;
-                    border-radius: 8px;
-                }
-                .comparison-meter {
-                    position: relative;
-                    height: 60px;
-                    margin: 30px 0;
-                }
-                .meter-scale {
-                    display: flex;
-                    justify-content: space-between;
-                    margin-bottom: 5px;
-                }
-                .meter-track {
-                    height: 8px;
-                    background: linear-gradient(to right, #dc3545, #ffc107, #28a745);
-                    border-radius: 4px;
-                    position: relative;
-                }
-                .industry-avg-marker, .your-score-marker {
-                    position: absolute;
-                    transform: translateX(-50%);
-                }
-                .marker-line {
-                    height: 16px;
-                    width: 2px;
-                    background-color: #333;
-                    margin: 0 auto;
-                }
-                .marker-label {
-                    font-size: 12px;
-                    white-space: nowrap;
-                    position: absolute;
-                    left: 50%;
-                    transform: translateX(-50%);
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>Comprehensive Security Scan Report</h1>
-                    <p>Generated on """ + datetime.now().strftime("%Y-%m-%d at %H:%M:%S") + """</p>
-                </div>
-                
-                <div class="summary">
-                    <h2>Executive Summary</h2>
-        """
-        
-        # Add risk score if available
-        if 'risk_assessment' in scan_results and 'overall_score' in scan_results['risk_assessment']:
-            risk_score = scan_results['risk_assessment']['overall_score']
-            risk_level = scan_results['risk_assessment']['risk_level']
-            color = scan_results['risk_assessment'].get('color', '#92d36e')  # Default to green if no color
-            
-            # Add the improved gauge visualization
-            html += f"""
-                <div class="score-container">
-                    <div class="score-gauge">
-                        <svg viewBox="0 0 120 120" class="gauge">
-                            <circle class="gauge-background" r="54" cx="60" cy="60" stroke-width="12"></circle>
-                            <circle class="gauge-value" r="54" cx="60" cy="60" stroke-width="12" 
-                                    style="stroke: {color}; 
-                                          stroke-dasharray: {risk_score * 3.39} 339;"></circle>
-                            <text class="gauge-text" x="60" y="60" text-anchor="middle" alignment-baseline="middle"
-                                  style="fill: {color};">
-                                {risk_score}
-                            </text>
-                        </svg>
-                        <div class="score-label">{risk_level} Risk</div>
-                    </div>
-                </div>
-            """
-            
-            # Add industry benchmarking if available
-            if 'industry' in scan_results and scan_results['industry'].get('benchmarks'):
-                benchmarks = scan_results['industry']['benchmarks']
-                industry_name = scan_results['industry'].get('name', 'Your Industry')
-                
-                html += f"""
-                <div class="industry-comparison">
-                    <h3>{industry_name} Comparison</h3>
-                    <p>{benchmarks['message']}</p>
-                    
-                    <div class="comparison-meter">
-                        <div class="meter-scale">
-                            <span>0</span>
-                            <span>25</span>
-                            <span>50</span>
-                            <span>75</span>
-                            <span>100</span>
-                        </div>
-                        <div class="meter-track">
-                            <!-- Industry average marker -->
-                            <div class="industry-avg-marker" style="left: {benchmarks['avg_score']}%;">
-                                <div class="marker-line"></div>
-                                <div class="marker-label">Industry Average</div>
-                            </div>
-                            
-                            <!-- Your score marker -->
-                            <div class="your-score-marker" style="left: {risk_score}%;">
-                                <div class="marker-line"></div>
-                                <div class="marker-label">Your Score</div>
-                            </div>
-                        </div>
-                    </div>
-                    
-                    <div class="standing-badge">
-                        <p>Your Standing: <strong>{benchmarks['standing']}</strong></p>
-                    </div>
-                    
-                    <div class="row">
-                        <div>
-                            <h4>Recommended Compliance Standards</h4>
-                            <ul>
-                """
-                
-                # Add compliance standards
-                for compliance in benchmarks.get('key_compliance', []):
-                    html += f"<li>{compliance}</li>\n"
-                
-                html += """
-                            </ul>
-                        </div>
-                    </div>
-                </div>
-                """
-        
-        # Add scan scope information
-        html += """
-                    <p><strong>Scan Type:</strong> Comprehensive Security Assessment</p>
-        """
-        
-        if 'target' in scan_results:
-            target = scan_results['target']
-            html += f"""
-                    <p><strong>Target:</strong> {target}</p>
-            """
-        
-        html += """
-                </div>
-                
-                <h2>Key Findings</h2>
-        """
-        
-        # Build a list of key findings
-        key_findings = []
-        
-        # Email security findings
-        if 'email_security' in scan_results:
-            email_sec = scan_results['email_security']
-            if 'error' not in email_sec:
-                for protocol in ['spf', 'dmarc', 'dkim']:
-                    if protocol in email_sec and email_sec[protocol]['severity'] in ['High', 'Critical']:
-                        status = email_sec[protocol]['status'] if 'status' in email_sec[protocol] else f"Issue with {protocol.upper()}"
-                        key_findings.append({
-                            'category': 'Email Security',
-                            'finding': status,
-                            'severity': email_sec[protocol]['severity']
-                        })
-        
-        # Web security findings
-        if 'ssl_certificate' in scan_results and 'error' not in scan_results['ssl_certificate']:
-            if scan_results['ssl_certificate']['severity'] in ['High', 'Critical']:
-                key_findings.append({
-                    'category': 'Web Security',
-                    'finding': scan_results['ssl_certificate']['status'],
-                    'severity': scan_results['ssl_certificate']['severity']
-                })
-        
-        if 'security_headers' in scan_results and 'error' not in scan_results['security_headers']:
-            if scan_results['security_headers']['severity'] in ['High', 'Critical']:
-                key_findings.append({
-                    'category': 'Web Security',
-                    'finding': f"Missing important security headers (Score: {scan_results['security_headers']['score']}/100)",
-                    'severity': scan_results['security_headers']['severity']
-                })
-        
-        if 'cms' in scan_results and 'error' not in scan_results['cms']:
-            if scan_results['cms']['severity'] in ['High', 'Critical'] and scan_results['cms']['cms_detected']:
-                vulnerabilities = scan_results['cms'].get('potential_vulnerabilities', [])
-                if vulnerabilities:
-                    key_findings.append({
-                        'category': 'Web Application',
-                        'finding': f"Vulnerable {scan_results['cms']['cms_name']} installation detected",
-                        'severity': scan_results['cms']['severity']
-                    })
-        
-        if 'sensitive_content' in scan_results and 'error' not in scan_results['sensitive_content']:
-            if scan_results['sensitive_content']['severity'] in ['High', 'Critical']:
-                paths = scan_results['sensitive_content'].get('paths', [])
-                path_count = len(paths)
-                key_findings.append({
-                    'category': 'Web Content',
-                    'finding': f"Exposed sensitive content ({path_count} paths discovered)",
-                    'severity': scan_results['sensitive_content']['severity']
-                })
-        
-        # Network findings
-        if 'network' in scan_results and 'open_ports' in scan_results['network']:
-            if scan_results['network']['open_ports']['severity'] in ['High', 'Critical']:
-                key_findings.append({
-                    'category': 'Network Security',
-                    'finding': f"Excessive open ports detected ({scan_results['network']['open_ports']['count']} ports)",
-                    'severity': scan_results['network']['open_ports']['severity']
-                })
-        
-        # System findings
-        if 'system' in scan_results:
-            if 'os_updates' in scan_results['system'] and scan_results['system']['os_updates']['severity'] in ['High', 'Critical']:
-                key_findings.append({
-                    'category': 'System Security',
-                    'finding': scan_results['system']['os_updates']['message'],
-                    'severity': scan_results['system']['os_updates']['severity']
-                })
-            
-            if 'firewall' in scan_results['system'] and scan_results['system']['firewall']['severity'] in ['High', 'Critical']:
-                key_findings.append({
-                    'category': 'System Security',
-                    'finding': scan_results['system']['firewall']['status'],
-                    'severity': scan_results['system']['firewall']['severity']
-                })
-        
-        # If we have key findings, add them to the report
-        if key_findings:
-            html += """
-                <table>
-                    <tr>
-                        <th>Category</th>
-                        <th>Finding</th>
-                        <th>Severity</th>
-                    </tr>
-            """
-            
-            # Sort findings by severity (Critical first, then High, etc.)
-            severity_order = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3, "Info": 4}
-            key_findings.sort(key=lambda x: severity_order.get(x['severity'], 999))
-            
-            for finding in key_findings:
-                html += f"""
-                    <tr>
-                        <td>{finding['category']}</td>
-                        <td>{finding['finding']}</td>
-                        <td><span class="severity {finding['severity']}">{finding['severity']}</span></td>
-                    </tr>
-                """
-            
-            html += """
-                </table>
-            """
-        else:
-            html += """
-                <p>No critical security issues were detected in this scan. Continue to monitor and maintain your security posture.</p>
-            """
-        
-        # Add detailed sections
-        
-        # Email Security Section
-        if 'email_security' in scan_results:
-            html += """
-                <h2>Email Security Assessment</h2>
-                <table>
-                    <tr>
-                        <th>Protocol</th>
-                        <th>Status</th>
-                        <th>Severity</th>
-                    </tr>
-            """
-            
-            email_sec = scan_results['email_security']
-            if 'error' not in email_sec:
-                for protocol in ['spf', 'dmarc', 'dkim']:
-                    if protocol in email_sec:
-                        status = email_sec[protocol]['status'] if 'status' in email_sec[protocol] else "Unknown"
-                        severity = email_sec[protocol]['severity'] if 'severity' in email_sec[protocol] else "Info"
-                        html += f"""
-                            <tr>
-                                <td>{protocol.upper()}</td>
-                                <td>{status}</td>
-                                <td><span class="severity {severity}">{severity}</span></td>
-                            </tr>
-                        """
-            
-            html += """
-                </table>
-            """
-        
-        # SSL/TLS Section
-        if 'ssl_certificate' in scan_results and 'error' not in scan_results['ssl_certificate']:
-            html += """
-                <h2>SSL/TLS Certificate Analysis</h2>
-                <table>
-                    <tr>
-                        <th>Attribute</th>
-                        <th>Value</th>
-                    </tr>
-            """
-            
-            ssl_cert = scan_results['ssl_certificate']
-            attributes = [
-                ('Status', 'status'),
-                ('Issuer', 'issuer'),
-                ('Subject', 'subject'),
-                ('Valid Until', 'valid_until'),
-                ('Days Remaining', 'days_remaining'),
-                ('Protocol Version', 'protocol_version')
-            ]
-            
-            for label, key in attributes:
-                if key in ssl_cert:
-                    html += f"""
-                        <tr>
-                            <td>{label}</td>
-                            <td>{ssl_cert[key]}</td>
-                        </tr>
-                    """
-            
-            # Add a severity row
-            html += f"""
-                <tr>
-                    <td>Severity</td>
-                    <td><span class="severity {ssl_cert.get('severity', 'Info')}">{ssl_cert.get('severity', 'Info')}</span></td>
-                </tr>
-            """
-            
-            html += """
-                </table>
-            """
-            
-        # Security Headers Section
-        if 'security_headers' in scan_results and 'error' not in scan_results['security_headers']:
-            html += """
-            <h2>Security Headers Assessment</h2>
-            <p>Security headers help protect your website from various attacks like XSS, clickjacking, and more.</p>
-            """
-            
-            try:
-                html += f"""
-                <div class="score-container">
-                <div style="font-size: 18px;">Security Headers Score</div>
-                <div class="score" style="font-size: 48px;">{scan_results['security_headers']['score']}/100</div>
-                </div>
-                """
-            except Exception as e:
-                # Add error handling here
-                logging.error(f"Error formatting security headers score: {e}")
-                html += """
-                <div class="score-container">
-                <div style="font-size: 18px;">Security Headers Score</div>
-                <div class="score" style="font-size: 48px;">N/A</div>
-                </div>
-                """
-                
-        # Add recommendations section
-        if 'recommendations' in scan_results:
-            html += """
-                <h2>Recommendations</h2>
-            """
-            
-            for recommendation in scan_results['recommendations']:
-                html += f"""
-                    <div class="recommendation">
-                        <p>{recommendation}</p>
-                    </div>
-                """
-        
-         # Add threat scenarios section
-        if 'threat_scenarios' in scan_results:
-            html += """
-                <h2>Potential Threat Scenarios</h2>
-                <p>Based on the security scan results, these are potential threats that could affect your systems:</p>
-            """
-    
-            for threat in scan_results.get('threat_scenarios', []):
-                name = threat.get('name', 'Unknown Threat')
-                description = threat.get('description', 'No description provided')
-                impact = threat.get('impact', 'Unknown')
-                likelihood = threat.get('likelihood', 'Unknown')
-        
-                html += f"""
-                    <div class="threat">
-                        <h3>{name}</h3>
-                        <p>{description}</p>
-                        <p><strong>Impact:</strong> {impact} | <strong>Likelihood:</strong> {likelihood}</p>
-                    </div>
-                """
-        
-                # Add footer
-                html += """
-                        <div class="footer">
-                            <p>This report was generated automatically and is intended for informational purposes only.</p>
-                            <p>For a comprehensive security assessment, contact a cybersecurity professional.</p>
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
-        
-        return html
+        return report_cache.get_or_render(
+            scan_results.get('scan_id'), 'html', 0, lambda: _render_html_report(scan_results)
+        )
     except Exception as e:
-        logging.error(f"Error generating HTML report: {e}")
         # Return a simple error report if HTML generation fails
         return f"""
         <!DOCTYPE html>
@@ -2415,6 +1857,103 @@ def generate_html_report(scan_results, is_integrated=False, output_dir=None):
         </body>
         </html>
         """
+
+def _key_findings(scan_results):
+    """High and critical findings for the report summary, most severe first"""
+    key_findings = []
+    
+    # Email security findings
+    if 'email_security' in scan_results:
+        email_sec = scan_results['email_security']
+        if 'error' not in email_sec:
+            for protocol in ['spf', 'dmarc', 'dkim']:
+                if protocol in email_sec and email_sec[protocol]['severity'] in ['High', 'Critical']:
+                    status = email_sec[protocol]['status'] if 'status' in email_sec[protocol] else f"Issue with {protocol.upper()}"
+                    key_findings.append({
+                        'category': 'Email Security',
+                        'finding': status,
+                        'severity': email_sec[protocol]['severity']
+                    })
+
+    # Web security findings
+    if 'ssl_certificate' in scan_results and 'error' not in scan_results['ssl_certificate']:
+        if scan_results['ssl_certificate']['severity'] in ['High', 'Critical']:
+            key_findings.append({
+                'category': 'Web Security',
+                'finding': scan_results['ssl_certificate']['status'],
+                'severity': scan_results['ssl_certificate']['severity']
+            })
+
+    if 'security_headers' in scan_results and 'error' not in scan_results['security_headers']:
+        if scan_results['security_headers']['severity'] in ['High', 'Critical']:
+            key_findings.append({
+                'category': 'Web Security',
+                'finding': f"Missing important security headers (Score: {scan_results['security_headers']['score']}/100)",
+                'severity': scan_results['security_headers']['severity']
+            })
+
+    if 'cms' in scan_results and 'error' not in scan_results['cms']:
+        if scan_results['cms']['severity'] in ['High', 'Critical'] and scan_results['cms']['cms_detected']:
+            vulnerabilities = scan_results['cms'].get('potential_vulnerabilities', [])
+            if vulnerabilities:
+                key_findings.append({
+                    'category': 'Web Application',
+                    'finding': f"Vulnerable {scan_results['cms']['cms_name']} installation detected",
+                    'severity': scan_results['cms']['severity']
+                })
+
+    if 'sensitive_content' in scan_results and 'error' not in scan_results['sensitive_content']:
+        if scan_results['sensitive_content']['severity'] in ['High', 'Critical']:
+            paths = scan_results['sensitive_content'].get('paths', [])
+            path_count = len(paths)
+            key_findings.append({
+                'category': 'Web Content',
+                'finding': f"Exposed sensitive content ({path_count} paths discovered)",
+                'severity': scan_results['sensitive_content']['severity']
+            })
+
+    # Network findings
+    if 'network' in scan_results and 'open_ports' in scan_results['network']:
+        if scan_results['network']['open_ports']['severity'] in ['High', 'Critical']:
+            key_findings.append({
+                'category': 'Network Security',
+                'finding': f"Excessive open ports detected ({scan_results['network']['open_ports']['count']} ports)",
+                'severity': scan_results['network']['open_ports']['severity']
+            })
+
+    # System findings
+    if 'system' in scan_results:
+        if 'os_updates' in scan_results['system'] and scan_results['system']['os_updates']['severity'] in ['High', 'Critical']:
+            key_findings.append({
+                'category': 'System Security',
+                'finding': scan_results['system']['os_updates']['message'],
+                'severity': scan_results['system']['os_updates']['severity']
+            })
+
+        if 'firewall' in scan_results['system'] and scan_results['system']['firewall']['severity'] in ['High', 'Critical']:
+            key_findings.append({
+                'category': 'System Security',
+                'finding': scan_results['system']['firewall']['status'],
+                'severity': scan_results['system']['firewall']['severity']
+            })
+    
+    # Sort findings by severity (Critical first, then High, etc.)
+    severity_order = {"Critical": 0, "High": 1, "Medium": 2, "Low": 3, "Info": 4}
+    key_findings.sort(key=lambda x: severity_order.get(x['severity'], 999))
+    return key_findings
+
+def _render_html_report(scan_results):
+    """Render the report template (templates/reports/scan_report.html)"""
+    import report_templates
+    try:
+        return report_templates.render(
+            'reports/scan_report.html',
+            scan=scan_results,
+            key_findings=_key_findings(scan_results)
+        )
+    except Exception as e:
+        logging.error(f"Error generating HTML report: {e}")
+        raise
         
 # Make all functions available when importing the module
 __all__ = [
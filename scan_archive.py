@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Retention and archival for client scan databases.
+
+Scans older than SCAN_RETENTION_DAYS have their full JSON payload moved to a
+per-month archive database next to the client database
+(client_databases/archive/client_<id>_scans_<YYYYMM>.db). The row stays in
+the hot scans table as a slim summary with scan_results cleared and
+archived_month set, so listings, counts and search are unchanged and the
+hot table, its indexes and its backups stay small.
+
+hydrate_scan() puts the archived payload back when an old report is opened.
+Freed pages are returned to the filesystem with incremental VACUUM, which
+the client schema enables. A database created before that is converted by
+its first retention run with one full VACUUM.
+
+The retention job first runs RETENTION_START_DELAY seconds after a worker
+starts, so importing the app (scripts, tests, a deploy) never archives.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from migrations import CLIENT_DB_DIR, CLIENT_SCANS_DB, ensure_schema
+from time_buckets import to_epoch
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = int(os.environ.get('SCAN_RETENTION_DAYS', '180'))
+ARCHIVE_INTERVAL = int(os.environ.get('SCAN_ARCHIVE_INTERVAL', str(24 * 3600)))
+RETENTION_START_DELAY = int(os.environ.get('SCAN_RETENTION_START_DELAY', '900'))
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_path(db_path, month):
+    """Archive database holding one month of payloads for a client database"""
+    directory, filename = os.path.split(db_path)
+    base = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'archive', f'{base}_{month}.db')
+
+
+def _connect_archive(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=20.0)
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS archived_scans (
+        scan_id TEXT PRIMARY KEY,
+        scan_results TEXT,
+        created_at TEXT,
+        archived_at TEXT NOT NULL
+    )
+    ''')
+    return conn
+
+
+def archive_database(db_path, older_than_days=None, schema_kind=CLIENT_SCANS_DB):
+    """
+    Move payloads of scans older than the retention age into monthly archives.
+
+    The archive is committed before the hot rows are slimmed, so an
+    interrupted run only leaves payloads that the next run archives again.
+    Works on any scan database layout; archives sit next to db_path.
+
+    Returns:
+        dict: Number of scans archived and the months touched
+    """
+    days = RETENTION_DAYS if older_than_days is None else older_than_days
+    cutoff = to_epoch(datetime.now() - timedelta(days=days))
+    ensure_schema(db_path, schema_kind)
+
+    archived = 0
+    months = set()
+    conn = sqlite3.connect(db_path, timeout=20.0)
+    try:
+        while True:
+            rows = conn.execute('''
+                SELECT scan_id, scan_results, created_at, month_bucket FROM scans
+                WHERE epoch < ? AND archived_month IS NULL AND scan_results IS NOT NULL
+                LIMIT ?
+            ''', (cutoff, ARCHIVE_BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+
+            by_month = {}
+            for scan_id, scan_results, created_at, month in rows:
+                by_month.setdefault(month or 0, []).append((scan_id, scan_results, created_at))
+
+            now = datetime.now().isoformat()
+            for month, scans in by_month.items():
+                archive_conn = _connect_archive(archive_path(db_path, month))
+                try:
+                    archive_conn.executemany(
+                        'INSERT OR REPLACE INTO archived_scans (scan_id, scan_results, created_at, archived_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        [scan + (now,) for scan in scans]
+                    )
+                    archive_conn.commit()
+                finally:
+                    archive_conn.close()
+
+                conn.executemany(
+                    'UPDATE scans SET scan_results = NULL, archived_month = ? WHERE scan_id = ?',
+                    [(month, scan[0]) for scan in scans]
+                )
+                conn.commit()
+                archived += len(scans)
+                months.add(month)
+
+        if archived:
+            logger.info(f"Archived {archived} scans from {os.path.basename(db_path)} into {len(months)} month(s)")
+        return {'archived': archived, 'months': sorted(months)}
+    finally:
+        conn.close()
+
+
+def hydrate_scan(db_path, scan):
+    """
+    Restore an archived scan's payload in place.
+
+    Args:
+        db_path (str): Hot client database the row came from
+        scan (dict): Row from the scans table
+
+    Returns:
+        dict: The same scan, with scan_results and parsed_results filled in
+    """
+    month = scan.get('archived_month')
+    if not month or scan.get('scan_results'):
+        return scan
+
+    path = archive_path(db_path, month)
+    if not os.path.exists(path):
+        logger.warning(f"Archive {path} missing for scan {scan.get('scan_id')}")
+        return scan
+
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute('SELECT scan_results FROM archived_scans WHERE scan_id = ?',
+                           (scan.get('scan_id'),)).fetchone()
+    finally:
+        conn.close()
+
+    if row and row[0]:
+        scan['scan_results'] = row[0]
+        try:
+            scan['parsed_results'] = json.loads(row[0])
+        except (TypeError, ValueError):
+            scan['parsed_results'] = {}
+    return scan
+
+
+def vacuum_database(db_path):
+    """
+    Return free pages to the filesystem with incremental VACUUM.
+
+    A database not yet in incremental auto-vacuum mode is switched over
+    with a full VACUUM, once.
+
+    Returns:
+        int: Pages released
+    """
+    conn = sqlite3.connect(db_path, timeout=20.0)
+    try:
+        before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            logger.info(f"Converting {os.path.basename(db_path)} to incremental auto-vacuum")
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            return before
+        conn.execute('PRAGMA incremental_vacuum')
+        conn.commit()
+        after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return before - after
+    finally:
+        conn.close()
+
+
+def _file_size(path):
+    size = 0
+    for suffix in ('', '-wal'):
+        if os.path.exists(path + suffix):
+            size += os.path.getsize(path + suffix)
+    return size
+
+
+def tenant_storage_report(client_db_dir=CLIENT_DB_DIR):
+    """
+    Disk usage per tenant, split into hot and archived data.
+
+    Returns:
+        list: One dict per client database, largest first
+    """
+    report = []
+    if not os.path.exists(client_db_dir):
+        return report
+
+    for filename in sorted(os.listdir(client_db_dir)):
+        if not (filename.startswith('client_') and filename.endswith('_scans.db')):
+            continue
+        db_path = os.path.join(client_db_dir, filename)
+        base = os.path.splitext(filename)[0]
+        archive_dir = os.path.join(client_db_dir, 'archive')
+        archives = []
+        if os.path.exists(archive_dir):
+            archives = [name for name in os.listdir(archive_dir)
+                        if name.startswith(base + '_') and name.endswith('.db')]
+
+        entry = {
+            'client_id': filename.split('_')[1],
+            'database': filename,
+            'hot_bytes': _file_size(db_path),
+            'archive_bytes': sum(_file_size(os.path.join(archive_dir, name)) for name in archives),
+            'archive_months': len(archives),
+            'hot_scans': 0,
+            'archived_scans': 0,
+            'free_pages': 0
+        }
+        try:
+            ensure_schema(db_path, CLIENT_SCANS_DB)
+            conn = sqlite3.connect(db_path)
+            try:
+                entry['hot_scans'], entry['archived_scans'] = conn.execute(
+                    'SELECT COUNT(*), COUNT(archived_month) FROM scans').fetchone()
+                entry['free_pages'] = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"Could not read storage stats for {filename}: {e}")
+        entry['total_bytes'] = entry['hot_bytes'] + entry['archive_bytes']
+        report.append(entry)
+
+    report.sort(key=lambda entry: entry['total_bytes'], reverse=True)
+    return report
+
+
+def run_retention(store=None, older_than_days=None):
+    """
+    Archive old scans and vacuum every database of a scan store.
+
+    Returns:
+        dict: Totals for the run
+    """
+    if store is None:
+        from scan_storage import get_scan_store
+        store = get_scan_store()
+
+    totals = {'databases': 0, 'archived': 0, 'pages_freed': 0, 'failed': 0}
+    for db_path in store.databases():
+        try:
+            result = archive_database(db_path, older_than_days, store.schema_kind)
+            totals['archived'] += result['archived']
+            totals['pages_freed'] += vacuum_database(db_path)
+            totals['databases'] += 1
+        except Exception as e:
+            logger.error(f"Error running retention for {os.path.basename(db_path)}: {e}")
+            totals['failed'] += 1
+    return totals
+
+
+def start_retention_scheduler():
+    """Archive and vacuum once per SCAN_ARCHIVE_INTERVAL, shared across workers"""
+    from maintenance import start_periodic_task
+    start_periodic_task('scan_retention', ARCHIVE_INTERVAL, run_retention, first_delay=RETENTION_START_DELAY)
+
+
+if __name__ == "__main__":
+    print(json.dumps(run_retention(), indent=2))
+    print(json.dumps(tenant_storage_report(), indent=2))
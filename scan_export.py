@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV / NDJSON exports of a client's scans and leads.
+
+Rows are read from the tenant's store with fetchmany() in fixed-size chunks
+and encoded chunk by chunk, so an export of any size holds one chunk in
+memory and the header is sent before the first query step finishes. The
+client routes wrap export_stream() in a streaming Flask Response.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from scan_storage import get_scan_store
+from time_buckets import day_range_epochs
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+# Exportable columns per dataset; 'default' is used when no selection is given
+DATASETS = {
+    'scans': {
+        'table': 'scans',
+        'order': 'created_at, id',
+        'columns': [
+            'scan_id', 'scanner_id', 'timestamp', 'lead_name', 'lead_email', 'lead_phone',
+            'lead_company', 'company_size', 'target_domain', 'security_score', 'risk_level',
+            'scan_type', 'status', 'vulnerabilities_found', 'recommendations_count',
+            'created_at', 'scan_results'
+        ],
+        'default': [
+            'scan_id', 'scanner_id', 'timestamp', 'lead_name', 'lead_email', 'lead_company',
+            'target_domain', 'security_score', 'risk_level', 'created_at'
+        ]
+    },
+    'leads': {
+        'table': 'leads',
+        'order': 'id',
+        'columns': [
+            'email', 'name', 'phone', 'company', 'company_size', 'industry', 'first_scan_date',
+            'last_scan_date', 'total_scans', 'avg_security_score', 'lead_status', 'notes',
+            'created_at', 'updated_at'
+        ],
+        'default': [
+            'email', 'name', 'phone', 'company', 'first_scan_date', 'last_scan_date',
+            'total_scans', 'avg_security_score', 'lead_status'
+        ]
+    }
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+# Leading characters a spreadsheet treats as a formula when it opens a CSV
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def select_columns(dataset, requested=None):
+    """
+    Validate a comma-separated column selection against the dataset.
+
+    Returns:
+        list: Selected columns in the requested order (defaults if none given)
+
+    Raises:
+        ValueError: On an unknown dataset or column
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown export dataset '{dataset}'")
+    if not requested:
+        return list(DATASETS[dataset]['default'])
+    columns = [column.strip() for column in requested.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in DATASETS[dataset]['columns']]
+    if unknown:
+        raise ValueError(f"Unknown columns for {dataset}: {', '.join(unknown)}")
+    return columns
+
+
+def validate_dates(date_from=None, date_to=None):
+    """
+    Check export date bounds before any response is started.
+
+    Raises:
+        ValueError: If a bound is not a YYYY-MM-DD date or the range is reversed
+    """
+    parsed = []
+    for name, value in (('date_from', date_from), ('date_to', date_to)):
+        if not value:
+            parsed.append(None)
+            continue
+        try:
+            parsed.append(datetime.strptime(value[:10], '%Y-%m-%d'))
+        except ValueError:
+            raise ValueError(f"Invalid {name} '{value}', expected YYYY-MM-DD")
+    if parsed[0] and parsed[1] and parsed[0] > parsed[1]:
+        raise ValueError('date_from is after date_to')
+
+
+def _build_query(store, client_id, dataset, columns, date_from=None, date_to=None, scanner_id=None):
+    spec = DATASETS[dataset]
+    select = list(columns)
+    if dataset == 'scans' and 'scan_results' in columns:
+        # Needed to restore payloads moved to the monthly archives
+        select.append('archived_month')
+
+    condition, params = store.scope(client_id)
+    conditions = [condition] if condition else []
+    params = list(params)
+
+    if dataset == 'scans':
+        start_epoch, end_epoch = day_range_epochs(date_from, date_to)
+        if start_epoch is not None:
+            conditions.append('epoch >= ?')
+            params.append(start_epoch)
+        if end_epoch is not None:
+            conditions.append('epoch < ?')
+            params.append(end_epoch)
+        if scanner_id:
+            conditions.append('scanner_id = ?')
+            params.append(scanner_id)
+    else:
+        # Lead dates are ISO strings, so date-only bounds compare correctly
+        if date_from:
+            conditions.append('last_scan_date >= ?')
+            params.append(date_from[:10])
+        if date_to:
+            conditions.append('last_scan_date < ?')
+            params.append((datetime.fromisoformat(date_to[:10]) + timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f"SELECT {', '.join(select)} FROM {spec['table']} {where} ORDER BY {spec['order']}", params
+
+
+def iter_rows(client_id, dataset, columns, date_from=None, date_to=None, scanner_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield lists of row dicts, chunk_size rows at a time.
+
+    The connection stays open only while the generator is consumed and is
+    closed when it finishes or the client disconnects.
+    """
+    store = get_scan_store()
+    if not store.tenant_exists(client_id):
+        return
+
+    query, params = _build_query(store, client_id, dataset, columns, date_from, date_to, scanner_id)
+    db_path = store.db_path(client_id)
+    archives = {}
+    conn = store.connect(client_id)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = []
+            for row in rows:
+                record = dict(row)
+                month = record.pop('archived_month', None)
+                if month and not record.get('scan_results'):
+                    record['scan_results'] = _archived_payload(archives, db_path, month, record.get('scan_id'))
+                chunk.append(record)
+            yield chunk
+    except sqlite3.Error as e:
+        # Headers are already sent by now, so the export just ends early
+        logger.error(f"Error exporting {dataset} for client {client_id}: {e}")
+    finally:
+        conn.close()
+        for archive_conn in archives.values():
+            archive_conn.close()
+
+
+def _archived_payload(archives, db_path, month, scan_id):
+    """Fetch one archived payload, keeping one connection per archive month open for the export"""
+    from scan_archive import archive_path
+
+    if month not in archives:
+        path = archive_path(db_path, month)
+        if not os.path.exists(path):
+            return None
+        archives[month] = sqlite3.connect(path)
+    row = archives[month].execute('SELECT scan_results FROM archived_scans WHERE scan_id = ?', (scan_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _csv_cell(value):
+    """Text cell as a literal: lead fields come from the public scan form"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([[_csv_cell(row.get(column)) for column in columns] for row in chunk])
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, chunks):
+    for chunk in chunks:
+        lines = []
+        for row in chunk:
+            record = {column: row.get(column) for column in columns}
+            if record.get('scan_results'):
+                try:
+                    record['scan_results'] = json.loads(record['scan_results'])
+                except (TypeError, ValueError):
+                    pass
+            lines.append(json.dumps(record, default=str))
+        yield '\n'.join(lines) + '\n'
+
+
+def export_stream(client_id, dataset, fmt='csv', columns=None, date_from=None, date_to=None, scanner_id=None):
+    """
+    Generator of encoded export text for one client.
+
+    Args:
+        client_id (int): Tenant to export
+        dataset (str): 'scans' or 'leads'
+        fmt (str): 'csv' or 'ndjson'
+        columns (list): Columns from select_columns()
+        date_from, date_to (str): Inclusive YYYY-MM-DD bounds
+        scanner_id (str): Limit scans to one scanner
+
+    Raises:
+        ValueError: On an unknown format, dataset or column or a bad date,
+            before anything is streamed
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    validate_dates(date_from, date_to)
+    columns = columns or select_columns(dataset)
+    chunks = iter_rows(client_id, dataset, columns, date_from, date_to, scanner_id)
+    if fmt == 'csv':
+        return _csv_chunks(columns, chunks)
+    return _ndjson_chunks(columns, chunks)
+
+
+def export_filename(dataset, fmt, suffix=None):
+    parts = [dataset] + ([suffix] if suffix else []) + [datetime.now().strftime('%Y%m%d_%H%M%S')]
+    return f"{'_'.join(parts)}.{fmt}"
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Storage backends for client scan data.
+
+client_database_manager talks to a ScanStore instead of opening
+client_databases/client_<id>_scans.db directly. Two layouts are available:
+
+    per_client    one SQLite file per client (the original layout)
+    consolidated  one SQLite file for every client, partitioned by a
+                  client_id column with composite (client_id, ...) indexes
+
+The layout is chosen with SCAN_STORAGE_BACKEND. Both use the same scans and
+leads columns, so queries are written once and narrowed to a tenant with
+scope(). migrate_layout() copies data from one layout to the other, and
+benchmark_scan_storage.py compares them.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from migrations import (
+    CLIENT_DB_DIR, CLIENT_SCANS_DB, CONSOLIDATED_DB_PATH, CONSOLIDATED_SCANS_DB, ensure_schema
+)
+
+logger = logging.getLogger(__name__)
+
+SCAN_COLUMNS = [
+    'scan_id', 'scanner_id', 'timestamp', 'lead_name', 'lead_email', 'lead_phone',
+    'lead_company', 'company_size', 'target_domain', 'security_score', 'risk_level',
+    'scan_type', 'status', 'ip_address', 'user_agent', 'scan_duration',
+    'vulnerabilities_found', 'recommendations_count', 'scan_results', 'created_at', 'updated_at'
+]
+
+LEAD_COLUMNS = [
+    'email', 'name', 'phone', 'company', 'company_size', 'industry', 'first_scan_date',
+    'last_scan_date', 'total_scans', 'avg_security_score', 'lead_status', 'notes',
+    'created_at', 'updated_at'
+]
+
+
+class ScanStore:
+    """Interface every scan storage layout implements"""
+
+    name = None
+    schema_kind = None
+
+    def db_path(self, client_id):
+        """Database file holding a client's scans"""
+        raise NotImplementedError
+
+    def tenant_exists(self, client_id):
+        raise NotImplementedError
+
+    def create_tenant(self, client_id, business_name):
+        """Provision storage for a client. Returns the database path or None"""
+        raise NotImplementedError
+
+    def tenant_ids(self):
+        """Client IDs with provisioned storage"""
+        raise NotImplementedError
+
+    def tenant_name(self, client_id):
+        raise NotImplementedError
+
+    def databases(self):
+        """Every database file this store uses"""
+        raise NotImplementedError
+
+    def scope(self, client_id):
+        """
+        Condition restricting scans/leads queries to one client.
+
+        Returns:
+            tuple: (condition or None, params)
+        """
+        raise NotImplementedError
+
+    def tenant_values(self, client_id):
+        """Extra column values to include when inserting a client's rows"""
+        raise NotImplementedError
+
+    def cache_scope(self, client_id):
+        """Namespace for cached counts of one client"""
+        raise NotImplementedError
+
+    def find_scan(self, scan_id):
+        """
+        Look up a scan without knowing its client.
+
+        Returns:
+            tuple: (db_path, scan dict) or (None, None)
+        """
+        raise NotImplementedError
+
+    def scan_totals(self, today_bucket=None):
+        """
+        Cross-tenant totals.
+
+        Returns:
+            dict: total_scans, clients_with_scans and scans_today
+        """
+        raise NotImplementedError
+
+    def connect(self, client_id):
+        """Open a client's database with the schema migrated"""
+        db_path = self.db_path(client_id)
+        ensure_schema(db_path, self.schema_kind)
+        conn = sqlite3.connect(db_path, timeout=20.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+class PerClientScanStore(ScanStore):
+    """One SQLite database per client under client_databases/"""
+
+    name = 'per_client'
+    schema_kind = CLIENT_SCANS_DB
+
+    def __init__(self, db_dir=CLIENT_DB_DIR):
+        self.db_dir = db_dir
+
+    def db_path(self, client_id):
+        return os.path.join(self.db_dir, f'client_{client_id}_scans.db')
+
+    def tenant_exists(self, client_id):
+        return os.path.exists(self.db_path(client_id))
+
+    def create_tenant(self, client_id, business_name):
+        """Create a dedicated database for a client to track their scans"""
+        try:
+            os.makedirs(self.db_dir, exist_ok=True)
+            db_path = self.db_path(client_id)
+
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+
+            # Create scans table for this client
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_id TEXT UNIQUE NOT NULL,
+                scanner_id TEXT,
+                timestamp TEXT NOT NULL,
+                lead_name TEXT,
+                lead_email TEXT NOT NULL,
+                lead_phone TEXT,
+                lead_company TEXT,
+                company_size TEXT,
+                target_domain TEXT,
+                security_score INTEGER DEFAULT 0,
+                risk_level TEXT,
+                scan_type TEXT DEFAULT 'comprehensive',
+                status TEXT DEFAULT 'completed',
+                ip_address TEXT,
+                user_agent TEXT,
+                scan_duration INTEGER,
+                vulnerabilities_found INTEGER DEFAULT 0,
+                recommendations_count INTEGER DEFAULT 0,
+                scan_results TEXT,  -- JSON data
+                created_at TEXT NOT NULL,
+                updated_at TEXT
+            )
+            ''')
+
+            # Create reports table for generated reports
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_id TEXT NOT NULL,
+                report_type TEXT DEFAULT 'pdf',
+                report_path TEXT,
+                generated_at TEXT NOT NULL,
+                email_sent BOOLEAN DEFAULT 0,
+                email_sent_at TEXT,
+                download_count INTEGER DEFAULT 0,
+                FOREIGN KEY (scan_id) REFERENCES scans(scan_id)
+            )
+            ''')
+
+            # Create leads table for lead management
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS leads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                name TEXT,
+                phone TEXT,
+                company TEXT,
+                company_size TEXT,
+                industry TEXT,
+                first_scan_date TEXT,
+                last_scan_date TEXT,
+                total_scans INTEGER DEFAULT 1,
+                avg_security_score REAL DEFAULT 0,
+                lead_status TEXT DEFAULT 'new',  -- new, contacted, qualified, converted
+                notes TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT
+            )
+            ''')
+
+            # Create scanner_usage table to track which scanners are used
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scanner_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scanner_id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                scans_count INTEGER DEFAULT 0,
+                unique_leads INTEGER DEFAULT 0,
+                avg_score REAL DEFAULT 0,
+                created_at TEXT NOT NULL
+            )
+            ''')
+
+            # Create indexes for better performance
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_email ON scans(lead_email)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_date ON scans(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_score ON scans(security_score)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_scans_scanner ON scans(scanner_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(lead_status)')
+
+            # Insert initial metadata
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS database_info (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            ''')
+
+            cursor.executemany('INSERT OR REPLACE INTO database_info (key, value) VALUES (?, ?)', [
+                ('client_id', str(client_id)),
+                ('business_name', business_name),
+                ('created_at', datetime.now().isoformat()),
+                ('database_version', '1.0')
+            ])
+
+            conn.commit()
+            conn.close()
+
+            # Indexes, time buckets and full-text search come from the schema registry
+            ensure_schema(db_path, CLIENT_SCANS_DB)
+
+            logger.info(f"Created dedicated database for client {client_id} ({business_name}): {db_path}")
+            return db_path
+
+        except Exception as e:
+            logger.error(f"Error creating client database for {client_id}: {e}")
+            return None
+
+    def tenant_ids(self):
+        if not os.path.exists(self.db_dir):
+            return []
+        client_ids = []
+        for filename in os.listdir(self.db_dir):
+            if filename.startswith('client_') and filename.endswith('_scans.db'):
+                try:
+                    client_ids.append(int(filename.split('_')[1]))
+                except ValueError:
+                    continue
+        return sorted(client_ids)
+
+    def tenant_name(self, client_id):
+        conn = sqlite3.connect(self.db_path(client_id))
+        try:
+            row = conn.execute("SELECT value FROM database_info WHERE key = 'business_name'").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+    def databases(self):
+        return [self.db_path(client_id) for client_id in self.tenant_ids()]
+
+    def scope(self, client_id):
+        return None, []
+
+    def tenant_values(self, client_id):
+        return {}
+
+    def cache_scope(self, client_id):
+        return self.db_path(client_id)
+
+    def find_scan(self, scan_id):
+        for db_path in self.databases():
+            try:
+                conn = sqlite3.connect(db_path)
+                conn.row_factory = sqlite3.Row
+                try:
+                    row = conn.execute('SELECT * FROM scans WHERE scan_id = ?', (scan_id,)).fetchone()
+                finally:
+                    conn.close()
+                if row:
+                    return db_path, dict(row)
+            except Exception as e:
+                logger.error(f"Error searching in {os.path.basename(db_path)}: {e}")
+        return None, None
+
+    def scan_totals(self, today_bucket=None):
+        totals = {'total_scans': 0, 'clients_with_scans': 0, 'scans_today': 0}
+        for db_path in self.databases():
+            try:
+                ensure_schema(db_path, CLIENT_SCANS_DB)
+                conn = sqlite3.connect(db_path)
+                try:
+                    count, today = conn.execute(
+                        'SELECT COUNT(*), COALESCE(SUM(day_bucket = ?), 0) FROM scans', (today_bucket,)
+                    ).fetchone()
+                finally:
+                    conn.close()
+                totals['total_scans'] += count
+                totals['scans_today'] += today
+                if count:
+                    totals['clients_with_scans'] += 1
+            except Exception as e:
+                logger.warning(f"Error reading {os.path.basename(db_path)}: {e}")
+        return totals
+
+
+class ConsolidatedScanStore(ScanStore):
+    """Every client's scans in one SQLite database, keyed by client_id"""
+
+    name = 'consolidated'
+    schema_kind = CONSOLIDATED_SCANS_DB
+
+    def __init__(self, db_path=CONSOLIDATED_DB_PATH):
+        self.path = db_path
+
+    def db_path(self, client_id):
+        return self.path
+
+    def _query(self, query, params=()):
+        ensure_schema(self.path, CONSOLIDATED_SCANS_DB)
+        conn = sqlite3.connect(self.path, timeout=20.0)
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    def tenant_exists(self, client_id):
+        if not os.path.exists(self.path):
+            return False
+        return bool(self._query('SELECT 1 FROM tenants WHERE client_id = ?', (client_id,)))
+
+    def create_tenant(self, client_id, business_name):
+        """Register a client; the shared schema is created once for all of them"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            ensure_schema(self.path, CONSOLIDATED_SCANS_DB)
+            conn = sqlite3.connect(self.path, timeout=20.0)
+            try:
+                conn.execute(
+                    'INSERT OR IGNORE INTO tenants (client_id, business_name, created_at) VALUES (?, ?, ?)',
+                    (client_id, business_name, datetime.now().isoformat())
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            return self.path
+        except Exception as e:
+            logger.error(f"Error registering client {client_id} in consolidated scan database: {e}")
+            return None
+
+    def tenant_ids(self):
+        if not os.path.exists(self.path):
+            return []
+        return [row[0] for row in self._query('SELECT client_id FROM tenants ORDER BY client_id')]
+
+    def tenant_name(self, client_id):
+        rows = self._query('SELECT business_name FROM tenants WHERE client_id = ?', (client_id,))
+        return rows[0][0] if rows else None
+
+    def databases(self):
+        return [self.path] if os.path.exists(self.path) else []
+
+    def scope(self, client_id):
+        return 'client_id = ?', [client_id]
+
+    def tenant_values(self, client_id):
+        return {'client_id': client_id}
+
+    def cache_scope(self, client_id):
+        return f"{self.path}#{client_id}"
+
+    def find_scan(self, scan_id):
+        if not os.path.exists(self.path):
+            return None, None
+        conn = self.connect(None)
+        try:
+            row = conn.execute('SELECT * FROM scans WHERE scan_id = ?', (scan_id,)).fetchone()
+        finally:
+            conn.close()
+        return (self.path, dict(row)) if row else (None, None)
+
+    def scan_totals(self, today_bucket=None):
+        if not os.path.exists(self.path):
+            return {'total_scans': 0, 'clients_with_scans': 0, 'scans_today': 0}
+        count, clients, today = self._query(
+            'SELECT COUNT(*), COUNT(DISTINCT client_id), COALESCE(SUM(day_bucket = ?), 0) FROM scans',
+            (today_bucket,)
+        )[0]
+        return {'total_scans': count, 'clients_with_scans': clients, 'scans_today': today}
+
+
+STORE_TYPES = {
+    PerClientScanStore.name: PerClientScanStore,
+    ConsolidatedScanStore.name: ConsolidatedScanStore
+}
+
+_store = None
+
+
+def get_scan_store():
+    """The configured scan store (SCAN_STORAGE_BACKEND, default per_client)"""
+    global _store
+    if _store is None:
+        backend = os.environ.get('SCAN_STORAGE_BACKEND', PerClientScanStore.name)
+        if backend not in STORE_TYPES:
+            logger.error(f"Unknown SCAN_STORAGE_BACKEND '{backend}', using per_client")
+            backend = PerClientScanStore.name
+        _store = STORE_TYPES[backend]()
+    return _store
+
+
+def set_scan_store(store):
+    """Swap the active store (used by the layout migration and benchmarks)"""
+    global _store
+    _store = store
+
+
+def _copy_rows(source_conn, target_conn, table, columns, source_scope, extra_values):
+    """Copy one tenant's rows of a table, skipping rows the target already has"""
+    available = [row[1] for row in source_conn.execute(f'PRAGMA table_info({table})')]
+    copy_columns = [column for column in columns if column in available]
+    condition, params = source_scope
+    where = f'WHERE {condition}' if condition else ''
+    rows = source_conn.execute(f"SELECT {', '.join(copy_columns)} FROM {table} {where}", params).fetchall()
+
+    insert_columns = copy_columns + list(extra_values)
+    placeholders = ', '.join('?' for _ in insert_columns)
+    target_conn.executemany(
+        f"INSERT OR IGNORE INTO {table} ({', '.join(insert_columns)}) VALUES ({placeholders})",
+        [tuple(row) + tuple(extra_values.values()) for row in rows]
+    )
+    return len(rows)
+
+
+def migrate_layout(source, target, client_ids=None):
+    """
+    Copy scans and leads from one store layout to another.
+
+    Safe to re-run: rows already present in the target are skipped. Payloads
+    held in the source's monthly archives are restored into the copied rows.
+
+    Returns:
+        dict: Tenants, scans and leads copied
+    """
+    from scan_archive import hydrate_scan
+
+    totals = {'tenants': 0, 'scans': 0, 'leads': 0, 'failed': 0}
+    for client_id in (client_ids or source.tenant_ids()):
+        try:
+            if not target.create_tenant(client_id, source.tenant_name(client_id) or 'Unknown'):
+                totals['failed'] += 1
+                continue
+
+            source_conn = source.connect(client_id)
+            target_conn = target.connect(client_id)
+            condition, params = source.scope(client_id)
+            try:
+                scans = _copy_rows(
+                    source_conn, target_conn, 'scans', SCAN_COLUMNS, (condition, params),
+                    target.tenant_values(client_id)
+                )
+                # Archived payloads live next to the source database; bring them along
+                archived = source_conn.execute(
+                    'SELECT scan_id, archived_month FROM scans WHERE archived_month IS NOT NULL'
+                    + (f' AND {condition}' if condition else ''), params
+                ).fetchall()
+                for scan_id, month in archived:
+                    scan = hydrate_scan(source.db_path(client_id), {'scan_id': scan_id, 'archived_month': month})
+                    if scan.get('scan_results'):
+                        target_conn.execute('UPDATE scans SET scan_results = ? WHERE scan_id = ?',
+                                            (scan['scan_results'], scan_id))
+
+                leads = _copy_rows(
+                    source_conn, target_conn, 'leads', LEAD_COLUMNS, (condition, params),
+                    target.tenant_values(client_id)
+                )
+                target_conn.commit()
+            finally:
+                source_conn.close()
+                target_conn.close()
+
+            totals['tenants'] += 1
+            totals['scans'] += scans
+            totals['leads'] += leads
+        except Exception as e:
+            logger.error(f"Error migrating scans for client {client_id} from {source.name} to {target.name}: {e}")
+            totals['failed'] += 1
+
+    logger.info(f"Migrated {totals['tenants']} tenants from {source.name} to {target.name}: {totals}")
+    return totals
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] not in STORE_TYPES or sys.argv[2] not in STORE_TYPES:
+        print(f"Usage: python scan_storage.py <source> <target>   ({' | '.join(STORE_TYPES)})")
+        sys.exit(1)
+    print(json.dumps(migrate_layout(STORE_TYPES[sys.argv[1]](), STORE_TYPES[sys.argv[2]]()), indent=2))
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Per-scan summary model for report emails.
+
+Report emails used to walk the whole scan_results tree for their text part
+and wrap the full HTML report in a branded page, for every recipient and
+every resend. get_summary() now builds a small model once per scan:
+
+    metrics          score, risk level, grade and a few headline counts
+    top_findings     the most severe findings (scan._key_findings plus the
+                     enhanced scanner's per-section findings)
+    recommendations  normalized to title/priority
+    details          the long plain-text breakdown, built once
+
+email_parts() renders the text and HTML bodies from it, and caches them
+per scan and branding. The full report goes out as an attachment instead
+of inline; report_attachment() encodes it once per scan. load_logo()
+reads a tenant's logo once and caches its MIME part. A follow-up email
+for the same scan therefore only builds a new envelope.
+
+Summaries are dropped when the scan is rewritten (report_cache
+invalidation channel).
+"""
+
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from email.mime.image import MIMEImage
+from email.mime.text import MIMEText
+
+import invalidation
+
+logger = logging.getLogger(__name__)
+
+MAX_SUMMARIES = int(os.environ.get('SCAN_SUMMARY_CACHE_SIZE', '512'))
+MAX_LOGOS = 128
+MAX_ATTACHMENTS = 64
+TOP_FINDINGS = 5
+TOP_RECOMMENDATIONS = 5
+
+SEVERITY_ORDER = {'Critical': 0, 'High': 1, 'Medium': 2, 'Low': 3, 'Info': 4}
+FINDING_SECTIONS = (
+    ('network_security', 'Network Security'),
+    ('web_security', 'Web Security'),
+    ('email_security', 'Email Security'),
+    ('ssl_security', 'SSL/TLS Security')
+)
+
+_summaries = OrderedDict()
+_parts = OrderedDict()
+_logos = OrderedDict()
+_attachments = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(cache, key, value, limit):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+
+def _lookup(cache, key):
+    with _lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _top_findings(scan_results):
+    findings = []
+    try:
+        from scan import _key_findings
+        findings.extend(_key_findings(scan_results))
+    except Exception as e:
+        # Older or partial scans may lack fields the classic summary expects
+        logger.warning(f"Could not extract key findings: {e}")
+
+    for section, category in FINDING_SECTIONS:
+        for finding in (scan_results.get(section) or {}).get('findings') or []:
+            if not isinstance(finding, dict):
+                continue
+            severity = str(finding.get('severity', 'Medium')).capitalize()
+            if severity in ('Critical', 'High'):
+                findings.append({
+                    'category': category,
+                    'finding': finding.get('title') or finding.get('description') or 'Security issue',
+                    'severity': severity
+                })
+
+    findings.sort(key=lambda f: SEVERITY_ORDER.get(f['severity'], 999))
+    return findings[:TOP_FINDINGS]
+
+
+def _recommendations(scan_results):
+    recommendations = []
+    for rec in scan_results.get('recommendations') or []:
+        if isinstance(rec, dict):
+            recommendations.append({
+                'title': rec.get('title') or rec.get('description') or 'Recommendation',
+                'priority': str(rec.get('priority', 'medium')).capitalize()
+            })
+        else:
+            recommendations.append({'title': str(rec), 'priority': None})
+    return recommendations
+
+
+def _metrics(scan_results):
+    risk = scan_results.get('risk_assessment') or {}
+    open_ports = (scan_results.get('network') or {}).get('open_ports') or {}
+    return {
+        'overall_score': risk.get('overall_score'),
+        'risk_level': risk.get('risk_level'),
+        'grade': risk.get('grade'),
+        'open_ports': open_ports.get('count'),
+        'ssl_status': (scan_results.get('ssl_certificate') or {}).get('status'),
+        'headers_score': (scan_results.get('security_headers') or {}).get('score')
+    }
+
+
+def build_summary(scan_results):
+    """Summary model of a scan's results"""
+    from email_handler import create_comprehensive_text_summary
+    return {
+        'scan_id': scan_results.get('scan_id'),
+        'target': scan_results.get('target') or scan_results.get('domain') or '',
+        'timestamp': scan_results.get('timestamp'),
+        'metrics': _metrics(scan_results),
+        'top_findings': _top_findings(scan_results),
+        'recommendations': _recommendations(scan_results),
+        'details': create_comprehensive_text_summary(scan_results)
+    }
+
+
+def get_summary(scan_results):
+    """The scan's summary, built on first use and cached by scan ID"""
+    scan_id = scan_results.get('scan_id')
+    summary = _lookup(_summaries, scan_id) if scan_id else None
+    if summary is None:
+        invalidation.ensure_listening(on_error=clear)
+        summary = build_summary(scan_results)
+        if scan_id:
+            _remember(_summaries, scan_id, summary, MAX_SUMMARIES)
+    return summary
+
+
+def render_text(summary, branding):
+    lines = [f"{branding['company_name']} Security Scan Report"]
+    if summary['target']:
+        lines.append(f"Target: {summary['target']}")
+    metrics = summary['metrics']
+    if metrics['overall_score'] is not None:
+        grade = f", Grade {metrics['grade']}" if metrics['grade'] else ''
+        lines.append(f"Security Score: {metrics['overall_score']}/100 ({metrics['risk_level'] or 'Unknown'} Risk{grade})")
+    if branding.get('email_intro'):
+        lines.extend(['', branding['email_intro']])
+    if summary['top_findings']:
+        lines.extend(['', 'TOP FINDINGS', '============'])
+        lines.extend(f"• [{f['severity']}] {f['category']}: {f['finding']}" for f in summary['top_findings'])
+    lines.extend(['', summary['details']])
+    return '\n'.join(lines)
+
+
+def render_html(summary, branding):
+    import report_templates
+    return report_templates.render(
+        'emails/scan_summary.html',
+        summary=summary,
+        recommendations=summary['recommendations'][:TOP_RECOMMENDATIONS],
+        branding=branding
+    )
+
+
+def email_parts(summary, branding):
+    """
+    (text, html) bodies for a scan's email, cached per scan and branding.
+
+    Args:
+        summary (dict): From get_summary()
+        branding (dict): company_name, brand_color, email_intro, has_logo
+    """
+    key = (summary['scan_id'], tuple(sorted(branding.items()))) if summary['scan_id'] else None
+    parts = _lookup(_parts, key) if key else None
+    if parts is None:
+        parts = (render_text(summary, branding), render_html(summary, branding))
+        if key:
+            _remember(_parts, key, parts, MAX_SUMMARIES)
+    return parts
+
+
+def report_attachment(summary, html_report):
+    """The full report as an HTML attachment, encoded once per scan and report"""
+    key = (summary['scan_id'], hash(html_report)) if summary['scan_id'] else None
+    part = _lookup(_attachments, key) if key else None
+    if part is None:
+        part = MIMEText(html_report, 'html', 'utf-8')
+        part.add_header('Content-Disposition', 'attachment', filename='security-report.html')
+        if key:
+            _remember(_attachments, key, part, MAX_ATTACHMENTS)
+    return copy.deepcopy(part)
+
+
+def load_logo(logo_path, tenant=None):
+    """
+    Inline logo MIME part (Content-ID <logo>), read once per tenant and file.
+
+    Returns:
+        MIMEImage: A copy the caller may attach, or None if there is no logo
+    """
+    if not logo_path:
+        return None
+    try:
+        mtime = os.stat(logo_path).st_mtime_ns
+    except OSError:
+        return None
+    key = (tenant, logo_path, mtime)
+    part = _lookup(_logos, key)
+    if part is None:
+        with open(logo_path, 'rb') as logo_file:
+            part = MIMEImage(logo_file.read())
+        part.add_header('Content-ID', '<logo>')
+        part.add_header('Content-Disposition', 'inline', filename='logo.png')
+        _remember(_logos, key, part, MAX_LOGOS)
+    return copy.deepcopy(part)
+
+
+def _drop_scan(scan_id):
+    with _lock:
+        _summaries.pop(scan_id, None)
+        for cache in (_parts, _attachments):
+            for key in [key for key in cache if key[0] == scan_id]:
+                del cache[key]
+
+
+def clear():
+    with _lock:
+        _summaries.clear()
+        _parts.clear()
+        _logos.clear()
+        _attachments.clear()
+
+
+invalidation.subscribe('report_cache', _drop_scan)
@@ -8,6 +8,7 @@ import uuid
 import logging
 from datetime import datetime
 from client_db import get_db_connection
+import dashboard_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +56,7 @@ def create_scanner_for_client(client_id, scanner_data, created_by_user_id):
         ))
         
         scanner_db_id = cursor.lastrowid
+        dashboard_snapshot.invalidate(f'scanner:{scanner_id}', conn)
         conn.commit()
         conn.close()
         
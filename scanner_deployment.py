@@ -8,49 +8,42 @@ import os
 import logging
 from jinja2 import Template
 
+from http_cache import asset_version
+
 logger = logging.getLogger(__name__)
 
-def generate_scanner_deployment(scanner_uid, scanner_data, api_key):
-    """Generate all deployment files for a scanner"""
+DEPLOYMENTS_DIR = os.path.join('static', 'deployments')
+
+def write_file(path, content):
+    """Replace a deployment file atomically, so the embed route never serves a partial write"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
     try:
-        # Create deployment directory
-        deployment_dir = os.path.join('static', 'deployments', scanner_uid)
-        os.makedirs(deployment_dir, exist_ok=True)
-        
-        # Generate HTML embed code
-        html_result = generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key)
-        
-        # Generate CSS styles
-        css_result = generate_scanner_css(deployment_dir, scanner_data)
-        
-        # Generate JavaScript
-        js_result = generate_scanner_js(deployment_dir, scanner_uid, api_key)
-        
-        # Generate API documentation
-        api_result = generate_api_docs(deployment_dir, scanner_uid, api_key, scanner_data)
-        
-        if all([html_result, css_result, js_result, api_result]):
-            return {
-                'status': 'success',
-                'deployment_path': deployment_dir,
-                'embed_url': f'/scanner/{scanner_uid}/embed',
-                'api_url': f'/api/scanner/{scanner_uid}',
-                'docs_url': f'/scanner/{scanner_uid}/docs'
-            }
-        else:
-            return {
-                'status': 'error',
-                'message': 'Failed to generate some deployment files'
-            }
-            
-    except Exception as e:
-        logger.error(f"Error generating scanner deployment: {e}")
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def generate_scanner_deployment(scanner_uid, scanner_data, api_key):
+    """Generate the deployment files for a scanner whose inputs changed"""
+    from deployment_build import build_scanner
+    
+    result = build_scanner(scanner_uid, scanner_data, api_key)
+    if result['status'] != 'success':
         return {
             'status': 'error',
-            'message': str(e)
+            'message': result.get('message', 'Failed to generate some deployment files')
         }
+    return {
+        'status': 'success',
+        'deployment_path': result['deployment_path'],
+        'embed_url': f'/scanner/{scanner_uid}/embed',
+        'api_url': f'/api/scanner/{scanner_uid}',
+        'docs_url': f'/scanner/{scanner_uid}/docs'
+    }
 
-def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key):
+def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key, asset_versions=None):
     """Generate HTML embed code for the scanner"""
     try:
         html_template = """
@@ -72,7 +65,7 @@ def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key):
     <link rel="shortcut icon" href="/static/images/favicon.png">
     {% endif %}
     <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link rel="stylesheet" href="./scanner-styles.css">
+    <link rel="stylesheet" href="./scanner-styles.css{% if css_version %}?v={{ css_version }}{% endif %}">
     <style>
         :root {
             --primary-color: {{ primary_color }};
@@ -170,7 +163,7 @@ def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key):
     </div>
     
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-    <script src="./scanner-script.js"></script>
+    <script src="./scanner-script.js{% if js_version %}?v={{ js_version }}{% endif %}"></script>
     <script>
         // Initialize scanner with configuration
         window.ScannerConfig = {
@@ -195,13 +188,14 @@ def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key):
             favicon_url=scanner_data.get('favicon_path', scanner_data.get('favicon_url', '')),
             contact_email=scanner_data.get('contact_email', 'support@example.com'),
             scan_types=scanner_data.get('scan_types', ['port_scan', 'ssl_check']),
-            api_key=api_key
+            api_key=api_key,
+            css_version=(asset_versions or {}).get('css'),
+            js_version=(asset_versions or {}).get('js')
         )
         
         # Save HTML file
         html_path = os.path.join(deployment_dir, 'index.html')
-        with open(html_path, 'w') as f:
-            f.write(html_content)
+        write_file(html_path, html_content)
         
         # Generate embed snippet
         embed_snippet = f"""
@@ -215,8 +209,7 @@ def generate_scanner_html(deployment_dir, scanner_uid, scanner_data, api_key):
         """
         
         embed_path = os.path.join(deployment_dir, 'embed-snippet.html')
-        with open(embed_path, 'w') as f:
-            f.write(embed_snippet)
+        write_file(embed_path, embed_snippet)
         
         logger.info(f"Generated HTML files for scanner {scanner_uid}")
         return True
@@ -374,8 +367,7 @@ def generate_scanner_css(deployment_dir, scanner_data):
         """
         
         css_path = os.path.join(deployment_dir, 'scanner-styles.css')
-        with open(css_path, 'w') as f:
-            f.write(css_content)
+        write_file(css_path, css_content)
         
         logger.info(f"Generated CSS for scanner")
         return True
@@ -572,8 +564,7 @@ if (typeof module !== 'undefined' && module.exports) {{
         """
         
         js_path = os.path.join(deployment_dir, 'scanner-script.js')
-        with open(js_path, 'w') as f:
-            f.write(js_content)
+        write_file(js_path, js_content)
         
         logger.info(f"Generated JavaScript for scanner")
         return True
@@ -666,7 +657,7 @@ Get the status and results of a scan.
 #### JavaScript Integration
 ```javascript
 // Include the scanner script
-<script src="{os.environ.get('BASE_URL', '')}/scanner/{scanner_uid}/scanner-script.js"></script>
+<script src="{os.environ.get('BASE_URL', '')}/scanner/{scanner_uid}/scanner-script.js?v={asset_version()}"></script>
 
 // Initialize
 const scanner = new SecurityScanner({{
@@ -713,8 +704,7 @@ For technical support, contact: {contact_email}
         """
         
         docs_path = os.path.join(deployment_dir, 'api-docs.md')
-        with open(docs_path, 'w') as f:
-            f.write(api_docs)
+        write_file(docs_path, api_docs)
         
         logger.info(f"Generated API documentation for scanner")
         return True
@@ -738,72 +728,18 @@ if __name__ == "__main__":
     print(f"Deployment result: {result}")
 
 def regenerate_scanner_if_needed(scanner_id, client_id):
-    """Regenerate scanner deployment if customizations have changed recently"""
+    """Rebuild the parts of a scanner's deployment whose inputs changed since the last build"""
     try:
-        from client_db import get_db_connection
-        import sqlite3
-        from datetime import datetime, timedelta
-        
-        conn = get_db_connection()
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        from deployment_build import build_scanner, load_scanners
         
-        # Get scanner info
-        cursor.execute('SELECT scanner_id FROM scanners WHERE id = ?', (scanner_id,))
-        scanner = cursor.fetchone()
-        
-        if not scanner:
+        scanners = load_scanners(scanner_id=scanner_id)
+        if not scanners:
             return False
-            
-        scanner_uid = scanner['scanner_id']
         
-        # Check if customizations were updated recently (within last hour)
-        cursor.execute('SELECT updated_at FROM customizations WHERE client_id = ?', (client_id,))
-        custom = cursor.fetchone()
-        
-        if custom and custom['updated_at']:
-            # Parse the updated_at timestamp
-            try:
-                updated_time = datetime.fromisoformat(custom['updated_at'])
-                one_hour_ago = datetime.now() - timedelta(hours=1)
-                
-                # If customizations were updated recently, regenerate
-                if updated_time > one_hour_ago:
-                    logger.info(f"Customizations updated recently, regenerating scanner {scanner_uid}")
-                    
-                    # Get full scanner data for regeneration
-                    cursor.execute('''
-                        SELECT s.*, c.primary_color, c.secondary_color, c.button_color, 
-                               c.logo_path, c.favicon_path, cl.business_name
-                        FROM scanners s
-                        JOIN clients cl ON s.client_id = cl.id
-                        LEFT JOIN customizations c ON cl.id = c.client_id
-                        WHERE s.id = ?
-                    ''', (scanner_id,))
-                    
-                    full_scanner = cursor.fetchone()
-                    if full_scanner:
-                        fs = dict(full_scanner)
-                        scanner_data = {
-                            'name': fs['name'],
-                            'business_name': fs['business_name'],
-                            'primary_color': fs['primary_color'] or '#02054c',
-                            'secondary_color': fs['secondary_color'] or '#35a310',
-                            'button_color': fs['button_color'] or fs['primary_color'] or '#02054c',
-                            'logo_url': fs['logo_path'] or '',
-                            'favicon_url': fs['favicon_path'] or '',
-                        }
-                        
-                        # Regenerate deployment
-                        success = generate_scanner_deployment(scanner_uid, scanner_data, fs['api_key'])
-                        conn.close()
-                        return success
-            except Exception as parse_error:
-                logger.warning(f"Could not parse customization timestamp: {parse_error}")
-        
-        conn.close()
-        return False
+        scanner_uid, scanner_data, api_key = scanners[0]
+        result = build_scanner(scanner_uid, scanner_data, api_key)
+        return result['status'] == 'success'
         
     except Exception as e:
         logger.warning(f"Error checking if scanner regeneration needed: {e}")
-        return False
\ No newline at end of file
+        return False
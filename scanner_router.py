@@ -1,6 +1,6 @@
 # In scanner_router.py
 from flask import Blueprint, request, redirect, url_for, render_template, abort
-from client_db import get_client_by_subdomain
+from tenant_config import get_client_by_subdomain
 from jinja2 import Template
 
 scanner_bp = Blueprint('scanner', __name__)
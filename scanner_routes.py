@@ -553,6 +553,8 @@ def update_password(user):
             user['id']
         ))
         
+        from session_cache import invalidate_user
+        invalidate_user(user['id'], conn)
         conn.commit()
         
         flash("Password updated successfully", "success")
@@ -433,6 +433,10 @@ def delete_scanner(user, scanner_id):
         
         # Delete the scanner
         cursor.execute('DELETE FROM deployed_scanners WHERE id = ?', (scanner_id,))
+        import api_key_cache
+        import tenant_config
+        api_key_cache.invalidate_client(scanner['client_id'], conn)
+        tenant_config.invalidate(scanner['client_id'], conn)
         
         # Log the deletion in audit log
         cursor.execute('''
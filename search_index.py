@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+FTS5 full-text search over leads and scans.
+
+Each client scan database gets a scans_fts index (external content over the
+scans table) kept in sync by triggers. The main database holds a global
+lead_search catalog covering every client, updated whenever a scan is saved,
+so admin lead search doesn't need to open every client database.
+
+User input is turned into prefix queries ("joh acme" -> "joh"* AND "acme"*)
+and results are ranked with bm25().
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ['lead_name', 'lead_email', 'lead_company', 'target_domain']
+
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 MATCH expression of quoted prefix terms.
+
+    Returns:
+        str or None: MATCH expression, or None if the text has no searchable terms
+    """
+    if not text:
+        return None
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _database_path(conn):
+    try:
+        return conn.execute("PRAGMA database_list").fetchone()[2]
+    except Exception:
+        return None
+
+
+def ensure_scan_search_index(conn):
+    """
+    Create the scans_fts index and its sync triggers in a client scan database,
+    building it from existing rows the first time. Safe to call repeatedly.
+
+    Returns:
+        bool: True if the index is available
+    """
+    db_path = _database_path(conn)
+    if db_path and db_path in _indexed:
+        return True
+
+    with _indexed_lock:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='scans_fts'")
+        exists = cursor.fetchone() is not None
+
+        if not exists:
+            columns = ', '.join(SEARCH_COLUMNS)
+            new_values = ', '.join(f"NEW.{col}" for col in SEARCH_COLUMNS)
+            old_values = ', '.join(f"OLD.{col}" for col in SEARCH_COLUMNS)
+
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE scans_fts USING fts5(
+                    {columns}, content='scans', content_rowid='id', prefix='2 3'
+                )
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_scans_fts_insert AFTER INSERT ON scans BEGIN
+                    INSERT INTO scans_fts(rowid, {columns}) VALUES (NEW.id, {new_values});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_scans_fts_delete AFTER DELETE ON scans BEGIN
+                    INSERT INTO scans_fts(scans_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_scans_fts_update AFTER UPDATE OF {columns} ON scans BEGIN
+                    INSERT INTO scans_fts(scans_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+                    INSERT INTO scans_fts(rowid, {columns}) VALUES (NEW.id, {new_values});
+                END
+            """)
+            cursor.execute("INSERT INTO scans_fts(scans_fts) VALUES ('rebuild')")
+            conn.commit()
+            logger.info(f"Built scan search index for {db_path}")
+
+        if db_path:
+            _indexed.add(db_path)
+        return True
+
+
+def scan_search_condition(text, id_column='id'):
+    """
+    WHERE fragment restricting scans to those matching a search string.
+
+    Returns:
+        tuple: (condition or None, params)
+    """
+    match_query = build_match_query(text)
+    if not match_query:
+        return None, []
+    return f"{id_column} IN (SELECT rowid FROM scans_fts WHERE scans_fts MATCH ?)", [match_query]
+
+
+def search_scans(conn, text, limit=20):
+    """Ranked search of one client database's scans"""
+    match_query = build_match_query(text)
+    if not match_query:
+        return []
+    ensure_scan_search_index(conn)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT s.id, s.scan_id, s.scanner_id, s.timestamp, s.lead_name, s.lead_email,
+               s.lead_company, s.target_domain, s.security_score, s.risk_level,
+               bm25(scans_fts) AS rank
+        FROM scans_fts
+        JOIN scans s ON s.id = scans_fts.rowid
+        WHERE scans_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (match_query, limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+# Global lead catalog in the main database
+
+GLOBAL_CATALOG_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS lead_search USING fts5(
+    {', '.join(SEARCH_COLUMNS)},
+    client_id UNINDEXED, scan_id UNINDEXED, scanner_id UNINDEXED, timestamp UNINDEXED,
+    prefix='2 3'
+)
+"""
+
+# scan_id is UNINDEXED in lead_search, so replacing a scan's row goes through its rowid
+CATALOG_KEYS_SQL = """
+CREATE TABLE IF NOT EXISTS lead_search_keys (
+    scan_id TEXT PRIMARY KEY,
+    search_rowid INTEGER NOT NULL
+)
+"""
+
+
+def ensure_global_catalog(conn):
+    """Create the cross-tenant lead_search table and its scan_id -> rowid keys in the main database"""
+    conn.execute(GLOBAL_CATALOG_SQL)
+    conn.execute(CATALOG_KEYS_SQL)
+
+
+def rebuild_catalog_keys(conn):
+    """Recompute lead_search_keys from the catalog rows (caller commits)"""
+    conn.execute("DELETE FROM lead_search_keys")
+    conn.execute("""
+        INSERT OR REPLACE INTO lead_search_keys (scan_id, search_rowid)
+        SELECT scan_id, rowid FROM lead_search WHERE scan_id IS NOT NULL ORDER BY rowid
+    """)
+
+
+def index_scan_globally(conn, client_id, scan):
+    """
+    Insert or replace one scan in the global lead catalog.
+
+    Args:
+        conn: Main database connection (caller commits)
+        client_id: Owning client
+        scan (dict): Needs scan_id plus any of the searchable lead fields
+    """
+    ensure_global_catalog(conn)
+    scan_id = scan.get('scan_id')
+    row = conn.execute("SELECT search_rowid FROM lead_search_keys WHERE scan_id = ?", (scan_id,)).fetchone()
+    if row:
+        conn.execute("DELETE FROM lead_search WHERE rowid = ?", (row[0],))
+    cursor = conn.execute("""
+        INSERT INTO lead_search (lead_name, lead_email, lead_company, target_domain,
+                                 client_id, scan_id, scanner_id, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        scan.get('lead_name') or '', scan.get('lead_email') or '', scan.get('lead_company') or '',
+        scan.get('target_domain') or '', client_id, scan_id, scan.get('scanner_id'),
+        scan.get('timestamp')
+    ))
+    if scan_id is not None:
+        conn.execute("INSERT OR REPLACE INTO lead_search_keys (scan_id, search_rowid) VALUES (?, ?)",
+                     (scan_id, cursor.lastrowid))
+
+
+def search_leads(conn, text, limit=25, client_id=None):
+    """
+    Ranked lead search across all clients using the global catalog.
+
+    Returns:
+        list: Matching leads with client_id, scan_id and rank
+    """
+    match_query = build_match_query(text)
+    if not match_query:
+        return []
+    ensure_global_catalog(conn)
+    query = """
+        SELECT lead_name, lead_email, lead_company, target_domain, client_id,
+               scan_id, scanner_id, timestamp, bm25(lead_search) AS rank
+        FROM lead_search
+        WHERE lead_search MATCH ?
+    """
+    params = [match_query]
+    if client_id is not None:
+        query += " AND client_id = ?"
+        params.append(client_id)
+    query += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+
+    cursor = conn.execute(query, params)
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def rebuild_global_catalog(main_db_path, client_db_dir):
+    """
+    Rebuild the global lead catalog from every client scan database.
+
+    Returns:
+        int: Number of scans indexed
+    """
+    conn = sqlite3.connect(main_db_path)
+    total = 0
+    try:
+        ensure_global_catalog(conn)
+        conn.execute("DELETE FROM lead_search")
+        if os.path.exists(client_db_dir):
+            for filename in sorted(os.listdir(client_db_dir)):
+                if not (filename.startswith('client_') and filename.endswith('_scans.db')):
+                    continue
+                try:
+                    client_id = int(filename.split('_')[1])
+                except ValueError:
+                    continue
+                client_conn = sqlite3.connect(os.path.join(client_db_dir, filename))
+                try:
+                    rows = client_conn.execute("""
+                        SELECT lead_name, lead_email, lead_company, target_domain,
+                               scan_id, scanner_id, timestamp
+                        FROM scans
+                    """).fetchall()
+                except sqlite3.Error as e:
+                    logger.warning(f"Skipping {filename} while rebuilding lead catalog: {e}")
+                    rows = []
+                finally:
+                    client_conn.close()
+                conn.executemany("""
+                    INSERT INTO lead_search (lead_name, lead_email, lead_company, target_domain,
+                                             client_id, scan_id, scanner_id, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(r[0] or '', r[1] or '', r[2] or '', r[3] or '', client_id, r[4], r[5], r[6]) for r in rows])
+                total += len(rows)
+        rebuild_catalog_keys(conn)
+        conn.commit()
+        logger.info(f"Rebuilt global lead catalog with {total} scans")
+        return total
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    from client_db import CLIENT_DB_PATH
+    db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'client_databases')
+    print(f"Indexed {rebuild_global_catalog(CLIENT_DB_PATH, db_dir)} scans")
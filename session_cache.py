@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+In-process cache of verified sessions.
+
+verify_session() used to open a connection and join sessions with users on
+every authenticated request. Successful verifications are now kept in a
+per-process dict keyed by the SHA-256 of the token, so a cached request
+costs a dict lookup. Entries live for SESSION_CACHE_TTL seconds and never
+outlive the session's own expires_at.
+
+Logout, password changes and user deactivation drop entries in every
+gunicorn worker through the shared invalidation channel (invalidation.py).
+The TTL bounds staleness if the channel is unavailable.
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import invalidation
+from migrations import CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '30'))
+SWEEP_INTERVAL = 3600
+MAX_ENTRIES = 10000
+
+_cache = {}          # token hash -> (expires monotonic, user_id, result)
+_by_user = {}        # user_id -> set of token hashes
+_lock = threading.Lock()
+
+
+def token_hash(session_token):
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+def get_session(session_token):
+    """Cached verify_session() result for a token, or None"""
+    if not session_token:
+        return None
+    key = token_hash(session_token)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        _drop(key)
+        return None
+    # Callers add to the user dict, so never hand out the cached one
+    return copy.deepcopy(entry[2])
+
+
+def store_session(session_token, result, expires_at=None):
+    """Cache a successful verification until the TTL or the session's expiry, whichever is first"""
+    if not session_token or result.get('status') != 'success':
+        return
+    ttl = SESSION_CACHE_TTL
+    if expires_at:
+        try:
+            ttl = min(ttl, (datetime.fromisoformat(expires_at) - datetime.now()).total_seconds())
+        except (TypeError, ValueError):
+            pass
+    if ttl <= 0:
+        return
+
+    invalidation.ensure_listening(on_error=clear)
+    user_id = result['user'].get('user_id', result['user'].get('id'))
+    key = token_hash(session_token)
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            _evict()
+        _cache[key] = (time.monotonic() + ttl, user_id, copy.deepcopy(result))
+        _by_user.setdefault(user_id, set()).add(key)
+
+
+def _drop(key):
+    with _lock:
+        entry = _cache.pop(key, None)
+        if entry is not None:
+            keys = _by_user.get(entry[1])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del _by_user[entry[1]]
+
+
+def _drop_user(user_id):
+    with _lock:
+        for key in _by_user.pop(user_id, set()):
+            _cache.pop(key, None)
+
+
+def _drop_user_key(user_id):
+    # Channel keys arrive as text
+    _drop_user(int(user_id))
+
+
+def _evict():
+    """Drop expired entries, then the oldest ones, to make room (caller holds _lock)"""
+    now = time.monotonic()
+    for key in [key for key, entry in _cache.items() if entry[0] <= now]:
+        entry = _cache.pop(key)
+        _by_user.get(entry[1], set()).discard(key)
+    while len(_cache) >= MAX_ENTRIES:
+        key, entry = next(iter(_cache.items()))
+        del _cache[key]
+        _by_user.get(entry[1], set()).discard(key)
+
+
+def invalidate_token(session_token, conn=None):
+    """Forget one session in every worker (logout)"""
+    if session_token:
+        invalidation.publish('session_token', token_hash(session_token), conn)
+
+
+def invalidate_user(user_id, conn=None):
+    """Forget every session of a user in every worker (password change, deactivation, edits)"""
+    if user_id is not None:
+        invalidation.publish('session_user', user_id, conn)
+
+
+def clear():
+    """Drop every cached session in this process"""
+    with _lock:
+        _cache.clear()
+        _by_user.clear()
+
+
+def sweep_expired_sessions(db_path=None):
+    """
+    Delete expired session rows and old cache invalidation messages.
+
+    Returns:
+        dict: Rows removed from each table
+    """
+    conn = sqlite3.connect(db_path or CLIENT_DB_PATH, timeout=20.0)
+    try:
+        sessions = conn.execute('DELETE FROM sessions WHERE expires_at < ?',
+                                (datetime.now().isoformat(),)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    return {'sessions': sessions, 'invalidations': invalidation.prune_messages(db_path)}
+
+
+def start_session_sweeper():
+    """Sweep expired sessions hourly, shared across workers"""
+    from maintenance import start_periodic_task
+    start_periodic_task('session_sweep', SWEEP_INTERVAL, sweep_expired_sessions)
+
+
+invalidation.subscribe('session_token', _drop)
+invalidation.subscribe('session_user', _drop_user_key)
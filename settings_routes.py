@@ -441,69 +441,24 @@ def update_backup_settings(user):
 @settings_bp.route('/settings/backup/run', methods=['POST'])
 @admin_required
 def run_backup(user):
-    """Run a manual database backup"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Start a manual database backup in the background"""
+    from backup_service import start_backup
     
     try:
-        # Get backup settings
-        cursor.execute("SELECT * FROM backup_settings LIMIT 1")
-        backup_settings = dict(cursor.fetchone() or {})
-        
-        if not backup_settings:
-            flash("Backup settings not found", "danger")
-            return redirect(url_for('settings.settings_dashboard'))
-        
-        # Ensure backup directory exists
-        backup_path = backup_settings.get('backup_path')
-        if not backup_path:
-            backup_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
-            os.makedirs(backup_path, exist_ok=True)
-        
-        # Generate backup filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"scanner_db_backup_{timestamp}.db"
-        backup_file = os.path.join(backup_path, backup_filename)
-        
-        # Close the current connection to perform backup
-        conn.close()
-        
-        # Get database path
-        from client_db import CLIENT_DB_PATH
-        
-        # Create a backup using SQLite's backup API
-        import shutil
-        shutil.copy2(CLIENT_DB_PATH, backup_file)
-        
-        # Reconnect to update backup timestamp
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            UPDATE backup_settings SET
-                last_backup = ?,
-                last_updated = ?,
-                updated_by = ?
-            WHERE id = 1
-        """, (
-            datetime.now().isoformat(),
-            datetime.now().isoformat(),
-            user['id']
-        ))
-        
-        conn.commit()
-        
-        flash(f"Backup created successfully: {backup_filename}", "success")
-        return redirect(url_for('settings.settings_dashboard'))
-        
+        if start_backup(user_id=user['id'], force=bool(request.form.get('force'))):
+            flash("Backup started. Unchanged databases are skipped; check the backup status for progress.", "success")
+        else:
+            flash("A backup is already running", "info")
     except Exception as e:
-        if conn:
-            conn.rollback()
-        flash(f"Error creating backup: {str(e)}", "danger")
-        return redirect(url_for('settings.settings_dashboard'))
-    finally:
-        if conn:
-            conn.close()
+        flash(f"Error starting backup: {str(e)}", "danger")
+    return redirect(url_for('settings.settings_dashboard'))
+
+@settings_bp.route('/settings/backup/status')
+@admin_required
+def backup_status(user):
+    """Progress of the running backup and the last result"""
+    from backup_service import backup_status as current_backup_status
+    return jsonify({'status': 'success', 'backup': current_backup_status()})
 
 @settings_bp.route('/settings/password', methods=['POST'])
 @admin_required
@@ -553,6 +508,8 @@ def update_password(user):
             user['id']
         ))
         
+        from session_cache import invalidate_user
+        invalidate_user(user['id'], conn)
         conn.commit()
         
         flash("Password updated successfully", "success")
@@ -617,7 +574,6 @@ def api_system_info(user):
     try:
         # Get system information
         import platform
-        import psutil
         
         # OS info
         os_info = {
@@ -635,26 +591,28 @@ def api_system_info(user):
             'compiler': platform.python_compiler()
         }
         
-        # System resources
+        # System resources from the background sampler; nothing is measured here
+        import health_sampler
+        health = health_sampler.health_report()
+        current = health['current']
         resources = {
-            'cpu_count': psutil.cpu_count(),
-            'cpu_percent': psutil.cpu_percent(interval=0.1),
-            'memory_total': psutil.virtual_memory().total,
-            'memory_available': psutil.virtual_memory().available,
-            'memory_percent': psutil.virtual_memory().percent,
-            'disk_total': psutil.disk_usage('/').total,
-            'disk_used': psutil.disk_usage('/').used,
-            'disk_free': psutil.disk_usage('/').free,
-            'disk_percent': psutil.disk_usage('/').percent
+            'cpu_count': os.cpu_count(),
+            'cpu_percent': current.get('system_cpu_percent'),
+            'memory_total': current.get('memory_total') or 0,
+            'memory_available': current.get('memory_available') or 0,
+            'memory_percent': current.get('memory_percent'),
+            'disk_total': current.get('disk_total') or 0,
+            'disk_used': current.get('disk_used') or 0,
+            'disk_free': current.get('disk_free') or 0,
+            'disk_percent': current.get('disk_percent')
         }
         
         # Database info
         from client_db import CLIENT_DB_PATH
-        import os
         
         db_info = {
             'db_path': CLIENT_DB_PATH,
-            'db_size': os.path.getsize(CLIENT_DB_PATH) if os.path.exists(CLIENT_DB_PATH) else 0,
+            'db_size': current.get('main_db_size') or 0,
             'db_exists': os.path.exists(CLIENT_DB_PATH)
         }
         
@@ -670,7 +628,8 @@ def api_system_info(user):
                 'os': os_info,
                 'python': python_info,
                 'resources': resources,
-                'database': db_info
+                'database': db_info,
+                'health': health
             }
         })
         
@@ -680,6 +639,17 @@ def api_system_info(user):
             'message': str(e)
         }), 500
 
+@settings_bp.route('/api/settings/health')
+@admin_required
+def api_health(user):
+    """Latest health sample and recent history for sparklines"""
+    import health_sampler
+    limit = request.args.get('limit', 60, type=int)
+    return jsonify({
+        'status': 'success',
+        'data': health_sampler.health_report(limit=max(1, min(limit, health_sampler.HISTORY_SIZE)))
+    })
+
 def format_bytes(bytes):
     """Format bytes to human-readable format"""
     if bytes < 1024:
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+In-process cache of tenant configuration.
+
+Embed pages, scanner stylesheets, the scan forms and reports all re-read the
+same rows on every request: the client, its customizations and its
+scanners. Those rows change only when a client edits their settings or
+branding, so they are cached per worker and served from memory.
+
+Every change to a tenant's configuration goes through invalidate(). It bumps
+clients.config_version in the writing transaction and publishes a
+'tenant_config' message on the shared invalidation channel, so every worker
+drops the client's entries. The version is kept on cached records for
+validators such as ETags. Entries also expire after CONFIG_CACHE_TTL, which
+bounds staleness if a row is changed outside these paths.
+"""
+
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import invalidation
+from migrations import CLIENT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CACHE_TTL = float(os.environ.get('TENANT_CONFIG_CACHE_TTL', '300'))
+MISS_TTL = 5
+MAX_ENTRIES = 10000
+
+_entries = {}    # (kind, key) -> (expires monotonic, client_id, record or None)
+_lock = threading.Lock()
+
+CLIENT_QUERY = '''
+SELECT c.*, cu.*, c.id AS id, COALESCE(c.config_version, 0) AS config_version
+FROM clients c
+LEFT JOIN customizations cu ON c.id = cu.client_id
+WHERE c.id = ?
+'''
+
+SCANNER_QUERY = '''
+SELECT s.*, c.business_name, COALESCE(c.config_version, 0) AS config_version,
+       COALESCE(s.primary_color, cu.primary_color, '#02054c') as final_primary_color,
+       COALESCE(s.secondary_color, cu.secondary_color, '#35a310') as final_secondary_color,
+       COALESCE(s.button_color, cu.button_color, '#28a745') as final_button_color,
+       COALESCE(s.font_family, cu.font_family, 'Inter') as final_font_family,
+       COALESCE(s.color_style, cu.color_style, 'gradient') as final_color_style,
+       COALESCE(s.logo_url, cu.logo_path, '') as final_logo_url,
+       COALESCE(s.email_subject, cu.email_subject, 'Your Security Scan Report') as final_email_subject,
+       COALESCE(s.email_intro, cu.email_intro, '') as final_email_intro,
+       cu.primary_color AS custom_primary_color, cu.secondary_color AS custom_secondary_color,
+       cu.button_color AS custom_button_color,
+       cu.scanner_description, cu.cta_button_text, cu.company_tagline,
+       cu.support_email, cu.custom_footer_text, cu.favicon_path
+FROM scanners s
+JOIN clients c ON s.client_id = c.id
+LEFT JOIN customizations cu ON c.id = cu.client_id
+WHERE s.scanner_id = ?
+'''
+
+SUBDOMAIN_QUERY = '''
+SELECT c.*, d.*, c.id AS id, COALESCE(c.config_version, 0) AS config_version
+FROM clients c
+JOIN deployed_scanners d ON c.id = d.client_id
+WHERE d.subdomain = ?
+'''
+
+
+def _load(query, key):
+    conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(query, (key,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    record = dict(row)
+    # Credentials are resolved by api_key_cache; never keep them here
+    record.pop('api_key', None)
+    if isinstance(record.get('default_scans'), str):
+        try:
+            record['default_scans'] = json.loads(record['default_scans'])
+        except ValueError:
+            record['default_scans'] = []
+    return record
+
+
+def _cached(kind, key, query, client_key):
+    if key is None or key == '':
+        return None
+    cache_key = (kind, str(key))
+    entry = _entries.get(cache_key)
+    if entry is None or entry[0] <= time.monotonic():
+        try:
+            record = _load(query, key)
+        except sqlite3.Error as e:
+            logger.error(f"Error loading {kind} configuration for {key}: {e}")
+            return None
+        invalidation.ensure_listening(on_error=clear)
+        ttl = CONFIG_CACHE_TTL if record is not None else MISS_TTL
+        client_id = record[client_key] if record is not None else None
+        entry = (time.monotonic() + ttl, client_id, record)
+        with _lock:
+            if len(_entries) >= MAX_ENTRIES:
+                _evict()
+            _entries[cache_key] = entry
+    # Callers decorate these dicts for templates, so never hand out the cached one
+    return copy.deepcopy(entry[2])
+
+
+def get_client(client_id):
+    """Client row merged with its customizations, or None"""
+    return _cached('client', client_id, CLIENT_QUERY, 'id')
+
+
+def get_scanner(scanner_uid):
+    """Scanner row with resolved branding (final_* columns) and the client's customizations, or None"""
+    return _cached('scanner', scanner_uid, SCANNER_QUERY, 'client_id')
+
+
+def get_client_by_subdomain(subdomain):
+    """Client row merged with its deployed scanner, or None"""
+    return _cached('subdomain', subdomain, SUBDOMAIN_QUERY, 'id')
+
+
+def _evict():
+    """Drop expired entries, then the oldest ones, to make room (caller holds _lock)"""
+    now = time.monotonic()
+    for key in [key for key, entry in _entries.items() if entry[0] <= now]:
+        del _entries[key]
+    while len(_entries) >= MAX_ENTRIES:
+        del _entries[next(iter(_entries))]
+
+
+def _drop_client(client_id):
+    client_id = int(client_id)
+    with _lock:
+        for key in [key for key, entry in _entries.items() if entry[1] == client_id or entry[2] is None]:
+            del _entries[key]
+
+
+def invalidate(client_id, conn=None):
+    """
+    Record a configuration change and drop the client's entries in every worker.
+
+    Args:
+        client_id: Client whose settings, customizations or scanners changed
+        conn: Open connection on the main database; the version bump and
+            the message then commit with the caller's change
+    """
+    if client_id is None:
+        return
+    statement = 'UPDATE clients SET config_version = COALESCE(config_version, 0) + 1 WHERE id = ?'
+    try:
+        if conn is not None:
+            conn.execute(statement, (client_id,))
+        else:
+            own_conn = sqlite3.connect(CLIENT_DB_PATH, timeout=20.0)
+            try:
+                own_conn.execute(statement, (client_id,))
+                own_conn.commit()
+            finally:
+                own_conn.close()
+    except sqlite3.Error as e:
+        logger.error(f"Error bumping config version for client {client_id}: {e}")
+    invalidation.publish('tenant_config', client_id, conn)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+invalidation.subscribe('tenant_config', _drop_client)
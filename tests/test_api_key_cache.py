@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+# client_db creates its tables on import; keep them out of the checked-in database
+os.environ.setdefault('CLIENT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'client_scanner.db'))
+
+import api_key_cache
+import client_db
+import invalidation
+import migrations
+
+
+class TestApiKeyCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'main.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE clients (id INTEGER PRIMARY KEY, business_name TEXT, api_key TEXT, '
+                     'subscription_level TEXT, default_scans TEXT)')
+        conn.execute('CREATE TABLE customizations (id INTEGER PRIMARY KEY, client_id INTEGER, primary_color TEXT)')
+        conn.execute('CREATE TABLE deployed_scanners (id INTEGER PRIMARY KEY, client_id INTEGER, '
+                     'subdomain TEXT, deploy_status TEXT)')
+        conn.execute('CREATE TABLE scanners (id INTEGER PRIMARY KEY, client_id INTEGER, scanner_id TEXT, '
+                     'name TEXT, api_key TEXT, status TEXT)')
+        migrations._main_cache_invalidations(conn)
+        conn.execute("INSERT INTO clients VALUES (3, 'Acme', 'client-key', 'professional', '[\"ssl\"]')")
+        conn.execute("INSERT INTO customizations VALUES (40, 3, '#123456')")
+        conn.execute("INSERT INTO scanners VALUES (8, 3, 'scn_a', 'Main', 'scanner-key', 'active')")
+        conn.execute("INSERT INTO scanners VALUES (9, 3, 'scn_b', 'Old', 'old-key', 'deleted')")
+        conn.commit()
+        conn.close()
+
+        for patcher in (mock.patch.object(api_key_cache, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'ensure_listening')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        invalidation.apply_pending()
+
+    def tearDown(self):
+        api_key_cache.clear()
+        invalidation._last_id = None
+        self.tmpdir.cleanup()
+
+    def execute(self, statement):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+    def test_client_record_is_cached_without_the_key(self):
+        client = api_key_cache.get_client('client-key')
+        self.assertEqual(client['id'], 3)
+        self.assertNotIn('api_key', client)
+        self.assertEqual(client['default_scans'], ['ssl'])
+        self.assertEqual(client['subscription_level'], 'professional')
+        self.assertEqual([scanner['scanner_id'] for scanner in client['scanners']], ['scn_a'])
+
+        # With the row gone, only the cache can answer
+        self.execute('DELETE FROM clients')
+        self.assertEqual(api_key_cache.get_client('client-key')['business_name'], 'Acme')
+        self.assertNotIn('client-key', repr(api_key_cache._clients))
+
+    def test_scanner_lookup(self):
+        scanner, client = api_key_cache.get_scanner('scn_a', 'scanner-key')
+        self.assertEqual(scanner['client_id'], 3)
+        self.assertEqual(client['id'], 3)
+        self.assertEqual(api_key_cache.get_scanner('scn_a', 'wrong-key'), (None, None))
+
+    def test_invalidation_drops_client_entries(self):
+        api_key_cache.get_client('client-key')
+        api_key_cache.get_scanner('scn_a', 'scanner-key')
+        self.execute("UPDATE clients SET api_key = 'new-key'")
+        api_key_cache.invalidate_client(3)
+        self.assertIsNone(api_key_cache.get_client('client-key'))
+        self.assertEqual(api_key_cache.get_client('new-key')['id'], 3)
+        self.assertEqual(api_key_cache._scanners, {})
+
+    def test_invalidation_from_another_worker(self):
+        api_key_cache.get_client('client-key')
+        self.execute("INSERT INTO cache_invalidations (channel, cache_key, created_at) VALUES ('api_client', '3', 0)")
+        self.execute('DELETE FROM clients')
+        invalidation.apply_pending()
+        self.assertIsNone(api_key_cache.get_client('client-key'))
+
+    def test_deleting_a_client_drops_its_credentials(self):
+        self.assertEqual(api_key_cache.get_client('client-key')['id'], 3)
+        with mock.patch.object(client_db, 'CLIENT_DB_PATH', self.db_path):
+            self.assertEqual(client_db.delete_client(3)['status'], 'success')
+        self.assertIsNone(api_key_cache.get_client('client-key'))
+
+    def test_deactivating_a_client_drops_its_credentials(self):
+        self.execute('ALTER TABLE clients ADD COLUMN active INTEGER DEFAULT 1')
+        self.execute('ALTER TABLE clients ADD COLUMN updated_at TEXT')
+        self.execute('ALTER TABLE clients ADD COLUMN updated_by INTEGER')
+        self.execute('ALTER TABLE deployed_scanners ADD COLUMN last_updated TEXT')
+        self.assertEqual(api_key_cache.get_client('client-key')['id'], 3)
+        with mock.patch.object(client_db, 'CLIENT_DB_PATH', self.db_path):
+            self.assertEqual(client_db.deactivate_client(3)['status'], 'success')
+        # Re-read rather than served from the cache
+        self.assertEqual(api_key_cache.get_client('client-key')['active'], 0)
+
+    def test_misses_expire_quickly(self):
+        self.assertIsNone(api_key_cache.get_client('later-key'))
+        self.execute("UPDATE clients SET api_key = 'later-key'")
+        self.assertIsNone(api_key_cache.get_client('later-key'))
+        with mock.patch.object(api_key_cache.time, 'monotonic', return_value=api_key_cache.time.monotonic() + 10):
+            self.assertEqual(api_key_cache.get_client('later-key')['id'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import backup_service
+from backup_service import backup_sources, change_signature, load_manifest, run_backup
+
+
+class TestBackupService(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.backup_dir = os.path.join(self.tmpdir.name, 'backups')
+        self.sources = []
+        for name in ('main.db', 'client_1_scans.db'):
+            path = os.path.join(self.tmpdir.name, name)
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)')
+            conn.execute("INSERT INTO items (value) VALUES ('first')")
+            conn.commit()
+            conn.close()
+            self.sources.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def restore(self, filename):
+        path = os.path.join(self.tmpdir.name, 'restored.db')
+        with gzip.open(os.path.join(self.backup_dir, filename), 'rb') as packed, open(path, 'wb') as raw:
+            raw.write(packed.read())
+        conn = sqlite3.connect(path)
+        try:
+            return [row[0] for row in conn.execute('SELECT value FROM items ORDER BY id')]
+        finally:
+            conn.close()
+
+    def test_incremental_backup(self):
+        first = run_backup(self.backup_dir, sources=self.sources)
+        self.assertEqual((first['copied'], first['unchanged'], first['failed']), (2, 0, 0))
+
+        # Nothing changed: nothing is copied
+        second = run_backup(self.backup_dir, sources=self.sources)
+        self.assertEqual((second['copied'], second['unchanged']), (0, 2))
+
+        time.sleep(1.1)
+        before = change_signature(self.sources[1])
+        conn = sqlite3.connect(self.sources[1])
+        conn.execute("INSERT INTO items (value) VALUES ('second')")
+        conn.commit()
+        conn.close()
+        self.assertNotEqual(change_signature(self.sources[1]), before)
+
+        third = run_backup(self.backup_dir, sources=self.sources)
+        self.assertEqual((third['copied'], third['unchanged']), (1, 1))
+
+        manifest = load_manifest(self.backup_dir)
+        latest = manifest[os.path.abspath(self.sources[1])]['file']
+        self.assertTrue(latest.endswith('.db.gz'))
+        self.assertEqual(self.restore(latest), ['first', 'second'])
+
+    def test_sleeps_between_backup_steps(self):
+        conn = sqlite3.connect(self.sources[0])
+        conn.executemany('INSERT INTO items (value) VALUES (?)', [('x' * 2000,) for _ in range(20)])
+        conn.commit()
+        conn.close()
+        target = os.path.join(self.tmpdir.name, 'main.db.gz')
+        with mock.patch.object(backup_service.time, 'sleep') as sleep:
+            backup_service.backup_database(self.sources[0], target, pages=2, sleep=0.01)
+        self.assertGreater(sleep.call_count, 1)
+        sleep.assert_called_with(0.01)
+
+    def test_sources_include_spools(self):
+        spool = os.path.join(self.tmpdir.name, 'write_behind_spool.db')
+        sqlite3.connect(spool).close()
+        missing = os.path.join(self.tmpdir.name, 'mail_spool.db')
+        sources = backup_sources(self.sources[0], self.sources[1], os.path.join(self.tmpdir.name, 'none'),
+                                 spool_paths=[spool, missing])
+        self.assertEqual(sources, [self.sources[0], self.sources[1], spool])
+
+
+if __name__ == '__main__':
+    unittest.main()
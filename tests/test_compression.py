@@ -0,0 +1,116 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+
+import compression
+import http_cache
+
+BODY = '<html>' + 'security report ' * 200 + '</html>'
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmpdir.name, 'static')
+        os.makedirs(os.path.join(self.static, 'deployments', 'scanner_1'))
+        self.script = os.path.join(self.static, 'deployments', 'scanner_1', 'scanner-script.js')
+        with open(self.script, 'w') as f:
+            f.write('console.log("scanner");\n' * 200)
+
+        app = Flask(__name__, static_folder=self.static)
+
+        @app.route('/report')
+        def report():
+            return http_cache.finish(BODY)
+
+        self.renders = 0
+
+        @app.route('/cached-report')
+        def cached_report():
+            cached = http_cache.not_modified('report-v1')
+            if cached:
+                return cached
+            self.renders += 1
+            return http_cache.finish(BODY, etag='report-v1')
+
+        @app.route('/small')
+        def small():
+            return jsonify({'status': 'ok'})
+
+        http_cache.init_app(app)
+        compression.init_app(app)
+        self.client = app.test_client()
+        compression.clear_cache()
+
+    def tearDown(self):
+        compression.clear_cache()
+        self.tmpdir.cleanup()
+
+    def test_large_html_is_compressed_and_revalidates(self):
+        response = self.client.get('/report', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data).decode(), BODY)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        # The weakened ETag still matches the view's validator
+        response = self.client.get('/report', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_weakened_etag_answers_before_rendering(self):
+        response = self.client.get('/cached-report', headers={'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        self.assertEqual(etag, 'W/"report-v1"')
+
+        response = self.client.get('/cached-report', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.renders, 1)
+
+    def test_small_or_unaccepted_responses_are_sent_as_is(self):
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        response = self.client.get('/report', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.data.decode(), BODY)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_identical_bodies_are_compressed_once(self):
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            for _ in range(3):
+                self.client.get('/report', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(compress.call_count, 1)
+
+    def test_static_file_served_from_precompressed_sibling(self):
+        self.assertTrue(compression.needs_precompress(self.script))
+        self.assertIn('gzip', compression.precompress(self.script))
+        self.assertFalse(compression.needs_precompress(self.script))
+
+        url = '/static/deployments/scanner_1/scanner-script.js'
+        with mock.patch.object(compression, 'compress') as compress:
+            response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        compress.assert_not_called()
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        with open(self.script, 'rb') as f:
+            self.assertEqual(gzip.decompress(response.data), f.read())
+        etag = response.headers['ETag']
+        response.close()
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response.close()
+
+        response = self.client.get(url)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+# client_db creates its tables on import; keep them out of the checked-in database
+os.environ.setdefault('CLIENT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'client_scanner.db'))
+
+import dashboard_snapshot
+import enhanced_admin_dashboard
+
+DATA = {
+    'overview': {'total_clients': 3, 'total_scans': 12},
+    'clients': [],
+    'scanners': [{'scanner_id': 'scanner_1', 'name': 'Main'}],
+    'recent_leads': [],
+    'system_health': {'db_integrity': 'ok'},
+    'recent_activities': [],
+    'recent_logins': []
+}
+
+
+class TestDashboardSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, 'dashboard_snapshot.json')
+        for patcher in (mock.patch.object(dashboard_snapshot, 'SNAPSHOT_PATH', self.path),
+                        mock.patch.object(dashboard_snapshot, 'SETTLE_DELAY', 0),
+                        mock.patch.object(dashboard_snapshot, '_pending', None),
+                        mock.patch.object(dashboard_snapshot, '_loaded', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(enhanced_admin_dashboard, 'build_dashboard_data', return_value=DATA)
+        self.build = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_page_loads_read_the_snapshot(self):
+        first = enhanced_admin_dashboard.get_enhanced_dashboard_data()
+        second = enhanced_admin_dashboard.get_enhanced_dashboard_data()
+        self.assertEqual(self.build.call_count, 1)
+        self.assertEqual(second['overview']['total_clients'], 3)
+        self.assertIn('datetime', second)
+        self.assertEqual(first['snapshot_generated_at'], second['snapshot_generated_at'])
+        self.assertTrue(os.path.exists(self.path))
+
+        # Another worker parses the file once per write
+        with mock.patch.object(dashboard_snapshot, '_loaded', None), \
+                mock.patch.object(dashboard_snapshot.json, 'load', wraps=dashboard_snapshot.json.load) as load:
+            dashboard_snapshot.load_snapshot()
+            dashboard_snapshot.load_snapshot()
+        self.assertEqual(load.call_count, 1)
+
+    def test_periodic_refresh_is_claimed_once(self):
+        with mock.patch.object(dashboard_snapshot, 'claim_task', side_effect=[True, False]) as claim:
+            self.assertEqual(dashboard_snapshot.run_due_refresh(), dashboard_snapshot.REFRESH_INTERVAL)
+            # The losing worker sleeps until the next periodic slot instead of polling the claim
+            delay = dashboard_snapshot.run_due_refresh()
+        self.assertGreater(delay, dashboard_snapshot.REFRESH_INTERVAL - 5)
+        self.assertLessEqual(delay, dashboard_snapshot.REFRESH_INTERVAL)
+        claim.assert_called_with('dashboard_snapshot', dashboard_snapshot.REFRESH_INTERVAL)
+        self.assertEqual(self.build.call_count, 1)
+
+        # An early refresh another worker holds is retried soon
+        dashboard_snapshot._mark_stale('client:7')
+        with mock.patch.object(dashboard_snapshot, 'claim_task', return_value=False):
+            self.assertEqual(dashboard_snapshot.run_due_refresh(), dashboard_snapshot.MIN_REFRESH_INTERVAL)
+
+    def test_invalidation_triggers_early_refresh(self):
+        dashboard_snapshot.refresh()
+        dashboard_snapshot._mark_stale('client:7')
+        with mock.patch.object(dashboard_snapshot, 'claim_task', return_value=True) as claim:
+            dashboard_snapshot.run_due_refresh()
+        claim.assert_called_once_with('dashboard_snapshot', dashboard_snapshot.MIN_REFRESH_INTERVAL)
+        self.assertEqual(self.build.call_count, 2)
+        self.assertIsNone(dashboard_snapshot._pending)
+
+    def test_refresh_by_another_worker_clears_pending(self):
+        dashboard_snapshot._mark_stale('client:7')
+        time.sleep(0.01)
+        dashboard_snapshot.refresh()    # as if written by another worker
+        with mock.patch.object(dashboard_snapshot, 'claim_task') as claim:
+            dashboard_snapshot.run_due_refresh()
+        claim.assert_not_called()
+        self.assertIsNone(dashboard_snapshot._pending)
+
+
+if __name__ == '__main__':
+    unittest.main()
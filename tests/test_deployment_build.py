@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import deployment_build
+import scanner_deployment
+
+SCANNER_DATA = {
+    'name': 'Acme Scanner',
+    'business_name': 'Acme',
+    'primary_color': '#123456',
+    'secondary_color': '#654321',
+    'contact_email': 'security@acme.test'
+}
+
+
+class TestDeploymentBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.deployments = self.tmpdir.name
+        deployment_build._source_hashes.clear()
+
+    def tearDown(self):
+        deployment_build._source_hashes.clear()
+        self.tmpdir.cleanup()
+
+    def build(self, data=SCANNER_DATA, **kwargs):
+        return deployment_build.build_scanner('scanner_acme', dict(data), 'key_123',
+                                              deployments_dir=self.deployments, **kwargs)
+
+    def test_unchanged_inputs_rebuild_nothing(self):
+        first = self.build()
+        self.assertEqual(first['rebuilt'], ['css', 'js', 'html', 'docs'])
+        deployment_dir = first['deployment_path']
+        index_mtime = os.stat(os.path.join(deployment_dir, 'index.html')).st_mtime_ns
+
+        second = self.build()
+        self.assertEqual(second['rebuilt'], [])
+        self.assertEqual(os.stat(os.path.join(deployment_dir, 'index.html')).st_mtime_ns, index_mtime)
+        manifest = json.load(open(os.path.join(deployment_dir, deployment_build.MANIFEST_NAME)))
+        self.assertEqual(sorted(manifest), ['css', 'docs', 'html', 'js'])
+        # Generated files get precompressed siblings for the static route
+        self.assertTrue(os.path.exists(os.path.join(deployment_dir, 'scanner-script.js.gz')))
+        # Atomic writes leave no temp files behind
+        self.assertFalse([name for name in os.listdir(deployment_dir) if name.endswith('.tmp')])
+
+    def test_only_targets_with_changed_inputs_rebuild(self):
+        self.build()
+        recolored = dict(SCANNER_DATA, primary_color='#abcdef')
+        # New colors change the stylesheet, and index.html links it by content hash
+        self.assertEqual(self.build(recolored)['rebuilt'], ['css', 'html'])
+
+        # A missing output is rebuilt even though its inputs match
+        os.remove(os.path.join(self.deployments, 'scanner_acme', 'api-docs.md'))
+        self.assertEqual(self.build(recolored)['rebuilt'], ['docs'])
+
+    def test_template_change_rebuilds_its_target(self):
+        self.build()
+        deployment_build._source_hashes['generate_scanner_js'] = 'edited template'
+        # The script's content hash is unchanged, so index.html is left alone
+        self.assertEqual(self.build()['rebuilt'], ['js'])
+        self.assertEqual(self.build(force=True)['rebuilt'], ['css', 'js', 'html', 'docs'])
+
+    def test_failed_generator_reports_error(self):
+        with mock.patch.object(scanner_deployment, 'generate_scanner_css', return_value=False):
+            result = self.build()
+        self.assertEqual(result['status'], 'error')
+
+    def test_rebuild_all_runs_in_parallel_with_progress(self):
+        scanners = [(f'scanner_{i}', dict(SCANNER_DATA, name=f'Scanner {i}'), f'key_{i}') for i in range(4)]
+        seen = []
+        summary = deployment_build.rebuild_all(scanners, jobs=2, deployments_dir=self.deployments,
+                                               progress=lambda done, total, result: seen.append((done, total)))
+        self.assertEqual((summary['total'], summary['rebuilt'], summary['failed']), (4, 4, 0))
+        self.assertEqual(seen[-1], (4, 4))
+        self.assertTrue(os.path.exists(os.path.join(self.deployments, 'scanner_3', 'index.html')))
+
+        summary = deployment_build.rebuild_all(scanners, jobs=2, deployments_dir=self.deployments)
+        self.assertEqual(summary['unchanged'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
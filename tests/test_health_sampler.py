@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+import unittest
+from collections import deque
+from unittest import mock
+
+from flask import Flask, jsonify
+
+import health_sampler
+
+
+class TestHealthSampler(unittest.TestCase):
+    def setUp(self):
+        for patcher in (mock.patch.object(health_sampler, '_samples', deque(maxlen=3)),
+                        mock.patch.object(health_sampler, '_active_scans', 0),
+                        mock.patch.object(health_sampler, '_tracking', True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sample_fields_and_ring_buffer(self):
+        sample = health_sampler.collect_sample()
+        for field in ('rss', 'open_fds', 'threads', 'main_db_size', 'client_db_count',
+                      'write_queue_depth', 'mail_queue_depth', 'active_scans'):
+            self.assertIn(field, sample)
+        self.assertGreater(sample['threads'], 0)
+
+        for n in range(5):
+            health_sampler.record({'timestamp': n, 'cpu_percent': n * 10})
+        series = health_sampler.history(fields=('cpu_percent',))
+        self.assertEqual(series, {'timestamps': [2, 3, 4], 'cpu_percent': [20, 30, 40]})
+        self.assertEqual(health_sampler.history(fields=('cpu_percent',), limit=1)['cpu_percent'], [40])
+
+    def test_health_report_does_not_sample_on_request(self):
+        health_sampler.record({'timestamp': time.time(), 'rss': 1024})
+        with mock.patch.object(health_sampler, 'collect_sample') as collect:
+            report = health_sampler.health_report()
+        collect.assert_not_called()
+        self.assertEqual(report['current']['rss'], 1024)
+        self.assertEqual(report['history']['rss'], [1024])
+
+    def test_active_scans_follow_scan_requests(self):
+        app = Flask(__name__)
+        app.teardown_request(health_sampler._scan_finished)
+        seen = {}
+
+        @app.route('/scan', methods=['POST'])
+        def scan():
+            health_sampler.scan_started()
+            health_sampler.scan_started()    # counted once per request
+            seen['during'] = health_sampler.collect_sample()['active_scans']
+            return jsonify({'status': 'ok'})
+
+        @app.route('/api/data')
+        def api_data():
+            seen['api'] = health_sampler.collect_sample()['active_scans']
+            return jsonify({'status': 'ok'})
+
+        client = app.test_client()
+        client.post('/scan')
+        client.get('/api/data')
+        self.assertEqual(seen, {'during': 1, 'api': 0})
+        self.assertEqual(health_sampler.collect_sample()['active_scans'], 0)
+
+    def test_persisted_history_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'health.db')
+            now = time.time()
+            with mock.patch.object(health_sampler, 'SAMPLES_PATH', path), \
+                    mock.patch.object(health_sampler, 'SAMPLE_INTERVAL', 10):
+                for n in range(4):
+                    timestamp = now // 10 * 10 - 40 + n * 10
+                    health_sampler.record({'timestamp': timestamp, 'pid': 1, 'rss': n, 'mail_queue_depth': n})
+                    # A second worker sampling in the same interval
+                    health_sampler.record({'timestamp': timestamp + 1, 'pid': 2, 'rss': 100 + n,
+                                           'mail_queue_depth': n})
+                health_sampler._samples.clear()
+                self.assertEqual(health_sampler.load_history(), 3)
+            series = health_sampler.history(fields=('mail_queue_depth', 'rss'))
+            self.assertEqual(series['mail_queue_depth'], [1, 2, 3])
+            # Per-process figures aren't carried over from other workers
+            self.assertEqual(series['rss'], [None, None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import http_cache
+import scanner_deployment
+from routes.scanner_routes import scanner_bp
+
+SCANNER = {
+    'scanner_id': 'scn_a', 'client_id': 3, 'name': 'Main', 'config_version': 2,
+    'custom_primary_color': '#111111', 'custom_secondary_color': None, 'custom_button_color': None
+}
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__, static_folder=self.tmpdir.name, static_url_path='/static')
+        self.app.register_blueprint(scanner_bp)
+        http_cache.init_app(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_styles_etag_and_conditional_get(self):
+        with mock.patch('tenant_config.get_scanner', return_value=dict(SCANNER)):
+            response = self.client.get('/scanner/scn_a/scanner-styles.css')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'#111111', response.data)
+            self.assertIn('must-revalidate', response.headers['Cache-Control'])
+            etag = response.headers['ETag']
+
+            response = self.client.get('/scanner/scn_a/scanner-styles.css', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.data, b'')
+
+            version = http_cache.asset_version(2)
+            response = self.client.get(f'/scanner/scn_a/scanner-styles.css?v={version}')
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            self.assertIn(f'max-age={http_cache.IMMUTABLE_MAX_AGE}', response.headers['Cache-Control'])
+
+        # A branding change moves the validator
+        with mock.patch('tenant_config.get_scanner', return_value=dict(SCANNER, config_version=3)):
+            response = self.client.get('/scanner/scn_a/scanner-styles.css', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+
+    def test_script_is_cacheable(self):
+        response = self.client.get('/scanner/scn_a/scanner-script.js')
+        response = self.client.get('/scanner/scn_a/scanner-script.js',
+                                   headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_static_deployment_files(self):
+        folder = os.path.join(self.tmpdir.name, 'deployments', 'scn_a')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'scanner-styles.css'), 'w') as f:
+            f.write('body {}')
+
+        response = self.client.get('/static/deployments/scn_a/scanner-styles.css?v=abc')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertNotIn('no-cache', response.headers['Cache-Control'])
+        response.close()
+        response = self.client.get('/static/deployments/scn_a/scanner-styles.css')
+        self.assertIn(f'max-age={http_cache.EMBED_MAX_AGE}', response.headers['Cache-Control'])
+        etag = response.headers['ETag']
+        response.close()
+        response = self.client.get('/static/deployments/scn_a/scanner-styles.css', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_generated_page_links_assets_by_content_hash(self):
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        try:
+            result = scanner_deployment.generate_scanner_deployment('scn_a', {'name': 'Main'}, 'key')
+            self.assertEqual(result['status'], 'success')
+            folder = os.path.join('static', 'deployments', 'scn_a')
+            with open(os.path.join(folder, 'index.html')) as f:
+                page = f.read()
+            css_version = http_cache.file_version(os.path.join(folder, 'scanner-styles.css'))
+            self.assertIn(f'./scanner-styles.css?v={css_version}', page)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import hashlib
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+import login_pipeline
+
+
+class TestLoginPipeline(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, '
+                          'password_hash TEXT, salt TEXT, active INTEGER DEFAULT 1)')
+        self.conn.execute("INSERT INTO users VALUES (1, 'ann', 'ann@acme.io', ?, 'salt1', 1)",
+                          (login_pipeline.pbkdf2_hash('secret', 'salt1'),))
+        legacy = hashlib.sha256(('oldpass' + 'salt2').encode()).hexdigest()
+        self.conn.execute("INSERT INTO users VALUES (2, 'bob', 'bob@acme.io', ?, 'salt2', 1)", (legacy,))
+        login_pipeline.reset_throttle()
+
+    def tearDown(self):
+        login_pipeline.reset_throttle()
+        self.conn.close()
+
+    def login(self, username, password, ip='10.0.0.1'):
+        return login_pipeline.authenticate(self.conn.cursor(), username, password, ip)
+
+    def test_valid_and_invalid_password(self):
+        user, error = self.login('ann', 'secret')
+        self.assertIsNone(error)
+        self.assertEqual(user['id'], 1)
+        user, error = self.login('ann@acme.io', 'wrong')
+        self.assertIsNone(user)
+        self.assertEqual(error['message'], 'Invalid credentials')
+
+    def test_legacy_hash_is_upgraded(self):
+        user, error = self.login('bob', 'oldpass')
+        self.assertIsNone(error)
+        row = self.conn.execute('SELECT password_hash, salt FROM users WHERE id = 2').fetchone()
+        self.assertEqual(row['password_hash'], login_pipeline.pbkdf2_hash('oldpass', row['salt']))
+        # Still logs in with the upgraded hash
+        self.assertIsNone(self.login('bob', 'oldpass')[1])
+
+    def test_account_throttle_rejects_without_hashing(self):
+        for _ in range(login_pipeline.ACCOUNT_MAX_FAILURES):
+            self.login('ann', 'wrong', ip=None)
+        with mock.patch.object(login_pipeline, 'pbkdf2_hash') as hashed:
+            user, error = self.login('ann', 'secret', ip=None)
+        self.assertIsNone(user)
+        self.assertIn('Too many login attempts', error['message'])
+        hashed.assert_not_called()
+
+    def test_account_throttle_counts_username_and_email_together(self):
+        for n in range(login_pipeline.ACCOUNT_MAX_FAILURES):
+            self.login('ann' if n % 2 else 'ann@acme.io', 'wrong', ip=None)
+        self.assertIn('Too many login attempts', self.login('ann@acme.io', 'secret', ip=None)[1]['message'])
+        self.assertIn('Too many login attempts', self.login('ann', 'secret', ip=None)[1]['message'])
+        # Other accounts are unaffected
+        self.assertIsNone(self.login('bob', 'oldpass', ip=None)[1])
+
+    def test_hash_runs_in_the_request_thread(self):
+        threads = []
+
+        def record_thread(password, salt):
+            threads.append(threading.current_thread())
+            return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 1).hex()
+
+        with mock.patch.object(login_pipeline, 'pbkdf2_hash', side_effect=record_thread):
+            self.login('ann', 'secret')
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_ip_throttle(self):
+        with mock.patch.object(login_pipeline, 'IP_MAX_ATTEMPTS', 2):
+            self.login('nobody', 'x')
+            self.login('nobody2', 'x')
+            self.assertIn('Too many login attempts', self.login('ann', 'secret')[1]['message'])
+            # Other addresses are unaffected
+            self.assertIsNone(self.login('ann', 'secret', ip='10.0.0.2')[1])
+
+    def test_saturated_pool_rejects_immediately(self):
+        with mock.patch.object(login_pipeline._slots, 'acquire', return_value=False):
+            user, error = self.login('ann', 'secret')
+        self.assertIsNone(user)
+        self.assertEqual(error, login_pipeline.BUSY)
+
+
+if __name__ == '__main__':
+    unittest.main()
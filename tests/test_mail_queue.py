@@ -0,0 +1,198 @@
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+from email.mime.text import MIMEText
+from unittest import mock
+
+import mail_queue
+import report_templates
+
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail, like a local debugging server"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost debugging SMTP')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                address = line.split(':', 1)[1].strip('<> ')
+                if address in server.reject:
+                    self.reply(f'{server.reject[address]} rejected')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    data_line = self.rfile.readline().decode()
+                    if data_line.rstrip('\r\n') == '.':
+                        break
+                    data.append(data_line)
+                server.messages.append((recipients, ''.join(data)))
+                self.reply('250 Queued')
+            elif command == 'NOOP' or command == 'RSET':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), DebuggingSMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.reject = {}
+
+
+def message(to, subject='Security Scan Report'):
+    msg = MIMEText('<p>report</p>', 'html')
+    msg['Subject'] = subject
+    msg['From'] = 'reports@example.com'
+    msg['To'] = to
+    return msg
+
+
+class TestMailQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.smtp = DebuggingSMTPServer()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+
+        env = {'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(self.smtp.server_address[1]),
+               'SMTP_STARTTLS': 'False', 'SMTP_USER': '', 'SMTP_PASSWORD': ''}
+        for patcher in (mock.patch.dict(os.environ, env),
+                        mock.patch.object(mail_queue, 'MAIL_SPOOL_PATH', os.path.join(self.tmpdir.name, 'mail.db')),
+                        mock.patch.object(mail_queue, 'ENABLED', False),
+                        mock.patch.object(report_templates, 'JINJA_CACHE_DIR', os.path.join(self.tmpdir.name, 'jinja')),
+                        mock.patch.object(report_templates, '_env', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.smtp.shutdown()
+        self.smtp.server_close()
+        self.tmpdir.cleanup()
+
+    def test_batch_is_sent_over_one_connection(self):
+        ids = [mail_queue.enqueue(message(f'lead{i}@example.com')) for i in range(5)]
+        self.assertEqual(mail_queue.queue_depth(), 5)
+
+        self.assertTrue(mail_queue.flush())
+        self.assertEqual(len(self.smtp.messages), 5)
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(mail_queue.status(ids[0])['status'], 'sent')
+        self.assertEqual(mail_queue.queue_depth(), 0)
+
+    def test_connection_is_reused_and_reopened_when_dropped(self):
+        connection = mail_queue.SMTPConnection()
+        try:
+            mail_queue.enqueue(message('a@example.com'))
+            mail_queue.drain_once(connection)
+            # The server closes the idle session behind our back
+            connection.server.sock.shutdown(socket.SHUT_RDWR)
+            mail_queue.enqueue(message('b@example.com'))
+            mail_queue.drain_once(connection)
+        finally:
+            connection.close()
+        self.assertEqual(len(self.smtp.messages), 2)
+        self.assertEqual(self.smtp.connections, 2)
+
+    def test_temporary_failures_back_off_and_permanent_ones_fail(self):
+        self.smtp.reject = {'busy@example.com': 451, 'gone@example.com': 550}
+        busy = mail_queue.enqueue(message('busy@example.com'))
+        gone = mail_queue.enqueue(message('gone@example.com'))
+        mail_queue.flush()
+
+        self.assertEqual(mail_queue.status(gone)['status'], 'failed')
+        busy_status = mail_queue.status(busy)
+        self.assertEqual(busy_status['status'], 'queued')
+        self.assertEqual(busy_status['attempts'], 1)
+        self.assertEqual(mail_queue.retry_delay(1), mail_queue.RETRY_BASE_DELAY)
+        self.assertEqual(mail_queue.retry_delay(3), mail_queue.RETRY_BASE_DELAY * 4)
+
+        # Not due yet, so a flush leaves it alone; once due it is retried
+        mail_queue.flush()
+        self.assertEqual(mail_queue.status(busy)['attempts'], 1)
+        self.smtp.reject = {}
+        with mock.patch('time.time', return_value=time.time() + mail_queue.RETRY_BASE_DELAY + 1):
+            mail_queue.flush()
+        self.assertEqual(mail_queue.status(busy)['status'], 'sent')
+
+    def test_delivery_is_recorded_on_the_report(self):
+        with mock.patch('report_artifacts.mark_emailed') as mark_emailed:
+            mail_queue.enqueue(message('lead@example.com'), client_id=3, scan_id='scan_mail')
+            mail_queue.flush()
+        mark_emailed.assert_called_once()
+        self.assertEqual(mark_emailed.call_args[0][:2], (3, 'scan_mail'))
+
+    def test_message_reclaimed_mid_batch_is_not_sent_twice(self):
+        first = mail_queue.enqueue(message('a@example.com'))
+        second = mail_queue.enqueue(message('b@example.com'))
+        spool_conn = mail_queue._connect_spool()
+        connection = mail_queue.SMTPConnection()
+        try:
+            rows = mail_queue._claim_batch(spool_conn, 'slow-worker')
+            # The batch ran past CLAIM_TIMEOUT and another worker took over the second message
+            spool_conn.execute("UPDATE outbound_mail SET claimed_by = 'other-worker' WHERE id = ?", (second,))
+            spool_conn.commit()
+            mail_queue._deliver(spool_conn, connection, rows, 'slow-worker')
+        finally:
+            connection.close()
+            spool_conn.close()
+        self.assertEqual([recipients for recipients, _ in self.smtp.messages], [['a@example.com']])
+        self.assertEqual(mail_queue.status(first)['status'], 'sent')
+        self.assertEqual(mail_queue.status(second)['status'], 'queued')
+
+    def test_enhanced_scan_report_records_delivery_not_enqueue(self):
+        import enhanced_scan_routes
+        import report_artifacts
+        with mock.patch('tenant_config.get_client', return_value=None), \
+                mock.patch.object(report_artifacts, 'wait_for_html', return_value='<p>report</p>'), \
+                mock.patch.object(report_artifacts, 'mark_emailed') as mark_emailed:
+            with mock.patch.dict(os.environ, {'SMTP_USER': 'reports@example.com', 'SMTP_PASSWORD': 'secret'}):
+                enhanced_scan_routes.send_enhanced_scan_report(
+                    {'scan_id': 'scan_e'}, {'email': 'lead@example.com', 'company': 'Acme'}, client_id=4
+                )
+            mark_emailed.assert_not_called()
+            mail_queue.flush()
+        self.assertEqual(mark_emailed.call_args[0][:2], (4, 'scan_e'))
+
+    def test_report_email_is_queued_not_sent_inline(self):
+        import email_handler
+        with mock.patch.dict(os.environ, {'SMTP_USER': 'reports@example.com', 'SMTP_PASSWORD': 'secret'}):
+            sent = email_handler.send_email_report(
+                {'email': 'lead@example.com', 'company': 'Acme'}, {'scan_id': 'scan_q'}, '<p>report</p>'
+            )
+        self.assertTrue(sent)
+        self.assertEqual(self.smtp.connections, 0)
+        self.assertEqual(mail_queue.queue_depth(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import migrations
+from migrations import CLIENT_SCANS_DB, LEADS_DB, MAIN_DB, ensure_schema, latest_version, migrate_database, table_columns
+
+
+class TestSchemaMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'client_1_scans.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, scan_id TEXT UNIQUE, scanner_id TEXT,
+                timestamp TEXT, lead_name TEXT, lead_email TEXT, lead_company TEXT,
+                target_domain TEXT, created_at TEXT
+            )
+        ''')
+        conn.execute("INSERT INTO scans (scan_id, lead_email, created_at) VALUES ('a', 'a@acme.io', '2025-01-02T03:04:05')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        migrations._migrated_paths.clear()
+        migrations._schema_cache.clear()
+        self.tmpdir.cleanup()
+
+    def test_client_database_reaches_latest_version(self):
+        self.assertEqual(migrate_database(self.db_path, CLIENT_SCANS_DB), latest_version(CLIENT_SCANS_DB))
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], latest_version(CLIENT_SCANS_DB))
+            self.assertEqual(conn.execute('SELECT day_bucket FROM scans').fetchone()[0], 20250102)
+            self.assertIsNotNone(conn.execute(
+                "SELECT name FROM sqlite_master WHERE name = 'idx_scans_created_id'").fetchone())
+        finally:
+            conn.close()
+        self.assertIn('month_bucket', table_columns(self.db_path, 'scans'))
+
+    def test_ensure_schema_runs_once(self):
+        self.assertTrue(ensure_schema(self.db_path, CLIENT_SCANS_DB))
+        # Later calls must not touch the database at all
+        os.remove(self.db_path)
+        self.assertTrue(ensure_schema(self.db_path, CLIENT_SCANS_DB))
+
+    def test_leads_columns_added_to_old_table(self):
+        leads_path = os.path.join(self.tmpdir.name, 'leads.db')
+        conn = sqlite3.connect(leads_path)
+        conn.execute('CREATE TABLE leads (id INTEGER PRIMARY KEY, name TEXT, email TEXT, created_at TEXT)')
+        conn.commit()
+        conn.close()
+
+        self.assertTrue(ensure_schema(leads_path, LEADS_DB))
+        for column in ['lead_id', 'windows_version', 'timestamp']:
+            self.assertIn(column, table_columns(leads_path, 'leads'))
+
+    def test_main_steps_wait_for_their_tables(self):
+        main_path = os.path.join(self.tmpdir.name, 'main.db')
+        conn = sqlite3.connect(main_path)
+        conn.executescript('''
+            CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, created_at TEXT);
+            CREATE TABLE clients (id INTEGER PRIMARY KEY, business_name TEXT, active INTEGER, created_at TEXT);
+            CREATE TABLE deployed_scanners (id INTEGER PRIMARY KEY, client_id INTEGER);
+        ''')
+        conn.close()
+        self.assertEqual(table_columns(main_path, 'scan_history'), [])
+
+        # v3 needs scan_history: the version must not move past it
+        self.assertIsNone(migrate_database(main_path, MAIN_DB))
+        conn = sqlite3.connect(main_path)
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], 2)
+        conn.execute('CREATE TABLE scan_history (id INTEGER PRIMARY KEY, client_id INTEGER, '
+                     'scan_type TEXT, timestamp TEXT)')
+        conn.commit()
+        conn.close()
+
+        # Likewise v7 and sessions, so its index isn't skipped for good
+        self.assertIsNone(migrate_database(main_path, MAIN_DB))
+        conn = sqlite3.connect(main_path)
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], 6)
+        conn.execute('CREATE TABLE sessions (id INTEGER PRIMARY KEY, user_id INTEGER, expires_at TEXT)')
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(migrate_database(main_path, MAIN_DB), latest_version(MAIN_DB))
+        conn = sqlite3.connect(main_path)
+        self.assertIsNotNone(conn.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'idx_sessions_expires_at'").fetchone())
+        conn.close()
+        # Cached columns are re-read after migrating
+        self.assertIn('day_bucket', table_columns(main_path, 'scan_history'))
+        self.assertIn('config_version', table_columns(main_path, 'clients'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import sqlite3
+import unittest
+
+from pagination import build_page, cached_count, decode_cursor, encode_cursor, invalidate_counts, keyset_clause
+
+
+class TestKeysetPagination(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE scans (id INTEGER PRIMARY KEY, created_at TEXT)')
+        self.conn.executemany(
+            'INSERT INTO scans (id, created_at) VALUES (?, ?)',
+            [(i, f'2025-01-{(i % 5) + 1:02d}T00:00:00') for i in range(1, 24)]
+        )
+
+    def tearDown(self):
+        self.conn.close()
+
+    def fetch_page(self, token, per_page=5):
+        key, direction = decode_cursor(token)
+        direction = direction or 'next'
+        condition, params, order_by = keyset_clause(('created_at', 'id'), key, direction)
+        where = f'WHERE {condition}' if condition else ''
+        rows = self.conn.execute(
+            f'SELECT id, created_at FROM scans {where} ORDER BY {order_by} LIMIT ?',
+            params + [per_page + 1]
+        ).fetchall()
+        return build_page(rows, per_page, lambda row: (row[1], row[0]), direction, key is not None)
+
+    def test_cursor_round_trip(self):
+        token = encode_cursor(('2025-01-01T00:00:00', 7), 'prev')
+        self.assertEqual(decode_cursor(token), (('2025-01-01T00:00:00', 7), 'prev'))
+        self.assertEqual(decode_cursor('not-a-cursor'), (None, None))
+
+    def test_walk_forward_and_back(self):
+        expected = [row[0] for row in self.conn.execute(
+            'SELECT id FROM scans ORDER BY created_at DESC, id DESC')]
+
+        seen = []
+        pages = []
+        token = None
+        while True:
+            rows, info = self.fetch_page(token)
+            pages.append((token, [row[0] for row in rows], info))
+            seen.extend(row[0] for row in rows)
+            if not info['has_next']:
+                break
+            token = info['next_cursor']
+        self.assertEqual(seen, expected)
+
+        # Step back from the last page to the one before it
+        _, last_ids, last_info = pages[-1]
+        rows, info = self.fetch_page(last_info['prev_cursor'])
+        self.assertEqual([row[0] for row in rows], pages[-2][1])
+        self.assertTrue(info['has_next'])
+
+    def test_cached_count_and_invalidation(self):
+        cursor = self.conn.cursor()
+        invalidate_counts('test-db')
+        self.assertEqual(cached_count('test-db', cursor, 'SELECT COUNT(*) FROM scans'), 23)
+        self.conn.execute("INSERT INTO scans (id, created_at) VALUES (100, '2025-02-01T00:00:00')")
+        self.assertEqual(cached_count('test-db', cursor, 'SELECT COUNT(*) FROM scans'), 23)
+        invalidate_counts('test-db')
+        self.assertEqual(cached_count('test-db', cursor, 'SELECT COUNT(*) FROM scans'), 24)
+
+
+if __name__ == '__main__':
+    unittest.main()
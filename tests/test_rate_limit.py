@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import rate_limit
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(rate_limit, 'RATE_LIMIT_PATH', os.path.join(self.tmpdir.name, 'limits.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        rate_limit._local = threading.local()
+        self.now = 1000.0
+        patcher = mock.patch.object(rate_limit.time, 'time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        conn = getattr(rate_limit._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        rate_limit._local = threading.local()
+        self.tmpdir.cleanup()
+
+    def test_burst_then_refill(self):
+        bucket = ('ip:scan:1.2.3.4', 3, 0.5)
+        results = [rate_limit.consume([bucket])['allowed'] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+        denied = rate_limit.consume([bucket])
+        self.assertEqual(denied['retry_after'], 2)
+        self.assertEqual(rate_limit.headers(denied)['Retry-After'], '2')
+
+        self.now += 2
+        decision = rate_limit.consume([bucket])
+        self.assertTrue(decision['allowed'])
+        self.assertEqual(decision['remaining'], 0)
+
+    def test_buckets_are_shared_between_workers(self):
+        bucket = ('scanner:scn_a', 2, 0.0)
+        rate_limit.consume([bucket])
+        # Another worker has its own connection to the same store
+        rate_limit._local = threading.local()
+        self.assertTrue(rate_limit.consume([bucket])['allowed'])
+        self.assertFalse(rate_limit.consume([bucket])['allowed'])
+
+    def test_rejection_spends_nothing(self):
+        roomy, empty = ('ip:api:1.2.3.4', 5, 0.0), ('key:abc', 1, 0.0)
+        rate_limit.consume([empty])
+        self.assertFalse(rate_limit.consume([roomy, empty])['allowed'])
+        self.assertEqual(rate_limit.consume([roomy])['remaining'], 4)
+
+    def test_tier_sizing_and_hashed_keys(self):
+        key, capacity, rate = rate_limit.key_bucket('secret-key', {'subscription_level': 'enterprise'})
+        self.assertNotIn('secret-key', key)
+        self.assertEqual((capacity, rate), (120, 1.0))
+        self.assertEqual(rate_limit.scanner_bucket('scn_a', {'subscription_level': None})[1], 10)
+
+    def test_enforce_sets_headers_and_429(self):
+        app = Flask(__name__)
+        app.after_request(rate_limit.add_headers)
+        bucket = ('ip:scan:1.2.3.4', 1, 0.01)
+
+        @app.route('/scan', methods=['POST'])
+        def scan():
+            limited = rate_limit.enforce([bucket])
+            return limited or 'ok'
+
+        client = app.test_client()
+        response = client.post('/scan')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['RateLimit-Remaining'], '0')
+        response = client.post('/scan')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '100')
+
+    def test_prune_forgets_idle_buckets(self):
+        rate_limit.consume([('ip:scan:old', 3, 1.0)])
+        self.now += rate_limit.IDLE_RETENTION + 1
+        rate_limit.consume([('ip:scan:new', 3, 1.0)])
+        self.assertEqual(rate_limit.prune_buckets(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from flask import Flask
+
+import report_artifacts
+import report_cache
+import report_templates
+import scan_storage
+import write_behind
+
+SCAN = {
+    'scan_id': 'scan_art',
+    'target': 'example.com',
+    'risk_assessment': {'overall_score': 71, 'risk_level': 'Medium'},
+    'recommendations': [{'title': 'Enable MFA', 'priority': 'high'}]
+}
+
+
+class InlineExecutor:
+    """Runs render jobs in-process so the tests need no pool"""
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+class TestReportArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = scan_storage.PerClientScanStore(self.tmpdir.name)
+        self.branding = {'business_name': 'Acme', 'config_version': 1}
+        previous = scan_storage.get_scan_store()
+        scan_storage.set_scan_store(self.store)
+        self.addCleanup(scan_storage.set_scan_store, previous)
+
+        for patcher in (mock.patch.object(report_artifacts, 'REPORT_ARTIFACT_DIR', os.path.join(self.tmpdir.name, 'artifacts')),
+                        mock.patch.object(report_artifacts, '_get_executor', return_value=InlineExecutor()),
+                        mock.patch('tenant_config.get_client', side_effect=lambda client_id: self.branding),
+                        mock.patch.object(report_cache, 'ENABLED', False),
+                        mock.patch.object(write_behind, 'SPOOL_PATH', os.path.join(self.tmpdir.name, 'spool.db')),
+                        mock.patch.object(write_behind, 'ENABLED', False),
+                        mock.patch.object(report_templates, 'JINJA_CACHE_DIR', os.path.join(self.tmpdir.name, 'jinja')),
+                        mock.patch.object(report_templates, '_env', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.store.create_tenant(1, 'Acme')
+        conn = self.store.connect(1)
+        conn.execute('INSERT INTO scans (scan_id, timestamp, lead_email, scan_results, created_at) VALUES (?, ?, ?, ?, ?)',
+                     ('scan_art', '2025-06-01T12:00:00', 'lead@example.com', json.dumps(SCAN), '2025-06-01T12:00:00'))
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def rows(self):
+        conn = self.store.connect(1)
+        rows = {row['report_type']: dict(row) for row in conn.execute('SELECT * FROM reports')}
+        conn.close()
+        return rows
+
+    def test_queued_scan_records_content_addressed_artifacts(self):
+        with mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            self.assertTrue(report_artifacts.queue_scan(1, dict(SCAN)))
+            report_artifacts.queue_scan(1, dict(SCAN))
+
+        rows = self.rows()
+        self.assertEqual(rows['html']['status'], 'ready')
+        self.assertEqual(rows['html']['branding_version'], 1)
+        path = report_artifacts.artifact_path(rows['html']['content_hash'], 'html')
+        self.assertEqual(os.path.getsize(path), rows['html']['size'])
+        # Re-rendering identical output reuses the file and the row
+        self.assertEqual(len(os.listdir(os.path.dirname(path))), 1)
+        self.assertEqual(len(rows), 2)
+        # Without WeasyPrint the PDF is reported, not retried forever
+        self.assertEqual(rows['pdf']['status'], 'unavailable')
+
+    def test_download_serves_file_with_range_support(self):
+        with mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            report_artifacts.queue_scan(1, dict(SCAN))
+        app = Flask(__name__)
+        with app.test_request_context(headers={'Range': 'bytes=0-9'}):
+            response = report_artifacts.send_artifact(1, 'scan_art', 'html')
+            response.direct_passthrough = False
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(len(response.get_data()), 10)
+            self.assertIn('attachment', response.headers['Content-Disposition'])
+            response.close()
+        self.assertEqual(self.rows()['html']['download_count'], 1)
+        self.assertIn('Enable MFA', report_artifacts.load_html(1, 'scan_art'))
+
+    def test_missing_or_stale_artifact_is_requeued(self):
+        with mock.patch.object(report_artifacts, 'queue_scan') as queue:
+            row = report_artifacts.get_artifact(1, 'scan_art', 'html')
+        queue.assert_called_once()
+        self.assertIsNone(row['path'])
+
+        with mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            report_artifacts.queue_scan(1, dict(SCAN))
+        self.branding = {'business_name': 'Acme', 'config_version': 2}
+        with mock.patch.object(report_artifacts, 'queue_scan') as queue:
+            row = report_artifacts.get_artifact(1, 'scan_art', 'html')
+        # The old rendering is still served while the new one is queued
+        queue.assert_called_once()
+        self.assertIsNotNone(row['path'])
+
+    def test_pending_rows_from_a_lost_worker_are_requeued(self):
+        with mock.patch.object(report_artifacts, '_get_executor', side_effect=RuntimeError('pool down')):
+            report_artifacts.queue_scan(1, dict(SCAN))
+        self.assertEqual(self.rows()['html']['status'], 'pending')
+
+        with mock.patch.object(report_artifacts, 'PENDING_TIMEOUT', -60), \
+                mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            self.assertEqual(report_artifacts.requeue_stale(), 1)
+        self.assertEqual(self.rows()['html']['status'], 'ready')
+
+    def test_failed_render_stops_after_max_attempts(self):
+        failed = {'html': {'status': 'failed', 'error': 'boom'}, 'pdf': {'status': 'failed', 'error': 'boom'}}
+        with mock.patch.object(report_artifacts, 'render_artifacts', return_value=failed) as render:
+            report_artifacts.queue_scan(1, dict(SCAN))
+            for _ in range(report_artifacts.MAX_RENDER_ATTEMPTS + 2):
+                row = report_artifacts.get_artifact(1, 'scan_art', 'html')
+        self.assertEqual(render.call_count, report_artifacts.MAX_RENDER_ATTEMPTS)
+        self.assertTrue(report_artifacts.exhausted(row))
+        self.assertEqual(self.rows()['html']['render_attempts'], report_artifacts.MAX_RENDER_ATTEMPTS)
+        with mock.patch.object(report_artifacts, 'render_artifacts', return_value=failed):
+            self.assertIsNone(report_artifacts.wait_for_html(1, 'scan_art', timeout=5, poll=0))
+
+    def test_rows_go_through_write_behind(self):
+        with mock.patch.object(write_behind, 'ENABLED', True), \
+                mock.patch.object(write_behind, '_ensure_writer'), \
+                mock.patch.object(report_artifacts, '_get_executor', side_effect=RuntimeError('pool down')):
+            report_artifacts.queue_scan(1, dict(SCAN))
+            self.assertEqual(self.rows(), {})
+            with mock.patch.object(report_artifacts, 'queue_scan') as queue:
+                row = report_artifacts.get_artifact(1, 'scan_art', 'html')
+            queue.assert_not_called()
+            self.assertEqual(row['status'], 'pending')
+            self.assertTrue(write_behind.flush(timeout=5))
+        self.assertEqual(self.rows()['html']['status'], 'pending')
+
+    def test_delivery_recorded_before_rows_are_written(self):
+        with mock.patch.object(write_behind, 'ENABLED', True), \
+                mock.patch.object(write_behind, '_ensure_writer'), \
+                mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            report_artifacts.queue_scan(1, dict(SCAN))
+            self.assertTrue(report_artifacts.mark_emailed(1, 'scan_art', '2026-01-01T00:00:00'))
+            self.assertTrue(write_behind.flush(timeout=5))
+        rows = self.rows()
+        self.assertEqual(rows['html']['status'], 'ready')
+        self.assertEqual(rows['html']['email_sent'], 1)
+        self.assertEqual(rows['html']['email_sent_at'], '2026-01-01T00:00:00')
+
+    def test_email_only_row_does_not_block_rendering(self):
+        self.assertTrue(report_artifacts.mark_emailed(1, 'scan_art'))
+        with mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            report_artifacts.get_artifact(1, 'scan_art', 'html')
+        rows = self.rows()
+        self.assertEqual(rows['html']['status'], 'ready')
+        self.assertEqual(rows['html']['email_sent'], 1)
+
+    def test_older_write_does_not_replace_newer_row(self):
+        with mock.patch.object(report_artifacts, 'pdf_available', return_value=False):
+            report_artifacts.queue_scan(1, dict(SCAN))
+        conn = self.store.connect(1)
+        report_artifacts._write_report_rows(conn, [{
+            'client_id': 1, 'scan_id': 'scan_art', 'updated_at': '2000-01-01T00:00:00',
+            'rows': {'html': {'status': 'pending', 'error': None}}
+        }])
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.rows()['html']['status'], 'ready')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import enhanced_scan_report_generator
+import invalidation
+import migrations
+import report_cache
+
+SCAN = {'scan_id': 'scan_abc', 'target': 'example.com', 'risk_assessment': {'overall_score': 82}}
+
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'main.db')
+        conn = sqlite3.connect(self.db_path)
+        migrations._main_cache_invalidations(conn)
+        conn.commit()
+        conn.close()
+
+        for patcher in (mock.patch.object(report_cache, 'REPORT_CACHE_DIR', os.path.join(self.tmpdir.name, 'reports')),
+                        mock.patch.object(invalidation, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'ensure_listening')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        invalidation.apply_pending()
+        report_cache._disk_bytes = None
+        self.renders = 0
+
+    def tearDown(self):
+        report_cache.clear()
+        invalidation._last_id = None
+        self.tmpdir.cleanup()
+
+    def render(self, html='<html>report</html>'):
+        def render():
+            self.renders += 1
+            return html
+        return render
+
+    def test_repeat_views_render_once(self):
+        for _ in range(3):
+            html = report_cache.get_or_render('scan_abc', 'client_view', 1, self.render())
+        self.assertEqual(html, '<html>report</html>')
+        self.assertEqual(self.renders, 1)
+
+        # Another worker starts with an empty memory tier and reads the disk tier
+        report_cache.clear()
+        report_cache.get_or_render('scan_abc', 'client_view', 1, self.render())
+        self.assertEqual(self.renders, 1)
+
+        # New branding is a new key
+        report_cache.get_or_render('scan_abc', 'client_view', 2, self.render())
+        self.assertEqual(self.renders, 2)
+
+    def test_invalidate_scan_drops_every_tier(self):
+        report_cache.get_or_render('scan_abc', 'client_view', 1, self.render())
+        report_cache.get_or_render('scan_abc', 'enhanced', 0, self.render())
+        report_cache.get_or_render('scan_xyz', 'enhanced', 0, self.render())
+        report_cache.invalidate_scan('scan_abc')
+
+        self.assertIsNone(report_cache.get('scan_abc', 'client_view', 1))
+        self.assertIsNone(report_cache.get('scan_abc', 'enhanced', 0))
+        self.assertIsNotNone(report_cache.get('scan_xyz', 'enhanced', 0))
+
+    def test_invalidation_from_another_worker(self):
+        report_cache.put('scan_abc', 'public_view', 0, '<html>old</html>')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO cache_invalidations (channel, cache_key, created_at) "
+                     "VALUES ('report_cache', 'scan_abc', 0)")
+        conn.commit()
+        conn.close()
+        invalidation.apply_pending()
+        self.assertNotIn(('scan_abc', 'public_view', '0'), report_cache._memory)
+
+    def test_failed_render_is_not_cached(self):
+        def broken():
+            raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            report_cache.get_or_render('scan_abc', 'html', 0, broken)
+        self.assertIsNone(report_cache.get('scan_abc', 'html', 0))
+
+    def test_memory_and_disk_tiers_are_bounded(self):
+        with mock.patch.object(report_cache, 'MEMORY_MAX_BYTES', 400):
+            for index in range(4):
+                report_cache.put(f'scan_{index}', 'html', 0, 'x' * 100)
+            report_cache.get('scan_0', 'html', 0)
+            report_cache.put('scan_4', 'html', 0, 'x' * 100)
+        # scan_1 was the least recently used
+        self.assertNotIn(('scan_1', 'html', '0'), report_cache._memory)
+        self.assertIn(('scan_0', 'html', '0'), report_cache._memory)
+        self.assertLessEqual(report_cache._memory_bytes, 400)
+
+        with mock.patch.object(report_cache, 'DISK_MAX_BYTES', 1):
+            self.assertEqual(report_cache.prune_disk(), 5)
+        report_cache.clear()
+        self.assertIsNone(report_cache.get('scan_0', 'html', 0))
+
+    def test_enhanced_report_is_cached_per_branding_version(self):
+        with mock.patch.object(enhanced_scan_report_generator, '_render_enhanced_html_report',
+                               side_effect=lambda scan, branding: '<html>enhanced</html>') as render:
+            branding = {'business_name': 'Acme', 'config_version': 4}
+            enhanced_scan_report_generator.generate_enhanced_html_report(dict(SCAN), branding)
+            enhanced_scan_report_generator.generate_enhanced_html_report(dict(SCAN), branding)
+            self.assertEqual(render.call_count, 1)
+
+            # Branding that did not come from tenant_config has no version to key on
+            enhanced_scan_report_generator.generate_enhanced_html_report(dict(SCAN), {'business_name': 'Acme'})
+            enhanced_scan_report_generator.generate_enhanced_html_report(dict(SCAN), {'business_name': 'Acme'})
+            self.assertEqual(render.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+# client_db creates its tables on import; keep them out of the checked-in database
+os.environ.setdefault('CLIENT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'client_scanner.db'))
+
+import report_metrics
+import reports_routes
+from time_buckets import ensure_time_buckets
+
+
+class TestReportMetrics(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript('''
+            CREATE TABLE scan_history (id INTEGER PRIMARY KEY, client_id INTEGER, scan_type TEXT, timestamp TEXT);
+            CREATE TABLE clients (id INTEGER PRIMARY KEY, business_name TEXT, subscription_level TEXT,
+                                  subscription_status TEXT, active INTEGER DEFAULT 1, created_at TEXT);
+            CREATE TABLE users (id INTEGER PRIMARY KEY, role TEXT, active INTEGER DEFAULT 1, created_at TEXT);
+            CREATE TABLE sessions (id INTEGER PRIMARY KEY, user_id INTEGER, created_at TEXT);
+        ''')
+        # Rows from before the aggregates existed are backfilled
+        self.conn.execute("INSERT INTO scan_history (client_id, scan_type, timestamp) "
+                          "VALUES (1, 'quick', '2025-01-10T09:00:00.123456')")
+        ensure_time_buckets(self.conn, 'scan_history')
+        report_metrics.ensure_report_metrics(self.conn)
+        self.cursor = self.conn.cursor()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def add_scan(self, timestamp, scan_type='full', client_id=1):
+        self.conn.execute('INSERT INTO scan_history (client_id, scan_type, timestamp) VALUES (?, ?, ?)',
+                          (client_id, scan_type, timestamp))
+
+    def test_triggers_keep_daily_and_monthly_counts(self):
+        self.add_scan('2025-01-10 15:00:00')
+        self.add_scan('2025-01-12T08:00:00')
+        self.add_scan('2025-02-01T08:00:00', 'quick')
+        self.assertEqual(report_metrics.series(self.cursor, 'scans', '2025-01-09', '2025-01-12'), [
+            {'date': '2025-01-09', 'count': 0},
+            {'date': '2025-01-10', 'count': 2},
+            {'date': '2025-01-11', 'count': 0},
+            {'date': '2025-01-12', 'count': 1}
+        ])
+        self.assertEqual(report_metrics.series(self.cursor, 'scans', '2024-12-15', '2025-02-10', 'month'), [
+            {'date': '2024-12', 'count': 0},
+            {'date': '2025-01', 'count': 3},
+            {'date': '2025-02', 'count': 1}
+        ])
+        totals = dict(report_metrics.dimension_totals(self.cursor, 'scans', '2025-01-01', '2025-02-28'))
+        self.assertEqual(totals, {'quick': 2, 'full': 2})
+
+        # Deletes and moved rows are reflected
+        self.conn.execute("DELETE FROM scan_history WHERE timestamp LIKE '2025-01-12%'")
+        self.conn.execute("UPDATE scan_history SET scan_type = 'full' WHERE timestamp LIKE '2025-02-01%'")
+        self.assertEqual(report_metrics.total(self.cursor, 'scans', '2025-01-01', '2025-01-31'), 2)
+        totals = dict(report_metrics.dimension_totals(self.cursor, 'scans', '2025-01-01', '2025-02-28'))
+        self.assertEqual(totals, {'quick': 1, 'full': 2})
+
+    def test_weekly_series_sums_days(self):
+        self.add_scan('2025-01-06T10:00:00')     # Monday
+        self.add_scan('2025-01-08T10:00:00')
+        self.add_scan('2025-01-13T10:00:00')     # next Monday
+        chart = report_metrics.series(self.cursor, 'scans', '2025-01-06', '2025-01-19', 'week')
+        # Week 1 also holds the backfilled 2025-01-10 scan
+        self.assertEqual(chart, [{'date': 'Week 01, 2025', 'count': 3}, {'date': 'Week 02, 2025', 'count': 1}])
+
+    def test_logins_survive_session_sweep_and_rebuild(self):
+        self.conn.execute("INSERT INTO sessions (user_id, created_at) VALUES (1, '2025-03-01T10:00:00')")
+        self.conn.execute("INSERT INTO sessions (user_id, created_at) VALUES (2, '2025-03-01T11:00:00')")
+        self.conn.execute('DELETE FROM sessions')
+        self.assertEqual(report_metrics.total(self.cursor, 'logins', '2025-03-01', '2025-03-01'), 2)
+
+        self.conn.execute("INSERT INTO clients (subscription_level, created_at) VALUES ('pro', '2025-03-01')")
+        self.conn.execute("DELETE FROM metric_daily WHERE metric = 'new_clients'")
+        report_metrics.rebuild(self.conn)
+        self.assertEqual(report_metrics.total(self.cursor, 'logins', '2025-03-01', '2025-03-01'), 2)
+        self.assertEqual(report_metrics.dimension_totals(self.cursor, 'new_clients', '2025-03-01', '2025-03-01'),
+                         [('pro', 1)])
+
+    def test_scan_report_reads_aggregates(self):
+        self.conn.execute("INSERT INTO clients (id, business_name, created_at) VALUES (1, 'Acme', '2025-01-01')")
+        today = datetime.now()
+        self.add_scan(today.isoformat())
+        self.add_scan((today - timedelta(days=2)).isoformat(), 'quick')
+
+        report = reports_routes.get_scan_reports(self.cursor, 'week')
+        self.assertEqual(len(report['chart_data']), 8)
+        self.assertEqual(report['chart_data'][-1], {'date': today.strftime('%Y-%m-%d'), 'count': 1})
+        self.assertEqual(sum(point['count'] for point in report['chart_data']), 2)
+        self.assertEqual(report['top_clients'], [{'name': 'Acme', 'count': 2}])
+
+        report = reports_routes.get_scan_reports(self.cursor, 'year')
+        self.assertEqual(report['chart_data'][-1]['date'], today.strftime('%Y-%m'))
+        self.assertEqual(len({point['date'] for point in report['chart_data']}), len(report['chart_data']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import enhanced_scan_report_generator
+import report_cache
+import report_templates
+import scan
+
+SCAN = {
+    'scan_id': 'scan_tpl',
+    'target': 'example.com',
+    'risk_assessment': {'overall_score': 64, 'risk_level': 'Medium', 'grade': 'C',
+                        'component_scores': {'network': 35}},
+    'network_security': {
+        'findings': [{'title': '<script>alert(1)</script>', 'severity': 'High'}],
+        'open_ports': [{'port': 3389, 'service': 'rdp'}]
+    },
+    'email_security': {'dmarc_analysis': {'status': 'FAIL'}},
+    'ssl_certificate': {'status': 'Expired', 'severity': 'Critical'},
+    'recommendations': ['Enable MFA'],
+    'threat_scenarios': [{'name': 'Ransomware'}, {'name': 'Phishing'}]
+}
+
+
+class TestReportTemplates(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for patcher in (mock.patch.object(report_cache, 'ENABLED', False),
+                        mock.patch.object(report_templates, 'JINJA_CACHE_DIR', self.tmpdir.name),
+                        mock.patch.object(report_templates, '_env', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_enhanced_report_renders_component_macros(self):
+        html = enhanced_scan_report_generator.generate_enhanced_html_report(
+            dict(SCAN), {'business_name': 'Acme', 'primary_color': '#123456', 'config_version': 1}
+        )
+        self.assertIn('--primary-color: #123456;', html)
+        self.assertIn('Network Security Analysis', html)
+        self.assertIn('<td>3389</td>', html)
+        self.assertIn('color: #dc3545;">35</div>', html)
+        # Scan data is escaped, not injected
+        self.assertNotIn('<script>alert(1)</script>', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    def test_section_helpers_render_macros(self):
+        html = enhanced_scan_report_generator.generate_email_details({'dmarc_analysis': {'status': 'FAIL'}})
+        self.assertIn('<h6>DMARC Policy</h6>', html)
+        self.assertIn('bg-danger', html)
+        self.assertNotIn('SPF Record', html)
+
+    def test_scan_report_has_one_footer(self):
+        html = scan.generate_html_report(dict(SCAN))
+        self.assertIn('<td>Web Security</td>', html)
+        self.assertIn('<p>Enable MFA</p>', html)
+        self.assertEqual(html.count('class="footer"'), 1)
+        self.assertTrue(html.rstrip().endswith('</html>'))
+
+    def test_new_worker_loads_bytecode_from_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            report_templates.create_environment(cache_dir=cache_dir).get_template('reports/scan_report.html')
+            self.assertTrue(os.listdir(cache_dir))
+
+            env = report_templates.create_environment(cache_dir=cache_dir)
+            with mock.patch.object(env, 'compile', side_effect=AssertionError('recompiled')):
+                env.get_template('reports/scan_report.html')
+
+
+if __name__ == '__main__':
+    unittest.main()
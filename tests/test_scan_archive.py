@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import migrations
+import scan_archive
+from migrations import CLIENT_SCANS_DB, ensure_schema
+from scan_archive import archive_database, archive_path, hydrate_scan, tenant_storage_report, vacuum_database
+
+
+class TestScanArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'client_3_scans.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, scan_id TEXT UNIQUE, scanner_id TEXT,
+                timestamp TEXT, lead_name TEXT, lead_email TEXT, lead_company TEXT,
+                target_domain TEXT, scan_results TEXT, created_at TEXT
+            )
+        ''')
+        conn.executemany(
+            'INSERT INTO scans (scan_id, lead_email, scan_results, created_at) VALUES (?, ?, ?, ?)',
+            [('old', 'a@acme.io', json.dumps({'findings': ['x' * 1000]}), '2020-02-10T12:00:00'),
+             ('new', 'b@acme.io', json.dumps({'findings': []}), '2999-01-01T00:00:00')]
+        )
+        conn.commit()
+        conn.close()
+        ensure_schema(self.db_path, CLIENT_SCANS_DB)
+
+    def tearDown(self):
+        migrations._migrated_paths.clear()
+        migrations._schema_cache.clear()
+        self.tmpdir.cleanup()
+
+    def scan(self, scan_id):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            return dict(conn.execute('SELECT * FROM scans WHERE scan_id = ?', (scan_id,)).fetchone())
+        finally:
+            conn.close()
+
+    def test_archive_and_hydrate(self):
+        result = archive_database(self.db_path, older_than_days=30)
+        self.assertEqual(result, {'archived': 1, 'months': [202002]})
+        self.assertTrue(os.path.exists(archive_path(self.db_path, 202002)))
+
+        old = self.scan('old')
+        self.assertIsNone(old['scan_results'])
+        self.assertEqual(old['archived_month'], 202002)
+        self.assertIsNotNone(self.scan('new')['scan_results'])
+
+        restored = hydrate_scan(self.db_path, old)
+        self.assertEqual(len(restored['parsed_results']['findings']), 1)
+
+        # A second run finds nothing left to move
+        self.assertEqual(archive_database(self.db_path, older_than_days=30)['archived'], 0)
+
+    def test_storage_report_and_vacuum(self):
+        archive_database(self.db_path, older_than_days=30)
+        self.assertGreaterEqual(vacuum_database(self.db_path), 0)
+
+        report = tenant_storage_report(self.tmpdir.name)
+        self.assertEqual(len(report), 1)
+        self.assertEqual(report[0]['client_id'], '3')
+        self.assertEqual((report[0]['hot_scans'], report[0]['archived_scans']), (2, 1))
+        self.assertEqual(report[0]['archive_months'], 1)
+        self.assertGreater(report[0]['archive_bytes'], 0)
+
+    def test_full_vacuum_left_to_retention_job(self):
+        def auto_vacuum():
+            conn = sqlite3.connect(self.db_path)
+            try:
+                return conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            finally:
+                conn.close()
+
+        ensure_schema(self.db_path, CLIENT_SCANS_DB)
+        self.assertEqual(auto_vacuum(), 0)    # startup migration doesn't rewrite the file
+        vacuum_database(self.db_path)
+        self.assertEqual(auto_vacuum(), 2)
+
+    def test_retention_waits_before_first_run(self):
+        with mock.patch('maintenance.start_periodic_task') as start:
+            scan_archive.start_retention_scheduler()
+        start.assert_called_once_with('scan_retention', scan_archive.ARCHIVE_INTERVAL, scan_archive.run_retention,
+                                      first_delay=scan_archive.RETENTION_START_DELAY)
+        self.assertGreater(scan_archive.RETENTION_START_DELAY, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+import client_database_manager as manager
+import migrations
+from scan_export import export_stream, iter_rows, select_columns
+from scan_storage import PerClientScanStore, get_scan_store, set_scan_store
+
+
+def _scan(scan_id, email, timestamp, scanner_id='scanner_a'):
+    return {
+        'client_id': 7,
+        'scan_data': {
+            'scan_id': scan_id,
+            'scanner_id': scanner_id,
+            'timestamp': timestamp,
+            'email': email,
+            'name': 'Lead, "Quoted"',
+            'company': 'Acme',
+            'target': 'acme.io',
+            'risk_assessment': {'overall_score': 64},
+            'findings': ['open port']
+        }
+    }
+
+
+class TestScanExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_store = get_scan_store()
+        self.store = PerClientScanStore(self.tmpdir.name)
+        set_scan_store(self.store)
+        self.store.create_tenant(7, 'Exporter')
+        conn = sqlite3.connect(self.store.db_path(7))
+        manager._write_client_scans(conn, [
+            _scan('s1', 'a@acme.io', '2024-03-01T09:00:00'),
+            _scan('s2', 'b@acme.io', '2024-03-15T09:00:00'),
+            _scan('s3', 'a@acme.io', '2024-04-02T09:00:00', scanner_id='scanner_b')
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        set_scan_store(self.original_store)
+        migrations._migrated_paths.clear()
+        migrations._schema_cache.clear()
+        self.tmpdir.cleanup()
+
+    def test_csv_with_columns_and_date_range(self):
+        columns = select_columns('scans', 'scan_id,lead_name')
+        today = date.today().isoformat()
+        text = ''.join(export_stream(7, 'scans', 'csv', columns, date_from=today, date_to=today))
+        rows = list(csv.reader(io.StringIO(text)))
+        self.assertEqual(rows[0], ['scan_id', 'lead_name'])
+        self.assertEqual([row[0] for row in rows[1:]], ['s1', 's2', 's3'])
+        self.assertEqual(rows[1][1], 'Lead, "Quoted"')
+
+        # Scans are dated by when they were stored; nothing falls in an old range
+        text = ''.join(export_stream(7, 'scans', 'csv', columns, date_from='2000-01-01', date_to='2000-12-31'))
+        self.assertEqual(text.splitlines(), ['scan_id,lead_name'])
+
+    def test_csv_neutralises_formula_cells(self):
+        malicious = _scan('s4', 'evil@acme.io', '2024-04-03T09:00:00')
+        malicious['scan_data'].update({'name': '=HYPERLINK("http://evil.example","x")', 'company': '@SUM(1+1)',
+                                       'target': '-2+3'})
+        conn = sqlite3.connect(self.store.db_path(7))
+        manager._write_client_scans(conn, [malicious])
+        conn.commit()
+        conn.close()
+
+        columns = select_columns('scans', 'scan_id,lead_name,lead_company,target_domain,security_score')
+        rows = list(csv.reader(io.StringIO(''.join(export_stream(7, 'scans', 'csv', columns)))))
+        self.assertEqual(rows[-1], ['s4', '\'=HYPERLINK("http://evil.example","x")', "'@SUM(1+1)", "'-2+3", '64'])
+        self.assertEqual(rows[1][1], 'Lead, "Quoted"')
+
+        # NDJSON carries the values as submitted
+        record = json.loads(''.join(export_stream(7, 'scans', 'ndjson', columns)).splitlines()[-1])
+        self.assertEqual(record['lead_company'], '@SUM(1+1)')
+
+    def test_ndjson_scanner_history_and_leads(self):
+        columns = select_columns('scans', 'scan_id,scan_results')
+        lines = ''.join(export_stream(7, 'scans', 'ndjson', columns, scanner_id='scanner_b')).splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['scan_id'], 's3')
+        self.assertEqual(record['scan_results']['findings'], ['open port'])
+
+        leads = [json.loads(line) for line in ''.join(export_stream(7, 'leads', 'ndjson')).splitlines()]
+        self.assertEqual(sorted(lead['email'] for lead in leads), ['a@acme.io', 'b@acme.io'])
+
+    def test_rows_arrive_in_chunks(self):
+        chunks = list(iter_rows(7, 'scans', ['scan_id'], chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+
+    def test_rejects_unknown_columns(self):
+        with self.assertRaises(ValueError):
+            select_columns('scans', 'scan_id,password_hash')
+        with self.assertRaises(ValueError):
+            select_columns('users')
+
+    def test_rejects_bad_dates_before_streaming(self):
+        # Raised by export_stream itself, so the route can answer 400 before any header is sent
+        for bounds in ({'date_from': 'not-a-date'}, {'date_to': '2024-13-01'},
+                       {'date_from': '2024-05-01', 'date_to': '2024-04-01'}):
+            with self.assertRaises(ValueError):
+                export_stream(7, 'scans', 'csv', **bounds)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import client_database_manager as manager
+import migrations
+from pagination import invalidate_counts
+from scan_storage import ConsolidatedScanStore, PerClientScanStore, get_scan_store, migrate_layout, set_scan_store
+
+
+def _scan(client_id, scan_id, email):
+    return {
+        'client_id': client_id,
+        'scan_data': {
+            'scan_id': scan_id,
+            'scanner_id': f'scanner_{client_id}',
+            'timestamp': '2024-05-01T10:00:00',
+            'email': email,
+            'name': 'Lead',
+            'company': 'Acme',
+            'target': 'acme.io',
+            'risk_assessment': {'overall_score': 72}
+        }
+    }
+
+
+class TestScanStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_store = get_scan_store()
+        invalidate_counts()
+
+    def tearDown(self):
+        set_scan_store(self.original_store)
+        invalidate_counts()
+        migrations._migrated_paths.clear()
+        migrations._schema_cache.clear()
+        self.tmpdir.cleanup()
+
+    def write(self, store, payloads):
+        for payload in payloads:
+            conn = sqlite3.connect(store.db_path(payload['client_id']))
+            try:
+                manager._write_client_scans(conn, [payload])
+                conn.commit()
+            finally:
+                conn.close()
+
+    def test_consolidated_store_isolates_tenants(self):
+        store = ConsolidatedScanStore(os.path.join(self.tmpdir.name, 'consolidated.db'))
+        set_scan_store(store)
+        self.assertTrue(store.create_tenant(1, 'One'))
+        self.assertTrue(store.create_tenant(2, 'Two'))
+        self.write(store, [_scan(1, 'a', 'a@one.io'), _scan(1, 'b', 'b@one.io'), _scan(2, 'c', 'c@two.io')])
+
+        reports, pagination = manager.get_client_scan_reports(1)
+        self.assertEqual(sorted(r['scan_id'] for r in reports), ['a', 'b'])
+        self.assertEqual(pagination['total_count'], 2)
+        self.assertEqual(manager.get_client_scan_statistics(2)['total_scans'], 1)
+        self.assertEqual(store.tenant_ids(), [1, 2])
+        self.assertEqual(store.scan_totals()['clients_with_scans'], 2)
+        self.assertEqual(manager.get_scan_by_id('c')['scan_id'], 'c')
+
+    def test_migrate_per_client_to_consolidated(self):
+        source = PerClientScanStore(os.path.join(self.tmpdir.name, 'clients'))
+        target = ConsolidatedScanStore(os.path.join(self.tmpdir.name, 'consolidated.db'))
+        for client_id in (3, 4):
+            self.assertTrue(source.create_tenant(client_id, f'Tenant {client_id}'))
+        self.write(source, [_scan(3, 'x', 'x@three.io'), _scan(4, 'y', 'y@four.io'), _scan(4, 'z', 'z@four.io')])
+
+        totals = migrate_layout(source, target)
+        self.assertEqual((totals['tenants'], totals['scans'], totals['failed']), (2, 3, 0))
+        self.assertEqual(target.tenant_name(4), 'Tenant 4')
+        # Re-running skips rows that were already copied
+        migrate_layout(source, target)
+        self.assertEqual(target.scan_totals()['total_scans'], 3)
+
+        set_scan_store(target)
+        reports, _ = manager.get_client_scan_reports(4)
+        self.assertEqual(sorted(r['scan_id'] for r in reports), ['y', 'z'])
+
+
+if __name__ == '__main__':
+    unittest.main()
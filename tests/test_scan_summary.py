@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import email_handler
+import report_templates
+import scan_summary
+
+SCAN = {
+    'scan_id': 'scan_sum',
+    'target': 'example.com',
+    'risk_assessment': {'overall_score': 58, 'risk_level': 'Medium', 'grade': 'D'},
+    'network_security': {'findings': [{'title': '<b>RDP exposed</b>', 'severity': 'critical'}]},
+    'web_security': {'findings': [{'title': 'Missing HSTS', 'severity': 'Low'}]},
+    'recommendations': [{'title': 'Close port 3389', 'priority': 'high'}]
+}
+BRANDING = {
+    'company_name': 'Acme MSP',
+    'brand_color': '#123456',
+    'email_intro': 'Thanks for scanning.',
+    'has_logo': True,
+    'has_report': True
+}
+
+
+class TestScanSummary(unittest.TestCase):
+    def setUp(self):
+        scan_summary.clear()
+        self.addCleanup(scan_summary.clear)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for patcher in (mock.patch.object(scan_summary.invalidation, 'ensure_listening'),
+                        mock.patch.object(report_templates, 'JINJA_CACHE_DIR', self.tmpdir.name),
+                        mock.patch.object(report_templates, '_env', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_summary_and_bodies_built_once_per_scan(self):
+        with mock.patch.object(email_handler, 'create_comprehensive_text_summary',
+                               return_value='DETAILS') as details, \
+                mock.patch.object(scan_summary, 'render_html', wraps=scan_summary.render_html) as render_html:
+            first = email_handler.build_report_message(dict(SCAN), '<html>report</html>', BRANDING)
+            second = email_handler.build_report_message(dict(SCAN), '<html>report</html>', BRANDING)
+        self.assertEqual(details.call_count, 1)
+        self.assertEqual(render_html.call_count, 1)
+        bodies = [[part.get_payload() for part in msg.get_payload()[0].get_payload()] for msg in (first, second)]
+        self.assertEqual(bodies[0], bodies[1])
+
+        summary = scan_summary.get_summary(SCAN)
+        self.assertEqual([f['severity'] for f in summary['top_findings']], ['Critical'])
+        self.assertEqual(summary['recommendations'], [{'title': 'Close port 3389', 'priority': 'High'}])
+
+    def test_message_structure_and_escaping(self):
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as logo:
+            logo.write(b'\x89PNG\r\n\x1a\n' + b'\0' * 32)
+        self.addCleanup(os.remove, logo.name)
+
+        msg = email_handler.build_report_message(
+            dict(SCAN), '<html>full report</html>', BRANDING, scan_summary.load_logo(logo.name, tenant=1)
+        )
+        self.assertEqual(msg.get_content_type(), 'multipart/mixed')
+        related, attachment = msg.get_payload()
+        self.assertEqual(related.get_content_type(), 'multipart/related')
+        self.assertEqual(attachment.get_filename(), 'security-report.html')
+        alternative, logo_part = related.get_payload()
+        self.assertEqual(logo_part['Content-ID'], '<logo>')
+        text, html = (part.get_payload(decode=True).decode() for part in alternative.get_payload())
+        self.assertIn('Security Score: 58/100', text)
+        self.assertIn('cid:logo', html)
+        self.assertIn('&lt;b&gt;RDP exposed&lt;/b&gt;', html)
+        self.assertNotIn('<b>RDP exposed</b>', html)
+
+    def test_logo_read_once_per_tenant(self):
+        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as logo:
+            logo.write(b'\x89PNG\r\n\x1a\n' + b'\0' * 32)
+        self.addCleanup(os.remove, logo.name)
+
+        with mock.patch.object(scan_summary, 'MIMEImage', wraps=scan_summary.MIMEImage) as image:
+            first = scan_summary.load_logo(logo.name, tenant=1)
+            second = scan_summary.load_logo(logo.name, tenant=1)
+            scan_summary.load_logo(logo.name, tenant=2)
+        self.assertEqual(image.call_count, 2)
+        self.assertIsNot(first, second)
+        self.assertIsNone(scan_summary.load_logo(None))
+
+    def test_invalidation_drops_scan(self):
+        with mock.patch.object(email_handler, 'create_comprehensive_text_summary',
+                               return_value='DETAILS') as details:
+            scan_summary.get_summary(SCAN)
+            scan_summary._drop_scan(SCAN['scan_id'])
+            scan_summary.get_summary(SCAN)
+        self.assertEqual(details.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from search_index import (
+    build_match_query, ensure_global_catalog, ensure_scan_search_index, index_scan_globally,
+    rebuild_catalog_keys, scan_search_condition, search_leads, search_scans
+)
+
+
+class TestScanSearchIndex(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('''
+            CREATE TABLE scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, scan_id TEXT UNIQUE, scanner_id TEXT,
+                timestamp TEXT, lead_name TEXT, lead_email TEXT, lead_company TEXT,
+                target_domain TEXT, security_score INTEGER, risk_level TEXT
+            )
+        ''')
+        self.conn.execute('''
+            INSERT INTO scans (scan_id, lead_name, lead_email, lead_company, target_domain)
+            VALUES ('existing', 'Jane Doe', 'jane@acme.io', 'Acme Corp', 'acme.io')
+        ''')
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.db_path)
+
+    def matching_ids(self, text):
+        condition, params = scan_search_condition(text, 'id')
+        rows = self.conn.execute(f'SELECT scan_id FROM scans WHERE {condition}', params).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query('John@Acme'), '"john"* "acme"*')
+        self.assertIsNone(build_match_query(' %% '))
+
+    def test_prefix_search_and_sync(self):
+        ensure_scan_search_index(self.conn)
+        self.assertEqual(self.matching_ids('acm'), ['existing'])
+
+        self.conn.execute('''
+            INSERT INTO scans (scan_id, lead_name, lead_email, lead_company, target_domain)
+            VALUES ('new', 'Bob Smith', 'bob@globex.com', 'Globex', 'globex.com')
+        ''')
+        self.assertEqual(self.matching_ids('glob'), ['new'])
+
+        self.conn.execute("UPDATE scans SET lead_company = 'Initech' WHERE scan_id = 'new'")
+        self.assertEqual(self.matching_ids('globex corp'), [])
+        self.assertEqual(self.matching_ids('initech'), ['new'])
+
+        self.conn.execute("DELETE FROM scans WHERE scan_id = 'existing'")
+        self.assertEqual(self.matching_ids('jane'), [])
+
+    def test_ranked_results(self):
+        results = search_scans(self.conn, 'jane')
+        self.assertEqual([row['scan_id'] for row in results], ['existing'])
+
+    def test_global_catalog(self):
+        index_scan_globally(self.conn, 7, {'scan_id': 'abc', 'lead_email': 'ceo@initech.com'})
+        index_scan_globally(self.conn, 7, {'scan_id': 'abc', 'lead_email': 'cto@initech.com'})
+        leads = search_leads(self.conn, 'initech')
+        self.assertEqual(len(leads), 1)
+        self.assertEqual(leads[0]['lead_email'], 'cto@initech.com')
+        self.assertEqual(search_leads(self.conn, 'initech', client_id=8), [])
+
+    def test_catalog_rows_replaced_by_rowid(self):
+        # A row written before lead_search_keys existed
+        ensure_global_catalog(self.conn)
+        self.conn.execute("""
+            INSERT INTO lead_search (lead_email, client_id, scan_id) VALUES ('ceo@initech.com', 7, 'abc')
+        """)
+        rebuild_catalog_keys(self.conn)
+
+        index_scan_globally(self.conn, 7, {'scan_id': 'abc', 'lead_email': 'cto@initech.com'})
+        self.assertEqual([lead['lead_email'] for lead in search_leads(self.conn, 'initech')],
+                         ['cto@initech.com'])
+        rowid = self.conn.execute("SELECT search_rowid FROM lead_search_keys WHERE scan_id = 'abc'").fetchone()[0]
+        self.assertEqual(self.conn.execute("SELECT scan_id FROM lead_search WHERE rowid = ?", (rowid,)).fetchone(),
+                         ('abc',))
+
+
+if __name__ == '__main__':
+    unittest.main()
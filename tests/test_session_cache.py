@@ -0,0 +1,103 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# client_db creates its tables on import; keep them out of the checked-in database
+os.environ.setdefault('CLIENT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'client_scanner.db'))
+
+import auth_routes
+import auth_utils
+import client_db
+import invalidation
+import migrations
+import session_cache
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'main.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, email TEXT, role TEXT, '
+                     'full_name TEXT, active INTEGER DEFAULT 1)')
+        conn.execute('CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, '
+                     'session_token TEXT UNIQUE, created_at TEXT, expires_at TEXT)')
+        migrations._main_cache_invalidations(conn)
+        conn.execute("INSERT INTO users (id, username, email, role, full_name) VALUES (5, 'ann', 'ann@acme.io', 'client', 'Ann')")
+        expires = (datetime.now() + timedelta(hours=1)).isoformat()
+        conn.execute("INSERT INTO sessions (user_id, session_token, expires_at) VALUES (5, 'tok-live', ?)", (expires,))
+        conn.execute("INSERT INTO sessions (user_id, session_token, expires_at) VALUES (5, 'tok-old', '2000-01-01T00:00:00')")
+        conn.commit()
+        conn.close()
+
+        for patcher in (mock.patch.object(auth_utils, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(session_cache, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'ensure_listening')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        invalidation.apply_pending()
+
+    def tearDown(self):
+        session_cache.clear()
+        invalidation._last_id = None
+        self.tmpdir.cleanup()
+
+    def delete_session_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('DELETE FROM sessions')
+        conn.commit()
+        conn.close()
+
+    def test_second_verification_is_served_from_cache(self):
+        first = auth_utils.verify_session('tok-live')
+        self.assertEqual(first['status'], 'success')
+        # With the rows gone, only the cache can answer
+        self.delete_session_rows()
+        second = auth_utils.verify_session('tok-live')
+        self.assertEqual(second, first)
+        second['user']['username'] = 'changed'
+        self.assertEqual(auth_utils.verify_session('tok-live')['user']['username'], 'ann')
+
+    def test_logout_invalidates(self):
+        auth_utils.verify_session('tok-live')
+        self.assertEqual(auth_utils.logout_user('tok-live')['status'], 'success')
+        self.assertIsNone(session_cache.get_session('tok-live'))
+        self.assertEqual(auth_utils.verify_session('tok-live')['status'], 'error')
+
+    def test_invalidation_from_another_worker(self):
+        auth_utils.verify_session('tok-live')
+        self.assertIsNotNone(session_cache.get_session('tok-live'))
+
+        # Another worker deactivates the user and publishes through the shared table
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO cache_invalidations (channel, cache_key, created_at) VALUES ('session_user', '5', 0)")
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(invalidation.apply_pending(), 1)
+        self.assertIsNone(session_cache.get_session('tok-live'))
+
+    def test_profile_edit_invalidates(self):
+        auth_utils.verify_session('tok-live')
+        with mock.patch.object(client_db, 'CLIENT_DB_PATH', self.db_path):
+            # Saving unchanged details keeps the cached session
+            auth_routes.update_user(5, {'full_name': 'Ann', 'email': 'ann@acme.io'}, 1)
+            self.assertIsNotNone(session_cache.get_session('tok-live'))
+            auth_routes.update_user(5, {'full_name': 'Ann Lee', 'email': 'ann@acme.io'}, 1)
+        self.assertIsNone(session_cache.get_session('tok-live'))
+        self.assertEqual(auth_utils.verify_session('tok-live')['user']['full_name'], 'Ann Lee')
+
+    def test_sweep_removes_expired_sessions(self):
+        self.assertEqual(session_cache.sweep_expired_sessions()['sessions'], 1)
+        conn = sqlite3.connect(self.db_path)
+        tokens = [row[0] for row in conn.execute('SELECT session_token FROM sessions')]
+        conn.close()
+        self.assertEqual(tokens, ['tok-live'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+# client_db creates its tables on import; keep them out of the checked-in database
+os.environ.setdefault('CLIENT_DB_PATH', os.path.join(tempfile.mkdtemp(), 'client_scanner.db'))
+
+import api_key_cache
+import client_db
+import invalidation
+import migrations
+import tenant_config
+
+
+class TestTenantConfig(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'main.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('CREATE TABLE clients (id INTEGER PRIMARY KEY, business_name TEXT, api_key TEXT, '
+                     'subscription_level TEXT, default_scans TEXT)')
+        conn.execute('CREATE TABLE customizations (id INTEGER PRIMARY KEY, client_id INTEGER, primary_color TEXT, '
+                     'secondary_color TEXT, button_color TEXT, font_family TEXT, color_style TEXT, logo_path TEXT, '
+                     'email_subject TEXT, email_intro TEXT, scanner_description TEXT, cta_button_text TEXT, '
+                     'company_tagline TEXT, support_email TEXT, custom_footer_text TEXT, favicon_path TEXT)')
+        conn.execute('CREATE TABLE scanners (id INTEGER PRIMARY KEY, client_id INTEGER, scanner_id TEXT, name TEXT, '
+                     'api_key TEXT, primary_color TEXT, secondary_color TEXT, button_color TEXT, font_family TEXT, '
+                     'color_style TEXT, logo_url TEXT, email_subject TEXT, email_intro TEXT)')
+        conn.execute('CREATE TABLE deployed_scanners (id INTEGER PRIMARY KEY, client_id INTEGER, subdomain TEXT)')
+        migrations._main_cache_invalidations(conn)
+        migrations._main_tenant_config_version(conn)
+        conn.execute("INSERT INTO clients (id, business_name, api_key, subscription_level, default_scans) "
+                     "VALUES (3, 'Acme', 'client-key', 'starter', '[\"ssl\"]')")
+        conn.execute("INSERT INTO customizations (id, client_id, primary_color, button_color, cta_button_text) "
+                     "VALUES (40, 3, '#111111', '#222222', 'Scan me')")
+        conn.execute("INSERT INTO scanners (id, client_id, scanner_id, name, api_key, secondary_color) "
+                     "VALUES (8, 3, 'scn_a', 'Main', 'scanner-key', '#333333')")
+        conn.execute("INSERT INTO deployed_scanners VALUES (12, 3, 'acme')")
+        conn.commit()
+        conn.close()
+
+        for patcher in (mock.patch.object(tenant_config, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'CLIENT_DB_PATH', self.db_path),
+                        mock.patch.object(invalidation, 'ensure_listening')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        invalidation.apply_pending()
+
+    def tearDown(self):
+        tenant_config.clear()
+        api_key_cache.clear()
+        invalidation._last_id = None
+        self.tmpdir.cleanup()
+
+    def delete_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        for table in ('scanners', 'customizations', 'deployed_scanners'):
+            conn.execute(f'DELETE FROM {table}')
+        conn.commit()
+        conn.close()
+
+    def test_scanner_branding_is_served_from_memory(self):
+        scanner = tenant_config.get_scanner('scn_a')
+        self.assertEqual(scanner['final_primary_color'], '#111111')
+        self.assertEqual(scanner['final_secondary_color'], '#333333')
+        self.assertEqual(scanner['custom_button_color'], '#222222')
+        self.assertEqual(scanner['cta_button_text'], 'Scan me')
+        self.assertNotIn('api_key', scanner)
+
+        # With the rows gone, only the cache can answer
+        self.delete_rows()
+        scanner['name'] = 'changed'
+        self.assertEqual(tenant_config.get_scanner('scn_a')['name'], 'Main')
+
+    def test_client_and_subdomain_records(self):
+        client = tenant_config.get_client(3)
+        self.assertEqual(client['id'], 3)
+        self.assertEqual(client['primary_color'], '#111111')
+        self.assertEqual(client['default_scans'], ['ssl'])
+        self.assertNotIn('api_key', client)
+        self.assertEqual(tenant_config.get_client_by_subdomain('acme')['id'], 3)
+        self.assertIsNone(tenant_config.get_client_by_subdomain('nobody'))
+
+    def test_invalidate_bumps_version_and_reloads(self):
+        self.assertEqual(tenant_config.get_client(3)['config_version'], 0)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE customizations SET primary_color = '#444444'")
+        tenant_config.invalidate(3, conn)
+        conn.commit()
+        conn.close()
+
+        client = tenant_config.get_client(3)
+        self.assertEqual(client['config_version'], 1)
+        self.assertEqual(client['primary_color'], '#444444')
+
+    def test_invalidation_from_another_worker(self):
+        tenant_config.get_scanner('scn_a')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO cache_invalidations (channel, cache_key, created_at) VALUES ('tenant_config', '3', 0)")
+        conn.commit()
+        conn.close()
+        self.delete_rows()
+        invalidation.apply_pending()
+        self.assertIsNone(tenant_config.get_scanner('scn_a'))
+
+    def test_deactivation_drops_client_and_subdomain_entries(self):
+        conn = sqlite3.connect(self.db_path)
+        for statement in ('ALTER TABLE clients ADD COLUMN active INTEGER DEFAULT 1',
+                          'ALTER TABLE clients ADD COLUMN updated_at TEXT',
+                          'ALTER TABLE clients ADD COLUMN updated_by INTEGER',
+                          'ALTER TABLE deployed_scanners ADD COLUMN deploy_status TEXT',
+                          'ALTER TABLE deployed_scanners ADD COLUMN last_updated TEXT'):
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+        self.assertEqual(tenant_config.get_client(3)['active'], 1)
+        self.assertEqual(tenant_config.get_client_by_subdomain('acme')['active'], 1)
+
+        with mock.patch.object(client_db, 'CLIENT_DB_PATH', self.db_path):
+            self.assertEqual(client_db.deactivate_client(3)['status'], 'success')
+        self.assertEqual(tenant_config.get_client(3)['active'], 0)
+        subdomain = tenant_config.get_client_by_subdomain('acme')
+        self.assertEqual((subdomain['active'], subdomain['deploy_status']), (0, 'inactive'))
+
+
+if __name__ == '__main__':
+    unittest.main()
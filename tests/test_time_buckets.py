@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from time_buckets import bucket_label, day_range_epochs, ensure_time_buckets, month_bucket
+
+
+class TestTimeBuckets(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('CREATE TABLE scans (id INTEGER PRIMARY KEY, scan_id TEXT UNIQUE, created_at TEXT)')
+        self.conn.execute("INSERT INTO scans (scan_id, created_at) VALUES ('old', '2025-03-04T10:11:12.123456')")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.db_path)
+
+    def test_backfill_and_trigger(self):
+        self.assertTrue(ensure_time_buckets(self.conn, 'scans'))
+        self.conn.execute("INSERT INTO scans (scan_id, created_at) VALUES ('new', '2025-03-31T23:59:59')")
+        rows = dict(
+            (row[0], row[1:]) for row in self.conn.execute(
+                'SELECT scan_id, day_bucket, week_bucket, month_bucket FROM scans')
+        )
+        self.assertEqual(rows['old'], (20250304, 202509, 202503))
+        self.assertEqual(rows['new'][0], 20250331)
+
+        self.conn.execute("UPDATE scans SET created_at = '2025-04-01T00:00:00' WHERE scan_id = 'new'")
+        self.assertEqual(
+            self.conn.execute("SELECT month_bucket FROM scans WHERE scan_id = 'new'").fetchone()[0],
+            month_bucket('2025-04-01T00:00:00')
+        )
+
+    def test_day_range_matches_date_filter(self):
+        ensure_time_buckets(self.conn, 'scans')
+        start, end = day_range_epochs('2025-03-04', '2025-03-04')
+        count = self.conn.execute('SELECT COUNT(*) FROM scans WHERE epoch >= ? AND epoch < ?', (start, end)).fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_bucket_label(self):
+        self.assertEqual(bucket_label(20250304, 'day_bucket'), '2025-03-04')
+        self.assertEqual(bucket_label(202503, 'month_bucket'), '2025-03')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import write_behind
+
+
+def _write_events(conn, payloads):
+    conn.executemany(
+        'INSERT OR REPLACE INTO events (event_id, value) VALUES (?, ?)',
+        [(p['event_id'], p['value']) for p in payloads]
+    )
+
+
+class TestWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.target = os.path.join(self.tmpdir.name, 'target.db')
+        self.original_spool = write_behind.SPOOL_PATH
+        self.original_handlers = dict(write_behind._handlers)
+        write_behind.SPOOL_PATH = os.path.join(self.tmpdir.name, 'spool.db')
+        conn = sqlite3.connect(self.target)
+        conn.execute('CREATE TABLE events (event_id TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        conn.close()
+        write_behind._handlers.clear()
+        write_behind.register_handler('event', lambda payload: self.target, _write_events)
+        # Keep the background writer out of the way so the queue can be inspected
+        patcher = mock.patch.object(write_behind, '_ensure_writer')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        write_behind._handlers.clear()
+        write_behind._handlers.update(self.original_handlers)
+        write_behind._local_pending.clear()
+        write_behind.SPOOL_PATH = self.original_spool
+        self.tmpdir.cleanup()
+
+    def events(self):
+        conn = sqlite3.connect(self.target)
+        try:
+            return dict(conn.execute('SELECT event_id, value FROM events').fetchall())
+        finally:
+            conn.close()
+
+    def test_pending_until_flushed(self):
+        write_behind.enqueue('event', {'event_id': 'a', 'value': 'one'}, item_key='a')
+        write_behind.enqueue('event', {'event_id': 'b', 'value': 'two'}, item_key='b')
+        self.assertEqual(write_behind.queue_depth(), 2)
+        self.assertEqual(write_behind.get_pending('event', 'a')['value'], 'one')
+        self.assertEqual(self.events(), {})
+
+        self.assertTrue(write_behind.flush(timeout=5))
+        self.assertEqual(self.events(), {'a': 'one', 'b': 'two'})
+        self.assertEqual(write_behind.queue_depth(), 0)
+        self.assertIsNone(write_behind.get_pending('event', 'a'))
+
+    def test_spool_survives_process_state(self):
+        write_behind.enqueue('event', {'event_id': 'c', 'value': 'three'}, item_key='c')
+        # A new process only has the spool, not the in-memory overlay
+        write_behind._local_pending.clear()
+        self.assertEqual(write_behind.get_pending('event', 'c')['value'], 'three')
+        self.assertEqual(write_behind.drain_once(), 1)
+        self.assertEqual(self.events(), {'c': 'three'})
+
+    def test_disabled_writes_synchronously(self):
+        write_behind.ENABLED = False
+        try:
+            self.assertTrue(write_behind.enqueue('event', {'event_id': 'd', 'value': 'four'}))
+        finally:
+            write_behind.ENABLED = True
+        self.assertEqual(self.events(), {'d': 'four'})
+        self.assertEqual(write_behind.queue_depth(), 0)
+
+    def expire_claims(self):
+        conn = sqlite3.connect(write_behind.SPOOL_PATH)
+        conn.execute('UPDATE pending_writes SET claimed_at = 0')
+        conn.commit()
+        conn.close()
+
+    def dead_writes(self):
+        conn = sqlite3.connect(write_behind.SPOOL_PATH)
+        try:
+            return [row[0] for row in conn.execute('SELECT item_key FROM dead_writes ORDER BY id')]
+        finally:
+            conn.close()
+
+    def test_bad_write_does_not_fail_its_group(self):
+        write_behind.enqueue('event', {'event_id': 'e', 'value': 'five'}, item_key='e')
+        write_behind.enqueue('event', {'event_id': 'f', 'value': None}, item_key='f')   # NOT NULL
+        write_behind.enqueue('event', {'event_id': 'g', 'value': 'seven'}, item_key='g')
+        self.assertEqual(write_behind.drain_once(), 3)
+        self.assertEqual(self.events(), {'e': 'five', 'g': 'seven'})
+        self.assertEqual(write_behind.queue_depth(), 1)
+        self.assertIsNotNone(write_behind.get_pending('event', 'f'))
+
+    def test_exhausted_writes_are_dead_lettered(self):
+        write_behind.enqueue('event', {'event_id': 'h', 'value': None}, item_key='h')
+        with self.assertLogs('write_behind', 'ERROR') as logs:
+            for _ in range(write_behind.MAX_ATTEMPTS):
+                self.assertEqual(write_behind.drain_once(), 1)
+                self.expire_claims()
+        self.assertTrue(any('dead_writes' in line for line in logs.output))
+        self.assertEqual(self.dead_writes(), ['h'])
+        self.assertEqual(write_behind.queue_depth(), 0)
+        self.assertIsNone(write_behind.get_pending('event', 'h'))
+        self.assertEqual(write_behind.dead_letter_count(), 1)
+
+    def test_crashed_final_attempt_is_dead_lettered(self):
+        write_behind.enqueue('event', {'event_id': 'i', 'value': 'nine'}, item_key='i')
+        write_behind._local_pending.clear()
+        conn = sqlite3.connect(write_behind.SPOOL_PATH)
+        conn.execute('UPDATE pending_writes SET attempts = ?', (write_behind.MAX_ATTEMPTS,))
+        conn.commit()
+        conn.close()
+        self.expire_claims()
+        self.assertEqual(write_behind.queue_depth(), 0)
+        self.assertIsNone(write_behind.get_pending('event', 'i'))
+        with self.assertLogs('write_behind', 'ERROR'):
+            self.assertEqual(write_behind.drain_once(), 0)
+        self.assertEqual(self.dead_writes(), ['i'])
+
+    def test_missing_target_database_is_not_created(self):
+        missing = os.path.join(self.tmpdir.name, 'missing.db')
+        write_behind.register_handler('event', lambda payload: missing, _write_events)
+        write_behind.enqueue('event', {'event_id': 'j', 'value': 'ten'}, item_key='j')
+        write_behind.drain_once()
+        self.assertFalse(os.path.exists(missing))
+        self.assertEqual(write_behind.queue_depth(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Precomputed time columns for scan tables.
+
+Timestamps are stored as ISO strings, and filters such as DATE(created_at) or
+strftime('%Y-%m', created_at) can't use an index. Each scan table gets an
+integer epoch plus day/week/month bucket columns, filled by triggers on insert
+and update, so date filters and time-series groupings become index range scans.
+
+Buckets are integers: day YYYYMMDD, week YYYYWW (strftime %W), month YYYYMM.
+The epoch treats stored wall-clock timestamps as UTC, matching SQLite's
+strftime('%s', ...), so bounds computed here line up with the triggers.
+"""
+
+import calendar
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKET_COLUMNS = ['epoch', 'day_bucket', 'week_bucket', 'month_bucket']
+
+# Tables and the time column each one is bucketed on, in order of preference
+BUCKETED_TABLES = {
+    'scans': ['created_at', 'timestamp'],
+    'scan_history': ['timestamp', 'created_at']
+}
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def _bucket_expressions(time_column, alias):
+    """SQL expressions computing each bucket column from a time column"""
+    source = f"{alias}.{time_column}"
+    return {
+        'epoch': f"CAST(strftime('%s', {source}) AS INTEGER)",
+        'day_bucket': f"CAST(strftime('%Y%m%d', {source}) AS INTEGER)",
+        'week_bucket': f"CAST(strftime('%Y%W', {source}) AS INTEGER)",
+        'month_bucket': f"CAST(strftime('%Y%m', {source}) AS INTEGER)"
+    }
+
+
+def ensure_time_buckets(conn, table):
+    """
+    Add bucket columns, indexes and sync triggers to a table, and backfill
+    existing rows. Safe to call repeatedly; work is done once per database.
+
+    Returns:
+        bool: True if the table has bucket columns after the call
+    """
+    try:
+        db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+    except Exception:
+        db_path = None
+
+    migration_key = (db_path, table)
+    if db_path and migration_key in _migrated:
+        return True
+
+    with _migrated_lock:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [col[1] for col in cursor.fetchall()]
+        if not columns:
+            return False
+
+        time_column = next((col for col in BUCKETED_TABLES.get(table, []) if col in columns), None)
+        if not time_column:
+            logger.warning(f"No time column found on {table}; skipping time buckets")
+            return False
+
+        for column in TIME_BUCKET_COLUMNS:
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+
+        for column in TIME_BUCKET_COLUMNS:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table}({column})")
+
+        new_values = _bucket_expressions(time_column, 'NEW')
+        assignments = ', '.join(f"{col} = {expr}" for col, expr in new_values.items())
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_time_buckets_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                UPDATE {table} SET {assignments} WHERE rowid = NEW.rowid;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_time_buckets_update
+            AFTER UPDATE OF {time_column} ON {table}
+            BEGIN
+                UPDATE {table} SET {assignments} WHERE rowid = NEW.rowid;
+            END
+        """)
+
+        # Backfill rows written before the columns existed
+        row_values = _bucket_expressions(time_column, table)
+        backfill = ', '.join(f"{col} = {expr}" for col, expr in row_values.items())
+        cursor.execute(f"UPDATE {table} SET {backfill} WHERE epoch IS NULL AND {time_column} IS NOT NULL")
+        if cursor.rowcount and cursor.rowcount > 0:
+            logger.info(f"Backfilled time buckets for {cursor.rowcount} rows in {table}")
+
+        conn.commit()
+        if db_path:
+            _migrated.add(migration_key)
+        return True
+
+
+def to_epoch(value):
+    """Convert a datetime, date string or ISO timestamp to the bucket epoch"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', ''))
+    return calendar.timegm(value.timetuple())
+
+
+def day_bucket(value):
+    """Day bucket (YYYYMMDD) for a datetime or ISO string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', ''))
+    return int(value.strftime('%Y%m%d'))
+
+
+def week_bucket(value):
+    """Week bucket (YYYYWW, Monday-based like strftime %W)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', ''))
+    return int(value.strftime('%Y%W'))
+
+
+def month_bucket(value):
+    """Month bucket (YYYYMM) for a datetime or ISO string"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', ''))
+    return int(value.strftime('%Y%m'))
+
+
+def day_range_epochs(date_from=None, date_to=None):
+    """
+    Epoch bounds for an inclusive date range given as YYYY-MM-DD strings.
+
+    Returns:
+        tuple: (start_epoch or None, end_epoch_exclusive or None)
+    """
+    start = to_epoch(date_from[:10]) if date_from else None
+    end = None
+    if date_to:
+        end = calendar.timegm((datetime.fromisoformat(date_to[:10]) + timedelta(days=1)).timetuple())
+    return start, end
+
+
+def bucket_label(bucket, column):
+    """Format a bucket integer the way the old strftime GROUP BY keys looked"""
+    if bucket is None:
+        return None
+    if column == 'day_bucket':
+        return f"{bucket // 10000:04d}-{bucket // 100 % 100:02d}-{bucket % 100:02d}"
+    return f"{bucket // 100:04d}-{bucket % 100:02d}"
+
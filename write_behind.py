@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Durable write-behind pipeline for post-scan persistence.
+
+Completed scans, leads and activity/audit rows used to be written
+synchronously to several SQLite files, each with its own commit and a 20s
+lock timeout. Writes now go to a small local spool database and return
+immediately; a background writer claims batches, groups them by target
+database and applies each group in a single transaction, with every write in
+its own savepoint so one bad payload only fails itself.
+
+The spool is shared by every gunicorn worker. Rows are claimed before they
+are applied, and claims older than CLAIM_TIMEOUT are retried, so a crashed
+worker's writes are picked up by another one. Delivery is at-least-once, so
+handlers must be idempotent (upserts / INSERT OR IGNORE). A write that
+fails MAX_ATTEMPTS times is moved to the dead_writes table and logged as an
+error instead of being retried forever. Target databases are opened
+read-write only, so a write for a missing database fails rather than
+creating an empty one.
+
+Read-your-writes: pending payloads can be looked up by key (e.g. scan_id)
+with get_pending(), which checks this process first and then the spool.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.environ.get(
+    'WRITE_BEHIND_SPOOL',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'write_behind_spool.db')
+)
+ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'True') == 'True'
+
+BATCH_SIZE = 200
+POLL_INTERVAL = 0.5       # seconds between idle polls of the spool
+CLAIM_TIMEOUT = 60        # seconds before another worker may retry a claim
+MAX_ATTEMPTS = 5
+MAX_LOCAL_PENDING = 1000  # read-your-writes overlay entries kept in memory
+
+# kind -> (target_func(payload) -> db_path, apply_func(conn, payloads))
+_handlers = {}
+
+_local_pending = OrderedDict()
+_local_lock = threading.Lock()
+_wakeup = threading.Event()
+_writer_thread = None
+_writer_lock = threading.Lock()
+_stopping = False
+
+
+def register_handler(kind, target_func, apply_func):
+    """
+    Register how a kind of write is persisted.
+
+    Args:
+        kind (str): Write type, e.g. 'client_scan'
+        target_func: Callable returning the database path a payload belongs to
+        apply_func: Callable(conn, payloads) writing a batch without committing
+    """
+    _handlers[kind] = (target_func, apply_func)
+
+
+def _connect_spool():
+    conn = sqlite3.connect(SPOOL_PATH, timeout=5.0)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS pending_writes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        item_key TEXT,
+        payload TEXT NOT NULL,
+        enqueued_at TEXT NOT NULL,
+        claimed_by TEXT,
+        claimed_at REAL,
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_writes_key ON pending_writes(kind, item_key)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pending_writes_claim ON pending_writes(claimed_at, id)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS dead_writes (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        item_key TEXT,
+        payload TEXT NOT NULL,
+        enqueued_at TEXT NOT NULL,
+        attempts INTEGER,
+        last_error TEXT,
+        failed_at TEXT NOT NULL
+    )
+    ''')
+    return conn
+
+
+def _connect_target(db_path):
+    """Open an existing target database; never create one"""
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=rw"
+    return sqlite3.connect(uri, uri=True, timeout=20.0)
+
+
+def _live_clause():
+    """WHERE fragment excluding rows that have used up their attempts"""
+    return '(attempts < ? OR claimed_at >= ?)', [MAX_ATTEMPTS, time.time() - CLAIM_TIMEOUT]
+
+
+def enqueue(kind, payload, item_key=None):
+    """
+    Queue a write for the background writer.
+
+    Falls back to applying the write synchronously if write-behind is
+    disabled or the spool is unavailable, so callers never lose data.
+
+    Returns:
+        bool: True if the write was queued or applied
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No write-behind handler registered for '{kind}'")
+
+    if not ENABLED:
+        return _apply_now(kind, [payload])
+
+    try:
+        conn = _connect_spool()
+        try:
+            conn.execute(
+                'INSERT INTO pending_writes (kind, item_key, payload, enqueued_at) VALUES (?, ?, ?, ?)',
+                (kind, item_key, json.dumps(payload, default=str), datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Write-behind spool unavailable, writing {kind} synchronously: {e}")
+        return _apply_now(kind, [payload])
+
+    if item_key is not None:
+        with _local_lock:
+            _local_pending[(kind, item_key)] = payload
+            while len(_local_pending) > MAX_LOCAL_PENDING:
+                _local_pending.popitem(last=False)
+
+    _ensure_writer()
+    _wakeup.set()
+    return True
+
+
+def get_pending(kind, item_key):
+    """Return a queued payload that hasn't been persisted yet, or None"""
+    with _local_lock:
+        payload = _local_pending.get((kind, item_key))
+    if payload is not None:
+        return payload
+
+    if not ENABLED or not os.path.exists(SPOOL_PATH):
+        return None
+    live, live_params = _live_clause()
+    try:
+        conn = _connect_spool()
+        try:
+            row = conn.execute(
+                f'SELECT payload FROM pending_writes WHERE kind = ? AND item_key = ? AND {live} '
+                'ORDER BY id DESC LIMIT 1',
+                [kind, item_key] + live_params
+            ).fetchone()
+        finally:
+            conn.close()
+        return json.loads(row[0]) if row else None
+    except Exception as e:
+        logger.warning(f"Could not read write-behind spool: {e}")
+        return None
+
+
+def queue_depth():
+    """Number of writes waiting in the spool (dead letters excluded)"""
+    if not os.path.exists(SPOOL_PATH):
+        return 0
+    live, live_params = _live_clause()
+    try:
+        conn = _connect_spool()
+        try:
+            return conn.execute(f'SELECT COUNT(*) FROM pending_writes WHERE {live}', live_params).fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        return 0
+
+
+def dead_letter_count():
+    """Number of writes that were given up on"""
+    if not os.path.exists(SPOOL_PATH):
+        return 0
+    try:
+        conn = _connect_spool()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM dead_writes').fetchone()[0]
+        finally:
+            conn.close()
+    except Exception:
+        return 0
+
+
+def _apply_now(kind, payloads):
+    target_func, apply_func = _handlers[kind]
+    try:
+        conn = _connect_target(target_func(payloads[0]))
+    except sqlite3.Error as e:
+        logger.error(f"Error writing {kind}: {e}")
+        return False
+    try:
+        apply_func(conn, payloads)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error writing {kind}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _claim_batch(conn, worker_id):
+    """Claim up to BATCH_SIZE unclaimed (or stale) writes for this worker"""
+    kinds = list(_handlers)
+    if not kinds:
+        return []
+    now = time.time()
+    placeholders = ', '.join('?' for _ in kinds)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Rows whose last attempt crashed with the worker are never reclaimed
+        _bury(conn, 'claimed_at < ? AND attempts >= ?', [now - CLAIM_TIMEOUT, MAX_ATTEMPTS])
+        conn.execute(f'''
+            UPDATE pending_writes SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM pending_writes
+                WHERE kind IN ({placeholders})
+                  AND (claimed_at IS NULL OR claimed_at < ?)
+                  AND attempts < ?
+                ORDER BY id
+                LIMIT ?
+            )
+        ''', [worker_id, now] + kinds + [now - CLAIM_TIMEOUT, MAX_ATTEMPTS, BATCH_SIZE])
+        rows = conn.execute(
+            'SELECT id, kind, item_key, payload, attempts FROM pending_writes '
+            'WHERE claimed_by = ? AND claimed_at = ? ORDER BY id',
+            (worker_id, now)
+        ).fetchall()
+        conn.execute('COMMIT')
+        return rows
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _bury(spool_conn, where, params):
+    """Move matching spool rows to dead_writes (caller commits). Returns the number moved"""
+    moved = spool_conn.execute(f'''
+        INSERT OR REPLACE INTO dead_writes (id, kind, item_key, payload, enqueued_at, attempts, last_error, failed_at)
+        SELECT id, kind, item_key, payload, enqueued_at, attempts, last_error, ?
+        FROM pending_writes WHERE {where}
+    ''', [datetime.now().isoformat()] + list(params)).rowcount
+    if moved:
+        spool_conn.execute(f'DELETE FROM pending_writes WHERE {where}', list(params))
+        logger.error(f"Write-behind gave up on {moved} write(s) after {MAX_ATTEMPTS} attempts; moved to dead_writes")
+    return moved
+
+
+def _apply_group(db_path, kind, items):
+    """
+    Apply one target database's writes in a single transaction.
+
+    Each write runs in its own savepoint, so a failing payload is rolled
+    back on its own and the others still commit.
+
+    Returns:
+        tuple: (applied items, [(item, error), ...] failed items)
+    """
+    _, apply_func = _handlers[kind]
+    try:
+        conn = _connect_target(db_path)
+    except sqlite3.Error as e:
+        return [], [(item, e) for item in items]
+
+    applied, failed = [], []
+    try:
+        conn.execute('BEGIN')
+        for item in items:
+            conn.execute('SAVEPOINT write_item')
+            try:
+                apply_func(conn, [item[3]])
+                conn.execute('RELEASE SAVEPOINT write_item')
+                applied.append(item)
+            except Exception as e:
+                conn.execute('ROLLBACK TO SAVEPOINT write_item')
+                conn.execute('RELEASE SAVEPOINT write_item')
+                failed.append((item, e))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return [], [(item, e) for item in items]
+    finally:
+        conn.close()
+    return applied, failed
+
+
+def _process_batch(spool_conn, rows):
+    """Group claimed writes by target database and apply each group in one transaction"""
+    groups = OrderedDict()
+    for row_id, kind, item_key, payload_json, attempts in rows:
+        payload = json.loads(payload_json)
+        target_func, _ = _handlers[kind]
+        try:
+            db_path = target_func(payload)
+        except Exception as e:
+            db_path = None
+            logger.error(f"Write-behind could not route {kind} write {row_id}: {e}")
+        groups.setdefault((db_path, kind), []).append((row_id, item_key, attempts, payload))
+
+    for (db_path, kind), items in groups.items():
+        if db_path is None:
+            applied, failed = [], [(item, 'no target database') for item in items]
+        else:
+            applied, failed = _apply_group(db_path, kind, items)
+
+        if applied:
+            row_ids = [item[0] for item in applied]
+            spool_conn.execute(
+                f"DELETE FROM pending_writes WHERE id IN ({', '.join('?' for _ in row_ids)})", row_ids
+            )
+            with _local_lock:
+                for _, item_key, _, _ in applied:
+                    if item_key is not None:
+                        _local_pending.pop((kind, item_key), None)
+            logger.info(f"Write-behind committed {len(applied)} {kind} write(s) to {os.path.basename(db_path)}")
+
+        for (row_id, item_key, attempts, _), error in failed:
+            logger.error(f"Write-behind {kind} write {row_id} on {db_path} failed (attempt {attempts}): {error}")
+            # Release the claim so the write is retried after a short delay
+            spool_conn.execute(
+                'UPDATE pending_writes SET claimed_at = ?, last_error = ? WHERE id = ?',
+                (time.time() - CLAIM_TIMEOUT + 5, str(error), row_id)
+            )
+            if attempts >= MAX_ATTEMPTS:
+                _bury(spool_conn, 'id = ?', [row_id])
+                with _local_lock:
+                    if item_key is not None:
+                        _local_pending.pop((kind, item_key), None)
+        spool_conn.commit()
+
+
+def drain_once():
+    """Claim and apply one batch. Returns the number of writes processed"""
+    worker_id = f"{os.getpid()}-{threading.get_ident()}"
+    spool_conn = _connect_spool()
+    try:
+        rows = _claim_batch(spool_conn, worker_id)
+        if rows:
+            _process_batch(spool_conn, rows)
+        return len(rows)
+    finally:
+        spool_conn.close()
+
+
+def _writer_loop():
+    while not _stopping:
+        try:
+            processed = drain_once()
+        except Exception as e:
+            logger.error(f"Write-behind writer error: {e}")
+            processed = 0
+        if not processed:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+
+
+def _ensure_writer():
+    global _writer_thread
+    if _writer_thread and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread and _writer_thread.is_alive():
+            return
+        _writer_thread = threading.Thread(target=_writer_loop, name='write-behind', daemon=True)
+        _writer_thread.start()
+
+
+def start_writer():
+    """Start the background writer (also replays writes left by a previous process)"""
+    if ENABLED:
+        _ensure_writer()
+
+
+def flush(timeout=10.0):
+    """
+    Apply queued writes in the calling thread until the spool is empty.
+
+    Returns:
+        bool: True if nothing is left pending for registered kinds
+    """
+    if not os.path.exists(SPOOL_PATH):
+        return True
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if not drain_once():
+                if _pending_for_registered_kinds() == 0:
+                    # Anything still in the overlay was applied by another worker
+                    with _local_lock:
+                        _local_pending.clear()
+                    return True
+                time.sleep(0.05)
+        except Exception as e:
+            logger.error(f"Error flushing write-behind queue: {e}")
+            time.sleep(0.1)
+    return False
+
+
+def _pending_for_registered_kinds():
+    kinds = list(_handlers)
+    if not kinds:
+        return 0
+    placeholders = ', '.join('?' for _ in kinds)
+    live, live_params = _live_clause()
+    conn = _connect_spool()
+    try:
+        return conn.execute(
+            f'SELECT COUNT(*) FROM pending_writes WHERE kind IN ({placeholders}) AND {live}',
+            kinds + live_params
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+@atexit.register
+def _flush_on_exit():
+    global _stopping
+    _stopping = True
+    _wakeup.set()
+    if ENABLED and _handlers:
+        flush(timeout=5.0)